@@ -37,6 +37,9 @@ class Config:
     
     # База данных
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///bot.db")
+    # Применять миграции Alembic при запуске; если выключено, бот не стартует
+    # на устаревшей схеме и миграции нужно выполнить вручную (alembic upgrade head)
+    DB_AUTO_MIGRATE: bool = os.getenv("DB_AUTO_MIGRATE", "true").lower() == "true"
     
     # Окружение
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
@@ -50,6 +53,8 @@ class Config:
     DATA_DIR: Path = BASE_DIR / "data"
     IMAGES_DIR: Path = DATA_DIR / "images"
     TEMPLATES_DIR: Path = DATA_DIR / "templates"
+    CHARTS_DIR: Path = DATA_DIR / "charts"
+    EXPORTS_DIR: Path = DATA_DIR / "exports"
     
     # Настройки генерации
     MAX_TEXT_LENGTH: int = 2000  # Максимальная длина текста для генерации
@@ -62,7 +67,94 @@ class Config:
     MAX_CONTENT_PLAN_DAYS: int = 90  # Максимум 90 дней для контент-плана
     
     # Настройки истории
-    MAX_HISTORY_ITEMS: int = 100  # Максимум элементов в истории на пользователя
+    MAX_HISTORY_ITEMS: int = int(os.getenv("MAX_HISTORY_ITEMS", "100"))  # Максимум элементов в истории на пользователя (на тип контента)
+    MAX_HISTORY_IMAGES: int = int(os.getenv("MAX_HISTORY_IMAGES", "50"))  # Максимум изображений в истории на пользователя
+    HISTORY_FLUSH_INTERVAL_MS: int = int(os.getenv("HISTORY_FLUSH_INTERVAL_MS", "500"))  # Интервал пакетной записи истории
+    HISTORY_FLUSH_BATCH_SIZE: int = int(os.getenv("HISTORY_FLUSH_BATCH_SIZE", "100"))  # Размер пакета, запускающий запись досрочно
+    HISTORY_WRITE_MAX_ATTEMPTS: int = int(os.getenv("HISTORY_WRITE_MAX_ATTEMPTS", "3"))  # Попыток записи строки до отбрасывания
+    ACTIVITY_HALF_LIFE_DAYS: float = float(os.getenv("ACTIVITY_HALF_LIFE_DAYS", "14"))  # Период полураспада весов профиля активности
+    ACTIVITY_WINDOW_DAYS: int = int(os.getenv("ACTIVITY_WINDOW_DAYS", "90"))  # Глубина истории при первом построении профиля
+    
+    # Очистка истории (ретеншн): лишние и старые записи переносятся в архив
+    HISTORY_RETENTION_ENABLED: bool = os.getenv("HISTORY_RETENTION_ENABLED", "true").lower() == "true"
+    HISTORY_RETENTION_DAYS: int = int(os.getenv("HISTORY_RETENTION_DAYS", "365"))  # 0 - без ограничения по возрасту
+    HISTORY_RETENTION_INTERVAL_MINUTES: int = int(os.getenv("HISTORY_RETENTION_INTERVAL_MINUTES", "15"))  # Период запуска
+    HISTORY_RETENTION_BATCH_SIZE: int = int(os.getenv("HISTORY_RETENTION_BATCH_SIZE", "100"))  # Записей в одной транзакции
+    HISTORY_RETENTION_USERS_PER_RUN: int = int(os.getenv("HISTORY_RETENTION_USERS_PER_RUN", "100"))  # Пользователей за запуск
+    HISTORY_RETENTION_PAUSE_MS: int = int(os.getenv("HISTORY_RETENTION_PAUSE_MS", "50"))  # Пауза между транзакциями
+    
+    # Фоновый перенос данных после миграций схемы (bot.services.data_backfill)
+    DATA_BACKFILL_PAUSE_MS: int = int(os.getenv("DATA_BACKFILL_PAUSE_MS", "50"))  # Пауза между пачками
+    
+    # Получение обновлений: polling или webhook
+    BOT_MODE: str = os.getenv("BOT_MODE", "polling").lower()
+    DROP_PENDING_UPDATES: bool = os.getenv("DROP_PENDING_UPDATES", "false").lower() == "true"  # Только для polling
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "")  # Публичный HTTPS URL, например https://bot.example.org/telegram
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")  # 1-256 символов: A-Z, a-z, 0-9, _ и -
+    WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+    WEBHOOK_QUEUE_SIZE: int = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))  # Входная очередь; при переполнении - 503
+    WEBHOOK_MAX_CONNECTIONS: int = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))  # Параллельных соединений от Telegram
+    
+    # Многопроцессный режим: супервизор принимает обновления и распределяет их по процессам
+    WORKER_PROCESSES: int = int(os.getenv("WORKER_PROCESSES", "1"))  # 1 - один процесс без супервизора
+    WORKER_INDEX: int = int(os.getenv("BOT_WORKER_INDEX", "-1"))  # Номер процесса-обработчика (задает супервизор)
+    WORKER_SOCKET: str = os.getenv("WORKER_SOCKET", str(Path(__file__).parent.parent / "data" / "workers.sock"))
+    WORKER_QUEUE_SIZE: int = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))  # Очередь обновлений на процесс
+    WORKER_HEARTBEAT_INTERVAL: float = float(os.getenv("WORKER_HEARTBEAT_INTERVAL", "5"))
+    WORKER_HEARTBEAT_TIMEOUT: float = float(os.getenv("WORKER_HEARTBEAT_TIMEOUT", "60"))  # Без heartbeat процесс перезапускается
+    
+    # Параллельная обработка обновлений (порядок внутри пользователя и чата сохраняется)
+    UPDATE_CONCURRENCY: int = int(os.getenv("UPDATE_CONCURRENCY", "16"))  # Одновременно выполняемых обновлений
+    UPDATE_MAX_PENDING: int = int(os.getenv("UPDATE_MAX_PENDING", "512"))  # Принятых, но не обработанных обновлений
+    
+    # Сохранение состояния диалогов (context.user_data и ConversationHandler) в БД
+    STATE_FLUSH_INTERVAL: float = float(os.getenv("STATE_FLUSH_INTERVAL", "5"))  # Секунд между пакетными записями
+    STATE_IDLE_MINUTES: int = int(os.getenv("STATE_IDLE_MINUTES", "30"))  # Через сколько минут бездействия состояние выгружается из памяти
+    STATE_TTL_HOURS: int = int(os.getenv("STATE_TTL_HOURS", "168"))  # Через сколько часов бездействия состояние удаляется
+    STATE_EXPIRY_INTERVAL_MINUTES: int = int(os.getenv("STATE_EXPIRY_INTERVAL_MINUTES", "10"))  # Период выгрузки и удаления
+    
+    # Кэш пользователей и профилей НКО
+    USER_CACHE_TTL: int = int(os.getenv("USER_CACHE_TTL", "300"))  # Время жизни записи в секундах
+    USER_CACHE_MAX_SIZE: int = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))  # Максимум пользователей в кэше
+    
+    # Сообщения прогресса генерации: правки объединяются и отправляются в фоне
+    PROGRESS_MIN_INTERVAL: float = float(os.getenv("PROGRESS_MIN_INTERVAL", "1.0"))  # Секунд между правками одного сообщения
+    PROGRESS_CHAT_EDITS_PER_MINUTE: int = int(os.getenv("PROGRESS_CHAT_EDITS_PER_MINUTE", "20"))  # Бюджет правок на чат
+    
+    # Напоминания по контент-планам (хранятся в БД, выборка раз в минуту)
+    REMINDER_MISFIRE_GRACE_SECONDS: int = int(os.getenv("REMINDER_MISFIRE_GRACE_SECONDS", "3600"))  # Допустимое опоздание после простоя
+    REMINDER_RECONCILE_INTERVAL_MINUTES: int = int(os.getenv("REMINDER_RECONCILE_INTERVAL_MINUTES", "60"))  # Сверка напоминаний с планами
+    
+    # Графики аналитики: отрисовка в отдельных процессах, кэш файлов
+    CHART_RENDER_WORKERS: int = int(os.getenv("CHART_RENDER_WORKERS", "2"))  # Процессов отрисовки
+    CHART_CACHE_TTL_HOURS: int = int(os.getenv("CHART_CACHE_TTL_HOURS", "24"))  # Время жизни файла графика
+    CHART_CACHE_MAX_FILES: int = int(os.getenv("CHART_CACHE_MAX_FILES", "500"))  # Максимум файлов графиков
+    
+    # Экспорт: файлы пишутся потоково, вне event loop
+    EXPORT_WORKERS: int = int(os.getenv("EXPORT_WORKERS", "2"))  # Одновременных экспортов
+    EXPORT_PROCESSES: int = int(os.getenv("EXPORT_PROCESSES", "4"))  # Процессов записи форматов пакетного экспорта
+    EXPORT_CACHE_TTL_HOURS: int = int(os.getenv("EXPORT_CACHE_TTL_HOURS", "24"))  # Время жизни файла экспорта
+    EXPORT_CACHE_MAX_FILES: int = int(os.getenv("EXPORT_CACHE_MAX_FILES", "200"))  # Максимум файлов экспорта
+    EXPORT_CACHE_MAX_MB: int = int(os.getenv("EXPORT_CACHE_MAX_MB", "500"))  # Максимальный размер каталога экспорта
+    EXPORT_CACHE_CLEANUP_MINUTES: int = int(os.getenv("EXPORT_CACHE_CLEANUP_MINUTES", "30"))  # Период очистки
+    
+    # Черновики постов контент-планов: генерируются заранее, в часы низкой нагрузки
+    PLAN_DRAFTS_ENABLED: bool = os.getenv("PLAN_DRAFTS_ENABLED", "true").lower() == "true"
+    PLAN_DRAFT_LOOKAHEAD_HOURS: int = int(os.getenv("PLAN_DRAFT_LOOKAHEAD_HOURS", "24"))  # Для публикаций в ближайшие N часов
+    PLAN_DRAFT_OFFPEAK_HOURS: str = os.getenv("PLAN_DRAFT_OFFPEAK_HOURS", "1-7")  # Часы работы по Москве (с-по); пусто - круглосуточно
+    PLAN_DRAFT_INTERVAL_MINUTES: int = int(os.getenv("PLAN_DRAFT_INTERVAL_MINUTES", "15"))  # Период проверки
+    PLAN_DRAFT_MAX_PER_RUN: int = int(os.getenv("PLAN_DRAFT_MAX_PER_RUN", "50"))  # Черновиков за один запуск
+    PLAN_DRAFT_DAILY_LIMIT: int = int(os.getenv("PLAN_DRAFT_DAILY_LIMIT", "500"))  # Черновиков в сутки (бюджет API)
+    PLAN_DRAFT_DELAY_SECONDS: float = float(os.getenv("PLAN_DRAFT_DELAY_SECONDS", "2"))  # Пауза между генерациями
+    PLAN_DRAFT_IMAGES: bool = os.getenv("PLAN_DRAFT_IMAGES", "false").lower() == "true"  # Генерировать и картинку
+    
+    # Исходящие сообщения (напоминания, рассылки): лимиты Telegram и очередь в БД
+    OUTBOX_GLOBAL_RATE: float = float(os.getenv("OUTBOX_GLOBAL_RATE", "25"))  # Сообщений в секунду на бота (лимит Telegram ~30)
+    OUTBOX_CHAT_RATE: float = float(os.getenv("OUTBOX_CHAT_RATE", "1"))  # Сообщений в секунду в личный чат
+    OUTBOX_GROUP_RATE_PER_MINUTE: int = int(os.getenv("OUTBOX_GROUP_RATE_PER_MINUTE", "20"))  # Сообщений в минуту в группу
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))  # Попыток при сетевых ошибках
+    OUTBOX_POLL_INTERVAL: float = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))  # Опрос очереди в многопроцессном режиме
     
     # Настройки распознавания речи (OpenRouter Whisper)
     OPENROUTER_WHISPER_MODEL: str = os.getenv("OPENROUTER_WHISPER_MODEL", "openai/whisper-1")  # Модель Whisper через OpenRouter
@@ -82,6 +174,11 @@ class Config:
             if not value:
                 missing.append(var)
         
+        if cls.BOT_MODE == "webhook":
+            missing.extend(var for var in ("WEBHOOK_URL", "WEBHOOK_SECRET") if not getattr(cls, var))
+        elif cls.BOT_MODE != "polling":
+            raise ValueError(f"Неизвестный BOT_MODE: {cls.BOT_MODE} (допустимо: polling, webhook)")
+        
         if missing:
             raise ValueError(
                 f"Отсутствуют обязательные переменные окружения: {', '.join(missing)}\n"
@@ -91,6 +188,7 @@ class Config:
         # Создаем необходимые директории
         cls.IMAGES_DIR.mkdir(parents=True, exist_ok=True)
         cls.TEMPLATES_DIR.mkdir(parents=True, exist_ok=True)
+        cls.EXPORTS_DIR.mkdir(parents=True, exist_ok=True)
         (cls.DATA_DIR / "temp_voice").mkdir(parents=True, exist_ok=True)
         
         return True
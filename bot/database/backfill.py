@@ -0,0 +1,146 @@
+"""
+Пакетное заполнение данных с сохранением прогресса
+
+Перенос данных (backfill) выполняется отдельно от миграций схемы: Alembic
+меняет схему в одной короткой транзакции, а данные переносятся после нее
+пачками по первичному ключу. После каждой пачки в таблицу backfill_progress
+записывается последний обработанный ключ, поэтому прерванный перенос
+продолжается с того же места, а завершенный больше не запускается.
+
+При старте бота перенос не выполняется: его ведет фоновая задача
+(bot.services.data_backfill) по нескольку пачек за раз. Пока перенос не
+завершен, читатели догоняют данные пользователя сами (см. backfill_user
+в модулях bot.database.migrations) - is_completed подсказывает, нужно ли это.
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Optional, Sequence
+from sqlalchemy import Engine, select
+from sqlalchemy.orm import Session
+from bot.database.models import BackfillProgress
+
+logger = logging.getLogger(__name__)
+
+# Как часто писать прогресс в лог (секунды)
+LOG_INTERVAL = 10
+
+# Завершенные переносы: после завершения прогресс больше не читается
+_completed = set()
+
+
+def run_backfill(
+    engine: Engine,
+    name: str,
+    key_column,
+    columns: Sequence,
+    process_batch: Callable[[Session, list], None],
+    where=None,
+    batch_size: int = 500,
+    max_batches: Optional[int] = None
+) -> int:
+    """
+    Обрабатывает строки пачками по возрастанию ключа
+
+    Каждая пачка выполняется в отдельной транзакции вместе с обновлением
+    прогресса, так что пачка либо обработана и учтена целиком, либо нет.
+
+    Args:
+        engine: Engine базы данных
+        name: Уникальное имя переноса (ключ в backfill_progress)
+        key_column: Целочисленная колонка-ключ (обычно первичный ключ)
+        columns: Выбираемые колонки (ключ добавляется автоматически)
+        process_batch: Функция (сессия, строки пачки), выполняющая перенос
+        where: Дополнительное условие выборки
+        batch_size: Количество строк в одной транзакции
+        max_batches: Обработать не больше пачек (None - до конца); остальное
+            обработает следующий запуск
+
+    Returns:
+        Количество обработанных строк за этот запуск (0 - переносить больше нечего)
+    """
+    if name in _completed:
+        return 0
+
+    with Session(engine) as db:
+        progress = db.get(BackfillProgress, name)
+        if progress is not None and progress.completed_at is not None:
+            _completed.add(name)
+            return 0
+        last_key = progress.last_key if progress is not None else 0
+
+    if last_key:
+        logger.info(f"Перенос {name}: продолжение после ключа {last_key}")
+
+    total = 0
+    batches = 0
+    last_log = time.monotonic()
+    while max_batches is None or batches < max_batches:
+        with Session(engine) as db, db.begin():
+            query = select(key_column, *columns).where(key_column > last_key)
+            if where is not None:
+                query = query.where(where)
+            rows = db.execute(query.order_by(key_column).limit(batch_size)).all()
+
+            progress = db.get(BackfillProgress, name)
+            if progress is None:
+                progress = BackfillProgress(name=name, last_key=0, rows_done=0)
+                db.add(progress)
+
+            if rows:
+                process_batch(db, rows)
+                last_key = rows[-1][0]
+                progress.last_key = last_key
+                progress.rows_done = (progress.rows_done or 0) + len(rows)
+            else:
+                progress.completed_at = datetime.utcnow()
+                rows_done = progress.rows_done
+
+        if not rows:
+            _completed.add(name)
+            if rows_done:
+                logger.info(f"Перенос {name} завершен: обработано {rows_done} строк")
+            break
+
+        total += len(rows)
+        batches += 1
+        if time.monotonic() - last_log >= LOG_INTERVAL:
+            logger.info(f"Перенос {name}: обработано {total} строк (ключ {last_key})")
+            last_log = time.monotonic()
+
+    return total
+
+
+def is_completed(db: Session, name: str) -> bool:
+    """
+    Завершен ли перенос (после завершения - без запроса к БД)
+
+    Args:
+        db: Сессия БД
+        name: Имя переноса
+    """
+    if name in _completed:
+        return True
+    progress = db.get(BackfillProgress, name)
+    if progress is not None and progress.completed_at is not None:
+        _completed.add(name)
+        return True
+    return False
+
+
+def get_progress(engine: Engine, name: str) -> Optional[BackfillProgress]:
+    """
+    Текущий прогресс переноса
+
+    Args:
+        engine: Engine базы данных
+        name: Имя переноса
+
+    Returns:
+        BackfillProgress (отсоединенный от сессии) или None, если перенос не запускался
+    """
+    with Session(engine, expire_on_commit=False) as db:
+        progress = db.get(BackfillProgress, name)
+        if progress is not None:
+            db.expunge(progress)
+        return progress
@@ -1,14 +1,47 @@
 """
 Подключение к базе данных и утилиты для работы с БД
 """
+import logging
 from contextlib import contextmanager
-from typing import Generator
-from sqlalchemy import create_engine, event, Engine
+from typing import Generator, Optional
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, event, inspect, Connection, Engine
 from sqlalchemy.orm import sessionmaker, Session, scoped_session
 from sqlalchemy.pool import StaticPool
 
 from bot.config import config
 from bot.database.models import Base
+from bot.database.migrations import content_history_fields
+
+logger = logging.getLogger(__name__)
+
+# Ревизия, соответствующая схеме баз, созданных до Alembic через create_all
+BASELINE_REVISION = "0001"
+
+# Индексы базовой ревизии, добавленные в модели уже после создания таблиц:
+# в базах до Alembic их нужно создать отдельно (create_all их пропускает)
+BASELINE_INDEXES = (
+    "ix_content_history_user_generated",
+    "ix_content_history_user_type_style",
+    "ix_content_history_user_post_type",
+    "ix_content_history_hashtags_user_hashtag",
+    "ix_content_history_archive_user_generated",
+    "ix_plan_slots_user_date",
+    "ix_plan_slots_plan_date",
+    "ix_plan_events_user_date",
+)
+
+# Таблицы, которые создают миграции после базовой ревизии
+POST_BASELINE_TABLES = (
+    "user_states",
+    "conversation_states",
+    "outbox_messages",
+    "plan_reminders",
+    "user_activity_profiles",
+)
 
 
 # Создаем engine для подключения к БД
@@ -46,9 +79,74 @@ SessionLocal = sessionmaker(
 db_session = scoped_session(SessionLocal)
 
 
+def get_alembic_config() -> AlembicConfig:
+    """Конфигурация Alembic с путями относительно корня проекта"""
+    alembic_cfg = AlembicConfig(str(config.BASE_DIR / "alembic.ini"))
+    alembic_cfg.set_main_option("script_location", str(config.BASE_DIR / "bot" / "database" / "migrations"))
+    alembic_cfg.attributes["configure_logger"] = False
+    return alembic_cfg
+
+
+def get_schema_revision(connection: Connection) -> Optional[str]:
+    """Текущая ревизия схемы БД (None - база не под управлением Alembic)"""
+    return MigrationContext.configure(connection).get_current_revision()
+
+
+def _adopt_legacy_schema(connection: Connection) -> None:
+    """
+    Приводит базу, созданную до Alembic через create_all, к базовой ревизии
+
+    create_all создает только отсутствующие таблицы, поэтому колонки
+    и индексы, добавленные в модели позже, создаются отдельно. Изменения
+    после базовой ревизии применяют следующие миграции.
+    """
+    Base.metadata.create_all(
+        bind=connection,
+        tables=[table for table in Base.metadata.sorted_tables if table.name not in POST_BASELINE_TABLES]
+    )
+    content_history_fields.add_columns(connection)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in BASELINE_INDEXES:
+                index.create(bind=connection, checkfirst=True)
+
+
 def init_db() -> None:
-    """Инициализация базы данных - создание всех таблиц"""
-    Base.metadata.create_all(bind=engine)
+    """
+    Инициализация базы данных: проверка версии схемы
+    
+    Новая база создается миграциями Alembic. База без версии, но с таблицами,
+    считается созданной до Alembic: она дополняется до базовой ревизии и
+    помечается ею. Если схема отстает от последней ревизии, миграции
+    применяются при DB_AUTO_MIGRATE, иначе запуск прерывается.
+    
+    Raises:
+        RuntimeError: Схема устарела, а автоматические миграции выключены
+    """
+    alembic_cfg = get_alembic_config()
+    head = ScriptDirectory.from_config(alembic_cfg).get_current_head()
+    
+    with engine.begin() as connection:
+        alembic_cfg.attributes["connection"] = connection
+        current = get_schema_revision(connection)
+        
+        if current is None and inspect(connection).has_table("users"):
+            logger.info(f"База создана без Alembic - приводим к ревизии {BASELINE_REVISION}")
+            _adopt_legacy_schema(connection)
+            command.stamp(alembic_cfg, BASELINE_REVISION)
+            current = BASELINE_REVISION
+        
+        if current != head:
+            if current is not None and not config.DB_AUTO_MIGRATE:
+                raise RuntimeError(
+                    f"Схема БД устарела (ревизия {current}, требуется {head}). "
+                    f"Выполните: alembic upgrade head"
+                )
+            logger.info(f"Применение миграций БД: {current or 'пустая база'} -> {head}")
+            command.upgrade(alembic_cfg, "head")
+    
+    # Перенос данных в новые колонки и таблицы не ждем: его ведет фоновая
+    # задача (bot.services.data_backfill), а читатели догоняют данные сами
     print("База данных инициализирована успешно")
 
 
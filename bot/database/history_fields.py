@@ -0,0 +1,83 @@
+"""
+Извлечение типизированных полей записи истории из content_data
+
+Используется при записи истории (history_writer) и при переносе старых записей
+(migrations/content_history_fields), чтобы колонки style, post_type, file_path,
+text_length, hashtag_count и таблица content_history_hashtags заполнялись одинаково.
+"""
+from typing import Any, Dict, List, Optional
+
+STYLE_MAX_LENGTH = 50
+POST_TYPE_MAX_LENGTH = 50
+FILE_PATH_MAX_LENGTH = 500
+HASHTAG_MAX_LENGTH = 255
+
+
+def _as_dict(content_data: Any) -> Dict[str, Any]:
+    return content_data if isinstance(content_data, dict) else {}
+
+
+def _short_str(value: Any, max_length: int) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    return str(value)[:max_length]
+
+
+def normalize_hashtag(tag: Any) -> Optional[str]:
+    """
+    Приводит хештег к виду, в котором он хранится в content_history_hashtags
+
+    Args:
+        tag: Хештег с '#' или без
+
+    Returns:
+        '#хештег' в нижнем регистре или None для пустого значения
+    """
+    tag = str(tag).strip().lstrip("#").strip().lower() if tag is not None else ""
+    if not tag:
+        return None
+    return f"#{tag}"[:HASHTAG_MAX_LENGTH]
+
+
+def extract_hashtags(content_data: Any) -> List[str]:
+    """
+    Возвращает уникальные нормализованные хештеги записи
+
+    Args:
+        content_data: Данные контента
+
+    Returns:
+        Список хештегов в порядке появления
+    """
+    raw = _as_dict(content_data).get("hashtags") or []
+    if isinstance(raw, str):
+        raw = raw.split()
+
+    hashtags = []
+    for tag in raw:
+        normalized = normalize_hashtag(tag)
+        if normalized and normalized not in hashtags:
+            hashtags.append(normalized)
+    return hashtags
+
+
+def extract_history_fields(content_data: Any) -> Dict[str, Any]:
+    """
+    Вычисляет значения типизированных колонок ContentHistory
+
+    Args:
+        content_data: Данные контента
+
+    Returns:
+        Dict с ключами style, post_type, file_path, text_length, hashtag_count
+    """
+    data = _as_dict(content_data)
+    text = data.get("text") or data.get("edited_text")
+
+    return {
+        "style": _short_str(data.get("style"), STYLE_MAX_LENGTH),
+        "post_type": _short_str(data.get("type"), POST_TYPE_MAX_LENGTH),
+        "file_path": _short_str(data.get("file_path") or data.get("path"), FILE_PATH_MAX_LENGTH),
+        "text_length": len(str(text)) if text else 0,
+        "hashtag_count": len(extract_hashtags(data)),
+    }
@@ -0,0 +1,160 @@
+"""
+Репозиторий истории контента с keyset-пагинацией
+
+Страницы выбираются по ключу (generated_at, id) в порядке убывания, а не через
+OFFSET: запрос N-й страницы читает из индекса ix_content_history_user_generated
+ровно page_size + 1 строк, как и запрос первой.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_, exists, or_
+from sqlalchemy.orm import Query, Session
+from bot.database.models import ContentHistory, ContentHistoryHashtag
+from bot.database.database import get_db
+from bot.database.history_fields import normalize_hashtag
+from bot.database.migrations import content_history_fields
+
+CURSOR_DATETIME_FORMAT = "%Y%m%d%H%M%S%f"
+
+
+@dataclass(frozen=True)
+class HistoryFilter:
+    """Фильтр просмотра истории"""
+    content_type: Optional[str] = None  # text, image, plan
+    favorites_only: bool = False
+    tag: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class HistoryItem:
+    """Снимок записи истории, независимый от сессии БД"""
+    id: int
+    content_type: str
+    content_data: Dict[str, Any]
+    tags: Optional[List[str]]
+    is_favorite: bool
+    generated_at: datetime
+
+    @classmethod
+    def from_model(cls, item: ContentHistory) -> "HistoryItem":
+        return cls(
+            id=item.id,
+            content_type=item.content_type,
+            content_data=item.content_data if isinstance(item.content_data, dict) else {"text": str(item.content_data)},
+            tags=item.tags,
+            is_favorite=bool(item.is_favorite),
+            generated_at=item.generated_at
+        )
+
+
+@dataclass(frozen=True)
+class HistoryPage:
+    """Страница истории"""
+    items: List[HistoryItem]
+    next_cursor: Optional[str]  # None - это последняя страница
+
+
+def encode_cursor(generated_at: datetime, item_id: int) -> str:
+    """Кодирует позицию (generated_at, id) в короткую строку для callback_data"""
+    return f"{generated_at.strftime(CURSOR_DATETIME_FORMAT)}_{item_id}"
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, int]]:
+    """
+    Декодирует курсор страницы
+
+    Returns:
+        (generated_at, id) или None, если курсор поврежден
+    """
+    try:
+        ts, item_id = cursor.split("_", 1)
+        return datetime.strptime(ts, CURSOR_DATETIME_FORMAT), int(item_id)
+    except (ValueError, AttributeError):
+        return None
+
+
+class HistoryRepository:
+    """Запросы к истории контента"""
+
+    @staticmethod
+    def _filtered_query(db: Session, user_id: int, history_filter: HistoryFilter) -> Query:
+        query = db.query(ContentHistory).filter(ContentHistory.user_id == user_id)
+
+        if history_filter.content_type:
+            query = query.filter(ContentHistory.content_type == history_filter.content_type)
+        if history_filter.favorites_only:
+            query = query.filter(ContentHistory.is_favorite == True)
+        if history_filter.tag:
+            # Хештеги записей - в content_history_hashtags (нижний регистр, с '#'),
+            # поиск по индексу (user_id, hashtag); "Тег" и "#тег" совпадают.
+            # Хештеги записей, еще не перенесенных фоном, переносятся сейчас
+            content_history_fields.backfill_user(db, user_id)
+            hashtag = normalize_hashtag(history_filter.tag)
+            query = query.filter(
+                exists().where(
+                    ContentHistoryHashtag.content_history_id == ContentHistory.id,
+                    ContentHistoryHashtag.user_id == user_id,
+                    ContentHistoryHashtag.hashtag == hashtag
+                )
+            )
+
+        return query
+
+    @staticmethod
+    def _after(query: Query, position: Tuple[datetime, int]) -> Query:
+        """Ограничивает выборку строками строго после позиции (в порядке убывания)"""
+        generated_at, item_id = position
+        return query.filter(
+            or_(
+                ContentHistory.generated_at < generated_at,
+                and_(ContentHistory.generated_at == generated_at, ContentHistory.id < item_id)
+            )
+        )
+
+    @staticmethod
+    def get_page(
+        user_id: int,
+        cursor: Optional[str] = None,
+        page_size: int = 5,
+        history_filter: Optional[HistoryFilter] = None
+    ) -> HistoryPage:
+        """
+        Возвращает страницу истории пользователя, начиная с курсора
+
+        Args:
+            user_id: ID пользователя
+            cursor: Курсор из предыдущей страницы (None = первая страница)
+            page_size: Размер страницы
+            history_filter: Фильтр по типу, избранному и тегу
+
+        Returns:
+            HistoryPage
+        """
+        history_filter = history_filter or HistoryFilter()
+
+        with get_db() as db:
+            query = HistoryRepository._filtered_query(db, user_id, history_filter)
+
+            position = decode_cursor(cursor) if cursor else None
+            if position:
+                query = HistoryRepository._after(query, position)
+
+            # Берем на одну строку больше, чтобы узнать, есть ли следующая страница
+            rows = query.order_by(
+                ContentHistory.generated_at.desc(),
+                ContentHistory.id.desc()
+            ).limit(page_size + 1).all()
+
+            items = [HistoryItem.from_model(row) for row in rows[:page_size]]
+
+        next_cursor = None
+        if len(rows) > page_size and items:
+            last = items[-1]
+            next_cursor = encode_cursor(last.generated_at, last.id)
+
+        return HistoryPage(items=items, next_cursor=next_cursor)
+
+
+# Глобальный экземпляр
+history_repository = HistoryRepository()
@@ -0,0 +1,121 @@
+"""
+Перенос типизированных полей content_history и таблицы content_history_hashtags
+
+Поля style, post_type, file_path, text_length и hashtag_count раньше читались
+только из JSON content_data. Колонки входят в базовую ревизию Alembic
+(для баз, созданных до Alembic, их добавляет add_columns), а значения
+переносятся из JSON пачками через run_backfill. Записи, у которых
+hashtag_count IS NULL, считаются еще не перенесенными.
+
+Перенос идет в фоне после старта, поэтому запросы по этим колонкам сначала
+вызывают backfill_user: до завершения переноса он переносит оставшиеся записи
+пользователя. Строки блокируются (FOR UPDATE) и проверяются повторно, так что
+фоновый перенос и читатель не обработают одну запись дважды.
+"""
+import logging
+from typing import Optional
+from sqlalchemy import Connection, Engine, inspect, insert, select, text, update
+from sqlalchemy.orm import Session
+from bot.database.backfill import is_completed, run_backfill
+from bot.database.models import ContentHistory, ContentHistoryHashtag
+from bot.database.history_fields import extract_history_fields, extract_hashtags
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_NAME = "content_history_fields"
+NEW_COLUMNS = ("style", "post_type", "file_path", "text_length", "hashtag_count")
+
+
+def add_columns(connection: Connection) -> None:
+    """
+    Добавляет в content_history недостающие колонки (create_all их не добавляет)
+
+    Args:
+        connection: Соединение с открытой транзакцией
+    """
+    existing = {column["name"] for column in inspect(connection).get_columns(ContentHistory.__tablename__)}
+    missing = [name for name in NEW_COLUMNS if name not in existing]
+    if not missing:
+        return
+
+    for name in missing:
+        column_type = ContentHistory.__table__.c[name].type.compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE {ContentHistory.__tablename__} ADD COLUMN {name} {column_type}"))
+    logger.info(f"В content_history добавлены колонки: {', '.join(missing)}")
+
+
+def _pending(condition):
+    """Еще не перенесенные записи по условию, заблокированные до конца транзакции"""
+    return select(
+        ContentHistory.id,
+        ContentHistory.user_id,
+        ContentHistory.content_data
+    ).where(condition, ContentHistory.hashtag_count.is_(None)).with_for_update()
+
+
+def _migrate(db: Session, rows) -> None:
+    if not rows:
+        return
+
+    db.execute(
+        update(ContentHistory),
+        [{"id": row.id, **extract_history_fields(row.content_data)} for row in rows]
+    )
+
+    hashtag_rows = [
+        {"content_history_id": row.id, "user_id": row.user_id, "hashtag": hashtag}
+        for row in rows
+        for hashtag in extract_hashtags(row.content_data)
+    ]
+    if hashtag_rows:
+        db.execute(insert(ContentHistoryHashtag), hashtag_rows)
+
+
+def _process_batch(db: Session, rows) -> None:
+    # Часть записей мог уже перенести backfill_user
+    _migrate(db, db.execute(_pending(ContentHistory.id.in_([row.id for row in rows]))).all())
+
+
+def backfill_user(db: Session, user_id: int) -> int:
+    """
+    Переносит оставшиеся записи пользователя, пока фоновый перенос не завершен
+
+    Вызывается перед запросами по типизированным колонкам и хештегам.
+    После завершения переноса запросов к БД не делает.
+
+    Args:
+        db: Сессия БД (перенос фиксируется вместе с ее транзакцией)
+        user_id: ID пользователя
+
+    Returns:
+        Количество перенесенных записей
+    """
+    if is_completed(db, BACKFILL_NAME):
+        return 0
+    rows = db.execute(_pending(ContentHistory.user_id == user_id)).all()
+    _migrate(db, rows)
+    return len(rows)
+
+
+def backfill(engine: Engine, batch_size: int = 500, max_batches: Optional[int] = None) -> int:
+    """
+    Заполняет типизированные колонки и хештеги для записей, созданных до миграции
+
+    Args:
+        engine: Engine базы данных
+        batch_size: Количество записей в одной транзакции
+        max_batches: Обработать не больше пачек (None - до конца)
+
+    Returns:
+        Количество обработанных записей (0 - переносить больше нечего)
+    """
+    return run_backfill(
+        engine,
+        BACKFILL_NAME,
+        ContentHistory.id,
+        (),
+        _process_batch,
+        where=ContentHistory.hashtag_count.is_(None),
+        batch_size=batch_size,
+        max_batches=max_batches
+    )
@@ -0,0 +1,73 @@
+"""
+Окружение Alembic
+
+Используется и из командной строки (alembic upgrade head), и из init_db():
+в этом случае соединение с открытой транзакцией передается через
+config.attributes["connection"].
+"""
+from logging.config import fileConfig
+
+from alembic import context
+
+from bot.config import config as bot_config
+from bot.database.models import Base
+
+config = context.config
+
+# При запуске из бота логирование уже настроено
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def include_object(object_, name, type_, reflected, compare_to):
+    """Исключает из автогенерации объекты, которых нет в моделях"""
+    # Таблицы FTS5 и колонка search_vector создаются миграцией 0008 в обход моделей,
+    # таблица apscheduler_jobs - хранилищем задач напоминаний (bot.services.scheduler)
+    if type_ == "table" and reflected and compare_to is None:
+        return False
+    if type_ == "column" and name == "search_vector":
+        return False
+    return True
+
+
+def _configure(**kwargs) -> None:
+    context.configure(
+        target_metadata=target_metadata,
+        include_object=include_object,
+        # SQLite не поддерживает большинство ALTER TABLE - изменения через пересоздание таблицы
+        render_as_batch=bot_config.DATABASE_URL.startswith("sqlite"),
+        compare_type=True,
+        **kwargs
+    )
+
+
+def run_migrations_offline() -> None:
+    """Генерация SQL без подключения к БД (alembic upgrade head --sql)"""
+    _configure(url=bot_config.DATABASE_URL, literal_binds=True, dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Применение миграций к БД"""
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
+    from bot.database.database import engine
+
+    with engine.connect() as connection:
+        _configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,119 @@
+"""
+Перенос дат и событий контент-планов из JSON schedule в таблицы
+
+Раньше ContentPlan.schedule хранил списки "dates" и "events". Перенос создает
+по ним строки plan_slots и plan_events и удаляет эти ключи из JSON (остальные
+параметры расписания - дни, время, темы - остаются в schedule). Планы, у которых
+в JSON больше нет "dates"/"events", считаются перенесенными.
+
+Перенос идет в фоне после старта. Чтение публикаций пользователя или плана
+сначала вызывает backfill_user/backfill_plan, которые до завершения переноса
+переносят оставшиеся планы сами; планы блокируются (FOR UPDATE) и проверяются
+повторно, поэтому публикации одного плана не создаются дважды.
+"""
+import logging
+from datetime import date
+from typing import Optional
+from sqlalchemy import Engine, String, cast, or_
+from sqlalchemy.orm import Session
+from bot.database.backfill import is_completed, run_backfill
+from bot.database.models import ContentPlan, PlanEvent
+from bot.database.plan_fields import build_slots, parse_slot_time
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_NAME = "plan_schedule"
+
+
+def _parse_date(value) -> date:
+    return date.fromisoformat(str(value)[:10])
+
+
+def _legacy_schedule():
+    schedule_text = cast(ContentPlan.schedule, String)
+    return or_(schedule_text.contains('"dates"'), schedule_text.contains('"events"'))
+
+
+def _migrate(db: Session, condition) -> int:
+    plans = db.query(ContentPlan).filter(condition, _legacy_schedule()).with_for_update().all()
+    for plan in plans:
+        schedule = dict(plan.schedule) if isinstance(plan.schedule, dict) else {}
+
+        dates = []
+        for value in schedule.pop("dates", None) or []:
+            try:
+                dates.append(_parse_date(value))
+            except ValueError:
+                logger.warning(f"План {plan.id}: пропущена некорректная дата {value!r}")
+        db.add_all(build_slots(plan.id, plan.user_id, dates, schedule.get("time"), schedule.get("topics")))
+
+        for event in schedule.pop("events", None) or []:
+            try:
+                db.add(PlanEvent(
+                    plan_id=plan.id,
+                    user_id=plan.user_id,
+                    name=str(event.get("name") or "Событие")[:255],
+                    date=_parse_date(event["date"]),
+                    time=parse_slot_time(event.get("time")) if event.get("time") else None,
+                    description=event.get("description")
+                ))
+            except (AttributeError, KeyError, ValueError):
+                logger.warning(f"План {plan.id}: пропущено некорректное событие {event!r}")
+
+        plan.schedule = schedule
+    if plans:
+        # Читатель запрашивает публикации в той же сессии (autoflush выключен)
+        db.flush()
+    return len(plans)
+
+
+def _process_batch(db: Session, rows) -> None:
+    # Часть планов могли уже перенести backfill_user/backfill_plan
+    _migrate(db, ContentPlan.id.in_([row.id for row in rows]))
+
+
+def backfill_user(db: Session, user_id: int) -> int:
+    """
+    Переносит оставшиеся планы пользователя, пока фоновый перенос не завершен
+
+    Args:
+        db: Сессия БД (перенос фиксируется вместе с ее транзакцией)
+        user_id: ID пользователя
+
+    Returns:
+        Количество проверенных планов
+    """
+    if is_completed(db, BACKFILL_NAME):
+        return 0
+    return _migrate(db, ContentPlan.user_id == user_id)
+
+
+def backfill_plan(db: Session, plan_id: int) -> int:
+    """То же, что backfill_user, для одного плана"""
+    if is_completed(db, BACKFILL_NAME):
+        return 0
+    return _migrate(db, ContentPlan.id == plan_id)
+
+
+def backfill(engine: Engine, batch_size: int = 100, max_batches: Optional[int] = None) -> int:
+    """
+    Переносит даты и события планов, созданных до появления plan_slots
+
+    Args:
+        engine: Engine базы данных
+        batch_size: Количество планов в одной транзакции
+        max_batches: Обработать не больше пачек (None - до конца)
+
+    Returns:
+        Количество обработанных планов (0 - переносить больше нечего)
+    """
+    return run_backfill(
+        engine,
+        BACKFILL_NAME,
+        ContentPlan.id,
+        (),
+        _process_batch,
+        where=_legacy_schedule(),
+        batch_size=batch_size,
+        max_batches=max_batches
+    )
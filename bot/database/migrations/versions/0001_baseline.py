@@ -0,0 +1,276 @@
+"""Базовая схема: все таблицы моделей на момент перехода на Alembic
+
+Базы, созданные раньше через create_all, при первом запуске приводятся
+к этой схеме и помечаются ревизией (см. init_db), а не создаются заново.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 10:28:09
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('backfill_progress',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('last_key', sa.Integer(), nullable=False),
+    sa.Column('rows_done', sa.Integer(), nullable=False),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('content_history_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('content_type', sa.String(length=20), nullable=False),
+    sa.Column('generated_at', sa.DateTime(), nullable=False),
+    sa.Column('reason', sa.String(length=20), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('content_history_archive', schema=None) as batch_op:
+        batch_op.create_index('ix_content_history_archive_user_generated', ['user_id', 'generated_at'], unique=False)
+
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=255), nullable=True),
+    sa.Column('first_name', sa.String(length=255), nullable=False),
+    sa.Column('last_name', sa.String(length=255), nullable=True),
+    sa.Column('language_code', sa.String(length=10), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('active_profile_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('nko_profiles',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('profile_name', sa.String(length=255), nullable=True),
+    sa.Column('organization_name', sa.String(length=500), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('activity_types', sa.JSON(), nullable=True),
+    sa.Column('target_audience', sa.String(length=500), nullable=True),
+    sa.Column('tone_of_voice', sa.String(length=50), nullable=True),
+    sa.Column('contact_info', sa.JSON(), nullable=True),
+    sa.Column('brand_colors', sa.JSON(), nullable=True),
+    sa.Column('logo_path', sa.String(length=500), nullable=True),
+    sa.Column('is_complete', sa.Boolean(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # users и nko_profiles ссылаются друг на друга - внешний ключ добавляется после обеих таблиц
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_foreign_key(
+            'fk_users_active_profile_id', 'nko_profiles', ['active_profile_id'], ['id'], ondelete='SET NULL'
+        )
+
+    op.create_table('content_history',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('content_type', sa.String(length=20), nullable=False),
+    sa.Column('content_data', sa.JSON(), nullable=False),
+    sa.Column('metadata', sa.JSON(), nullable=True),
+    sa.Column('is_saved', sa.Boolean(), nullable=False),
+    sa.Column('is_favorite', sa.Boolean(), nullable=False),
+    sa.Column('tags', sa.JSON(), nullable=True),
+    sa.Column('style', sa.String(length=50), nullable=True),
+    sa.Column('post_type', sa.String(length=50), nullable=True),
+    sa.Column('file_path', sa.String(length=500), nullable=True),
+    sa.Column('text_length', sa.Integer(), nullable=True),
+    sa.Column('hashtag_count', sa.Integer(), nullable=True),
+    sa.Column('generated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('content_history', schema=None) as batch_op:
+        batch_op.create_index('ix_content_history_user_generated', ['user_id', 'generated_at', 'id'], unique=False)
+        batch_op.create_index('ix_content_history_user_post_type', ['user_id', 'post_type'], unique=False)
+        batch_op.create_index('ix_content_history_user_type_style', ['user_id', 'content_type', 'style'], unique=False)
+
+    op.create_table('content_plans',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('plan_name', sa.String(length=255), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=False),
+    sa.Column('end_date', sa.Date(), nullable=False),
+    sa.Column('frequency', sa.Integer(), nullable=False),
+    sa.Column('schedule', sa.JSON(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('notification_settings',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('reminder_enabled', sa.Boolean(), nullable=False),
+    sa.Column('reminder_time', sa.Time(), nullable=True),
+    sa.Column('timezone', sa.String(length=50), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id')
+    )
+    op.create_table('post_templates',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('template_name', sa.String(length=255), nullable=False),
+    sa.Column('category', sa.String(length=100), nullable=False),
+    sa.Column('content_structure', sa.JSON(), nullable=False),
+    sa.Column('usage_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('teams',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('content_history_hashtags',
+    sa.Column('content_history_id', sa.Integer(), nullable=False),
+    sa.Column('hashtag', sa.String(length=255), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['content_history_id'], ['content_history.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('content_history_id', 'hashtag')
+    )
+    with op.batch_alter_table('content_history_hashtags', schema=None) as batch_op:
+        batch_op.create_index('ix_content_history_hashtags_user_hashtag', ['user_id', 'hashtag'], unique=False)
+
+    op.create_table('plan_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('plan_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('time', sa.Time(), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['plan_id'], ['content_plans.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('plan_events', schema=None) as batch_op:
+        batch_op.create_index('ix_plan_events_user_date', ['user_id', 'date'], unique=False)
+
+    op.create_table('plan_slots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('plan_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('time', sa.Time(), nullable=True),
+    sa.Column('topic', sa.String(length=500), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('generated_history_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['generated_history_id'], ['content_history.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['plan_id'], ['content_plans.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('plan_slots', schema=None) as batch_op:
+        batch_op.create_index('ix_plan_slots_plan_date', ['plan_id', 'date'], unique=False)
+        batch_op.create_index('ix_plan_slots_user_date', ['user_id', 'date'], unique=False)
+
+    op.create_table('shared_content',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('team_id', sa.Integer(), nullable=False),
+    sa.Column('content_history_id', sa.Integer(), nullable=False),
+    sa.Column('shared_by', sa.Integer(), nullable=True),
+    sa.Column('is_approved', sa.Boolean(), nullable=False),
+    sa.Column('approved_by', sa.Integer(), nullable=True),
+    sa.Column('approved_at', sa.DateTime(), nullable=True),
+    sa.Column('comments', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['approved_by'], ['users.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['content_history_id'], ['content_history.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['shared_by'], ['users.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['team_id'], ['teams.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('team_members',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('team_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('role', sa.String(length=20), nullable=False),
+    sa.Column('permissions', sa.JSON(), nullable=True),
+    sa.Column('joined_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['team_id'], ['teams.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('content_comments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('shared_content_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('comment_text', sa.Text(), nullable=False),
+    sa.Column('is_resolved', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['shared_content_id'], ['shared_content.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('content_comments')
+    op.drop_table('team_members')
+    op.drop_table('shared_content')
+    with op.batch_alter_table('plan_slots', schema=None) as batch_op:
+        batch_op.drop_index('ix_plan_slots_user_date')
+        batch_op.drop_index('ix_plan_slots_plan_date')
+
+    op.drop_table('plan_slots')
+    with op.batch_alter_table('plan_events', schema=None) as batch_op:
+        batch_op.drop_index('ix_plan_events_user_date')
+
+    op.drop_table('plan_events')
+    with op.batch_alter_table('content_history_hashtags', schema=None) as batch_op:
+        batch_op.drop_index('ix_content_history_hashtags_user_hashtag')
+
+    op.drop_table('content_history_hashtags')
+    op.drop_table('teams')
+    op.drop_table('post_templates')
+    op.drop_table('notification_settings')
+    op.drop_table('content_plans')
+    with op.batch_alter_table('content_history', schema=None) as batch_op:
+        batch_op.drop_index('ix_content_history_user_type_style')
+        batch_op.drop_index('ix_content_history_user_post_type')
+        batch_op.drop_index('ix_content_history_user_generated')
+
+    op.drop_table('content_history')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_users_active_profile_id', type_='foreignkey')
+
+    op.drop_table('nko_profiles')
+    op.drop_table('users')
+    with op.batch_alter_table('content_history_archive', schema=None) as batch_op:
+        batch_op.drop_index('ix_content_history_archive_user_generated')
+
+    op.drop_table('content_history_archive')
+    op.drop_table('backfill_progress')
@@ -0,0 +1,144 @@
+"""Комментарии командного контента строками content_comments
+
+- Комментарии из JSON shared_content.comments переносятся в content_comments,
+  колонка удаляется.
+- shared_content.version - версия для оптимистичной блокировки утверждения.
+- Уникальные индексы (team_id, user_id) в team_members и (team_id,
+  content_history_id) в shared_content. Дубли удаляются, остается первая
+  запись; комментарии дублей переносятся на нее.
+
+Колонка удаляется через ALTER TABLE DROP COLUMN без пересоздания таблицы
+(SQLite 3.35+): пересоздание shared_content удалило бы каскадом комментарии.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 11:05:00
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+shared_content = sa.table(
+    'shared_content',
+    sa.column('id', sa.Integer),
+    sa.column('team_id', sa.Integer),
+    sa.column('content_history_id', sa.Integer),
+    sa.column('shared_by', sa.Integer),
+    sa.column('comments', sa.JSON),
+)
+content_comments = sa.table(
+    'content_comments',
+    sa.column('shared_content_id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('comment_text', sa.Text),
+    sa.column('is_resolved', sa.Boolean),
+    sa.column('created_at', sa.DateTime),
+)
+
+
+def _columns(table: str) -> set:
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _indexes(table: str) -> set:
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def _comment_row(shared_content_id: int, value, default_user_id):
+    """Строка content_comments из элемента JSON-списка (None - пропустить)"""
+    created_at = None
+    if isinstance(value, dict):
+        text = value.get('text') or value.get('comment_text') or value.get('comment')
+        user_id = value.get('user_id') or default_user_id
+        try:
+            created_at = datetime.fromisoformat(str(value['created_at']))
+        except (KeyError, ValueError):
+            pass
+    else:
+        text = value
+        user_id = default_user_id
+
+    if not text or not user_id:
+        return None
+    return {
+        'shared_content_id': shared_content_id,
+        'user_id': int(user_id),
+        'comment_text': str(text),
+        'is_resolved': bool(value.get('is_resolved')) if isinstance(value, dict) else False,
+        'created_at': created_at or datetime.utcnow(),
+    }
+
+
+def _move_comments_and_dedupe(has_comments: bool) -> None:
+    bind = op.get_bind()
+    columns = [shared_content.c.id, shared_content.c.team_id, shared_content.c.content_history_id, shared_content.c.shared_by]
+    if has_comments:
+        columns.append(shared_content.c.comments)
+    rows = bind.execute(sa.select(*columns).order_by(shared_content.c.id)).all()
+
+    keep = {}
+    duplicates = {}
+    comment_rows = []
+    for row in rows:
+        target = keep.setdefault((row.team_id, row.content_history_id), row.id)
+        if target != row.id:
+            duplicates[row.id] = target
+        if has_comments and isinstance(row.comments, list):
+            for value in row.comments:
+                comment = _comment_row(target, value, row.shared_by)
+                if comment is not None:
+                    comment_rows.append(comment)
+
+    if comment_rows:
+        op.bulk_insert(content_comments, comment_rows)
+
+    for duplicate_id, target_id in duplicates.items():
+        bind.execute(
+            content_comments.update()
+            .where(content_comments.c.shared_content_id == duplicate_id)
+            .values(shared_content_id=target_id)
+        )
+    if duplicates:
+        bind.execute(shared_content.delete().where(shared_content.c.id.in_(list(duplicates))))
+
+    bind.execute(sa.text(
+        "DELETE FROM team_members WHERE id NOT IN "
+        "(SELECT MIN(id) FROM team_members GROUP BY team_id, user_id)"
+    ))
+
+
+def upgrade() -> None:
+    shared_columns = _columns('shared_content')
+    _move_comments_and_dedupe('comments' in shared_columns)
+
+    if 'comments' in shared_columns:
+        op.drop_column('shared_content', 'comments')
+    if 'version' not in shared_columns:
+        op.add_column('shared_content', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+    if 'uq_shared_content_team_history' not in _indexes('shared_content'):
+        op.create_index('uq_shared_content_team_history', 'shared_content', ['team_id', 'content_history_id'], unique=True)
+    if 'uq_team_members_team_user' not in _indexes('team_members'):
+        op.create_index('uq_team_members_team_user', 'team_members', ['team_id', 'user_id'], unique=True)
+    if 'ix_content_comments_shared_created' not in _indexes('content_comments'):
+        op.create_index('ix_content_comments_shared_created', 'content_comments', ['shared_content_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    # Комментарии остаются в content_comments, обратно в JSON не переносятся
+    op.drop_index('ix_content_comments_shared_created', table_name='content_comments')
+    op.drop_index('uq_team_members_team_user', table_name='team_members')
+    op.drop_index('uq_shared_content_team_history', table_name='shared_content')
+    op.drop_column('shared_content', 'version')
+    op.add_column('shared_content', sa.Column('comments', sa.JSON(), nullable=True))
@@ -0,0 +1,43 @@
+"""Таблицы состояния диалогов (persistence python-telegram-bot)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 13:40:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user_states',
+    sa.Column('user_id', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('data', sa.JSON(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_index(op.f('ix_user_states_updated_at'), 'user_states', ['updated_at'], unique=False)
+    op.create_table('conversation_states',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('key', sa.String(length=100), nullable=False),
+    sa.Column('state', sa.JSON(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name', 'key')
+    )
+    op.create_index(op.f('ix_conversation_states_updated_at'), 'conversation_states', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_conversation_states_updated_at'), table_name='conversation_states')
+    op.drop_table('conversation_states')
+    op.drop_index(op.f('ix_user_states_updated_at'), table_name='user_states')
+    op.drop_table('user_states')
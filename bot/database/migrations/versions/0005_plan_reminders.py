@@ -0,0 +1,50 @@
+"""Напоминания контент-планов по дням недели
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 17:20:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Строки для существующих планов создает сверка при запуске бота
+    op.create_table('plan_reminders',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('plan_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('weekday', sa.Integer(), nullable=False),
+    sa.Column('minute', sa.Integer(), nullable=False),
+    sa.Column('timezone', sa.String(length=50), nullable=False),
+    sa.Column('utc_offset', sa.Integer(), nullable=False),
+    sa.Column('weekday_utc', sa.Integer(), nullable=False),
+    sa.Column('minute_utc', sa.Integer(), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=False),
+    sa.Column('end_date', sa.Date(), nullable=False),
+    sa.Column('active', sa.Boolean(), nullable=False),
+    sa.Column('last_sent_on', sa.Date(), nullable=True),
+    sa.ForeignKeyConstraint(['plan_id'], ['content_plans.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_plan_reminders_due', 'plan_reminders', ['weekday_utc', 'minute_utc'], unique=False)
+    op.create_index(op.f('ix_plan_reminders_plan_id'), 'plan_reminders', ['plan_id'], unique=False)
+    op.create_index(op.f('ix_plan_reminders_user_id'), 'plan_reminders', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_plan_reminders_user_id'), table_name='plan_reminders')
+    op.drop_index(op.f('ix_plan_reminders_plan_id'), table_name='plan_reminders')
+    op.drop_index('ix_plan_reminders_due', table_name='plan_reminders')
+    op.drop_table('plan_reminders')
@@ -0,0 +1,26 @@
+"""Индекс публикаций контент-плана по статусу и дате
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 20:10:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # В базе до Alembic без plan_slots индекс уже создан вместе с таблицей (create_all)
+    op.create_index('ix_plan_slots_status_date', 'plan_slots', ['status', 'date'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_plan_slots_status_date', table_name='plan_slots')
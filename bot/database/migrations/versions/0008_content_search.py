@@ -0,0 +1,109 @@
+"""Полнотекстовый поиск по истории контента
+
+SQLite: таблица FTS5 content_history_fts и триггеры, которые ее поддерживают;
+PostgreSQL: вычисляемая колонка search_vector с GIN-индексом.
+
+Раньше эти объекты создавал content_search.ensure_index() при запуске,
+поэтому они могут уже существовать - создаются с IF NOT EXISTS, а индекс
+FTS5 заполняется историей, только если таблицы еще не было. Объекты не
+описаны в моделях (см. include_object в env.py).
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-20 10:00:00
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "content_history_fts"
+
+# Индексируемые поля строки content_history: владелец (токен u<user_id>), текст, хештеги, теги
+_SQLITE_VALUES = (
+    "{row}.id, 'u' || {row}.user_id, "
+    "coalesce(json_extract({row}.content_data, '$.text'), json_extract({row}.content_data, '$.edited_text'), ''), "
+    "coalesce((SELECT group_concat(value, ' ') FROM json_each({row}.content_data, '$.hashtags')), ''), "
+    "coalesce((SELECT group_concat(value, ' ') FROM json_each({row}.tags)), '')"
+)
+
+SQLITE_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        owner, body, hashtags, tags,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS content_history_fts_ai AFTER INSERT ON content_history BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, owner, body, hashtags, tags) VALUES ({_SQLITE_VALUES.format(row='new')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS content_history_fts_ad AFTER DELETE ON content_history BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS content_history_fts_au AFTER UPDATE OF content_data, tags, user_id ON content_history BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, owner, body, hashtags, tags) VALUES ({_SQLITE_VALUES.format(row='new')});
+    END
+    """,
+]
+
+POSTGRES_SCHEMA = [
+    """
+    ALTER TABLE content_history ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(content_data->>'text', content_data->>'edited_text', '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(content_data->>'hashtags', '')), 'B')
+        || setweight(to_tsvector('russian', coalesce(tags::text, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_content_history_search ON content_history USING GIN (search_vector)",
+]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        if not bind.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar():
+            # Поиск по контенту будет отключен (content_search.available = False)
+            logger.warning("SQLite собран без FTS5 - поисковый индекс не создан")
+            return
+        exists = bind.exec_driver_sql(
+            f"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '{FTS_TABLE}'"
+        ).first()
+        for statement in SQLITE_SCHEMA:
+            op.execute(statement)
+        if not exists:
+            op.execute(
+                f"INSERT INTO {FTS_TABLE}(rowid, owner, body, hashtags, tags) "
+                f"SELECT {_SQLITE_VALUES.format(row='h')} FROM content_history h"
+            )
+    elif bind.dialect.name == "postgresql":
+        for statement in POSTGRES_SCHEMA:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        for trigger in ("content_history_fts_ai", "content_history_fts_ad", "content_history_fts_au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif bind.dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_content_history_search")
+        op.execute("ALTER TABLE content_history DROP COLUMN IF EXISTS search_vector")
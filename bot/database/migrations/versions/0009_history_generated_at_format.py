@@ -0,0 +1,41 @@
+"""Единый формат generated_at истории в SQLite
+
+Записи, созданные до пакетной записи истории, получали generated_at из
+server_default (CURRENT_TIMESTAMP) - 'YYYY-MM-DD HH:MM:SS' без долей секунды,
+а SQLAlchemy пишет и сравнивает 'YYYY-MM-DD HH:MM:SS.ffffff'. SQLite
+сравнивает эти значения как строки, поэтому курсор keyset-пагинации
+(generated_at, id) на такой записи не продвигался. Значения дополняются
+до полного формата; в PostgreSQL колонка типизирована, менять нечего.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-21 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("content_history", "content_history_archive")
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for table in TABLES:
+        op.execute(
+            f"UPDATE {table} SET generated_at = generated_at || '.000000' "
+            f"WHERE length(generated_at) = 19"
+        )
+
+
+def downgrade() -> None:
+    # Полный формат читается и старым кодом
+    pass
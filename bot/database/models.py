@@ -2,10 +2,10 @@
 Модели базы данных для Telegram-бота НКО
 """
 from datetime import datetime, date, time
-from typing import Optional
+from typing import Any, Optional
 from sqlalchemy import (
-    Integer, String, Text, Boolean, DateTime, Date, Time, 
-    ForeignKey, JSON, Enum as SQLEnum
+    Integer, BigInteger, String, Text, Boolean, DateTime, Date, Time, 
+    ForeignKey, JSON, Index, LargeBinary, Enum as SQLEnum
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
@@ -133,6 +133,13 @@ class NKOProfile(Base):
 class ContentHistory(Base):
     """История сгенерированного контента"""
     __tablename__ = "content_history"
+    __table_args__ = (
+        # Keyset-пагинация истории пользователя по (generated_at, id)
+        Index("ix_content_history_user_generated", "user_id", "generated_at", "id"),
+        # Агрегаты аналитики по стилям и типам постов
+        Index("ix_content_history_user_type_style", "user_id", "content_type", "style"),
+        Index("ix_content_history_user_post_type", "user_id", "post_type"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
@@ -145,15 +152,137 @@ class ContentHistory(Base):
     is_favorite: Mapped[bool] = mapped_column(Boolean, default=False)  # Избранное
     tags: Mapped[Optional[list]] = mapped_column(JSON, nullable=True)  # Теги для поиска
     
-    generated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    # Часто читаемые поля content_data, вынесенные в колонки (см. history_fields)
+    style: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)  # Стиль текста
+    post_type: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)  # series, holiday, edited и т.д.
+    file_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)  # Файл изображения
+    text_length: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # Длина текста в символах
+    hashtag_count: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # NULL - запись еще не перенесена
+    
+    # Значение по умолчанию задается в Python: в SQLite CURRENT_TIMESTAMP хранится
+    # без долей секунды и не совпадает с курсором пагинации (см. миграцию 0009)
+    generated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, server_default=func.now())
     
     # Связи
     user: Mapped["User"] = relationship("User", back_populates="content_history")
+    hashtags: Mapped[list["ContentHistoryHashtag"]] = relationship(
+        "ContentHistoryHashtag",
+        cascade="all, delete-orphan",
+        passive_deletes=True
+    )
     
     def __repr__(self) -> str:
         return f"<ContentHistory(id={self.id}, user_id={self.user_id}, type={self.content_type})>"
 
 
+class ContentHistoryHashtag(Base):
+    """Хештег записи истории (для агрегатов по хештегам без разбора JSON)"""
+    __tablename__ = "content_history_hashtags"
+    __table_args__ = (
+        Index("ix_content_history_hashtags_user_hashtag", "user_id", "hashtag"),
+    )
+    
+    content_history_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("content_history.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    hashtag: Mapped[str] = mapped_column(String(255), primary_key=True)  # В нижнем регистре, с '#'
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    
+    def __repr__(self) -> str:
+        return f"<ContentHistoryHashtag(content_history_id={self.content_history_id}, hashtag={self.hashtag})>"
+
+
+class ContentHistoryArchive(Base):
+    """Архив записей истории, удаленных при очистке (данные сжаты zlib)"""
+    __tablename__ = "content_history_archive"
+    __table_args__ = (
+        Index("ix_content_history_archive_user_generated", "user_id", "generated_at"),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)  # ID исходной записи
+    user_id: Mapped[int] = mapped_column(Integer)  # Без внешнего ключа: архив переживает пользователя
+    content_type: Mapped[str] = mapped_column(String(20))
+    generated_at: Mapped[datetime] = mapped_column(DateTime)
+    reason: Mapped[str] = mapped_column(String(20))  # age, limit
+    payload: Mapped[bytes] = mapped_column(LargeBinary)  # zlib(JSON) всей записи с хештегами
+    
+    archived_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    
+    def __repr__(self) -> str:
+        return f"<ContentHistoryArchive(id={self.id}, user_id={self.user_id}, reason={self.reason})>"
+
+
+class UserActivityProfile(Base):
+    """Профиль активности пользователя по часам недели (см. bot.services.activity_profile)"""
+    __tablename__ = "user_activity_profiles"
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    # {час недели в UTC (0 - понедельник 00:00): вес}, веса затухают экспоненциально
+    weights: Mapped[dict] = mapped_column(JSON)
+    events: Mapped[int] = mapped_column(Integer, default=0)  # Учтено записей истории
+    updated_at: Mapped[datetime] = mapped_column(DateTime)  # Момент (UTC), к которому приведены веса
+
+    def __repr__(self) -> str:
+        return f"<UserActivityProfile(user_id={self.user_id}, events={self.events})>"
+
+
+class BackfillProgress(Base):
+    """Прогресс пакетного заполнения данных (см. bot.database.backfill)"""
+    __tablename__ = "backfill_progress"
+    
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    last_key: Mapped[int] = mapped_column(Integer, default=0)  # Последний обработанный ключ
+    rows_done: Mapped[int] = mapped_column(Integer, default=0)
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self) -> str:
+        return f"<BackfillProgress(name={self.name}, last_key={self.last_key}, rows_done={self.rows_done})>"
+
+
+class UserState(Base):
+    """Сохраненный context.user_data пользователя (см. bot.services.state_persistence)"""
+    __tablename__ = "user_states"
+    
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)  # Telegram user_id
+    data: Mapped[dict] = mapped_column(JSON)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, index=True)  # Последняя активность, для TTL
+    
+    def __repr__(self) -> str:
+        return f"<UserState(user_id={self.user_id}, updated_at={self.updated_at})>"
+
+
+class ConversationState(Base):
+    """Сохраненное состояние ConversationHandler для одного диалога"""
+    __tablename__ = "conversation_states"
+    
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)  # Имя ConversationHandler
+    key: Mapped[str] = mapped_column(String(100), primary_key=True)  # JSON ключа диалога, например [chat_id, user_id]
+    state: Mapped[Any] = mapped_column(JSON, nullable=True)  # Строка или число состояния
+    updated_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    
+    def __repr__(self) -> str:
+        return f"<ConversationState(name={self.name}, key={self.key}, state={self.state})>"
+
+
+class OutboxMessage(Base):
+    """Исходящее сообщение в очереди отправки (см. bot.services.outbox)"""
+    __tablename__ = "outbox_messages"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    priority: Mapped[int] = mapped_column(Integer)  # OutboxPriority: меньше - раньше
+    text: Mapped[str] = mapped_column(Text)
+    options: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)  # parse_mode, reply_markup и т.п.
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+    def __repr__(self) -> str:
+        return f"<OutboxMessage(id={self.id}, chat_id={self.chat_id}, priority={self.priority})>"
+
+
 class ContentPlan(Base):
     """Контент-план пользователя"""
     __tablename__ = "content_plans"
@@ -166,7 +295,7 @@ class ContentPlan(Base):
     end_date: Mapped[date] = mapped_column(Date)
     
     frequency: Mapped[int] = mapped_column(Integer)  # Публикаций в неделю
-    schedule: Mapped[dict] = mapped_column(JSON)  # Расписание публикаций
+    schedule: Mapped[dict] = mapped_column(JSON)  # Параметры расписания (дни, время, темы); даты - в plan_slots
     
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
@@ -174,11 +303,121 @@ class ContentPlan(Base):
     
     # Связи
     user: Mapped["User"] = relationship("User", back_populates="content_plans")
+    slots: Mapped[list["PlanSlot"]] = relationship(
+        "PlanSlot",
+        back_populates="plan",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="PlanSlot.date"
+    )
+    events: Mapped[list["PlanEvent"]] = relationship(
+        "PlanEvent",
+        back_populates="plan",
+        passive_deletes=True
+    )
     
     def __repr__(self) -> str:
         return f"<ContentPlan(id={self.id}, user_id={self.user_id}, name={self.plan_name})>"
 
 
+class PlanSlotStatus(str, enum.Enum):
+    """Статусы публикации в контент-плане"""
+    PLANNED = "planned"  # Запланирована
+    GENERATED = "generated"  # Текст сгенерирован
+    PUBLISHED = "published"  # Опубликована
+    SKIPPED = "skipped"  # Пропущена
+
+
+class PlanSlot(Base):
+    """Запланированная публикация контент-плана"""
+    __tablename__ = "plan_slots"
+    __table_args__ = (
+        # Ближайшие публикации пользователя
+        Index("ix_plan_slots_user_date", "user_id", "date"),
+        Index("ix_plan_slots_plan_date", "plan_id", "date"),
+        # Ближайшие публикации без черновика (bot.services.plan_drafts)
+        Index("ix_plan_slots_status_date", "status", "date"),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    plan_id: Mapped[int] = mapped_column(Integer, ForeignKey("content_plans.id", ondelete="CASCADE"))
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    
+    date: Mapped[date] = mapped_column(Date)
+    time: Mapped[Optional[time]] = mapped_column(Time, nullable=True)
+    topic: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    status: Mapped[str] = mapped_column(String(20), default=PlanSlotStatus.PLANNED.value)  # PlanSlotStatus
+    generated_history_id: Mapped[Optional[int]] = mapped_column(
+        Integer,
+        ForeignKey("content_history.id", ondelete="SET NULL"),
+        nullable=True
+    )  # Сгенерированный для публикации пост
+    
+    # Связи
+    plan: Mapped["ContentPlan"] = relationship("ContentPlan", back_populates="slots")
+    
+    def __repr__(self) -> str:
+        return f"<PlanSlot(id={self.id}, plan_id={self.plan_id}, date={self.date}, status={self.status})>"
+
+
+class PlanReminder(Base):
+    """Напоминание контент-плана в один из его дней недели (см. bot.services.plan_reminders)"""
+    __tablename__ = "plan_reminders"
+    __table_args__ = (
+        # Напоминания, срабатывающие в минуту: (день недели, минута суток) в UTC
+        Index("ix_plan_reminders_due", "weekday_utc", "minute_utc"),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    plan_id: Mapped[int] = mapped_column(Integer, ForeignKey("content_plans.id", ondelete="CASCADE"), index=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    
+    # Время по часовому поясу пользователя: день недели (0=понедельник) и минута суток
+    weekday: Mapped[int] = mapped_column(Integer)
+    minute: Mapped[int] = mapped_column(Integer)
+    timezone: Mapped[str] = mapped_column(String(50))
+    utc_offset: Mapped[int] = mapped_column(Integer)  # Смещение пояса в минутах на момент расчета
+    weekday_utc: Mapped[int] = mapped_column(Integer)
+    minute_utc: Mapped[int] = mapped_column(Integer)
+    
+    start_date: Mapped[date] = mapped_column(Date)  # Период плана (даты пользователя)
+    end_date: Mapped[date] = mapped_column(Date)
+    active: Mapped[bool] = mapped_column(Boolean, default=True)  # False - напоминания отменены
+    last_sent_on: Mapped[Optional[date]] = mapped_column(Date, nullable=True)  # Дата пользователя последней отправки
+    
+    def __repr__(self) -> str:
+        return f"<PlanReminder(id={self.id}, plan_id={self.plan_id}, weekday={self.weekday}, minute={self.minute})>"
+
+
+class PlanEvent(Base):
+    """Событие календаря пользователя"""
+    __tablename__ = "plan_events"
+    __table_args__ = (
+        Index("ix_plan_events_user_date", "user_id", "date"),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    plan_id: Mapped[Optional[int]] = mapped_column(
+        Integer,
+        ForeignKey("content_plans.id", ondelete="SET NULL"),
+        nullable=True
+    )  # План, в период которого попадает событие
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    
+    name: Mapped[str] = mapped_column(String(255))
+    date: Mapped[date] = mapped_column(Date)
+    time: Mapped[Optional[time]] = mapped_column(Time, nullable=True)
+    description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    
+    # Связи
+    plan: Mapped[Optional["ContentPlan"]] = relationship("ContentPlan", back_populates="events")
+    
+    def __repr__(self) -> str:
+        return f"<PlanEvent(id={self.id}, user_id={self.user_id}, date={self.date}, name={self.name})>"
+
+
 class PostTemplate(Base):
     """Шаблоны постов"""
     __tablename__ = "post_templates"
@@ -283,6 +522,11 @@ class TeamMember(Base):
     # Связи
     team: Mapped["Team"] = relationship("Team", back_populates="members")
     
+    __table_args__ = (
+        # Одна запись участника на пару (команда, пользователь) - основа для upsert
+        Index("uq_team_members_team_user", "team_id", "user_id", unique=True),
+    )
+    
     def __repr__(self) -> str:
         return f"<TeamMember(id={self.id}, team_id={self.team_id}, user_id={self.user_id}, role={self.role})>"
 
@@ -301,12 +545,24 @@ class SharedContent(Base):
     approved_by: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     approved_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     
-    comments: Mapped[Optional[list]] = mapped_column(JSON, nullable=True)  # Комментарии к контенту
+    # Версия для оптимистичной блокировки: увеличивается при каждом решении по контенту
+    version: Mapped[int] = mapped_column(Integer, default=1, server_default="1")
     
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
     
     # Связи
     team: Mapped["Team"] = relationship("Team", back_populates="shared_content")
+    comments: Mapped[list["ContentComment"]] = relationship(
+        "ContentComment",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="ContentComment.created_at"
+    )
+    
+    __table_args__ = (
+        # Контент публикуется в команду один раз - основа для массовой вставки без дублей
+        Index("uq_shared_content_team_history", "team_id", "content_history_id", unique=True),
+    )
     
     def __repr__(self) -> str:
         return f"<SharedContent(id={self.id}, team_id={self.team_id}, content_history_id={self.content_history_id}, is_approved={self.is_approved})>"
@@ -325,6 +581,10 @@ class ContentComment(Base):
     
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
     
+    __table_args__ = (
+        Index("ix_content_comments_shared_created", "shared_content_id", "created_at"),
+    )
+    
     def __repr__(self) -> str:
         return f"<ContentComment(id={self.id}, shared_content_id={self.shared_content_id}, user_id={self.user_id})>"
 
@@ -0,0 +1,81 @@
+"""
+Построение строк plan_slots из параметров контент-плана
+
+Используется при создании плана (plan_repository) и при переносе старых планов
+из JSON schedule (migrations/plan_schedule).
+"""
+import re
+from datetime import date, time
+from typing import Any, Iterable, List, Optional, Union
+from bot.database.models import PlanSlot, PlanSlotStatus
+
+_TIME_RE = re.compile(r"\b([01]?\d|2[0-3])[:.]([0-5]\d)\b")
+
+
+def parse_slot_time(value: Any) -> Optional[time]:
+    """
+    Извлекает время публикации из строки расписания ("10:00", "утро, 18:30")
+
+    Args:
+        value: Строка времени из настроек плана
+
+    Returns:
+        Первое найденное время или None, если время задано словами
+    """
+    if isinstance(value, time):
+        return value
+    match = _TIME_RE.search(str(value or ""))
+    if not match:
+        return None
+    return time(int(match.group(1)), int(match.group(2)))
+
+
+def slot_topic(topics: Any, index: int) -> Optional[str]:
+    """
+    Тема публикации с порядковым номером index
+
+    Args:
+        topics: Темы плана - строка или список
+        index: Номер публикации (с 0)
+
+    Returns:
+        Тема или None
+    """
+    if isinstance(topics, (list, tuple)):
+        return str(topics[index % len(topics)])[:500] if topics else None
+    return str(topics)[:500] if topics else None
+
+
+def build_slots(
+    plan_id: int,
+    user_id: int,
+    dates: Iterable[Union[date, str]],
+    time_value: Any = None,
+    topics: Any = None
+) -> List[PlanSlot]:
+    """
+    Создает (не сохраняя) публикации плана
+
+    Args:
+        plan_id: ID контент-плана
+        user_id: ID владельца плана
+        dates: Даты публикаций (date или ISO-строки)
+        time_value: Время публикаций из настроек плана
+        topics: Темы плана - строка или список
+
+    Returns:
+        Список PlanSlot
+    """
+    slot_time = parse_slot_time(time_value)
+    slots = []
+    for index, value in enumerate(dates):
+        slot_date = date.fromisoformat(value[:10]) if isinstance(value, str) else value
+        slots.append(PlanSlot(
+            plan_id=plan_id,
+            user_id=user_id,
+            date=slot_date,
+            time=slot_time,
+            topic=slot_topic(topics, index),
+            status=PlanSlotStatus.PLANNED.value
+        ))
+    return slots
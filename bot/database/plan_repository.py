@@ -0,0 +1,197 @@
+"""
+Репозиторий расписания контент-планов
+
+Даты публикаций хранятся строками plan_slots, события календаря - строками
+plan_events (обе таблицы индексированы по (user_id, date)). "Ближайшие
+публикации" выбираются одним запросом по индексу, без загрузки планов
+и разбора дат в Python. Планы, чьи даты фоновый перенос еще не перенес
+из JSON schedule, переносятся перед чтением (plan_schedule.backfill_user).
+"""
+from dataclasses import dataclass
+from datetime import date, time
+from typing import Any, Iterable, List, Optional, Union
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from bot.database.models import ContentPlan, PlanSlot, PlanEvent
+from bot.database.database import get_db
+from bot.database.plan_fields import build_slots
+from bot.database.migrations import plan_schedule
+
+
+@dataclass(frozen=True)
+class UpcomingSlot:
+    """Предстоящая публикация активного плана"""
+    slot_id: int
+    plan_id: int
+    plan_name: str
+    date: date
+    time: Optional[time]
+    topic: Optional[str]
+    status: str
+
+
+@dataclass(frozen=True)
+class PlanSlotItem:
+    """Публикация плана, независимая от сессии БД"""
+    id: int
+    date: date
+    time: Optional[time]
+    topic: Optional[str]
+    status: str
+    generated_history_id: Optional[int]
+
+    @classmethod
+    def from_model(cls, slot: PlanSlot) -> "PlanSlotItem":
+        return cls(
+            id=slot.id,
+            date=slot.date,
+            time=slot.time,
+            topic=slot.topic,
+            status=slot.status,
+            generated_history_id=slot.generated_history_id
+        )
+
+
+class PlanRepository:
+    """Запросы к расписанию контент-планов"""
+
+    @staticmethod
+    def add_slots(
+        db: Session,
+        plan: ContentPlan,
+        dates: Iterable[Union[date, str]],
+        time_value: Any = None,
+        topics: Any = None
+    ) -> int:
+        """
+        Создает публикации плана в текущей сессии
+
+        Args:
+            db: Сессия БД
+            plan: Контент-план (должен иметь id - вызывайте после flush)
+            dates: Даты публикаций (date или ISO-строки)
+            time_value: Время публикаций из настроек плана
+            topics: Темы плана - строка или список
+
+        Returns:
+            Количество созданных публикаций
+        """
+        slots = build_slots(plan.id, plan.user_id, dates, time_value, topics)
+        db.add_all(slots)
+        return len(slots)
+
+    @staticmethod
+    def get_upcoming_slots(user_id: int, from_date: date, limit: int = 10) -> List[UpcomingSlot]:
+        """
+        Ближайшие публикации по всем активным планам пользователя
+
+        Args:
+            user_id: ID пользователя
+            from_date: Начиная с даты (включительно)
+            limit: Количество публикаций
+
+        Returns:
+            Список UpcomingSlot по возрастанию даты
+        """
+        with get_db() as db:
+            plan_schedule.backfill_user(db, user_id)
+            rows = db.query(
+                PlanSlot.id,
+                PlanSlot.plan_id,
+                ContentPlan.plan_name,
+                PlanSlot.date,
+                PlanSlot.time,
+                PlanSlot.topic,
+                PlanSlot.status
+            ).join(
+                ContentPlan, ContentPlan.id == PlanSlot.plan_id
+            ).filter(
+                PlanSlot.user_id == user_id,
+                PlanSlot.date >= from_date,
+                ContentPlan.is_active == True
+            ).order_by(
+                PlanSlot.date,
+                PlanSlot.time,
+                PlanSlot.id
+            ).limit(limit).all()
+
+        return [
+            UpcomingSlot(
+                slot_id=row.id,
+                plan_id=row.plan_id,
+                plan_name=row.plan_name,
+                date=row.date,
+                time=row.time,
+                topic=row.topic,
+                status=row.status
+            )
+            for row in rows
+        ]
+
+    @staticmethod
+    def get_plan_slots(plan_id: int) -> List[PlanSlotItem]:
+        """
+        Все публикации плана по возрастанию даты
+
+        Args:
+            plan_id: ID контент-плана
+
+        Returns:
+            Список PlanSlotItem
+        """
+        with get_db() as db:
+            plan_schedule.backfill_plan(db, plan_id)
+            slots = db.query(PlanSlot).filter(
+                PlanSlot.plan_id == plan_id
+            ).order_by(PlanSlot.date, PlanSlot.id).all()
+            return [PlanSlotItem.from_model(slot) for slot in slots]
+
+    @staticmethod
+    def count_slots(db: Session, plan_id: int) -> int:
+        """Количество публикаций в плане"""
+        plan_schedule.backfill_plan(db, plan_id)
+        return db.query(func.count(PlanSlot.id)).filter(PlanSlot.plan_id == plan_id).scalar() or 0
+
+    @staticmethod
+    def add_event(
+        user_id: int,
+        name: str,
+        event_date: date,
+        description: Optional[str] = None
+    ) -> Optional[int]:
+        """
+        Добавляет событие в календарь пользователя
+
+        Событие привязывается к активному плану, в период которого попадает дата;
+        если такого плана нет, событие сохраняется без плана.
+
+        Args:
+            user_id: ID пользователя
+            name: Название события
+            event_date: Дата события
+            description: Описание
+
+        Returns:
+            ID плана, к которому привязано событие, или None
+        """
+        with get_db() as db:
+            plan_id = db.query(ContentPlan.id).filter(
+                ContentPlan.user_id == user_id,
+                ContentPlan.is_active == True,
+                ContentPlan.start_date <= event_date,
+                ContentPlan.end_date >= event_date
+            ).order_by(ContentPlan.start_date.desc()).limit(1).scalar()
+
+            db.add(PlanEvent(
+                plan_id=plan_id,
+                user_id=user_id,
+                name=name[:255],
+                date=event_date,
+                description=description
+            ))
+
+        return plan_id
+
+
+# Глобальный экземпляр
+plan_repository = PlanRepository()
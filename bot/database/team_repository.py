@@ -0,0 +1,472 @@
+"""
+Репозиторий командного контента
+
+Экраны команд собираются одним запросом на экран: общий контент выбирается
+вместе с записью истории, названием команды и автором через JOIN, а
+членство пользователя проверяется подзапросом, поэтому число запросов
+не растет с количеством команд и публикаций.
+
+Изменения не переписывают общие данные целиком: комментарии добавляются
+отдельными строками content_comments, публикация в несколько команд и
+добавление участников - одной массовой вставкой с ON CONFLICT по уникальным
+индексам, а решение по контенту - условным UPDATE по версии записи
+(оптимистичная блокировка), без чтения и перезаписи в Python.
+"""
+import enum
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy import and_, delete, func, or_, select, update
+from bot.config import config
+from bot.database.models import (
+    ContentComment,
+    ContentHistory,
+    SharedContent,
+    Team,
+    TeamMember,
+    TeamRole,
+    User
+)
+from bot.database.database import get_db
+
+if config.DATABASE_URL.startswith("sqlite"):
+    from sqlalchemy.dialects.sqlite import insert as upsert_insert
+else:
+    from sqlalchemy.dialects.postgresql import insert as upsert_insert
+
+# Роли, которым доступно утверждение контента
+APPROVER_ROLES = (TeamRole.ADMIN.value, TeamRole.EDITOR.value)
+# Роли, которым доступна публикация контента в команду
+SHARER_ROLES = (TeamRole.ADMIN.value, TeamRole.EDITOR.value, TeamRole.AUTHOR.value)
+
+
+class ApprovalResult(str, enum.Enum):
+    """Результат решения по общему контенту"""
+    OK = "ok"
+    NOT_FOUND = "not_found"  # Контент удален
+    FORBIDDEN = "forbidden"  # Нет роли администратора или редактора
+    CONFLICT = "conflict"  # Решение уже принял кто-то другой (версия изменилась)
+
+
+@dataclass(frozen=True)
+class TeamMembership:
+    """Команда пользователя и его роль в ней"""
+    team_id: int
+    team_name: str
+    role: str
+    is_owner: bool
+
+
+@dataclass(frozen=True)
+class SharedItem:
+    """Общий контент команды вместе с записью истории, независимый от сессии БД"""
+    id: int
+    team_id: int
+    team_name: str
+    content_history_id: int
+    content_type: str
+    content_data: Dict[str, Any]
+    author_id: Optional[int]
+    author_name: Optional[str]
+    is_approved: bool
+    version: int
+    created_at: datetime
+
+    @property
+    def preview(self) -> str:
+        """Начало текста для списков"""
+        return str(self.content_data.get("text", self.content_data))[:50]
+
+
+@dataclass(frozen=True)
+class CommentItem:
+    """Комментарий к общему контенту"""
+    id: int
+    shared_content_id: int
+    user_id: int
+    author_name: Optional[str]
+    text: str
+    created_at: datetime
+    content_preview: str
+
+
+class TeamContentRepository:
+    """Запросы к командам и общему контенту"""
+
+    @staticmethod
+    def _member_team_ids(user_id: int, roles: Optional[Iterable[str]] = None):
+        """Подзапрос: команды, в которых пользователь состоит (с указанными ролями)"""
+        query = select(TeamMember.team_id).where(TeamMember.user_id == user_id)
+        if roles is not None:
+            query = query.where(TeamMember.role.in_(list(roles)))
+        return query
+
+    @staticmethod
+    def get_memberships(user_id: int, limit: Optional[int] = None) -> List[TeamMembership]:
+        """
+        Команды пользователя: где он участник или владелец
+
+        Args:
+            user_id: ID пользователя
+            limit: Максимум команд
+
+        Returns:
+            Список TeamMembership по названию команды
+        """
+        with get_db() as db:
+            query = db.query(
+                Team.id,
+                Team.name,
+                Team.owner_id,
+                func.max(TeamMember.role).label("role")
+            ).outerjoin(
+                TeamMember,
+                and_(TeamMember.team_id == Team.id, TeamMember.user_id == user_id)
+            ).filter(
+                or_(TeamMember.user_id == user_id, Team.owner_id == user_id)
+            ).group_by(
+                Team.id, Team.name, Team.owner_id
+            ).order_by(Team.name, Team.id)
+            if limit is not None:
+                query = query.limit(limit)
+            rows = query.all()
+
+        return [
+            TeamMembership(
+                team_id=row.id,
+                team_name=row.name,
+                # Владелец без записи участника считается администратором
+                role=row.role or TeamRole.ADMIN.value,
+                is_owner=row.owner_id == user_id
+            )
+            for row in rows
+        ]
+
+    @staticmethod
+    def get_shared_items(
+        user_id: int,
+        roles: Optional[Iterable[str]] = None,
+        pending_only: bool = False,
+        limit: int = 20,
+        shared_content_id: Optional[int] = None
+    ) -> List[SharedItem]:
+        """
+        Общий контент команд пользователя, новые первыми
+
+        Args:
+            user_id: ID пользователя
+            roles: Учитывать только команды, где у пользователя одна из ролей
+            pending_only: Только не утвержденный контент
+            limit: Максимум записей
+            shared_content_id: Только указанный контент
+
+        Returns:
+            Список SharedItem
+        """
+        with get_db() as db:
+            query = db.query(
+                SharedContent.id,
+                SharedContent.team_id,
+                Team.name.label("team_name"),
+                SharedContent.content_history_id,
+                ContentHistory.content_type,
+                ContentHistory.content_data,
+                User.id.label("author_id"),
+                User.first_name,
+                User.username,
+                SharedContent.is_approved,
+                SharedContent.version,
+                SharedContent.created_at
+            ).join(
+                Team, Team.id == SharedContent.team_id
+            ).join(
+                ContentHistory, ContentHistory.id == SharedContent.content_history_id
+            ).outerjoin(
+                # Автор - кто поделился контентом, иначе владелец записи
+                User, User.id == func.coalesce(SharedContent.shared_by, ContentHistory.user_id)
+            ).filter(
+                SharedContent.team_id.in_(TeamContentRepository._member_team_ids(user_id, roles))
+            )
+            if pending_only:
+                query = query.filter(SharedContent.is_approved == False)
+            if shared_content_id is not None:
+                query = query.filter(SharedContent.id == shared_content_id)
+            rows = query.order_by(
+                SharedContent.created_at.desc(),
+                SharedContent.id.desc()
+            ).limit(limit).all()
+
+        return [
+            SharedItem(
+                id=row.id,
+                team_id=row.team_id,
+                team_name=row.team_name,
+                content_history_id=row.content_history_id,
+                content_type=row.content_type,
+                content_data=row.content_data if isinstance(row.content_data, dict) else {"text": str(row.content_data)},
+                author_id=row.author_id,
+                author_name=row.first_name or row.username,
+                is_approved=bool(row.is_approved),
+                version=row.version,
+                created_at=row.created_at
+            )
+            for row in rows
+        ]
+
+    @staticmethod
+    def is_member(user_id: int, roles: Optional[Iterable[str]] = None) -> bool:
+        """Состоит ли пользователь хотя бы в одной команде (с одной из ролей)"""
+        with get_db() as db:
+            return db.query(
+                TeamContentRepository._member_team_ids(user_id, roles).exists()
+            ).scalar()
+
+
+    @staticmethod
+    def get_shared_item(user_id: int, shared_content_id: int) -> Optional[SharedItem]:
+        """Общий контент, если он опубликован в команду пользователя"""
+        items = TeamContentRepository.get_shared_items(user_id, limit=1, shared_content_id=shared_content_id)
+        return items[0] if items else None
+
+    @staticmethod
+    def get_shareable_teams(user_id: int) -> List[TeamMembership]:
+        """Команды, в которые пользователь может публиковать контент"""
+        return [
+            membership for membership in TeamContentRepository.get_memberships(user_id)
+            if membership.role in SHARER_ROLES
+        ]
+
+    @staticmethod
+    def share_to_teams(user_id: int, content_history_id: int, team_ids: Iterable[int]) -> int:
+        """
+        Публикует запись истории в несколько команд одной массовой вставкой
+
+        Команды, где у пользователя нет роли автора и выше, пропускаются,
+        как и команды, в которых запись уже опубликована.
+
+        Args:
+            user_id: ID пользователя (владельца записи)
+            content_history_id: ID записи истории
+            team_ids: ID команд
+
+        Returns:
+            Количество новых публикаций
+        """
+        with get_db() as db:
+            is_owner = db.query(ContentHistory.id).filter(
+                ContentHistory.id == content_history_id,
+                ContentHistory.user_id == user_id
+            ).scalar()
+            if not is_owner:
+                return 0
+
+            allowed_team_ids = db.scalars(
+                TeamContentRepository._member_team_ids(user_id, SHARER_ROLES).where(
+                    TeamMember.team_id.in_(list(team_ids))
+                )
+            ).all()
+            if not allowed_team_ids:
+                return 0
+
+            rows = [
+                {
+                    "team_id": team_id,
+                    "content_history_id": content_history_id,
+                    "shared_by": user_id,
+                    "is_approved": False,
+                    "version": 1
+                }
+                for team_id in sorted(set(allowed_team_ids))
+            ]
+            inserted = db.scalars(
+                upsert_insert(SharedContent).on_conflict_do_nothing(
+                    index_elements=["team_id", "content_history_id"]
+                ).returning(SharedContent.id),
+                rows
+            ).all()
+
+        return len(inserted)
+
+    @staticmethod
+    def upsert_members(team_id: int, roles: Dict[int, str]) -> None:
+        """
+        Добавляет участников команды или обновляет их роли одной вставкой
+
+        Args:
+            team_id: ID команды
+            roles: Роль для каждого пользователя {user_id: role}
+        """
+        if not roles:
+            return
+
+        statement = upsert_insert(TeamMember)
+        with get_db() as db:
+            db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=["team_id", "user_id"],
+                    set_={"role": statement.excluded.role}
+                ),
+                [{"team_id": team_id, "user_id": user_id, "role": role} for user_id, role in roles.items()]
+            )
+
+    @staticmethod
+    def add_comment(user_id: int, shared_content_id: int, text: str) -> Optional[int]:
+        """
+        Добавляет комментарий к общему контенту
+
+        Args:
+            user_id: ID автора комментария
+            shared_content_id: ID общего контента
+            text: Текст комментария
+
+        Returns:
+            ID комментария или None, если контент не найден в командах пользователя
+        """
+        with get_db() as db:
+            allowed = db.query(SharedContent.id).filter(
+                SharedContent.id == shared_content_id,
+                SharedContent.team_id.in_(TeamContentRepository._member_team_ids(user_id))
+            ).scalar()
+            if not allowed:
+                return None
+
+            comment = ContentComment(
+                shared_content_id=shared_content_id,
+                user_id=user_id,
+                comment_text=text
+            )
+            db.add(comment)
+            db.flush()
+            return comment.id
+
+    @staticmethod
+    def _comments_query(db):
+        return db.query(
+            ContentComment.id,
+            ContentComment.shared_content_id,
+            ContentComment.user_id,
+            User.first_name,
+            User.username,
+            ContentComment.comment_text,
+            ContentComment.created_at,
+            ContentHistory.content_data
+        ).join(
+            SharedContent, SharedContent.id == ContentComment.shared_content_id
+        ).join(
+            ContentHistory, ContentHistory.id == SharedContent.content_history_id
+        ).outerjoin(
+            User, User.id == ContentComment.user_id
+        )
+
+    @staticmethod
+    def _to_comment(row) -> CommentItem:
+        content_data = row.content_data if isinstance(row.content_data, dict) else {"text": str(row.content_data)}
+        return CommentItem(
+            id=row.id,
+            shared_content_id=row.shared_content_id,
+            user_id=row.user_id,
+            author_name=row.first_name or row.username,
+            text=row.comment_text,
+            created_at=row.created_at,
+            content_preview=str(content_data.get("text", content_data))[:50]
+        )
+
+    @staticmethod
+    def get_comments(shared_content_id: int, limit: int = 10) -> List[CommentItem]:
+        """
+        Последние комментарии к контенту в хронологическом порядке
+
+        Args:
+            shared_content_id: ID общего контента
+            limit: Максимум комментариев
+
+        Returns:
+            Список CommentItem
+        """
+        with get_db() as db:
+            rows = TeamContentRepository._comments_query(db).filter(
+                ContentComment.shared_content_id == shared_content_id
+            ).order_by(
+                ContentComment.created_at.desc(),
+                ContentComment.id.desc()
+            ).limit(limit).all()
+
+        return [TeamContentRepository._to_comment(row) for row in reversed(rows)]
+
+    @staticmethod
+    def get_recent_comments(user_id: int, limit: int = 10) -> List[CommentItem]:
+        """
+        Последние комментарии во всех командах пользователя, новые первыми
+
+        Args:
+            user_id: ID пользователя
+            limit: Максимум комментариев
+
+        Returns:
+            Список CommentItem
+        """
+        with get_db() as db:
+            rows = TeamContentRepository._comments_query(db).filter(
+                SharedContent.team_id.in_(TeamContentRepository._member_team_ids(user_id))
+            ).order_by(
+                ContentComment.created_at.desc(),
+                ContentComment.id.desc()
+            ).limit(limit).all()
+
+        return [TeamContentRepository._to_comment(row) for row in rows]
+
+    @staticmethod
+    def decide(user_id: int, shared_content_id: int, expected_version: int, approve: bool) -> ApprovalResult:
+        """
+        Утверждает или отклоняет (удаляет) общий контент
+
+        Решение применяется одним условным запросом: только если контент еще
+        не утвержден, его версия не изменилась с момента показа пользователю
+        и у пользователя есть роль администратора или редактора в команде.
+
+        Args:
+            user_id: ID пользователя, принимающего решение
+            shared_content_id: ID общего контента
+            expected_version: Версия, которую видел пользователь
+            approve: True - утвердить, False - отклонить
+
+        Returns:
+            ApprovalResult
+        """
+        conditions = (
+            SharedContent.id == shared_content_id,
+            SharedContent.version == expected_version,
+            SharedContent.is_approved == False,
+            SharedContent.team_id.in_(TeamContentRepository._member_team_ids(user_id, APPROVER_ROLES))
+        )
+
+        with get_db() as db:
+            if approve:
+                statement = update(SharedContent).where(*conditions).values(
+                    is_approved=True,
+                    approved_by=user_id,
+                    approved_at=datetime.now(),
+                    version=SharedContent.version + 1
+                )
+            else:
+                # Комментарии удаляются каскадом
+                statement = delete(SharedContent).where(*conditions)
+
+            result = db.execute(statement.execution_options(synchronize_session=False))
+            if result.rowcount == 1:
+                return ApprovalResult.OK
+
+            team_id = db.query(SharedContent.team_id).filter(SharedContent.id == shared_content_id).scalar()
+            if team_id is None:
+                return ApprovalResult.NOT_FOUND
+
+            can_approve = db.query(
+                TeamContentRepository._member_team_ids(user_id, APPROVER_ROLES).where(
+                    TeamMember.team_id == team_id
+                ).exists()
+            ).scalar()
+            return ApprovalResult.CONFLICT if can_approve else ApprovalResult.FORBIDDEN
+
+
+# Глобальный экземпляр
+team_repository = TeamContentRepository()
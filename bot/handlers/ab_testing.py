@@ -8,8 +8,8 @@ from bot.services.ai.openrouter import openrouter_api
 from bot.services.content.hashtag_generator import hashtag_generator
 from bot.services.content.text_processor import text_processor
 from bot.utils.helpers import get_or_create_user
-from bot.database.models import ContentHistory, NKOProfile
-from bot.database.database import get_db
+from bot.services.user_cache import user_cache
+from bot.services.history_writer import history_writer
 from bot.states.conversation import END
 
 logger = logging.getLogger(__name__)
@@ -52,11 +52,7 @@ async def handle_ab_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         
         # Получаем профиль НКО
-        nko_profile = None
-        with get_db() as db:
-            profile = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).first()
-            if profile:
-                nko_profile = profile
+        nko_profile = user_cache.get_active_profile(user_id)
         
         nko_info = ""
         if nko_profile:
@@ -186,21 +182,18 @@ async def handle_ab_selection(update: Update, context: ContextTypes.DEFAULT_TYPE
             user_id = update.effective_user.id
             get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
             
-            with get_db() as db:
-                history_entry = ContentHistory(
-                    user_id=user_id,
-                    content_type="text",
-                    content_data={
-                        "text": variant['original'],
-                        "hashtags": variant['hashtags'],
-                        "style": variant['style'],
-                        "type": "ab_test_winner",
-                        "ab_test": True
-                    },
-                    tags=variant['hashtags']
-                )
-                db.add(history_entry)
-                db.commit()
+            history_writer.enqueue(
+                user_id=user_id,
+                content_type="text",
+                content_data={
+                    "text": variant['original'],
+                    "hashtags": variant['hashtags'],
+                    "style": variant['style'],
+                    "type": "ab_test_winner",
+                    "ab_test": True
+                },
+                tags=variant['hashtags']
+            )
             
             await query.edit_message_text(
                 f"✅ **Вариант {variant_index + 1} сохранен!**\n\n{variant['text']}",
@@ -214,23 +207,20 @@ async def handle_ab_selection(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
         
-        with get_db() as db:
-            for i, variant in enumerate(variants):
-                history_entry = ContentHistory(
-                    user_id=user_id,
-                    content_type="text",
-                    content_data={
-                        "text": variant['original'],
-                        "hashtags": variant['hashtags'],
-                        "style": variant['style'],
-                        "type": "ab_test_variant",
-                        "variant_number": i + 1,
-                        "ab_test": True
-                    },
-                    tags=variant['hashtags']
-                )
-                db.add(history_entry)
-            db.commit()
+        for i, variant in enumerate(variants):
+            history_writer.enqueue(
+                user_id=user_id,
+                content_type="text",
+                content_data={
+                    "text": variant['original'],
+                    "hashtags": variant['hashtags'],
+                    "style": variant['style'],
+                    "type": "ab_test_variant",
+                    "variant_number": i + 1,
+                    "ab_test": True
+                },
+                tags=variant['hashtags']
+            )
         
         await query.answer("✅ Все варианты сохранены!", show_alert=True)
     
@@ -246,6 +236,8 @@ async def handle_ab_selection(update: Update, context: ContextTypes.DEFAULT_TYPE
 def setup_ab_testing_handlers(application):
     """Настройка обработчиков A/B тестирования"""
     conv_handler = ConversationHandler(
+        name="ab_testing",
+        persistent=True,
         entry_points=[
             MessageHandler(filters.Regex("^🔬 A/B тест$"), show_ab_testing_menu),
         ],
@@ -2,68 +2,45 @@
 Обработчики статистики и аналитики
 """
 import logging
-from datetime import datetime, timedelta
-from pathlib import Path
+from datetime import date, datetime, timedelta
 from typing import Dict, Any, List, Optional
 from telegram import Update
 from telegram.ext import ContextTypes
 from bot.utils.helpers import get_or_create_user
-from bot.database.models import ContentHistory, ContentPlan, PostTemplate
+from sqlalchemy import case, func
+from bot.database.models import ContentHistory, ContentHistoryHashtag, ContentPlan, PostTemplate
 from bot.database.database import get_db
+from bot.database.migrations import content_history_fields
+from bot.services.history_writer import history_writer
 from bot.services.analytics.predictions import prediction_service
+from bot.services.charts import Chart, chart_service
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
 
-try:
-    import matplotlib
-    matplotlib.use('Agg')  # Используем backend без GUI
-    import matplotlib.pyplot as plt
-    import matplotlib.dates as mdates
-    matplotlib_available = True
-except ImportError:
-    matplotlib_available = False
-    logging.warning("matplotlib не установлен, визуализация будет недоступна")
-
 logger = logging.getLogger(__name__)
 
-CHARTS_DIR = Path("data/charts")
-CHARTS_DIR.mkdir(parents=True, exist_ok=True)
-
 
 async def show_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает статистику использования бота"""
     user_id = update.effective_user.id
     get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
+    await history_writer.flush_user(user_id)
+    
+    week_ago = datetime.now() - timedelta(days=7)
+    month_ago = datetime.now() - timedelta(days=30)
     
     with get_db() as db:
-        # Общая статистика
-        total_texts = db.query(ContentHistory).filter(
-            ContentHistory.user_id == user_id,
-            ContentHistory.content_type == "text"
-        ).count()
-        
-        total_images = db.query(ContentHistory).filter(
-            ContentHistory.user_id == user_id,
-            ContentHistory.content_type == "image"
-        ).count()
-        
-        total_plans = db.query(ContentHistory).filter(
-            ContentHistory.user_id == user_id,
-            ContentHistory.content_type == "plan"
-        ).count()
-        
-        # Статистика за последние 7 дней
-        week_ago = datetime.now() - timedelta(days=7)
-        texts_week = db.query(ContentHistory).filter(
-            ContentHistory.user_id == user_id,
-            ContentHistory.content_type == "text",
-            ContentHistory.generated_at >= week_ago
-        ).count()
-        
-        images_week = db.query(ContentHistory).filter(
-            ContentHistory.user_id == user_id,
-            ContentHistory.content_type == "image",
-            ContentHistory.generated_at >= week_ago
-        ).count()
+        # Стили читаются из колонки style - записи, не перенесенные фоном, переносим сейчас
+        content_history_fields.backfill_user(db, user_id)
+        
+        # Общая статистика и активность за неделю/месяц - один агрегирующий запрос
+        type_rows = db.query(
+            ContentHistory.content_type,
+            func.count(ContentHistory.id),
+            func.sum(case((ContentHistory.generated_at >= week_ago, 1), else_=0)),
+            func.sum(case((ContentHistory.generated_at >= month_ago, 1), else_=0))
+        ).filter(
+            ContentHistory.user_id == user_id
+        ).group_by(ContentHistory.content_type).all()
         
         # Активные планы
         active_plans = db.query(ContentPlan).filter(
@@ -76,33 +53,33 @@ async def show_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
             PostTemplate.user_id == user_id
         ).count()
         
-        # Самая популярная функция
-        all_items = db.query(ContentHistory).filter(
-            ContentHistory.user_id == user_id
-        ).all()
-        
-        function_usage = {
-            "text": 0,
-            "image": 0,
-            "plan": 0
-        }
-        
-        for item in all_items:
-            if item.content_type in function_usage:
-                function_usage[item.content_type] += 1
-        
-        most_popular = max(function_usage.items(), key=lambda x: x[1])[0] if function_usage else "text"
-        most_popular_names = {
-            "text": "📝 Генерация текста",
-            "image": "🎨 Генерация изображений",
-            "plan": "📅 Контент-план"
-        }
-        
         # Статистика по стилям (для расширенной аналитики)
-        text_types = db.query(ContentHistory).filter(
+        style_rows = db.query(
+            ContentHistory.style,
+            func.count(ContentHistory.id)
+        ).filter(
             ContentHistory.user_id == user_id,
             ContentHistory.content_type == "text"
-        ).all()
+        ).group_by(ContentHistory.style).all()
+    
+    totals = {content_type: (total, week or 0, month or 0) for content_type, total, week, month in type_rows}
+    total_texts, texts_week, texts_month = totals.get("text", (0, 0, 0))
+    total_images, images_week, _ = totals.get("image", (0, 0, 0))
+    total_plans = totals.get("plan", (0, 0, 0))[0]
+    
+    # Самая популярная функция
+    function_usage = {
+        "text": total_texts,
+        "image": total_images,
+        "plan": total_plans
+    }
+    
+    most_popular = max(function_usage.items(), key=lambda x: x[1])[0] if function_usage else "text"
+    most_popular_names = {
+        "text": "📝 Генерация текста",
+        "image": "🎨 Генерация изображений",
+        "plan": "📅 Контент-план"
+    }
     
     # Формируем сообщение
     text = (
@@ -128,11 +105,9 @@ async def show_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if total_texts > 0:
         # Статистика по стилям
         style_stats = {}
-        for item in text_types:
-            if item.content_type == "text":
-                content_data = item.content_data if isinstance(item.content_data, dict) else {}
-                style = content_data.get("style", "не указан")
-                style_stats[style] = style_stats.get(style, 0) + 1
+        for style, count in style_rows:
+            style = style or "не указан"
+            style_stats[style] = style_stats.get(style, 0) + count
         
         if style_stats:
             text += "**Статистика по стилям:**\n"
@@ -141,14 +116,6 @@ async def show_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
             text += "\n"
         
         # Статистика активности за месяц
-        month_ago = datetime.now() - timedelta(days=30)
-        with get_db() as db_month:
-            texts_month = db_month.query(ContentHistory).filter(
-                ContentHistory.user_id == user_id,
-                ContentHistory.content_type == "text",
-                ContentHistory.generated_at >= month_ago
-            ).count()
-        
         text += "**За последний месяц:**\n"
         text += f"📝 Текстов: {texts_month}\n\n"
     
@@ -195,37 +162,43 @@ def get_detailed_statistics(user_id: int, period_days: int = 30) -> Dict[str, An
         start_date = datetime.now() - timedelta(days=period_days)
         
         with get_db() as db:
-            # Статистика по типам контента
-            texts = db.query(ContentHistory).filter(
-                ContentHistory.user_id == user_id,
-                ContentHistory.content_type == "text",
-                ContentHistory.generated_at >= start_date
-            ).all()
+            content_history_fields.backfill_user(db, user_id)
             
-            images = db.query(ContentHistory).filter(
+            # Активность по дням и типам контента
+            day = func.date(ContentHistory.generated_at)
+            activity_rows = db.query(
+                day,
+                ContentHistory.content_type,
+                func.count(ContentHistory.id)
+            ).filter(
                 ContentHistory.user_id == user_id,
-                ContentHistory.content_type == "image",
+                ContentHistory.content_type.in_(("text", "image", "plan")),
                 ContentHistory.generated_at >= start_date
-            ).all()
+            ).group_by(day, ContentHistory.content_type).all()
             
-            plans = db.query(ContentHistory).filter(
+            # Статистика по стилям
+            style_rows = db.query(
+                ContentHistory.style,
+                func.count(ContentHistory.id)
+            ).filter(
                 ContentHistory.user_id == user_id,
-                ContentHistory.content_type == "plan",
+                ContentHistory.content_type == "text",
                 ContentHistory.generated_at >= start_date
-            ).all()
+            ).group_by(ContentHistory.style).all()
             
-            # Активность по дням
+            type_counts = {"text": 0, "image": 0, "plan": 0}
             daily_activity = {}
-            for item in texts + images + plans:
-                day = item.generated_at.date()
-                daily_activity[day] = daily_activity.get(day, 0) + 1
+            for activity_day, content_type, count in activity_rows:
+                if isinstance(activity_day, str):
+                    # SQLite возвращает date() строкой
+                    activity_day = date.fromisoformat(activity_day)
+                daily_activity[activity_day] = daily_activity.get(activity_day, 0) + count
+                type_counts[content_type] += count
             
-            # Статистика по стилям
             style_stats = {}
-            for item in texts:
-                content_data = item.content_data if isinstance(item.content_data, dict) else {}
-                style = content_data.get("style", "не указан")
-                style_stats[style] = style_stats.get(style, 0) + 1
+            for style, count in style_rows:
+                style = style or "не указан"
+                style_stats[style] = style_stats.get(style, 0) + count
             
             # Самая активная неделя
             weekly_activity = {}
@@ -238,10 +211,10 @@ def get_detailed_statistics(user_id: int, period_days: int = 30) -> Dict[str, An
             return {
                 "success": True,
                 "period_days": period_days,
-                "texts_count": len(texts),
-                "images_count": len(images),
-                "plans_count": len(plans),
-                "total_count": len(texts) + len(images) + len(plans),
+                "texts_count": type_counts["text"],
+                "images_count": type_counts["image"],
+                "plans_count": type_counts["plan"],
+                "total_count": sum(type_counts.values()),
                 "daily_activity": daily_activity,
                 "style_stats": style_stats,
                 "most_active_week": most_active_week[0].isoformat() if most_active_week else None,
@@ -266,121 +239,99 @@ async def analyze_content_popularity(user_id: int, content_type: str = "text", l
         Dict с результатами анализа
     """
     try:
+        if content_type != "text":
+            return {"success": False, "error": "Тип контента не поддерживается для анализа популярности"}
+        
         with get_db() as db:
-            items = db.query(ContentHistory).filter(
+            content_history_fields.backfill_user(db, user_id)
+            
+            # Последние limit записей - все агрегаты считаются по ним
+            recent = db.query(
+                ContentHistory.id,
+                ContentHistory.style,
+                ContentHistory.text_length
+            ).filter(
                 ContentHistory.user_id == user_id,
                 ContentHistory.content_type == content_type
-            ).order_by(ContentHistory.generated_at.desc()).limit(limit).all()
-        
-        if not items:
-            return {"success": False, "error": "Контент не найден"}
-        
-        # Анализируем тексты
-        if content_type == "text":
-            popularity_metrics = {
-                "most_used_hashtags": {},
-                "most_common_styles": {},
-                "average_length": 0,
-                "total_hashtags": 0
-            }
+            ).order_by(
+                ContentHistory.generated_at.desc(),
+                ContentHistory.id.desc()
+            ).limit(limit).subquery()
             
-            total_length = 0
-            for item in items:
-                content_data = item.content_data if isinstance(item.content_data, dict) else {}
-                text = content_data.get("text", str(content_data))
-                
-                # Подсчитываем длину
-                total_length += len(text)
-                
-                # Анализируем хештеги
-                hashtags = content_data.get("hashtags", [])
-                for tag in hashtags:
-                    popularity_metrics["most_used_hashtags"][tag] = popularity_metrics["most_used_hashtags"].get(tag, 0) + 1
-                    popularity_metrics["total_hashtags"] += 1
-                
-                # Анализируем стили
-                style = content_data.get("style", "не указан")
-                popularity_metrics["most_common_styles"][style] = popularity_metrics["most_common_styles"].get(style, 0) + 1
+            items_count, average_length = db.query(
+                func.count(recent.c.id),
+                func.avg(func.coalesce(recent.c.text_length, 0))
+            ).one()
             
-            popularity_metrics["average_length"] = round(total_length / len(items), 1) if items else 0
-            popularity_metrics["most_used_hashtags"] = dict(sorted(
-                popularity_metrics["most_used_hashtags"].items(),
-                key=lambda x: x[1],
-                reverse=True
-            )[:10])
-            popularity_metrics["most_common_styles"] = dict(sorted(
-                popularity_metrics["most_common_styles"].items(),
+            if not items_count:
+                return {"success": False, "error": "Контент не найден"}
+            
+            style_rows = db.query(
+                recent.c.style,
+                func.count(recent.c.id)
+            ).group_by(recent.c.style).all()
+            
+            hashtag_count = func.count(ContentHistoryHashtag.content_history_id)
+            hashtag_rows = db.query(
+                ContentHistoryHashtag.hashtag,
+                hashtag_count
+            ).join(
+                recent, recent.c.id == ContentHistoryHashtag.content_history_id
+            ).group_by(
+                ContentHistoryHashtag.hashtag
+            ).order_by(hashtag_count.desc(), ContentHistoryHashtag.hashtag).all()
+        
+        # Анализируем тексты
+        most_common_styles = {}
+        for style, count in style_rows:
+            style = style or "не указан"
+            most_common_styles[style] = most_common_styles.get(style, 0) + count
+        
+        popularity_metrics = {
+            "most_used_hashtags": dict(hashtag_rows[:10]),
+            "most_common_styles": dict(sorted(
+                most_common_styles.items(),
                 key=lambda x: x[1],
                 reverse=True
-            ))
-            
-            return {
-                "success": True,
-                "content_type": content_type,
-                "items_analyzed": len(items),
-                "metrics": popularity_metrics
-            }
+            )),
+            "average_length": round(float(average_length or 0), 1),
+            "total_hashtags": sum(count for _, count in hashtag_rows)
+        }
         
-        return {"success": False, "error": "Тип контента не поддерживается для анализа популярности"}
+        return {
+            "success": True,
+            "content_type": content_type,
+            "items_analyzed": items_count,
+            "metrics": popularity_metrics
+        }
     
     except Exception as e:
         logger.exception(f"Ошибка при анализе популярности: {e}")
         return {"success": False, "error": str(e)}
 
 
-async def generate_activity_chart(user_id: int, period_days: int = 30) -> Optional[Path]:
+async def generate_activity_chart(user_id: int, period_days: int = 30) -> Optional[Chart]:
     """
-    Генерирует график активности пользователя
+    Генерирует график активности пользователя (отрисовка в пуле процессов,
+    неизменившиеся данные - из кэша)
     
     Args:
         user_id: ID пользователя
         period_days: Период в днях
     
     Returns:
-        Path к файлу с графиком или None
+        Chart (файл и file_id Telegram, если график уже отправлялся) или None
     """
-    if not matplotlib_available:
-        logger.warning("matplotlib не установлен, график не может быть создан")
-        return None
-    
     try:
         stats = get_detailed_statistics(user_id, period_days)
         
         if not stats.get("success") or not stats.get("daily_activity"):
             return None
         
-        daily_activity = stats["daily_activity"]
-        
-        # Сортируем по датам
-        sorted_dates = sorted(daily_activity.keys())
-        dates = sorted_dates
-        counts = [daily_activity[date] for date in dates]
-        
-        # Создаем график
-        plt.figure(figsize=(12, 6))
-        plt.plot(dates, counts, marker='o', linestyle='-', linewidth=2, markersize=5)
-        plt.fill_between(dates, counts, alpha=0.3)
-        plt.title(f'Активность за {period_days} дней', fontsize=14, fontweight='bold')
-        plt.xlabel('Дата', fontsize=12)
-        plt.ylabel('Количество постов', fontsize=12)
-        plt.grid(True, alpha=0.3)
-        plt.xticks(rotation=45)
-        
-        # Форматируем даты
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
-        plt.gcf().autofmt_xdate()
-        
-        plt.tight_layout()
-        
-        # Сохраняем график
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"activity_{user_id}_{timestamp}.png"
-        file_path = CHARTS_DIR / filename
-        plt.savefig(file_path, dpi=150, bbox_inches='tight')
-        plt.close()
-        
-        logger.info(f"График активности создан: {file_path}")
-        return file_path
+        daily_activity = {
+            day.isoformat(): count for day, count in stats["daily_activity"].items()
+        }
+        return await chart_service.activity_chart(user_id, period_days, daily_activity)
     
     except Exception as e:
         logger.exception(f"Ошибка при создании графика активности: {e}")
@@ -451,18 +402,22 @@ async def handle_analytics_callback(update: Update, context: ContextTypes.DEFAUL
     
     user_id = update.effective_user.id
     callback_data = query.data
+    await history_writer.flush_user(user_id)
     
     if callback_data == "analytics_chart":
         await query.edit_message_text("⏳ Генерирую график активности...")
         
-        chart_path = await generate_activity_chart(user_id, period_days=30)
+        chart = await generate_activity_chart(user_id, period_days=30)
         
-        if chart_path and chart_path.exists():
-            with open(chart_path, 'rb') as f:
-                await query.message.reply_photo(
-                    photo=f,
-                    caption="📈 График активности за последние 30 дней"
-                )
+        if chart and (chart.file_id or chart.path.exists()):
+            caption = "📈 График активности за последние 30 дней"
+            if chart.file_id:
+                # Уже отправленный график - без повторной загрузки файла
+                message = await query.message.reply_photo(photo=chart.file_id, caption=caption)
+            else:
+                with open(chart.path, 'rb') as f:
+                    message = await query.message.reply_photo(photo=f, caption=caption)
+            chart_service.remember_file_id(chart, message.photo[-1].file_id)
             await query.edit_message_text("✅ График создан!")
         else:
             await query.edit_message_text(
@@ -6,8 +6,8 @@ from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters
 from bot.utils.helpers import get_or_create_user
-from bot.database.models import ContentPlan, NKOProfile
-from bot.database.database import get_db
+from bot.database.plan_repository import plan_repository, UpcomingSlot
+from bot.services.user_cache import user_cache
 from bot.services.ai.openrouter import openrouter_api
 from bot.states.conversation import END
 
@@ -22,43 +22,18 @@ async def show_calendar_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_id = update.effective_user.id
     get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
     
-    # Проверяем активные планы и предстоящие даты
-    with get_db() as db:
-        active_plans = db.query(ContentPlan).filter(
-            ContentPlan.user_id == user_id,
-            ContentPlan.is_active == True
-        ).all()
-    
-    upcoming_events = []
+    # Ближайшие публикации активных планов - один запрос по индексу (user_id, date)
     today = datetime.now().date()
-    
-    for plan in active_plans:
-        schedule = plan.schedule if isinstance(plan.schedule, dict) else {}
-        dates = schedule.get("dates", [])
-        
-        for date_str in dates:
-            try:
-                event_date = datetime.fromisoformat(date_str).date()
-                if event_date >= today:
-                    upcoming_events.append({
-                        "date": event_date,
-                        "plan": plan
-                    })
-            except:
-                pass
-    
-    # Сортируем по дате
-    upcoming_events.sort(key=lambda x: x["date"])
-    upcoming_events = upcoming_events[:10]  # Берем ближайшие 10
+    upcoming_events = plan_repository.get_upcoming_slots(user_id, today, limit=10)
     
     text = "📅 **Календарь событий**\n\n"
     
     if upcoming_events:
         text += "**Ближайшие публикации:**\n\n"
         for event in upcoming_events:
-            date_str = event["date"].strftime("%d.%m.%Y (%A)")
-            plan_name = event["plan"].plan_name
-            days_left = (event["date"] - today).days
+            date_str = event.date.strftime("%d.%m.%Y (%A)")
+            plan_name = event.plan_name
+            days_left = (event.date - today).days
             
             if days_left == 0:
                 text += f"📌 **Сегодня** - {plan_name}\n"
@@ -116,29 +91,8 @@ async def calendar_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Получаем ближайшее событие из планов
         user_id = update.effective_user.id
         
-        with get_db() as db:
-            active_plans = db.query(ContentPlan).filter(
-                ContentPlan.user_id == user_id,
-                ContentPlan.is_active == True
-            ).all()
-        
-        upcoming_events = []
         today = datetime.now().date()
-        
-        for plan in active_plans:
-            schedule = plan.schedule if isinstance(plan.schedule, dict) else {}
-            dates = schedule.get("dates", [])
-            
-            for date_str in dates:
-                try:
-                    event_date = datetime.fromisoformat(date_str).date()
-                    if event_date >= today:
-                        upcoming_events.append({
-                            "date": event_date,
-                            "plan": plan
-                        })
-                except:
-                    pass
+        upcoming_events = plan_repository.get_upcoming_slots(user_id, today, limit=1)
         
         if not upcoming_events:
             await query.edit_message_text(
@@ -150,7 +104,6 @@ async def calendar_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return END
         
         # Берем ближайшее событие
-        upcoming_events.sort(key=lambda x: x["date"])
         nearest_event = upcoming_events[0]
         
         # Генерируем анонс
@@ -231,32 +184,14 @@ async def handle_event_description(update: Update, context: ContextTypes.DEFAULT
     user_id = update.effective_user.id
     event_data = context.user_data.get('calendar_event', {})
     
-    # Добавляем событие в ближайший активный план или создаем запись
-    with get_db() as db:
-        # Ищем активный план, который охватывает эту дату
-        plans = db.query(ContentPlan).filter(
-            ContentPlan.user_id == user_id,
-            ContentPlan.is_active == True
-        ).all()
-        
-        event_date = datetime.fromisoformat(event_data['date']).date()
-        
-        # Обновляем schedule с событием
-        for plan in plans:
-            if plan.start_date <= event_date <= plan.end_date:
-                schedule = plan.schedule if isinstance(plan.schedule, dict) else {}
-                events = schedule.get("events", [])
-                
-                events.append({
-                    "name": event_data['name'],
-                    "date": event_data['date'],
-                    "description": event_data.get('description')
-                })
-                
-                schedule["events"] = events
-                plan.schedule = schedule
-                db.commit()
-                break
+    # Привязываем событие к активному плану, в период которого оно попадает
+    event_date = datetime.fromisoformat(event_data['date']).date()
+    plan_repository.add_event(
+        user_id,
+        event_data['name'],
+        event_date,
+        event_data.get('description')
+    )
     
     await update.message.reply_text(
         f"✅ Событие '{event_data['name']}' добавлено в календарь!\n\n"
@@ -269,8 +204,8 @@ async def handle_event_description(update: Update, context: ContextTypes.DEFAULT
     return END
 
 
-async def generate_event_announcement(update: Update, context: ContextTypes.DEFAULT_TYPE, event: dict):
-    """Генерирует анонс для события"""
+async def generate_event_announcement(update: Update, context: ContextTypes.DEFAULT_TYPE, event: UpcomingSlot):
+    """Генерирует анонс для предстоящей публикации"""
     query = update.callback_query if hasattr(update, 'callback_query') else None
     
     if query:
@@ -278,15 +213,10 @@ async def generate_event_announcement(update: Update, context: ContextTypes.DEFA
     
     try:
         user_id = update.effective_user.id
-        plan = event["plan"]
-        event_date = event["date"]
+        event_date = event.date
         
         # Получаем профиль НКО
-        nko_profile = None
-        with get_db() as db:
-            profile = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).first()
-            if profile:
-                nko_profile = profile
+        nko_profile = user_cache.get_active_profile(user_id)
         
         nko_info = ""
         if nko_profile:
@@ -299,7 +229,7 @@ async def generate_event_announcement(update: Update, context: ContextTypes.DEFA
         
         prompt = f"""Создай анонс для предстоящего события.
 
-Событие: {plan.plan_name}
+Событие: {event.plan_name}{f" - {event.topic}" if event.topic else ""}
 Дата: {event_date.strftime('%d.%m.%Y')}
 Осталось дней: {days_left}
 {nko_info}
@@ -349,6 +279,8 @@ def setup_calendar_handlers(application):
     
     # ConversationHandler для создания события
     conv_handler = ConversationHandler(
+        name="calendar_event",
+        persistent=True,
         entry_points=[
             CallbackQueryHandler(calendar_callback, pattern="^calendar_create_event$"),
         ],
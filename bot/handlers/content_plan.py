@@ -15,10 +15,15 @@ from bot.utils.helpers import get_or_create_user, calculate_content_plan_dates
 from bot.utils.holidays import get_relevant_dates
 from bot.utils.template_loader import get_content_plan_template_by_category
 from bot.utils.export import export_plan_to_excel, export_to_ical, export_content_plan_to_csv
+from bot.services.export_cache import export_cache
 from bot.services.content.smart_planning import smart_planning_service
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
-from bot.database.models import ContentPlan, ContentHistory, NKOProfile
+from bot.database.models import ContentPlan, ContentHistory
 from bot.database.database import get_db
+from bot.database.plan_repository import plan_repository
+from bot.services.user_cache import user_cache
+from bot.services.history_writer import history_writer
+from bot.services.scheduler import schedule_content_plan_reminders
 from bot.states.conversation import END
 
 logger = logging.getLogger(__name__)
@@ -212,21 +217,17 @@ async def handle_topics(update: Update, context: ContextTypes.DEFAULT_TYPE):
         get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
         
         nko_info = ""
-        with get_db() as db:
-            from bot.database.models import NKOProfile
-            profile = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).first()
-            if profile:
-                nko_info = f"\nОрганизация: {profile.organization_name or 'не указано'}\n"
-                if profile.description:
-                    nko_info += f"Деятельность: {profile.description[:200]}\n"
+        profile = user_cache.get_active_profile(user_id)
+        if profile:
+            nko_info = f"\nОрганизация: {profile.organization_name or 'не указано'}\n"
+            if profile.description:
+                nko_info += f"Деятельность: {profile.description[:200]}\n"
         
         # Получаем релевантные праздничные даты
         holidays_info = ""
         activity_types = None
-        with get_db() as db:
-            profile = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).first()
-            if profile and profile.activity_types:
-                activity_types = profile.activity_types
+        if profile and profile.activity_types:
+            activity_types = list(profile.activity_types)
         
         relevant_holidays = get_relevant_dates(start_date, end_date, activity_types)
         if relevant_holidays:
@@ -280,28 +281,30 @@ async def handle_topics(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     schedule={
                         "days": days,
                         "time": time_str,
-                        "dates": [d.isoformat() for d in schedule_dates],
                         "topics": topics,
                         "content": plan_content
                     },
                     is_active=True
                 )
                 db.add(content_plan)
-                db.commit()
-                
-                # Сохраняем в историю
-                history_entry = ContentHistory(
-                    user_id=user_id,
-                    content_type="plan",
-                    content_data={
-                        "plan_id": content_plan.id,
-                        "period_days": period_days,
-                        "frequency": frequency,
-                        "topics": topics
-                    }
-                )
-                db.add(history_entry)
-                db.commit()
+                db.flush()
+                plan_id = content_plan.id
+                plan_repository.add_slots(db, content_plan, schedule_dates, time_str, topics)
+            
+            # Напоминания в дни публикаций
+            await schedule_content_plan_reminders(plan_id)
+            
+            # Сохраняем в историю
+            history_writer.enqueue(
+                user_id=user_id,
+                content_type="plan",
+                content_data={
+                    "plan_id": plan_id,
+                    "period_days": period_days,
+                    "frequency": frequency,
+                    "topics": topics
+                }
+            )
             
             # Форматируем ответ
             response_text = (
@@ -320,15 +323,15 @@ async def handle_topics(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Кнопки экспорта и дополнительных функций
             export_keyboard = InlineKeyboardMarkup([
                 [
-                    InlineKeyboardButton("📊 CSV", callback_data=f"export_plan_csv_{content_plan.id}"),
-                    InlineKeyboardButton("📈 Excel", callback_data=f"export_plan_excel_{content_plan.id}")
+                    InlineKeyboardButton("📊 CSV", callback_data=f"export_plan_csv_{plan_id}"),
+                    InlineKeyboardButton("📈 Excel", callback_data=f"export_plan_excel_{plan_id}")
                 ],
                 [
-                    InlineKeyboardButton("📅 iCal", callback_data=f"export_plan_ical_{content_plan.id}")
+                    InlineKeyboardButton("📅 iCal", callback_data=f"export_plan_ical_{plan_id}")
                 ],
                 [
-                    InlineKeyboardButton("🤖 Автогенерация постов", callback_data=f"plan_auto_generate_{content_plan.id}"),
-                    InlineKeyboardButton("📊 Анализ эффективности", callback_data=f"plan_analyze_{content_plan.id}")
+                    InlineKeyboardButton("🤖 Автогенерация постов", callback_data=f"plan_auto_generate_{plan_id}"),
+                    InlineKeyboardButton("📊 Анализ эффективности", callback_data=f"plan_analyze_{plan_id}")
                 ]
             ])
             
@@ -381,13 +384,12 @@ async def handle_plan_export_callback(update: Update, context: ContextTypes.DEFA
         
         # Получаем профиль НКО
         nko_profile = None
-        with get_db() as db:
-            profile = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).first()
-            if profile:
-                nko_profile = {
-                    "organization_name": profile.organization_name,
-                    "description": profile.description
-                }
+        profile = user_cache.get_active_profile(user_id)
+        if profile:
+            nko_profile = {
+                "organization_name": profile.organization_name,
+                "description": profile.description
+            }
         
         result = await smart_planning_service.auto_generate_plan_content(plan_id, user_id, nko_profile)
         
@@ -451,13 +453,7 @@ async def handle_plan_export_callback(update: Update, context: ContextTypes.DEFA
         
         file_path = await export_content_plan_to_csv(user_id, plan_id)
         
-        if file_path and file_path.exists():
-            with open(file_path, 'rb') as f:
-                await query.message.reply_document(
-                    document=f,
-                    filename=file_path.name,
-                    caption="✅ Контент-план экспортирован в CSV файл"
-                )
+        if file_path and await export_cache.send(query.message, file_path, "✅ Контент-план экспортирован в CSV файл"):
             await query.edit_message_text("✅ Экспорт завершен!")
         else:
             await query.edit_message_text("❌ Ошибка при экспорте. Попробуй еще раз.")
@@ -468,13 +464,7 @@ async def handle_plan_export_callback(update: Update, context: ContextTypes.DEFA
         
         file_path = await export_plan_to_excel(user_id, plan_id)
         
-        if file_path and file_path.exists():
-            with open(file_path, 'rb') as f:
-                await query.message.reply_document(
-                    document=f,
-                    filename=file_path.name,
-                    caption="✅ Контент-план экспортирован в Excel файл"
-                )
+        if file_path and await export_cache.send(query.message, file_path, "✅ Контент-план экспортирован в Excel файл"):
             await query.edit_message_text("✅ Экспорт завершен!")
         else:
             await query.edit_message_text("❌ Ошибка при экспорте или библиотека openpyxl не установлена.")
@@ -485,13 +475,7 @@ async def handle_plan_export_callback(update: Update, context: ContextTypes.DEFA
         
         file_path = await export_to_ical(user_id, plan_id)
         
-        if file_path and file_path.exists():
-            with open(file_path, 'rb') as f:
-                await query.message.reply_document(
-                    document=f,
-                    filename=file_path.name,
-                    caption="✅ Контент-план экспортирован в iCal файл"
-                )
+        if file_path and await export_cache.send(query.message, file_path, "✅ Контент-план экспортирован в iCal файл"):
             await query.edit_message_text("✅ Экспорт завершен!")
         else:
             await query.edit_message_text("❌ Ошибка при экспорте или библиотека icalendar не установлена.")
@@ -500,6 +484,8 @@ async def handle_plan_export_callback(update: Update, context: ContextTypes.DEFA
 def setup_content_plan_handlers(application):
     """Настройка обработчиков контент-плана"""
     conv_handler = ConversationHandler(
+        name="content_plan",
+        persistent=True,
         entry_points=[
             MessageHandler(filters.Regex("^📅 Контент-план$"), show_content_plan_menu),
         ],
@@ -558,26 +544,20 @@ async def auto_generate_plan_texts(plan_id: int, user_id: int) -> Dict[str, Any]
             if not plan:
                 return {"success": False, "error": "План не найден"}
             
-            schedule = plan.schedule if isinstance(plan.schedule, dict) else {}
-            dates = schedule.get("dates", [])
-            topics = schedule.get("topics", [])
-            
-            # Получаем профиль НКО
-            nko_profile = None
-            profile = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).first()
-            if profile:
-                nko_profile = profile
+        slots = plan_repository.get_plan_slots(plan_id)
+        
+        # Получаем профиль НКО
+        nko_profile = user_cache.get_active_profile(user_id)
         
         generated_texts = []
         
         # Генерируем тексты для каждой даты
-        for i, date_str in enumerate(dates, 1):
+        for slot in slots:
             try:
-                from datetime import datetime
-                post_date = datetime.fromisoformat(date_str).date() if isinstance(date_str, str) else date_str
+                post_date = slot.date
                 
                 # Тема поста
-                topic = topics[i % len(topics)] if topics else "Пост для НКО"
+                topic = slot.topic or "Пост для НКО"
                 
                 # Формируем промпт для генерации
                 nko_info = ""
@@ -622,7 +602,7 @@ async def auto_generate_plan_texts(plan_id: int, user_id: int) -> Dict[str, Any]
                 await asyncio.sleep(1)
             
             except Exception as e:
-                logger.error(f"Ошибка при генерации текста для даты {date_str}: {e}")
+                logger.error(f"Ошибка при генерации текста для даты {slot.date}: {e}")
                 continue
         
         return {
@@ -657,13 +637,12 @@ def get_plan_statistics(plan_id: int, user_id: int) -> Dict[str, Any]:
             if not plan:
                 return {"success": False, "error": "План не найден"}
             
-            schedule = plan.schedule if isinstance(plan.schedule, dict) else {}
-            dates = schedule.get("dates", [])
+            total_posts = plan_repository.count_slots(db, plan_id)
             
             # Подсчитываем выполненные посты (посты в истории с датами из плана)
             from datetime import datetime, timedelta
             completed_count = 0
-            if dates:
+            if total_posts:
                 plan_start = plan.start_date
                 plan_end = plan.end_date
                 
@@ -676,7 +655,6 @@ def get_plan_statistics(plan_id: int, user_id: int) -> Dict[str, Any]:
                 
                 completed_count = completed
             
-            total_posts = len(dates) if dates else 0
             completion_percentage = (completed_count / total_posts * 100) if total_posts > 0 else 0
             
             return {
@@ -5,9 +5,10 @@ import logging
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.helpers import escape_markdown
 from bot.utils.helpers import get_or_create_user
-from bot.database.models import ContentHistory
-from bot.database.database import get_db
+from bot.database.history_repository import history_repository, HistoryFilter
+from bot.services.history_writer import history_writer
 from bot.utils.export import (
     export_history_to_txt, 
     export_texts_to_csv,
@@ -15,50 +16,111 @@ from bot.utils.export import (
     export_to_pdf,
     create_images_archive
 )
+from bot.services.export_cache import export_cache
 
 logger = logging.getLogger(__name__)
 
 
-async def show_history_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показывает меню истории"""
-    user_id = update.effective_user.id
-    get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
+HISTORY_PAGE_SIZE = 5
+
+CONTENT_TYPE_LABELS = {
+    "text": "📝 Текст",
+    "image": "🎨 Изображение",
+    "plan": "📅 План"
+}
+
+
+def _get_history_browse(context: ContextTypes.DEFAULT_TYPE) -> dict:
+    """Состояние просмотра истории: фильтр и стек курсоров просмотренных страниц"""
+    return context.user_data.setdefault('history_browse', {
+        "content_type": None,
+        "favorites_only": False,
+        "tag": None,
+        "cursors": [None],
+        "next_cursor": None
+    })
+
+
+def _render_history_page(user_id: int, browse: dict):
+    """
+    Формирует текст и клавиатуру текущей страницы истории
     
-    with get_db() as db:
-        history_items = db.query(ContentHistory).filter(
-            ContentHistory.user_id == user_id
-        ).order_by(ContentHistory.generated_at.desc()).limit(10).all()
+    Returns:
+        (text, keyboard) или (None, None), если по фильтру ничего нет на первой странице
+    """
+    history_filter = HistoryFilter(
+        content_type=browse.get("content_type"),
+        favorites_only=browse.get("favorites_only", False),
+        tag=browse.get("tag")
+    )
+    page_index = len(browse["cursors"]) - 1
+    page = history_repository.get_page(
+        user_id,
+        cursor=browse["cursors"][-1],
+        page_size=HISTORY_PAGE_SIZE,
+        history_filter=history_filter
+    )
+    browse["next_cursor"] = page.next_cursor
     
-    if not history_items:
-        await update.message.reply_text(
-            "📊 **История**\n\n"
-            "У тебя пока нет сохраненного контента.\n\n"
-            "Сгенерируй текст или изображение, чтобы увидеть их здесь.",
-            parse_mode="Markdown"
-        )
-        return
+    is_filtered = bool(history_filter.content_type or history_filter.favorites_only or history_filter.tag)
+    if not page.items and page_index == 0 and not is_filtered:
+        return None, None
     
-    text = "📊 **История контента**\n\n"
+    text = f"📊 **История контента** (стр. {page_index + 1})\n"
+    filter_parts = []
+    if history_filter.content_type:
+        filter_parts.append(CONTENT_TYPE_LABELS.get(history_filter.content_type, history_filter.content_type))
+    if history_filter.favorites_only:
+        filter_parts.append("⭐ Избранное")
+    if history_filter.tag:
+        # Тег вводит пользователь: "_" в #добрые_дела ломает разметку Markdown
+        filter_parts.append(f"🏷 {escape_markdown(history_filter.tag)}")
+    if filter_parts:
+        text += f"Фильтр: {', '.join(filter_parts)}\n"
+    text += "\n"
     
-    for i, item in enumerate(history_items[:5], 1):
+    if not page.items:
+        text += "По этому фильтру ничего не найдено."
+    
+    for i, item in enumerate(page.items, page_index * HISTORY_PAGE_SIZE + 1):
         date_str = item.generated_at.strftime("%d.%m.%Y %H:%M")
-        item_text = "📝 Текст" if item.content_type == "text" else "🎨 Изображение"
+        item_text = CONTENT_TYPE_LABELS.get(item.content_type, "🎨 Изображение")
+        if item.is_favorite:
+            item_text += " ⭐"
         preview = ""
         
         if item.content_type == "text":
-            content_text = item.content_data.get("text", "") if isinstance(item.content_data, dict) else str(item.content_data)
+            content_text = item.content_data.get("text", "") or item.content_data.get("edited_text", "")
             preview = content_text[:50] + "..." if len(content_text) > 50 else content_text
         
         text += f"{i}. {item_text} - {date_str}\n"
         if preview:
-            text += f"   {preview}\n"
+            text += f"   {escape_markdown(preview)}\n"
         text += "\n"
     
-    if len(history_items) > 5:
-        text += f"\n... и еще {len(history_items) - 5} элементов"
+    # Навигация по страницам
+    pager_row = []
+    if page_index > 0:
+        pager_row.append(InlineKeyboardButton("◀️ Назад", callback_data="hist_prev"))
+    if page.next_cursor:
+        pager_row.append(InlineKeyboardButton("Далее ▶️", callback_data="hist_next"))
+    
+    def mark(label: str, active: bool) -> str:
+        return f"• {label}" if active else label
     
-    # Кнопки экспорта
-    export_keyboard = InlineKeyboardMarkup([
+    content_type = history_filter.content_type
+    keyboard = []
+    if pager_row:
+        keyboard.append(pager_row)
+    keyboard.extend([
+        [
+            InlineKeyboardButton(mark("Все", not content_type), callback_data="hist_type_all"),
+            InlineKeyboardButton(mark("📝", content_type == "text"), callback_data="hist_type_text"),
+            InlineKeyboardButton(mark("🎨", content_type == "image"), callback_data="hist_type_image"),
+            InlineKeyboardButton(mark("📅", content_type == "plan"), callback_data="hist_type_plan"),
+            InlineKeyboardButton(mark("⭐", history_filter.favorites_only), callback_data="hist_fav")
+        ],
+        # Кнопки экспорта
         [
             InlineKeyboardButton("📥 TXT", callback_data="export_history_txt"),
             InlineKeyboardButton("📊 CSV", callback_data="export_history_csv")
@@ -72,7 +134,73 @@ async def show_history_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ]
     ])
     
-    await update.message.reply_text(text, reply_markup=export_keyboard, parse_mode="Markdown")
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+async def show_history_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Показывает первую страницу истории
+    
+    Через команду можно сразу отфильтровать по тегу: /history #тег
+    """
+    user_id = update.effective_user.id
+    get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
+    await history_writer.flush_user(user_id)
+    
+    # Каждый вход в историю начинается с первой страницы без фильтров
+    context.user_data.pop('history_browse', None)
+    browse = _get_history_browse(context)
+    if getattr(context, "args", None):
+        browse["tag"] = " ".join(context.args).strip()
+    
+    text, keyboard = _render_history_page(user_id, browse)
+    
+    if text is None:
+        await update.message.reply_text(
+            "📊 **История**\n\n"
+            "У тебя пока нет сохраненного контента.\n\n"
+            "Сгенерируй текст или изображение, чтобы увидеть их здесь.",
+            parse_mode="Markdown"
+        )
+        return
+    
+    await update.message.reply_text(text, reply_markup=keyboard, parse_mode="Markdown")
+
+
+async def handle_history_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка листания и фильтров истории"""
+    query = update.callback_query
+    await query.answer()
+    
+    user_id = update.effective_user.id
+    callback_data = query.data
+    browse = _get_history_browse(context)
+    
+    if callback_data == "hist_next":
+        if not browse.get("next_cursor"):
+            return
+        browse["cursors"].append(browse["next_cursor"])
+    elif callback_data == "hist_prev":
+        if len(browse["cursors"]) > 1:
+            browse["cursors"].pop()
+    elif callback_data.startswith("hist_type_"):
+        content_type = callback_data.replace("hist_type_", "")
+        browse["content_type"] = None if content_type == "all" else content_type
+        browse["cursors"] = [None]
+    elif callback_data == "hist_fav":
+        browse["favorites_only"] = not browse.get("favorites_only", False)
+        browse["cursors"] = [None]
+    
+    text, keyboard = _render_history_page(user_id, browse)
+    if text is None:
+        await query.edit_message_text("📊 История пуста.")
+        return
+    
+    try:
+        await query.edit_message_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    except Exception as e:
+        # Например, "message is not modified" при повторном нажатии
+        logger.debug(f"Не удалось обновить страницу истории: {e}")
 
 
 async def handle_export_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -88,13 +216,7 @@ async def handle_export_callback(update: Update, context: ContextTypes.DEFAULT_T
         
         file_path = await export_history_to_txt(user_id)
         
-        if file_path and file_path.exists():
-            with open(file_path, 'rb') as f:
-                await query.message.reply_document(
-                    document=f,
-                    filename=file_path.name,
-                    caption="✅ История экспортирована в TXT файл"
-                )
+        if file_path and await export_cache.send(query.message, file_path, "✅ История экспортирована в TXT файл"):
             await query.edit_message_text("✅ Экспорт завершен!")
         else:
             await query.edit_message_text("❌ Ошибка при экспорте. Попробуй еще раз.")
@@ -104,13 +226,7 @@ async def handle_export_callback(update: Update, context: ContextTypes.DEFAULT_T
         
         file_path = await export_texts_to_csv(user_id)
         
-        if file_path and file_path.exists():
-            with open(file_path, 'rb') as f:
-                await query.message.reply_document(
-                    document=f,
-                    filename=file_path.name,
-                    caption="✅ Тексты экспортированы в CSV файл"
-                )
+        if file_path and await export_cache.send(query.message, file_path, "✅ Тексты экспортированы в CSV файл"):
             await query.edit_message_text("✅ Экспорт завершен!")
         else:
             await query.edit_message_text("❌ Ошибка при экспорте. Попробуй еще раз.")
@@ -120,13 +236,7 @@ async def handle_export_callback(update: Update, context: ContextTypes.DEFAULT_T
         
         file_path = await export_to_docx(user_id)
         
-        if file_path and file_path.exists():
-            with open(file_path, 'rb') as f:
-                await query.message.reply_document(
-                    document=f,
-                    filename=file_path.name,
-                    caption="✅ Тексты экспортированы в DOCX файл"
-                )
+        if file_path and await export_cache.send(query.message, file_path, "✅ Тексты экспортированы в DOCX файл"):
             await query.edit_message_text("✅ Экспорт завершен!")
         else:
             await query.edit_message_text("❌ Ошибка при экспорте или библиотека python-docx не установлена.")
@@ -136,13 +246,7 @@ async def handle_export_callback(update: Update, context: ContextTypes.DEFAULT_T
         
         file_path = await export_to_pdf(user_id)
         
-        if file_path and file_path.exists():
-            with open(file_path, 'rb') as f:
-                await query.message.reply_document(
-                    document=f,
-                    filename=file_path.name,
-                    caption="✅ Тексты экспортированы в PDF файл"
-                )
+        if file_path and await export_cache.send(query.message, file_path, "✅ Тексты экспортированы в PDF файл"):
             await query.edit_message_text("✅ Экспорт завершен!")
         else:
             await query.edit_message_text("❌ Ошибка при экспорте или библиотека reportlab не установлена.")
@@ -152,13 +256,7 @@ async def handle_export_callback(update: Update, context: ContextTypes.DEFAULT_T
         
         file_path = await create_images_archive(user_id)
         
-        if file_path and file_path.exists():
-            with open(file_path, 'rb') as f:
-                await query.message.reply_document(
-                    document=f,
-                    filename=file_path.name,
-                    caption="✅ Архив изображений создан"
-                )
+        if file_path and await export_cache.send(query.message, file_path, "✅ Архив изображений создан"):
             await query.edit_message_text("✅ Архив создан!")
         else:
             await query.edit_message_text("❌ Ошибка при создании архива или нет изображений для экспорта.")
@@ -166,7 +264,13 @@ async def handle_export_callback(update: Update, context: ContextTypes.DEFAULT_T
 
 def setup_history_handlers(application):
     """Настройка обработчиков истории"""
-    from telegram.ext import CallbackQueryHandler
+    from telegram.ext import CallbackQueryHandler, CommandHandler
+    # Просмотр истории с фильтром по тегу: /history #тег
+    application.add_handler(CommandHandler("history", show_history_menu))
+    # Листание страниц и фильтры
+    application.add_handler(
+        CallbackQueryHandler(handle_history_page_callback, pattern="^hist_")
+    )
     # Callback для экспорта
     application.add_handler(
         CallbackQueryHandler(handle_export_callback, pattern="^(export_history_|export_images_)")
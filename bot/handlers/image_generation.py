@@ -12,8 +12,7 @@ from bot.keyboards.inline import (
 from bot.services.ai.image_ai import image_ai_service
 from bot.services.ai.speech_recognition import speech_recognition_service
 from bot.services.image_processing import image_processing_service
-from bot.database.models import NKOProfile
-from bot.database.database import get_db
+from bot.services.user_cache import user_cache
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -138,17 +137,12 @@ async def handle_image_description(update: Update, context: ContextTypes.DEFAULT
                 # Проверяем, есть ли логотип в профиле НКО
                 has_logo = False
                 logo_path = None
-                with get_db() as db:
-                    nko_profile = db.query(NKOProfile).filter(
-                        NKOProfile.user_id == user_id,
-                        NKOProfile.is_complete == True,
-                        NKOProfile.is_active == True
-                    ).first()
-                    if nko_profile and nko_profile.logo_path:
-                        logo_file = Path(nko_profile.logo_path)
-                        if logo_file.exists():
-                            has_logo = True
-                            logo_path = logo_file
+                nko_profile = user_cache.get_active_profile(user_id)
+                if nko_profile and nko_profile.is_complete and nko_profile.is_active and nko_profile.logo_path:
+                    logo_file = Path(nko_profile.logo_path)
+                    if logo_file.exists():
+                        has_logo = True
+                        logo_path = logo_file
                 
                 # Сохраняем путь к изображению для дальнейшей обработки
                 context.user_data['image_gen']['file_path'] = str(image_path)
@@ -443,14 +437,9 @@ async def handle_cover_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Получаем цвета бренда из профиля НКО, если есть
         user_id = update.effective_user.id
         brand_colors = None
-        with get_db() as db:
-            nko_profile = db.query(NKOProfile).filter(
-                NKOProfile.user_id == user_id,
-                NKOProfile.is_complete == True,
-                NKOProfile.is_active == True
-            ).first()
-            if nko_profile and nko_profile.brand_colors:
-                brand_colors = nko_profile.brand_colors
+        nko_profile = user_cache.get_active_profile(user_id)
+        if nko_profile and nko_profile.is_complete and nko_profile.is_active and nko_profile.brand_colors:
+            brand_colors = list(nko_profile.brand_colors)
         
         # Используем цвета бренда или дефолтные
         bg_color = tuple(brand_colors[0]) if brand_colors and len(brand_colors) > 0 else (41, 128, 185)
@@ -613,6 +602,8 @@ def setup_image_generation_handlers(application):
     """Настройка обработчиков генерации изображений"""
     # ConversationHandler для генерации изображений
     image_gen_handler = ConversationHandler(
+        name="image_generation",
+        persistent=True,
         entry_points=[
             MessageHandler(
                 filters.Regex("^🎨 Генерация изображения$"),
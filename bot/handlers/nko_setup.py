@@ -4,8 +4,9 @@
 import logging
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler, CallbackQueryHandler, MessageHandler, filters
-from bot.database.models import NKOProfile, ActivityType
+from bot.database.models import User, NKOProfile, ActivityType
 from bot.database.database import get_db
+from bot.services.user_cache import user_cache
 from bot.keyboards.main_menu import get_main_menu_keyboard, get_skip_keyboard
 from bot.keyboards.inline import get_activity_types_keyboard, get_nko_template_keyboard
 from bot.states.conversation import NKO_SETUP, END
@@ -23,7 +24,7 @@ async def nko_setup_start_callback(update: Update, context: ContextTypes.DEFAULT
     await query.answer()
     
     user_id = update.effective_user.id
-    db_user = get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
+    get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
     
     # Проверяем, есть ли уже профили
     with get_db() as db:
@@ -432,9 +433,9 @@ async def nko_setup_brand_colors(update: Update, context: ContextTypes.DEFAULT_T
     user_id = update.effective_user.id
     setup_data = context.user_data.get('nko_setup', {})
     
+    get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
+    
     with get_db() as db:
-        db_user = get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
-        
         # Создаем новый профиль
         profile = NKOProfile(user_id=user_id)
         db.add(profile)
@@ -451,14 +452,15 @@ async def nko_setup_brand_colors(update: Update, context: ContextTypes.DEFAULT_T
         profile.is_complete = True
         
         # Если это первый профиль, делаем его активным
-        db_user = get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
         existing_profiles_count = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).count()
         if existing_profiles_count == 0:
             # Это будет первый профиль после добавления
             db.flush()  # Получаем ID нового профиля
+            db_user = db.query(User).filter(User.id == user_id).first()
             db_user.active_profile_id = profile.id
-        
-        db.commit()
+    
+    # Профиль и, возможно, активный профиль пользователя изменились - сбрасываем кэш
+    user_cache.invalidate_user(user_id)
     
     # Очищаем данные контекста
     context.user_data.pop('nko_setup', None)
@@ -476,6 +478,8 @@ async def nko_setup_brand_colors(update: Update, context: ContextTypes.DEFAULT_T
 def setup_nko_handlers(application):
     """Настройка обработчиков для настройки профиля НКО"""
     conv_handler = ConversationHandler(
+        name="nko_setup",
+        persistent=True,
         entry_points=[
             CallbackQueryHandler(nko_setup_start_callback, pattern="^nko_setup_start$"),
         ],
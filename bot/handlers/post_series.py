@@ -8,8 +8,8 @@ from bot.services.ai.openrouter import openrouter_api
 from bot.services.content.hashtag_generator import hashtag_generator
 from bot.services.content.text_processor import text_processor
 from bot.utils.helpers import get_or_create_user
-from bot.database.models import ContentHistory, NKOProfile
-from bot.database.database import get_db
+from bot.services.user_cache import user_cache
+from bot.services.history_writer import history_writer
 from bot.states.conversation import END
 
 logger = logging.getLogger(__name__)
@@ -96,11 +96,7 @@ async def generate_post_series(update: Update, context: ContextTypes.DEFAULT_TYP
         topic = context.user_data['post_series'].get('topic', '')
         
         # Получаем профиль НКО
-        nko_profile = None
-        with get_db() as db:
-            profile = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).first()
-            if profile:
-                nko_profile = profile
+        nko_profile = user_cache.get_active_profile(user_id)
         
         nko_info = ""
         if nko_profile:
@@ -210,23 +206,20 @@ async def generate_post_series(update: Update, context: ContextTypes.DEFAULT_TYP
         # Сохраняем серию в историю
         get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
         
-        with get_db() as db:
-            for post in generated_posts:
-                history_entry = ContentHistory(
-                    user_id=user_id,
-                    content_type="text",
-                    content_data={
-                        "text": post["original"],
-                        "hashtags": post["hashtags"],
-                        "series_number": post["number"],
-                        "series_total": count,
-                        "series_topic": topic,
-                        "type": "series"
-                    },
-                    tags=post["hashtags"]
-                )
-                db.add(history_entry)
-            db.commit()
+        for post in generated_posts:
+            history_writer.enqueue(
+                user_id=user_id,
+                content_type="text",
+                content_data={
+                    "text": post["original"],
+                    "hashtags": post["hashtags"],
+                    "series_number": post["number"],
+                    "series_total": count,
+                    "series_topic": topic,
+                    "type": "series"
+                },
+                tags=post["hashtags"]
+            )
         
         # Отправляем результаты
         response_text = f"✅ **Серия из {count} постов создана!**\n\n"
@@ -283,6 +276,8 @@ async def generate_post_series(update: Update, context: ContextTypes.DEFAULT_TYP
 def setup_post_series_handlers(application):
     """Настройка обработчиков генерации серий постов"""
     conv_handler = ConversationHandler(
+        name="post_series",
+        persistent=True,
         entry_points=[
             MessageHandler(filters.Regex("^📚 Серия постов$"), show_post_series_menu),
         ],
@@ -2,12 +2,14 @@
 Обработчики команд быстрого доступа
 """
 import logging
-from telegram import Update
-from telegram.ext import ContextTypes, CommandHandler
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
 from bot.handlers.text_generation import show_text_generation_menu, handle_free_text
 from bot.handlers.image_generation import show_image_generation_menu, handle_image_description
 from bot.handlers.content_plan import show_content_plan_menu
 from bot.handlers.analytics import show_statistics
+from bot.services.content.search import content_search
+from bot.services.history_writer import history_writer
 
 logger = logging.getLogger(__name__)
 
@@ -76,6 +78,102 @@ async def quick_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     await show_statistics(update, context)
 
 
+SEARCH_PAGE_SIZE = 5
+
+FUNCTION_KEYWORDS = {
+    "текст": ["📝 Генерация текста", "✏️ Редактор текста"],
+    "изображение": ["🎨 Генерация изображения"],
+    "план": ["📅 Контент-план", "📅 Календарь"],
+    "история": ["📊 История"],
+    "шаблон": ["📋 Шаблоны"],
+    "статистика": ["📈 Статистика"],
+    "аналитика": ["📈 Статистика", "📊 Анализ"],
+    "настройки": ["⚙️ Настройки"],
+    "команда": ["👥 Команда"],
+    "тест": ["🔬 A/B тест"]
+}
+
+FUNCTION_CALLBACKS = {
+    "📝 Генерация текста": "menu_text_gen",
+    "✏️ Редактор текста": "menu_text_editor",
+    "🎨 Генерация изображения": "menu_image_gen",
+    "📅 Контент-план": "menu_content_plan",
+    "📅 Календарь": "menu_calendar",
+    "📊 История": "menu_history",
+    "📋 Шаблоны": "menu_templates",
+    "📈 Статистика": "menu_statistics",
+    "⚙️ Настройки": "menu_settings",
+    "👥 Команда": "menu_team",
+    "🔬 A/B тест": "menu_ab_test"
+}
+
+CONTENT_TYPE_ICONS = {
+    "text": "📝",
+    "image": "🎨",
+    "plan": "📅"
+}
+
+
+def _find_functions(search_query: str) -> list:
+    """Ищет разделы бота по ключевым словам запроса"""
+    search_query_lower = search_query.lower()
+    results = []
+    for keyword, functions in FUNCTION_KEYWORDS.items():
+        if keyword in search_query_lower:
+            for func in functions:
+                if func not in results:
+                    results.append(func)
+    return results
+
+
+def _render_search_page(user_id: int, search_query: str, offset: int):
+    """
+    Формирует сообщение с результатами поиска по контенту и разделам
+
+    Args:
+        user_id: ID пользователя
+        search_query: Поисковый запрос
+        offset: Смещение страницы результатов по контенту
+
+    Returns:
+        (text, keyboard) или (None, None), если ничего не найдено
+    """
+    functions = _find_functions(search_query) if offset == 0 else []
+    page = content_search.search(user_id, search_query, offset=offset, limit=SEARCH_PAGE_SIZE)
+
+    if not functions and not page.results:
+        return None, None
+
+    # Сниппеты содержат произвольный текст, поэтому сообщение отправляется без Markdown
+    text = f"🔍 Результаты поиска: '{search_query}'\n\n"
+
+    if page.results:
+        text += "Найдено в твоем контенте:\n\n"
+        for i, result in enumerate(page.results, offset + 1):
+            icon = CONTENT_TYPE_ICONS.get(result.content_type, "📄")
+            date_str = result.generated_at.strftime("%d.%m.%Y %H:%M") if result.generated_at else ""
+            snippet = result.snippet.replace("\n", " ") or "(без текста)"
+            text += f"{i}. {icon} {date_str}\n{snippet}\n\n"
+
+    keyboard = []
+    if functions:
+        text += f"Найдено функций: {len(functions)}\n"
+        for func in functions[:5]:  # Ограничиваем до 5 результатов
+            keyboard.append([InlineKeyboardButton(func, callback_data=FUNCTION_CALLBACKS.get(func, "main_menu"))])
+
+    pager = []
+    if offset > 0:
+        pager.append(InlineKeyboardButton("◀️ Назад", callback_data=f"qsearch_{max(offset - SEARCH_PAGE_SIZE, 0)}"))
+    if page.has_more:
+        pager.append(InlineKeyboardButton("Вперед ▶️", callback_data=f"qsearch_{offset + SEARCH_PAGE_SIZE}"))
+    if pager:
+        keyboard.append(pager)
+
+    keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")])
+
+    return text, InlineKeyboardMarkup(keyboard)
+
+
 async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Команда /поиск [запрос] - поиск функций и контента
@@ -83,6 +181,7 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Использование:
     /поиск текст
     /поиск история
+    /поиск волонтеры субботник
     """
     search_query = " ".join(context.args) if context.args else None
     
@@ -90,80 +189,57 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(
             "🔍 **Поиск**\n\n"
             "Использование: /поиск [запрос]\n\n"
+            "Ищет по твоим постам, хештегам и тегам, а также по разделам бота.\n\n"
             "Примеры:\n"
+            "• /поиск волонтеры - найти посты про волонтеров\n"
             "• /поиск текст - найти функции генерации текста\n"
-            "• /поиск история - найти историю контента\n"
             "• /поиск план - найти функции планирования",
             parse_mode="Markdown"
         )
         return
     
-    # Простой поиск по ключевым словам
-    search_query_lower = search_query.lower()
-    
-    results = []
-    
-    # Поиск функций
-    function_keywords = {
-        "текст": ["📝 Генерация текста", "✏️ Редактор текста"],
-        "изображение": ["🎨 Генерация изображения"],
-        "план": ["📅 Контент-план", "📅 Календарь"],
-        "история": ["📊 История"],
-        "шаблон": ["📋 Шаблоны"],
-        "статистика": ["📈 Статистика"],
-        "аналитика": ["📈 Статистика", "📊 Анализ"],
-        "настройки": ["⚙️ Настройки"],
-        "команда": ["👥 Команда"],
-        "тест": ["🔬 A/B тест"]
-    }
-    
-    for keyword, functions in function_keywords.items():
-        if keyword in search_query_lower:
-            results.extend(functions)
-    
-    if results:
-        # Убираем дубликаты
-        results = list(set(results))
-        
-        from telegram import InlineKeyboardMarkup, InlineKeyboardButton
-        keyboard = []
-        for func in results[:5]:  # Ограничиваем до 5 результатов
-            # Создаем callback_data на основе функции
-            callback_map = {
-                "📝 Генерация текста": "menu_text_gen",
-                "✏️ Редактор текста": "menu_text_editor",
-                "🎨 Генерация изображения": "menu_image_gen",
-                "📅 Контент-план": "menu_content_plan",
-                "📅 Календарь": "menu_calendar",
-                "📊 История": "menu_history",
-                "📋 Шаблоны": "menu_templates",
-                "📈 Статистика": "menu_statistics",
-                "⚙️ Настройки": "menu_settings",
-                "👥 Команда": "menu_team",
-                "🔬 A/B тест": "menu_ab_test"
-            }
-            callback = callback_map.get(func, "main_menu")
-            keyboard.append([InlineKeyboardButton(func, callback_data=callback)])
-        
-        keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")])
-        
-        await update.message.reply_text(
-            f"🔍 **Результаты поиска:** '{search_query}'\n\n"
-            f"Найдено функций: {len(results)}\n\n"
-            f"Выбери функцию:",
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode="Markdown"
-        )
+    user_id = update.effective_user.id
+    # Запрос сохраняем для листания страниц: в callback_data он может не поместиться
+    context.user_data['search_query'] = search_query
+
+    await history_writer.flush_user(user_id)
+    text, keyboard = _render_search_page(user_id, search_query, 0)
+
+    if text:
+        await update.message.reply_text(text, reply_markup=keyboard)
     else:
         await update.message.reply_text(
             f"❌ По запросу '{search_query}' ничего не найдено.\n\n"
             f"Попробуй другие ключевые слова:\n"
+            f"• слова из своих постов или хештеги\n"
             f"• текст, изображение, план\n"
             f"• история, шаблоны, статистика\n"
             f"• настройки, команда, тест"
         )
 
 
+async def handle_search_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Листание результатов поиска"""
+    query = update.callback_query
+    await query.answer()
+
+    search_query = context.user_data.get('search_query')
+    if not search_query:
+        await query.edit_message_text("Поиск устарел. Повтори команду /поиск [запрос]")
+        return
+
+    try:
+        offset = max(int(query.data.replace("qsearch_", "")), 0)
+    except ValueError:
+        offset = 0
+
+    text, keyboard = _render_search_page(update.effective_user.id, search_query, offset)
+    if text:
+        await query.edit_message_text(text, reply_markup=keyboard)
+    else:
+        await query.edit_message_text(f"❌ По запросу '{search_query}' больше ничего не найдено.")
+
+
 def setup_quick_commands_handlers(application):
     """Настройка обработчиков команд быстрого доступа"""
     application.add_handler(CommandHandler("текст", quick_text_command))
@@ -176,4 +252,5 @@ def setup_quick_commands_handlers(application):
     application.add_handler(CommandHandler("stats", quick_stats_command))  # Английская версия
     application.add_handler(CommandHandler("поиск", search_command))
     application.add_handler(CommandHandler("search", search_command))  # Английская версия
+    application.add_handler(CallbackQueryHandler(handle_search_page_callback, pattern="^qsearch_"))
 
@@ -5,8 +5,7 @@ import logging
 from telegram import Update
 from telegram.ext import ContextTypes
 from bot.utils.helpers import get_or_create_user
-from bot.database.models import NKOProfile
-from bot.database.database import get_db
+from bot.services.user_cache import user_cache
 from bot.keyboards.inline import get_nko_setup_start_keyboard
 
 logger = logging.getLogger(__name__)
@@ -17,8 +16,7 @@ async def show_settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_id = update.effective_user.id
     get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
     
-    with get_db() as db:
-        nko_profile = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).first()
+    nko_profile = user_cache.get_active_profile(user_id)
     
     text = "⚙️ **Настройки**\n\n"
     
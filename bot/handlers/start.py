@@ -14,8 +14,10 @@ from bot.keyboards.inline import (
     get_achievements_keyboard
 )
 from bot.utils.helpers import get_or_create_user
-from bot.database.models import User, NKOProfile, ContentHistory, ContentPlan, PostTemplate
+from bot.database.models import ContentHistory, ContentPlan, PostTemplate
 from bot.database.database import get_db
+from bot.services.user_cache import user_cache
+from bot.services.history_writer import history_writer
 from bot.services.ai.speech_recognition import speech_recognition_service
 
 logger = logging.getLogger(__name__)
@@ -267,6 +269,7 @@ async def show_achievements_callback(update: Update, context: ContextTypes.DEFAU
     await query.answer()
     
     user_id = update.effective_user.id
+    await history_writer.flush_user(user_id)
     stats = get_user_statistics(user_id)
     achievements = get_achievements(user_id, stats)
     
@@ -307,7 +310,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Создаем или получаем пользователя в БД
-    db_user = get_or_create_user(
+    get_or_create_user(
         user_id=user.id,
         username=user.username,
         first_name=user.first_name or "",
@@ -316,20 +319,11 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     
     # Проверяем, есть ли активный профиль НКО
-    with get_db() as db:
-        # Проверяем активный профиль через связь User
-        db_user = db.query(User).filter(User.id == user.id).first()
-        if db_user and db_user.active_profile_id:
-            nko_profile = db.query(NKOProfile).filter(NKOProfile.id == db_user.active_profile_id).first()
-        else:
-            # Если нет активного профиля, берем первый завершенный
-            nko_profile = db.query(NKOProfile).filter(
-                NKOProfile.user_id == user.id,
-                NKOProfile.is_complete == True
-            ).first()
-        has_profile = nko_profile is not None and nko_profile.is_complete
+    nko_profile = user_cache.get_active_profile(user.id)
+    has_profile = nko_profile is not None and nko_profile.is_complete
     
     # Получаем статистику пользователя
+    await history_writer.flush_user(user.id)
     stats = get_user_statistics(user.id)
     
     # Формируем имя для приветствия
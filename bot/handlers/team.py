@@ -7,6 +7,7 @@ from telegram.ext import ContextTypes
 from bot.utils.helpers import get_or_create_user
 from bot.database.models import ContentHistory
 from bot.database.database import get_db
+from bot.services.history_writer import history_writer
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +28,7 @@ async def team_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if callback_data == "team_my_posts":
         user_id = update.effective_user.id
+        await history_writer.flush_user(user_id)
         
         with get_db() as db:
             posts = db.query(ContentHistory).filter(
@@ -51,14 +53,6 @@ async def team_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             await query.edit_message_text(text, parse_mode="Markdown")
     
-    elif callback_data == "team_comments":
-        await query.edit_message_text(
-            "💬 **Комментарии**\n\n"
-            "Функция комментариев будет доступна в следующих версиях.\n\n"
-            "Сейчас ты можешь использовать редактор текста для улучшения постов.",
-            parse_mode="Markdown"
-        )
-    
     elif callback_data == "main_menu":
         await query.edit_message_text("Возврат в главное меню")
         return
@@ -70,8 +64,9 @@ def setup_team_handlers(application):
     """Настройка обработчиков командной работы"""
     from telegram.ext import CallbackQueryHandler
     
+    # Остальные callback "team_" обрабатываются в team_advanced
     application.add_handler(
-        CallbackQueryHandler(team_callback, pattern="^team_")
+        CallbackQueryHandler(team_callback, pattern="^team_my_posts$")
     )
 
 
@@ -4,43 +4,37 @@
 import logging
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler, CallbackQueryHandler, MessageHandler, filters
-from bot.database.models import Team, TeamMember, SharedContent, ContentComment, ContentHistory, TeamRole
+from bot.database.models import Team, ContentHistory, TeamRole
 from bot.database.database import get_db
-from bot.utils.helpers import get_or_create_user
+from bot.database.team_repository import team_repository, ApprovalResult, APPROVER_ROLES
+from bot.services.history_writer import history_writer
+from bot.handlers.common import cancel_conversation
 from bot.states.conversation import END
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+ROLE_EMOJI = {
+    TeamRole.ADMIN.value: "👑",
+    TeamRole.EDITOR.value: "✏️",
+    TeamRole.AUTHOR.value: "✍️",
+    TeamRole.VIEWER.value: "👁️"
+}
+
 
 async def show_team_advanced_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает расширенное меню командной работы"""
     user_id = update.effective_user.id
     
-    with get_db() as db:
-        # Получаем команды пользователя
-        user_teams = db.query(TeamMember).filter(
-            TeamMember.user_id == user_id
-        ).all()
-        
-        owned_teams = db.query(Team).filter(
-            Team.owner_id == user_id
-        ).all()
+    # Команды, где пользователь участник или владелец - один запрос
+    memberships = team_repository.get_memberships(user_id)
     
     text = "👥 **Командная работа**\n\n"
     
-    if user_teams or owned_teams:
+    if memberships:
         text += "**Твои команды:**\n"
-        for member in user_teams[:5]:
-            team = member.team
-            role_emoji = {
-                TeamRole.ADMIN: "👑",
-                TeamRole.EDITOR: "✏️",
-                TeamRole.AUTHOR: "✍️",
-                TeamRole.VIEWER: "👁️"
-            }
-            emoji = role_emoji.get(member.role, "👤")
-            text += f"{emoji} {team.name} ({member.role})\n"
+        for membership in memberships[:5]:
+            emoji = ROLE_EMOJI.get(membership.role, "👤")
+            text += f"{emoji} {membership.team_name} ({membership.role})\n"
         text += "\n"
     else:
         text += "У тебя пока нет команд.\n\n"
@@ -50,7 +44,8 @@ async def show_team_advanced_menu(update: Update, context: ContextTypes.DEFAULT_
     text += "• Присоединиться к команде\n"
     text += "• Общий контент\n"
     text += "• Утверждение контента\n"
-    text += "• Комментарии"
+    text += "• Комментарии\n"
+    text += "• Публикация постов в команды"
     
     keyboard = InlineKeyboardMarkup([
         [
@@ -65,12 +60,18 @@ async def show_team_advanced_menu(update: Update, context: ContextTypes.DEFAULT_
             InlineKeyboardButton("✅ На утверждение", callback_data="team_pending_approval"),
             InlineKeyboardButton("💬 Комментарии", callback_data="team_comments")
         ],
+        [
+            InlineKeyboardButton("📤 Поделиться постом", callback_data="team_share")
+        ],
         [
             InlineKeyboardButton("◀️ Назад", callback_data="main_menu")
         ]
     ])
     
-    await update.message.reply_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    if update.message:
+        await update.message.reply_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    else:
+        await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode="Markdown")
 
 
 async def handle_team_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -92,12 +93,9 @@ async def handle_team_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         return "waiting_team_name"
     
     elif callback_data == "team_list":
-        with get_db() as db:
-            user_teams = db.query(TeamMember).filter(
-                TeamMember.user_id == user_id
-            ).all()
+        memberships = team_repository.get_memberships(user_id, limit=10)
         
-        if not user_teams:
+        if not memberships:
             await query.edit_message_text(
                 "📋 **Мои команды**\n\n"
                 "Ты пока не состоишь ни в одной команде.\n\n"
@@ -108,18 +106,11 @@ async def handle_team_callback(update: Update, context: ContextTypes.DEFAULT_TYP
             text = "📋 **Мои команды**\n\n"
             keyboard_buttons = []
             
-            for member in user_teams[:10]:
-                team = member.team
-                role_emoji = {
-                    TeamRole.ADMIN: "👑",
-                    TeamRole.EDITOR: "✏️",
-                    TeamRole.AUTHOR: "✍️",
-                    TeamRole.VIEWER: "👁️"
-                }
-                emoji = role_emoji.get(member.role, "👤")
-                text += f"{emoji} {team.name} - {member.role}\n"
+            for membership in memberships:
+                emoji = ROLE_EMOJI.get(membership.role, "👤")
+                text += f"{emoji} {membership.team_name} - {membership.role}\n"
                 keyboard_buttons.append([
-                    InlineKeyboardButton(f"{team.name}", callback_data=f"team_view_{team.id}")
+                    InlineKeyboardButton(f"{membership.team_name}", callback_data=f"team_view_{membership.team_id}")
                 ])
             
             keyboard_buttons.append([
@@ -138,6 +129,29 @@ async def handle_team_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     elif callback_data == "team_pending_approval":
         await show_pending_approval(update, context)
     
+    elif callback_data.startswith("team_content_view_"):
+        shared_content_id = int(callback_data.replace("team_content_view_", ""))
+        await show_content_view(update, context, shared_content_id)
+    
+    elif callback_data == "team_comments":
+        await show_recent_comments(update, context)
+    
+    elif callback_data == "team_share":
+        await show_share_posts(update, context)
+    
+    elif callback_data.startswith("team_share_post_"):
+        history_id = int(callback_data.replace("team_share_post_", ""))
+        await show_share_teams(update, context, history_id)
+    
+    elif callback_data.startswith("team_share_all_"):
+        history_id = int(callback_data.replace("team_share_all_", ""))
+        team_ids = [membership.team_id for membership in team_repository.get_shareable_teams(user_id)]
+        await share_post(update, context, history_id, team_ids)
+    
+    elif callback_data.startswith("team_share_to_"):
+        history_id, team_id = (int(part) for part in callback_data.replace("team_share_to_", "").split("_"))
+        await share_post(update, context, history_id, [team_id])
+    
     elif callback_data == "team_back":
         await show_team_advanced_menu(update, context)
     
@@ -149,163 +163,270 @@ async def handle_team_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     return END
 
 
+async def _reply(update: Update, text: str, keyboard_buttons=None):
+    """Отправляет или редактирует сообщение в зависимости от типа update"""
+    query = update.callback_query if hasattr(update, 'callback_query') else None
+    reply_markup = InlineKeyboardMarkup(keyboard_buttons) if keyboard_buttons else None
+    
+    if query:
+        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode="Markdown")
+    else:
+        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode="Markdown")
+
+
 async def show_shared_content(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает общий контент команды"""
     user_id = update.effective_user.id
-    query = update.callback_query if hasattr(update, 'callback_query') else None
     
-    with get_db() as db:
-        # Получаем команды пользователя
-        user_teams = db.query(TeamMember).filter(
-            TeamMember.user_id == user_id
-        ).all()
-        
-        if not user_teams:
-            text = "📂 **Общий контент**\n\n"
+    # Контент всех команд пользователя вместе с записями истории, командами и авторами
+    shared_content = team_repository.get_shared_items(user_id, limit=20)
+    
+    if not shared_content:
+        text = "📂 **Общий контент**\n\n"
+        if team_repository.is_member(user_id):
+            text += "В твоих командах пока нет общего контента."
+        else:
             text += "Ты не состоишь ни в одной команде.\n\n"
             text += "Создай команду или присоединись к существующей!"
-            
-            if query:
-                await query.edit_message_text(text, parse_mode="Markdown")
-            else:
-                await update.message.reply_text(text, parse_mode="Markdown")
-            return
-        
-        # Получаем общий контент из всех команд
-        team_ids = [member.team_id for member in user_teams]
-        shared_content = db.query(SharedContent).filter(
-            SharedContent.team_id.in_(team_ids)
-        ).order_by(SharedContent.created_at.desc()).limit(20).all()
-        
-        if not shared_content:
-            text = "📂 **Общий контент**\n\n"
-            text += "В твоих командах пока нет общего контента."
-            
-            if query:
-                await query.edit_message_text(text, parse_mode="Markdown")
-            else:
-                await update.message.reply_text(text, parse_mode="Markdown")
-            return
-        
-        text = "📂 **Общий контент команды**\n\n"
-        
-        for i, item in enumerate(shared_content[:10], 1):
-            content = db.query(ContentHistory).filter(
-                ContentHistory.id == item.content_history_id
-            ).first()
-            
-            if content:
-                content_data = content.content_data if isinstance(content.content_data, dict) else {}
-                preview = content_data.get("text", str(content_data))[:50]
-                status = "✅ Утвержден" if item.is_approved else "⏳ На утверждении"
-                text += f"{i}. {status} - {preview}...\n"
-        
-        keyboard_buttons = []
-        for item in shared_content[:5]:
-            keyboard_buttons.append([
-                InlineKeyboardButton(
-                    f"📝 Просмотр {item.id}",
-                    callback_data=f"team_content_view_{item.id}"
-                )
-            ])
-        
+        await _reply(update, text)
+        return
+    
+    text = "📂 **Общий контент команды**\n\n"
+    
+    for i, item in enumerate(shared_content[:10], 1):
+        status = "✅ Утвержден" if item.is_approved else "⏳ На утверждении"
+        author = f" ({item.author_name})" if item.author_name else ""
+        text += f"{i}. {status} - {item.team_name}{author}: {item.preview}...\n"
+    
+    keyboard_buttons = []
+    for item in shared_content[:5]:
         keyboard_buttons.append([
-            InlineKeyboardButton("◀️ Назад", callback_data="team_back")
-        ])
-        
-        if query:
-            await query.edit_message_text(
-                text,
-                reply_markup=InlineKeyboardMarkup(keyboard_buttons),
-                parse_mode="Markdown"
-            )
-        else:
-            await update.message.reply_text(
-                text,
-                reply_markup=InlineKeyboardMarkup(keyboard_buttons),
-                parse_mode="Markdown"
+            InlineKeyboardButton(
+                f"📝 Просмотр {item.id}",
+                callback_data=f"team_content_view_{item.id}"
             )
+        ])
+    
+    keyboard_buttons.append([
+        InlineKeyboardButton("◀️ Назад", callback_data="team_back")
+    ])
+    
+    await _reply(update, text, keyboard_buttons)
 
 
 async def show_pending_approval(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает контент, ожидающий утверждения"""
     user_id = update.effective_user.id
-    query = update.callback_query if hasattr(update, 'callback_query') else None
     
-    with get_db() as db:
-        # Получаем команды, где пользователь может утверждать (ADMIN или EDITOR)
-        user_teams = db.query(TeamMember).filter(
-            TeamMember.user_id == user_id,
-            TeamMember.role.in_([TeamRole.ADMIN.value, TeamRole.EDITOR.value])
-        ).all()
-        
-        if not user_teams:
-            text = "✅ **На утверждение**\n\n"
+    # Только команды, где пользователь может утверждать (ADMIN или EDITOR)
+    pending_content = team_repository.get_shared_items(
+        user_id,
+        roles=APPROVER_ROLES,
+        pending_only=True,
+        limit=10
+    )
+    
+    if not pending_content:
+        text = "✅ **На утверждение**\n\n"
+        if team_repository.is_member(user_id, APPROVER_ROLES):
+            text += "Нет контента, ожидающего утверждения."
+        else:
             text += "У тебя нет прав на утверждение контента.\n\n"
             text += "Нужна роль Администратора или Редактора."
-            
-            if query:
-                await query.edit_message_text(text, parse_mode="Markdown")
-            else:
-                await update.message.reply_text(text, parse_mode="Markdown")
-            return
-        
-        team_ids = [member.team_id for member in user_teams]
-        pending_content = db.query(SharedContent).filter(
-            SharedContent.team_id.in_(team_ids),
-            SharedContent.is_approved == False
-        ).order_by(SharedContent.created_at.desc()).limit(20).all()
-        
-        if not pending_content:
-            text = "✅ **На утверждение**\n\n"
-            text += "Нет контента, ожидающего утверждения."
-            
-            if query:
-                await query.edit_message_text(text, parse_mode="Markdown")
-            else:
-                await update.message.reply_text(text, parse_mode="Markdown")
-            return
-        
-        text = "✅ **Контент на утверждение**\n\n"
+        await _reply(update, text)
+        return
+    
+    text = "✅ **Контент на утверждение**\n\n"
+    
+    keyboard_buttons = []
+    for item in pending_content:
+        author = f" ({item.author_name})" if item.author_name else ""
+        text += f"• {item.team_name}{author}: {item.preview}...\n"
         
-        keyboard_buttons = []
-        for item in pending_content[:10]:
-            content = db.query(ContentHistory).filter(
-                ContentHistory.id == item.content_history_id
-            ).first()
-            
-            if content:
-                content_data = content.content_data if isinstance(content.content_data, dict) else {}
-                preview = content_data.get("text", str(content_data))[:50]
-                text += f"• {preview}...\n"
-                
+        keyboard_buttons.append([
+            InlineKeyboardButton(
+                f"✅ Утвердить {item.id}",
+                callback_data=f"team_approve_{item.id}_{item.version}"
+            ),
+            InlineKeyboardButton(
+                f"❌ Отклонить {item.id}",
+                callback_data=f"team_reject_{item.id}_{item.version}"
+            )
+        ])
+    
+    keyboard_buttons.append([
+        InlineKeyboardButton("◀️ Назад", callback_data="team_back")
+    ])
+    
+    await _reply(update, text, keyboard_buttons)
+
+
+async def show_content_view(update: Update, context: ContextTypes.DEFAULT_TYPE, shared_content_id: int):
+    """Показывает общий контент с комментариями"""
+    user_id = update.effective_user.id
+    item = team_repository.get_shared_item(user_id, shared_content_id)
+    
+    if not item:
+        await _reply(update, "❌ Контент не найден.", [[InlineKeyboardButton("◀️ Назад", callback_data="team_shared_content")]])
+        return
+    
+    status = "✅ Утвержден" if item.is_approved else "⏳ На утверждении"
+    text = f"📝 **{item.team_name}** - {status}\n"
+    if item.author_name:
+        text += f"Автор: {item.author_name}\n"
+    text += f"\n{str(item.content_data.get('text', item.content_data))[:1500]}\n"
+    
+    comments = team_repository.get_comments(item.id, limit=10)
+    if comments:
+        text += "\n💬 **Комментарии:**\n"
+        for comment in comments:
+            text += f"• {comment.author_name or comment.user_id}: {comment.text[:200]}\n"
+    
+    keyboard_buttons = [[
+        InlineKeyboardButton("💬 Комментировать", callback_data=f"team_comment_{item.id}")
+    ]]
+    if not item.is_approved:
+        keyboard_buttons.append([
+            InlineKeyboardButton("✅ Утвердить", callback_data=f"team_approve_{item.id}_{item.version}"),
+            InlineKeyboardButton("❌ Отклонить", callback_data=f"team_reject_{item.id}_{item.version}")
+        ])
+    keyboard_buttons.append([
+        InlineKeyboardButton("◀️ Назад", callback_data="team_shared_content")
+    ])
+    
+    await _reply(update, text, keyboard_buttons)
+
+
+async def show_recent_comments(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показывает последние комментарии в командах пользователя"""
+    user_id = update.effective_user.id
+    comments = team_repository.get_recent_comments(user_id, limit=10)
+    
+    text = "💬 **Комментарии**\n\n"
+    keyboard_buttons = []
+    if not comments:
+        text += "В твоих командах пока нет комментариев."
+    else:
+        seen = set()
+        for comment in comments:
+            text += f"• {comment.author_name or comment.user_id} к «{comment.content_preview}»: {comment.text[:100]}\n"
+            if comment.shared_content_id not in seen and len(seen) < 5:
+                seen.add(comment.shared_content_id)
                 keyboard_buttons.append([
                     InlineKeyboardButton(
-                        f"✅ Утвердить {item.id}",
-                        callback_data=f"team_approve_{item.id}"
-                    ),
-                    InlineKeyboardButton(
-                        f"❌ Отклонить {item.id}",
-                        callback_data=f"team_reject_{item.id}"
+                        f"📝 {comment.content_preview[:30]}",
+                        callback_data=f"team_content_view_{comment.shared_content_id}"
                     )
                 ])
-        
-        keyboard_buttons.append([
-            InlineKeyboardButton("◀️ Назад", callback_data="team_back")
+    
+    keyboard_buttons.append([
+        InlineKeyboardButton("◀️ Назад", callback_data="team_back")
+    ])
+    await _reply(update, text, keyboard_buttons)
+
+
+async def show_share_posts(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показывает последние посты пользователя для публикации в команды"""
+    user_id = update.effective_user.id
+    await history_writer.flush_user(user_id)
+    
+    with get_db() as db:
+        posts = [
+            (post.id, post.content_data if isinstance(post.content_data, dict) else {"text": str(post.content_data)})
+            for post in db.query(ContentHistory.id, ContentHistory.content_data).filter(
+                ContentHistory.user_id == user_id,
+                ContentHistory.content_type == "text"
+            ).order_by(ContentHistory.generated_at.desc(), ContentHistory.id.desc()).limit(5)
+        ]
+    
+    if not posts:
+        await _reply(update, "📤 **Поделиться постом**\n\nУ тебя пока нет сохраненных постов.",
+                     [[InlineKeyboardButton("◀️ Назад", callback_data="team_back")]])
+        return
+    
+    keyboard_buttons = [
+        [InlineKeyboardButton(f"📝 {str(data.get('text', ''))[:40]}", callback_data=f"team_share_post_{history_id}")]
+        for history_id, data in posts
+    ]
+    keyboard_buttons.append([
+        InlineKeyboardButton("◀️ Назад", callback_data="team_back")
+    ])
+    await _reply(update, "📤 **Поделиться постом**\n\nВыбери пост:", keyboard_buttons)
+
+
+async def show_share_teams(update: Update, context: ContextTypes.DEFAULT_TYPE, history_id: int):
+    """Показывает команды, в которые можно опубликовать пост"""
+    teams = team_repository.get_shareable_teams(update.effective_user.id)
+    
+    if not teams:
+        await _reply(
+            update,
+            "📤 **Поделиться постом**\n\nНет команд, где у тебя есть права на публикацию.\n\n"
+            "Нужна роль Автора, Редактора или Администратора.",
+            [[InlineKeyboardButton("◀️ Назад", callback_data="team_back")]]
+        )
+        return
+    
+    keyboard_buttons = [
+        [InlineKeyboardButton(f"👥 {team.team_name}", callback_data=f"team_share_to_{history_id}_{team.team_id}")]
+        for team in teams[:10]
+    ]
+    if len(teams) > 1:
+        keyboard_buttons.insert(0, [
+            InlineKeyboardButton("📢 Во все команды", callback_data=f"team_share_all_{history_id}")
         ])
-        
-        if query:
-            await query.edit_message_text(
-                text,
-                reply_markup=InlineKeyboardMarkup(keyboard_buttons),
-                parse_mode="Markdown"
-            )
-        else:
-            await update.message.reply_text(
-                text,
-                reply_markup=InlineKeyboardMarkup(keyboard_buttons),
-                parse_mode="Markdown"
-            )
+    keyboard_buttons.append([
+        InlineKeyboardButton("◀️ Назад", callback_data="team_share")
+    ])
+    await _reply(update, "📤 **Поделиться постом**\n\nВыбери команду:", keyboard_buttons)
+
+
+async def share_post(update: Update, context: ContextTypes.DEFAULT_TYPE, history_id: int, team_ids):
+    """Публикует пост в выбранные команды"""
+    shared = team_repository.share_to_teams(update.effective_user.id, history_id, team_ids)
+    
+    if shared:
+        text = f"✅ Пост отправлен на утверждение в команд: {shared}"
+    else:
+        text = "ℹ️ Пост уже опубликован в выбранных командах."
+    
+    await _reply(update, text, [[InlineKeyboardButton("◀️ Назад", callback_data="team_back")]])
+
+
+async def start_comment(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Начало ввода комментария к общему контенту"""
+    query = update.callback_query
+    await query.answer()
+    
+    context.user_data['team_comment_id'] = int(query.data.replace("team_comment_", ""))
+    context.user_data['_conversation_active'] = True
+    
+    await query.edit_message_text("💬 Напиши комментарий:")
+    return "waiting_comment"
+
+
+async def handle_comment_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сохраняет комментарий к общему контенту"""
+    comment_text = update.message.text.strip()
+    shared_content_id = context.user_data.pop('team_comment_id', None)
+    context.user_data.pop('_conversation_active', None)
+    
+    if not comment_text or shared_content_id is None:
+        await update.message.reply_text("❌ Пустой комментарий не сохранен.")
+        return END
+    
+    comment_id = team_repository.add_comment(update.effective_user.id, shared_content_id, comment_text[:2000])
+    if comment_id:
+        await update.message.reply_text(
+            "✅ Комментарий добавлен!",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("📝 К контенту", callback_data=f"team_content_view_{shared_content_id}")
+            ]])
+        )
+    else:
+        await update.message.reply_text("❌ Контент не найден в твоих командах.")
+    
+    return END
 
 
 async def handle_team_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -347,20 +468,15 @@ async def handle_team_description(update: Update, context: ContextTypes.DEFAULT_
         )
         db.add(team)
         db.flush()
-        
-        # Добавляем создателя как администратора
-        member = TeamMember(
-            team_id=team.id,
-            user_id=user_id,
-            role=TeamRole.ADMIN.value
-        )
-        db.add(member)
-        db.commit()
+        team_id = team.id
+    
+    # Добавляем создателя как администратора
+    team_repository.upsert_members(team_id, {user_id: TeamRole.ADMIN.value})
     
     await update.message.reply_text(
         f"✅ Команда '{team_name}' создана!\n\n"
         f"Ты добавлен как администратор.\n\n"
-        f"Пригласи других участников через ID команды: {team.id}"
+        f"Пригласи других участников через ID команды: {team_id}"
     )
     
     context.user_data.pop('team_create', None)
@@ -369,66 +485,37 @@ async def handle_team_description(update: Update, context: ContextTypes.DEFAULT_
     return END
 
 
+APPROVAL_MESSAGES = {
+    ApprovalResult.NOT_FOUND: "Контент не найден",
+    ApprovalResult.FORBIDDEN: "У тебя нет прав на утверждение",
+    ApprovalResult.CONFLICT: "Решение по контенту уже принято другим участником"
+}
+
+
 async def handle_approve_content(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработка утверждения контента"""
+    """Обработка утверждения и отклонения контента"""
     query = update.callback_query
-    await query.answer()
+    approve = query.data.startswith("team_approve_")
+    shared_content_id, version = (
+        int(part) for part in query.data.split("_")[2:4]
+    )
     
-    if query.data.startswith("team_approve_"):
-        content_id = int(query.data.replace("team_approve_", ""))
-        user_id = update.effective_user.id
-        
-        with get_db() as db:
-            shared_content = db.query(SharedContent).filter(
-                SharedContent.id == content_id
-            ).first()
-            
-            if not shared_content:
-                await query.answer("Контент не найден", show_alert=True)
-                return
-            
-            # Проверяем права
-            member = db.query(TeamMember).filter(
-                TeamMember.team_id == shared_content.team_id,
-                TeamMember.user_id == user_id,
-                TeamMember.role.in_([TeamRole.ADMIN.value, TeamRole.EDITOR.value])
-            ).first()
-            
-            if not member:
-                await query.answer("У тебя нет прав на утверждение", show_alert=True)
-                return
-            
-            # Утверждаем
-            shared_content.is_approved = True
-            shared_content.approved_by = user_id
-            shared_content.approved_at = datetime.now()
-            db.commit()
-        
-        await query.answer("✅ Контент утвержден!", show_alert=True)
-        await show_pending_approval(update, context)
+    result = team_repository.decide(update.effective_user.id, shared_content_id, version, approve)
     
-    elif query.data.startswith("team_reject_"):
-        content_id = int(query.data.replace("team_reject_", ""))
-        user_id = update.effective_user.id
-        
-        with get_db() as db:
-            shared_content = db.query(SharedContent).filter(
-                SharedContent.id == content_id
-            ).first()
-            
-            if shared_content:
-                # Удаляем из общего контента (или помечаем как отклоненный)
-                db.delete(shared_content)
-                db.commit()
-        
-        await query.answer("❌ Контент отклонен", show_alert=True)
-        await show_pending_approval(update, context)
+    if result == ApprovalResult.OK:
+        await query.answer("✅ Контент утвержден!" if approve else "❌ Контент отклонен", show_alert=True)
+    else:
+        await query.answer(APPROVAL_MESSAGES[result], show_alert=True)
+    
+    await show_pending_approval(update, context)
 
 
 def setup_team_advanced_handlers(application):
     """Настройка расширенных обработчиков командной работы"""
     # ConversationHandler для создания команды
     conv_handler = ConversationHandler(
+        name="team_create",
+        persistent=True,
         entry_points=[
             CallbackQueryHandler(handle_team_callback, pattern="^team_create$"),
         ],
@@ -441,20 +528,37 @@ def setup_team_advanced_handlers(application):
             ]
         },
         fallbacks=[
-            MessageHandler(filters.Regex("^❌ Отмена$"), lambda u, c: (u.user_data.pop('_conversation_active', None), END)[1]),
-            MessageHandler(filters.Regex("^◀️ Назад$"), lambda u, c: (u.user_data.pop('_conversation_active', None), END)[1]),
+            MessageHandler(filters.Regex("^❌ Отмена$"), cancel_conversation),
+            MessageHandler(filters.Regex("^◀️ Назад$"), cancel_conversation),
         ],
         allow_reentry=True
     )
     
     application.add_handler(conv_handler)
     
-    # Callback handlers
-    from telegram.ext import CallbackQueryHandler
+    # ConversationHandler для комментария к общему контенту
+    application.add_handler(ConversationHandler(
+        name="team_comment",
+        persistent=True,
+        entry_points=[
+            CallbackQueryHandler(start_comment, pattern=r"^team_comment_\d+$"),
+        ],
+        states={
+            "waiting_comment": [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_comment_text)
+            ]
+        },
+        fallbacks=[
+            MessageHandler(filters.Regex("^❌ Отмена$"), cancel_conversation),
+        ],
+        allow_reentry=True
+    ))
+    
+    # Callback handlers: утверждение регистрируется раньше общего обработчика "^team_"
     application.add_handler(
-        CallbackQueryHandler(handle_team_callback, pattern="^team_")
+        CallbackQueryHandler(handle_approve_content, pattern=r"^team_(approve|reject)_\d+_\d+$")
     )
     application.add_handler(
-        CallbackQueryHandler(handle_approve_content, pattern="^team_approve_|^team_reject_")
+        CallbackQueryHandler(handle_team_callback, pattern="^team_")
     )
 
@@ -6,8 +6,10 @@ from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, CallbackQueryHandler, filters
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
 from bot.utils.helpers import get_or_create_user
-from bot.database.models import PostTemplate, ContentHistory
+from bot.database.models import PostTemplate
 from bot.database.database import get_db
+from bot.services.user_cache import user_cache
+from bot.services.history_writer import history_writer
 from bot.services.ai.openrouter import openrouter_api
 from bot.services.content.hashtag_generator import hashtag_generator
 from bot.services.content.text_processor import text_processor
@@ -176,6 +178,7 @@ async def templates_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
             template_id = int(template_key.replace("user_", ""))
             user_id = update.effective_user.id
             
+            content_structure = None
             with get_db() as db:
                 template = db.query(PostTemplate).filter(
                     PostTemplate.id == template_id,
@@ -184,12 +187,13 @@ async def templates_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 
                 if template:
                     template.usage_count += 1
-                    db.commit()
-                    
-                    # Генерируем пост из шаблона
-                    await generate_from_template(update, context, template.content_structure)
-                else:
-                    await query.answer("Шаблон не найден", show_alert=True)
+                    content_structure = template.content_structure
+            
+            # Генерация идет вне сессии БД: сессия не держится на время запроса к AI
+            if content_structure is not None:
+                await generate_from_template(update, context, content_structure)
+            else:
+                await query.answer("Шаблон не найден", show_alert=True)
         else:
             # Предустановленный шаблон
             if template_key in PREDEFINED_TEMPLATES:
@@ -310,12 +314,7 @@ async def generate_from_template(update: Update, context: ContextTypes.DEFAULT_T
         template_text = template_structure.get('text', '')
         
         # Получаем профиль НКО
-        from bot.database.models import NKOProfile
-        nko_profile = None
-        with get_db() as db:
-            profile = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).first()
-            if profile:
-                nko_profile = profile
+        nko_profile = user_cache.get_active_profile(user_id)
         
         # Генерируем похожий пост
         nko_info = ""
@@ -360,19 +359,16 @@ async def generate_from_template(update: Update, context: ContextTypes.DEFAULT_T
             
             # Сохраняем в историю
             get_or_create_user(user_id, None, "")
-            with get_db() as db:
-                history_entry = ContentHistory(
-                    user_id=user_id,
-                    content_type="text",
-                    content_data={
-                        "text": generated_text,
-                        "hashtags": hashtags,
-                        "type": "template_based"
-                    },
-                    tags=hashtags
-                )
-                db.add(history_entry)
-                db.commit()
+            history_writer.enqueue(
+                user_id=user_id,
+                content_type="text",
+                content_data={
+                    "text": generated_text,
+                    "hashtags": hashtags,
+                    "type": "template_based"
+                },
+                tags=hashtags
+            )
             
             from bot.keyboards.inline import get_post_actions_keyboard
             await processing_msg.edit_text(
@@ -408,12 +404,7 @@ async def generate_from_predefined_template(update: Update, context: ContextType
         user_id = update.effective_user.id
         
         # Получаем профиль НКО
-        from bot.database.models import NKOProfile
-        nko_profile = None
-        with get_db() as db:
-            profile = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).first()
-            if profile:
-                nko_profile = profile
+        nko_profile = user_cache.get_active_profile(user_id)
         
         nko_info = ""
         if nko_profile:
@@ -458,20 +449,17 @@ async def generate_from_predefined_template(update: Update, context: ContextType
             
             # Сохраняем в историю
             get_or_create_user(user_id, None, "")
-            with get_db() as db:
-                history_entry = ContentHistory(
-                    user_id=user_id,
-                    content_type="text",
-                    content_data={
-                        "text": generated_text,
-                        "hashtags": hashtags,
-                        "type": "template_based",
-                        "template_category": template['category']
-                    },
-                    tags=hashtags
-                )
-                db.add(history_entry)
-                db.commit()
+            history_writer.enqueue(
+                user_id=user_id,
+                content_type="text",
+                content_data={
+                    "text": generated_text,
+                    "hashtags": hashtags,
+                    "type": "template_based",
+                    "template_category": template['category']
+                },
+                tags=hashtags
+            )
             
             from bot.keyboards.inline import get_post_actions_keyboard
             await processing_msg.edit_text(
@@ -497,6 +485,8 @@ def setup_templates_handlers(application):
     """Настройка обработчиков шаблонов"""
     # ConversationHandler для создания шаблона
     conv_handler = ConversationHandler(
+        name="templates",
+        persistent=True,
         entry_points=[
             CallbackQueryHandler(templates_callback, pattern="^template_create$"),
         ],
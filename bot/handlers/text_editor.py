@@ -15,8 +15,8 @@ from bot.services.content.text_processor import (
 )
 from bot.services.content.style_checker import style_checker
 from bot.utils.helpers import get_or_create_user
-from bot.database.models import ContentHistory, NKOProfile
-from bot.database.database import get_db
+from bot.services.user_cache import user_cache
+from bot.services.history_writer import history_writer
 from bot.keyboards.inline import get_text_editor_actions_keyboard
 from bot.keyboards.main_menu import get_main_menu_keyboard
 
@@ -57,11 +57,7 @@ async def handle_text_for_editing(update: Update, context: ContextTypes.DEFAULT_
         get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
         
         # Получаем профиль НКО для проверки стиля
-        nko_profile = None
-        with get_db() as db:
-            profile = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).first()
-            if profile:
-                nko_profile = profile
+        nko_profile = user_cache.get_active_profile(user_id)
         
         # Расширенный анализ текста
         readability = text_processor.calculate_readability(text)
@@ -168,23 +164,20 @@ async def handle_text_for_editing(update: Update, context: ContextTypes.DEFAULT_
                     report += f"\n⚠️ Текст может быть улучшен для аудитории\n"
             
             # Сохраняем в историю
-            with get_db() as db:
-                history_entry = ContentHistory(
-                    user_id=user_id,
-                    content_type="text",
-                    content_data={
-                        "original_text": text,
-                        "edited_text": edited_content,
-                        "type": "edited",
-                        "readability": readability,
-                        "sentiment": sentiment,
-                        "repetitions": repetitions,
-                        "style_check": style_check,
-                        "audience_analysis": audience_analysis
-                    }
-                )
-                db.add(history_entry)
-                db.commit()
+            history_writer.enqueue(
+                user_id=user_id,
+                content_type="text",
+                content_data={
+                    "original_text": text,
+                    "edited_text": edited_content,
+                    "type": "edited",
+                    "readability": readability,
+                    "sentiment": sentiment,
+                    "repetitions": repetitions,
+                    "style_check": style_check,
+                    "audience_analysis": audience_analysis
+                }
+            )
             
             context.user_data['edited_text'] = edited_content
             context.user_data['original_text'] = text
@@ -325,6 +318,8 @@ async def text_editor_callback(update: Update, context: ContextTypes.DEFAULT_TYP
 def setup_text_editor_handlers(application):
     """Настройка обработчиков редактора текста"""
     conv_handler = ConversationHandler(
+        name="text_editor",
+        persistent=True,
         entry_points=[
             MessageHandler(filters.Regex("^✏️ Редактор текста$"), show_text_editor_menu),
         ],
@@ -15,8 +15,8 @@ from bot.services.content.hashtag_generator import hashtag_generator
 from bot.services.content.text_processor import text_processor
 from bot.services.content.platform_optimizer import platform_optimizer, Platform
 from bot.keyboards.platform_keyboard import get_platform_selection_keyboard, parse_platform_callback
-from bot.database.models import ContentHistory, NKOProfile
-from bot.database.database import get_db
+from bot.services.user_cache import user_cache
+from bot.services.history_writer import history_writer
 from bot.utils.helpers import get_or_create_user
 from bot.states.conversation import END
 from telegram.ext import ConversationHandler
@@ -188,14 +188,12 @@ async def handle_free_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await _generate_text_from_free_input(update, context, progress, extracted_style)
     
     # Стиль не найден, предлагаем выбрать
-    from bot.utils.progress import update_progress_message
-    processing_msg = await update.message.reply_text(
+    await update.message.reply_text(
         "✅ Текст принят!\n\n"
         "⏳ Анализ запроса...\n\n"
         "Выбери стиль написания поста:",
         reply_markup=get_style_keyboard()
     )
-    await update_progress_message(processing_msg, "⏳ Анализ запроса...", 0, 4)
     
     return "waiting_style"
 
@@ -215,7 +213,7 @@ async def _generate_text_from_free_input(
         processing_msg_or_progress: Сообщение или ProgressBar для обновления статуса
         style: Выбранный стиль
     """
-    from bot.utils.progress import ProgressBar, update_progress_message
+    from bot.utils.progress import ProgressBar, finish_progress, update_progress_message
     
     # Определяем, это ProgressBar или обычное сообщение
     is_progress_bar = isinstance(processing_msg_or_progress, ProgressBar)
@@ -230,11 +228,9 @@ async def _generate_text_from_free_input(
             await update_progress_message(processing_msg, "🤔 Генерация контента...", 1, 4)
         # Получаем профиль НКО
         user_id = update.effective_user.id
-        nko_profile = None
-        with get_db() as db:
-            profile = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).first()
-            if profile and profile.is_complete:
-                nko_profile = profile
+        nko_profile = user_cache.get_active_profile(user_id)
+        if nko_profile and not nko_profile.is_complete:
+            nko_profile = None
         
         # Формируем промпт для генерации
         user_text = context.user_data.get('free_text', '')
@@ -367,20 +363,17 @@ async def _generate_text_from_free_input(
             user_id = update.effective_user.id
             db_user = get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
             
-            with get_db() as db:
-                history_entry = ContentHistory(
-                    user_id=user_id,
-                    content_type="text",
-                    content_data={
-                        "text": generated_text,
-                        "hashtags": hashtags,
-                        "style": style,
-                        "original_text": user_text
-                    },
-                    tags=hashtags
-                )
-                db.add(history_entry)
-                db.commit()
+            history_writer.enqueue(
+                user_id=user_id,
+                content_type="text",
+                content_data={
+                    "text": generated_text,
+                    "hashtags": hashtags,
+                    "style": style,
+                    "original_text": user_text
+                },
+                tags=hashtags
+            )
             
             context.user_data['last_generated_text'] = final_text
             context.user_data['last_text_data'] = {
@@ -399,6 +392,7 @@ async def _generate_text_from_free_input(
                     parse_mode="Markdown"
                 )
             elif hasattr(processing_msg, 'edit_text'):
+                await finish_progress(processing_msg)
                 await processing_msg.edit_text(
                     f"✅ **Готово!** Вот твой пост:\n\n{final_text}",
                     reply_markup=get_post_actions_keyboard(),
@@ -414,6 +408,7 @@ async def _generate_text_from_free_input(
             return "post_ready"
         else:
             error_msg = "❌ Ошибка при генерации текста. Попробуй еще раз или выбери другой способ генерации."
+            await finish_progress(processing_msg)
             if hasattr(processing_msg, 'edit_text'):
                 await processing_msg.edit_text(error_msg, reply_markup=get_text_generation_types_keyboard())
             else:
@@ -423,6 +418,7 @@ async def _generate_text_from_free_input(
     except Exception as e:
         logger.exception(f"Ошибка при генерации текста: {e}")
         error_msg = "❌ Произошла ошибка при генерации. Попробуй еще раз."
+        await finish_progress(processing_msg)
         if hasattr(processing_msg, 'edit_text'):
             await processing_msg.edit_text(error_msg, reply_markup=get_text_generation_types_keyboard())
         else:
@@ -522,11 +518,7 @@ async def handle_examples_prompt(update: Update, context: ContextTypes.DEFAULT_T
     
     try:
         user_id = update.effective_user.id
-        nko_profile = None
-        with get_db() as db:
-            profile = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).first()
-            if profile:
-                nko_profile = profile
+        nko_profile = user_cache.get_active_profile(user_id)
         
         # Формируем промпт для анализа стиля и генерации
         examples_text = "\n\n---\n\n".join([f"Пример {i+1}:\n{ex}" for i, ex in enumerate(examples)])
@@ -601,21 +593,18 @@ async def handle_examples_prompt(update: Update, context: ContextTypes.DEFAULT_T
             # Сохраняем в историю
             db_user = get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
             
-            with get_db() as db:
-                history_entry = ContentHistory(
-                    user_id=user_id,
-                    content_type="text",
-                    content_data={
-                        "text": generated_text,
-                        "hashtags": hashtags,
-                        "examples_used": examples,
-                        "prompt": prompt_text,
-                        "type": "examples_based"
-                    },
-                    tags=hashtags
-                )
-                db.add(history_entry)
-                db.commit()
+            history_writer.enqueue(
+                user_id=user_id,
+                content_type="text",
+                content_data={
+                    "text": generated_text,
+                    "hashtags": hashtags,
+                    "examples_used": examples,
+                    "prompt": prompt_text,
+                    "type": "examples_based"
+                },
+                tags=hashtags
+            )
             
             context.user_data['last_generated_text'] = final_text
             context.user_data['last_text_data'] = {
@@ -810,11 +799,7 @@ async def handle_structured_style(update: Update, context: ContextTypes.DEFAULT_
         
         # Получаем профиль НКО
         user_id = update.effective_user.id
-        nko_profile = None
-        with get_db() as db:
-            profile = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).first()
-            if profile:
-                nko_profile = profile
+        nko_profile = user_cache.get_active_profile(user_id)
         
         # Формируем промпт для генерации
         event_info = f"Тип события: {structured_data.get('event_type', 'пост')}\n"
@@ -900,20 +885,17 @@ async def handle_structured_style(update: Update, context: ContextTypes.DEFAULT_
             # Сохраняем в историю
             db_user = get_or_create_user(user_id, update.effective_user.username, update.effective_user.first_name or "")
             
-            with get_db() as db:
-                history_entry = ContentHistory(
-                    user_id=user_id,
-                    content_type="text",
-                    content_data={
-                        "text": generated_text,
-                        "hashtags": hashtags,
-                        "style": style,
-                        "structured_data": structured_data
-                    },
-                    tags=hashtags
-                )
-                db.add(history_entry)
-                db.commit()
+            history_writer.enqueue(
+                user_id=user_id,
+                content_type="text",
+                content_data={
+                    "text": generated_text,
+                    "hashtags": hashtags,
+                    "style": style,
+                    "structured_data": structured_data
+                },
+                tags=hashtags
+            )
             
             context.user_data['last_generated_text'] = final_text
             context.user_data['last_text_data'] = {
@@ -957,6 +939,8 @@ def setup_text_generation_handlers(application):
     # Важно: ConversationHandler отслеживает состояние автоматически через context.user_data
     # После callback query состояние устанавливается, и следующий Message должен обработаться
     free_text_handler = ConversationHandler(
+        name="text_free",
+        persistent=True,
         entry_points=[
             CallbackQueryHandler(text_generation_type_callback, pattern="^text_gen_free$"),
         ],
@@ -986,6 +970,8 @@ def setup_text_generation_handlers(application):
     
     # Conversation handler для примеров
     examples_handler = ConversationHandler(
+        name="text_examples",
+        persistent=True,
         entry_points=[
             CallbackQueryHandler(text_generation_type_callback, pattern="^text_gen_examples$"),
         ],
@@ -1011,6 +997,8 @@ def setup_text_generation_handlers(application):
     
     # Conversation handler для структурированной формы
     structured_handler = ConversationHandler(
+        name="text_structured",
+        persistent=True,
         entry_points=[
             CallbackQueryHandler(text_generation_type_callback, pattern="^text_gen_structured$"),
         ],
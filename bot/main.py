@@ -3,18 +3,24 @@
 """
 import logging
 import asyncio
-from telegram import Update
+import os
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+from telegram import Bot, Update
 from telegram.ext import (
     Application,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
     ConversationHandler,
+    Updater,
     filters
 )
 
 from bot.config import config
 from bot.database.database import init_db
+from bot.services.content.search import content_search
 from bot.handlers.start import (
     start_command, 
     help_command, 
@@ -42,7 +48,18 @@ from bot.handlers.smart_menu import setup_smart_menu_handlers
 from bot.handlers.quick_commands import setup_quick_commands_handlers
 from bot.handlers.platform_optimization import setup_platform_optimization_handlers
 from bot.handlers.post_series import setup_post_series_handlers
-from bot.services.scheduler import start_scheduler
+from bot.services.scheduler import scheduler, start_scheduler, stop_scheduler
+from bot.services.history_writer import history_writer
+from bot.services.history_retention import history_retention
+from bot.services.charts import chart_service
+from bot.services.export_cache import export_cache
+from bot.services.data_backfill import data_backfill
+from bot.utils.export import shutdown_export
+from bot.services.outbox import outbox
+from bot.services.state_persistence import state_persistence
+from bot.services.update_processor import UserOrderedUpdateProcessor
+from bot.services.webhook import InFlightLimitedQueue, WebhookServer
+from bot.services.workers import WORKER_SOCKET_ENV, Supervisor, WorkerLink
 
 logger = logging.getLogger(__name__)
 
@@ -124,6 +141,90 @@ def setup_handlers(application: Application):
     logger.info("Обработчики настроены")
 
 
+async def start_ingress(
+    bot: Bot,
+    update_queue: asyncio.Queue,
+    updater: Optional[Updater]
+) -> Optional[WebhookServer]:
+    """
+    Запускает прием обновлений от Telegram: webhook-сервер или polling
+    
+    Args:
+        bot: Бот
+        update_queue: Очередь, в которую передаются обновления
+        updater: Updater для polling (в режиме webhook не используется)
+    
+    Returns:
+        Запущенный webhook-сервер или None в режиме polling
+    """
+    if config.BOT_MODE == "webhook":
+        webhook_server = WebhookServer(
+            bot,
+            update_queue,
+            path=urlparse(config.WEBHOOK_URL).path or "/",
+            secret_token=config.WEBHOOK_SECRET,
+            host=config.WEBHOOK_HOST,
+            port=config.WEBHOOK_PORT,
+            queue_size=config.WEBHOOK_QUEUE_SIZE
+        )
+        await webhook_server.start()
+        await bot.set_webhook(
+            url=config.WEBHOOK_URL,
+            secret_token=config.WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=config.WEBHOOK_MAX_CONNECTIONS
+        )
+        logger.info(f"Webhook установлен: {config.WEBHOOK_URL}")
+        return webhook_server
+    
+    # Бот будет работать до получения сигнала остановки
+    await updater.start_polling(
+        allowed_updates=Update.ALL_TYPES,
+        drop_pending_updates=config.DROP_PENDING_UPDATES
+    )
+    return None
+
+
+async def stop_ingress(webhook_server: Optional[WebhookServer], updater: Optional[Updater]) -> None:
+    """Прекращает прием обновлений и дожидается передачи принятых"""
+    if webhook_server is not None:
+        await webhook_server.stop()
+    elif updater is not None and updater.running:
+        await updater.stop()
+
+
+async def run_supervisor():
+    """Многопроцессный режим: прием обновлений и распределение по процессам-обработчикам"""
+    # Миграции выполняются один раз, до запуска процессов
+    init_db()
+    logger.info("База данных инициализирована")
+    
+    supervisor = Supervisor(
+        workers=config.WORKER_PROCESSES,
+        socket_path=Path(config.WORKER_SOCKET),
+        queue_size=config.WORKER_QUEUE_SIZE,
+        heartbeat_interval=config.WORKER_HEARTBEAT_INTERVAL,
+        heartbeat_timeout=config.WORKER_HEARTBEAT_TIMEOUT
+    )
+    await supervisor.start()
+    
+    bot = Bot(config.TELEGRAM_BOT_TOKEN)
+    updater = None if config.BOT_MODE == "webhook" else Updater(bot, supervisor.update_queue)
+    webhook_server = None
+    try:
+        async with bot:
+            if updater is not None:
+                await updater.initialize()
+            webhook_server = await start_ingress(bot, supervisor.update_queue, updater)
+            logger.info(f"Бот запущен: процессов-обработчиков {config.WORKER_PROCESSES}")
+            await asyncio.Event().wait()  # Бесконечное ожидание
+    finally:
+        await stop_ingress(webhook_server, updater)
+        if updater is not None:
+            await updater.shutdown()
+        await supervisor.stop()
+
+
 async def run_bot():
     """Запуск бота"""
     try:
@@ -131,32 +232,98 @@ async def run_bot():
         config.validate()
         logger.info("Конфигурация проверена")
         
-        # Инициализация БД
-        init_db()
-        logger.info("База данных инициализирована")
+        is_worker = config.WORKER_INDEX >= 0
+        if config.WORKER_PROCESSES > 1 and not is_worker:
+            await run_supervisor()
+            return
+        
+        # Инициализация БД (в процессе-обработчике ее уже выполнил супервизор)
+        if not is_worker:
+            init_db()
+            logger.info("База данных инициализирована")
+        # Поисковый индекс создает миграция; доступность проверяет каждый процесс
+        content_search.ensure_index()
         
-        # Создание приложения
-        application = Application.builder().token(config.TELEGRAM_BOT_TOKEN).build()
+        # Создание приложения: обновления разных пользователей обрабатываются параллельно
+        builder = Application.builder().token(
+            config.TELEGRAM_BOT_TOKEN
+        ).concurrent_updates(
+            UserOrderedUpdateProcessor(config.UPDATE_CONCURRENCY, config.UPDATE_MAX_PENDING)
+        ).update_queue(
+            InFlightLimitedQueue(config.UPDATE_MAX_PENDING)
+        ).persistence(
+            # user_data и состояния диалогов сохраняются в БД и переживают перезапуск
+            state_persistence
+        )
+        if config.BOT_MODE == "webhook" or is_worker:
+            # Обновления принимает встроенный сервер или супервизор, Updater не нужен
+            builder = builder.updater(None)
+        application = builder.build()
         
         # Настройка обработчиков
         setup_handlers(application)
         
-        # Запуск планировщика для напоминаний
-        start_scheduler()
+        # Запуск планировщика; напоминания (задачи в БД) выполняет один процесс
+        start_scheduler(reminders=config.WORKER_INDEX <= 0)
         logger.info("Планировщик запущен")
         
+        # Периодическая очистка истории (лимиты и срок хранения): одним процессом
+        if config.HISTORY_RETENTION_ENABLED and config.WORKER_INDEX <= 0:
+            history_retention.start(scheduler, config.HISTORY_RETENTION_INTERVAL_MINUTES)
+        
+        # Удаление устаревших файлов экспорта (каталог общий для процессов)
+        if config.WORKER_INDEX <= 0:
+            export_cache.start(scheduler, config.EXPORT_CACHE_CLEANUP_MINUTES)
+        
+        # Перенос данных после миграций - в фоне, одним процессом
+        if config.WORKER_INDEX <= 0:
+            data_backfill.start(scheduler)
+        
+        # Выгрузка бездействующих пользователей из памяти и удаление устаревших состояний
+        state_persistence.start(scheduler, application, config.STATE_EXPIRY_INTERVAL_MINUTES)
+        
         # Запуск бота
         logger.info("Бот запускается...")
         logger.info("Бот успешно запущен и готов к работе!")
         
-        # Запускаем polling - бот будет работать до получения сигнала остановки
         async with application:
             await application.start()
-            await application.updater.start_polling(
-                allowed_updates=Update.ALL_TYPES,
-                drop_pending_updates=True
-            )
-            await asyncio.Event().wait()  # Бесконечное ожидание
+            
+            # Исходящие сообщения с учетом лимитов Telegram; недоставленные - из очереди в БД
+            await outbox.start(application.bot, config.WORKER_INDEX, config.WORKER_PROCESSES if is_worker else 1)
+            
+            webhook_server = None
+            worker_link = None
+            if is_worker:
+                # Обновления присылает супервизор; разрыв связи - сигнал остановки
+                worker_link = WorkerLink(
+                    config.WORKER_INDEX,
+                    os.getenv(WORKER_SOCKET_ENV, config.WORKER_SOCKET),
+                    config.WORKER_HEARTBEAT_INTERVAL
+                )
+                await worker_link.start(application)
+                stop_event = worker_link.closed
+            else:
+                webhook_server = await start_ingress(application.bot, application.update_queue, application.updater)
+                stop_event = asyncio.Event()  # Бесконечное ожидание
+            
+            # Фоновая пакетная запись истории контента
+            history_writer.start()
+            try:
+                await stop_event.wait()
+            finally:
+                # Прекращаем прием обновлений и дожидаемся обработки принятых
+                if worker_link is not None:
+                    await worker_link.stop()
+                else:
+                    await stop_ingress(webhook_server, application.updater)
+                await application.stop()
+                await outbox.stop()
+                # Сбрасываем в БД всё, что осталось в очереди
+                await history_writer.stop()
+                stop_scheduler()
+                chart_service.shutdown()
+                shutdown_export()
         
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем")
@@ -0,0 +1,278 @@
+"""
+Профиль активности пользователя по часам недели
+
+Для каждого пользователя хранится одна строка user_activity_profiles:
+разреженная гистограмма {час недели в UTC: вес} с экспоненциальным
+затуханием (период полураспада ACTIVITY_HALF_LIFE_DAYS), приведенная
+к моменту updated_at.
+
+- Профиль обновляется при записи истории (HistoryWriter) в той же
+  транзакции: старые веса умножаются на коэффициент затухания, новые
+  записи добавляются к своим часам. Обход истории не нужен.
+- Профиль без строки (пользователь до появления профилей) строится
+  один раз агрегатом SQL по истории за ACTIVITY_WINDOW_DAYS дней:
+  GROUP BY (день, час) по индексу (user_id, generated_at).
+
+Профиль используется временем адаптивных напоминаний,
+recommend_posting_time и analyze_best_posting_times; часы переводятся
+в пояс пользователя при чтении.
+"""
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import Integer, cast, extract, func, select, update
+from sqlalchemy.orm import Session
+from bot.config import config
+from bot.database.database import get_db
+from bot.database.models import ContentHistory, NotificationSettings, UserActivityProfile
+from bot.services.plan_reminders import get_timezone, utc_offset_minutes
+
+if config.DATABASE_URL.startswith("sqlite"):
+    from sqlalchemy.dialects.sqlite import insert as upsert_insert
+else:
+    from sqlalchemy.dialects.postgresql import insert as upsert_insert
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_WEEK = 7 * 24
+# Веса меньше этого значения не храним
+MIN_STORED_WEIGHT = 0.01
+# Суммарный вес, начиная с которого профилю можно доверять (~1 свежая запись)
+MIN_PROFILE_WEIGHT = 0.5
+
+
+def _hour_of_week(moment: datetime) -> int:
+    """Час недели (0 - понедельник 00:00)"""
+    return moment.weekday() * 24 + moment.hour
+
+
+def _history_slots(column):
+    """Выражения SQL: день недели (0=понедельник) и час для колонки даты-времени"""
+    if config.DATABASE_URL.startswith("sqlite"):
+        weekday = (cast(func.strftime("%w", column), Integer) + 6) % 7
+        hour = cast(func.strftime("%H", column), Integer)
+    else:
+        weekday = cast(extract("isodow", column), Integer) - 1
+        hour = cast(extract("hour", column), Integer)
+    return weekday, hour
+
+
+class ActivityProfileService:
+    """Затухающая гистограмма активности пользователей по часам недели"""
+
+    def __init__(self, half_life_days: float, window_days: int):
+        """
+        Args:
+            half_life_days: Период полураспада весов (дни)
+            window_days: Глубина истории при первом построении профиля (дни)
+        """
+        self.half_life = timedelta(days=half_life_days)
+        self.window = timedelta(days=window_days)
+
+    def _decay(self, since: datetime, until: datetime) -> float:
+        """Коэффициент затухания веса от момента since к моменту until"""
+        if until <= since:
+            return 1.0
+        return 0.5 ** ((until - since) / self.half_life)
+
+    @staticmethod
+    def _pack(weights: Dict[int, float]) -> Dict[str, float]:
+        """Веса для хранения: ключи-строки (JSON), без пренебрежимо малых"""
+        return {
+            str(hour): round(weight, 4)
+            for hour, weight in sorted(weights.items())
+            if weight >= MIN_STORED_WEIGHT
+        }
+
+    def _build(self, db: Session, user_ids: Iterable[int], now: datetime) -> Dict[int, Tuple[Dict[int, float], int]]:
+        """
+        Строит профили по истории агрегатом SQL (без загрузки записей)
+
+        Args:
+            db: Сессия БД
+            user_ids: ID пользователей
+            now: Момент, к которому приводятся веса
+
+        Returns:
+            {user_id: (веса по часам недели, учтено записей)}
+        """
+        user_ids = list(user_ids)
+        weekday, hour = _history_slots(ContentHistory.generated_at)
+        day = func.date(ContentHistory.generated_at)
+        rows = db.execute(
+            select(ContentHistory.user_id, day, weekday, hour, func.count())
+            .where(
+                ContentHistory.user_id.in_(user_ids),
+                ContentHistory.generated_at >= now - self.window
+            )
+            .group_by(ContentHistory.user_id, day, weekday, hour)
+        ).all()
+
+        profiles: Dict[int, Tuple[Dict[int, float], int]] = {user_id: ({}, 0) for user_id in user_ids}
+        for user_id, day_value, weekday_value, hour_value, count in rows:
+            if isinstance(day_value, str):
+                day_value = date.fromisoformat(day_value)
+            moment = datetime.combine(day_value, datetime.min.time()) + timedelta(hours=hour_value)
+            weights, events = profiles[user_id]
+            slot = weekday_value * 24 + hour_value
+            weights[slot] = weights.get(slot, 0.0) + count * self._decay(moment, now)
+            profiles[user_id] = (weights, events + count)
+        return profiles
+
+    def _upsert(self, db: Session, profiles: Dict[int, Tuple[Dict[int, float], int]], now: datetime) -> None:
+        """Записывает построенные профили (параллельно построенный профиль заменяется)"""
+        if not profiles:
+            return
+        statement = upsert_insert(UserActivityProfile)
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[UserActivityProfile.user_id],
+                set_={
+                    "weights": statement.excluded.weights,
+                    "events": statement.excluded.events,
+                    "updated_at": statement.excluded.updated_at,
+                }
+            ),
+            [
+                {"user_id": user_id, "weights": self._pack(weights), "events": events, "updated_at": now}
+                for user_id, (weights, events) in profiles.items()
+            ]
+        )
+
+    def record(self, db: Session, rows: List[Dict[str, Any]]) -> None:
+        """
+        Учитывает новые записи истории в профилях (вызывается после их INSERT)
+
+        Args:
+            db: Сессия БД той же транзакции
+            rows: Строки истории (user_id, generated_at в UTC)
+        """
+        now = datetime.utcnow()
+        added: Dict[int, Dict[int, float]] = defaultdict(dict)
+        counts: Dict[int, int] = defaultdict(int)
+        for row in rows:
+            moment = row.get("generated_at") or now
+            slot = _hour_of_week(moment)
+            weights = added[row["user_id"]]
+            weights[slot] = weights.get(slot, 0.0) + self._decay(moment, now)
+            counts[row["user_id"]] += 1
+
+        profiles = db.execute(
+            select(
+                UserActivityProfile.user_id,
+                UserActivityProfile.weights,
+                UserActivityProfile.events,
+                UserActivityProfile.updated_at
+            )
+            .where(UserActivityProfile.user_id.in_(list(added)))
+            .with_for_update()
+        ).all()
+
+        updates = []
+        for user_id, stored, events, updated_at in profiles:
+            factor = self._decay(updated_at, now)
+            weights = {int(hour): weight * factor for hour, weight in stored.items()}
+            for slot, weight in added.pop(user_id).items():
+                weights[slot] = weights.get(slot, 0.0) + weight
+            updates.append({
+                "user_id": user_id,
+                "weights": self._pack(weights),
+                "events": events + counts[user_id],
+                "updated_at": max(updated_at, now),
+            })
+        if updates:
+            db.execute(update(UserActivityProfile), updates)
+
+        # Профилей еще нет - строим по истории, в которую уже вошли новые строки
+        if added:
+            self._upsert(db, self._build(db, added, now), now)
+
+    def get_weights(self, user_id: int) -> Tuple[Dict[int, float], int]:
+        """
+        Веса профиля по часам недели в UTC, приведенные к текущему моменту
+
+        Args:
+            user_id: ID пользователя
+
+        Returns:
+            (веса {час недели: вес}, учтено записей)
+        """
+        now = datetime.utcnow()
+        with get_db() as db:
+            profile = db.get(UserActivityProfile, user_id)
+            if profile is None:
+                built = self._build(db, [user_id], now)
+                self._upsert(db, built, now)
+                return built[user_id]
+            factor = self._decay(profile.updated_at, now)
+            return {int(hour): weight * factor for hour, weight in profile.weights.items()}, profile.events
+
+    def local_profile(self, user_id: int) -> Tuple[Dict[int, float], int]:
+        """
+        Веса профиля по часам недели в поясе пользователя
+
+        Args:
+            user_id: ID пользователя
+
+        Returns:
+            (веса {час недели: вес}, учтено записей)
+        """
+        with get_db() as db:
+            timezone_name = db.execute(
+                select(NotificationSettings.timezone).where(NotificationSettings.user_id == user_id)
+            ).scalar()
+        shift = round(utc_offset_minutes(get_timezone(timezone_name)) / 60)
+
+        weights, events = self.get_weights(user_id)
+        return {(hour + shift) % HOURS_PER_WEEK: weight for hour, weight in weights.items()}, events
+
+    def hours_of_day(self, user_id: int) -> Tuple[Dict[int, float], int]:
+        """
+        Активность по часам суток в поясе пользователя
+
+        Args:
+            user_id: ID пользователя
+
+        Returns:
+            (веса {час: вес}, учтено записей); пустой словарь, если данных недостаточно
+        """
+        weights, events = self.local_profile(user_id)
+        if sum(weights.values()) < MIN_PROFILE_WEIGHT:
+            return {}, events
+        hours: Dict[int, float] = defaultdict(float)
+        for hour, weight in weights.items():
+            hours[hour % 24] += weight
+        return dict(hours), events
+
+    def late_share(self, user_id: int, weekday: int, hour: int) -> Optional[float]:
+        """
+        Доля активности пользователя позже указанного часа того же дня недели
+
+        Если в этот день недели активности нет, используются все дни.
+
+        Args:
+            user_id: ID пользователя
+            weekday: День недели (0=понедельник) в поясе пользователя
+            hour: Час в поясе пользователя
+
+        Returns:
+            Доля от 0 до 1 или None, если данных недостаточно
+        """
+        weights, _ = self.local_profile(user_id)
+        day = {slot % 24: weight for slot, weight in weights.items() if slot // 24 == weekday}
+        if sum(day.values()) < MIN_PROFILE_WEIGHT:
+            day = defaultdict(float)
+            for slot, weight in weights.items():
+                day[slot % 24] += weight
+        total = sum(day.values())
+        if total < MIN_PROFILE_WEIGHT:
+            return None
+        return sum(weight for slot, weight in day.items() if slot > hour) / total
+
+
+# Глобальный экземпляр
+activity_profile = ActivityProfileService(
+    half_life_days=config.ACTIVITY_HALF_LIFE_DAYS,
+    window_days=config.ACTIVITY_WINDOW_DAYS
+)
@@ -4,8 +4,11 @@
 import logging
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
+from sqlalchemy import func
 from bot.database.models import ContentHistory
 from bot.database.database import get_db
+from bot.database.migrations import content_history_fields
+from bot.services.activity_profile import activity_profile
 from bot.services.ai.openrouter import openrouter_api
 
 logger = logging.getLogger(__name__)
@@ -36,12 +39,26 @@ class PredictionService:
         try:
             # Анализируем историю пользователя
             with get_db() as db:
-                history = db.query(ContentHistory).filter(
+                content_history_fields.backfill_user(db, user_id)
+                recent = db.query(
+                    ContentHistory.id,
+                    ContentHistory.text_length,
+                    ContentHistory.hashtag_count
+                ).filter(
                     ContentHistory.user_id == user_id,
                     ContentHistory.content_type == "text"
-                ).order_by(ContentHistory.generated_at.desc()).limit(50).all()
+                ).order_by(
+                    ContentHistory.generated_at.desc(),
+                    ContentHistory.id.desc()
+                ).limit(50).subquery()
+                
+                history_count, avg_length, avg_hashtags = db.query(
+                    func.count(recent.c.id),
+                    func.avg(func.coalesce(recent.c.text_length, 0)),
+                    func.avg(func.coalesce(recent.c.hashtag_count, 0))
+                ).one()
             
-            if not history:
+            if not history_count:
                 return {
                     "success": True,
                     "predicted_reach": "средний",
@@ -50,11 +67,11 @@ class PredictionService:
                 }
             
             # Анализируем паттерны
-            avg_length = sum(len(str(item.content_data.get("text", ""))) for item in history) / len(history)
+            avg_length = float(avg_length or 0)
             current_length = len(text)
             
             # Анализируем хештеги
-            avg_hashtags = sum(len(item.content_data.get("hashtags", [])) if isinstance(item.content_data, dict) else 0 for item in history) / len(history)
+            avg_hashtags = float(avg_hashtags or 0)
             current_hashtags = len(hashtags)
             
             # Простой прогноз на основе паттернов
@@ -234,40 +251,29 @@ class PredictionService:
             Dict с рекомендациями по времени
         """
         try:
-            with get_db() as db:
-                history = db.query(ContentHistory).filter(
-                    ContentHistory.user_id == user_id
-                ).order_by(ContentHistory.generated_at.desc()).limit(100).all()
+            # Профиль активности по часам (в поясе пользователя), без чтения истории
+            hours, _ = activity_profile.hours_of_day(user_id)
             
-            if not history:
+            if not hours:
                 return {
                     "success": True,
                     "recommended_times": ["09:00", "14:00", "18:00"],
                     "message": "Рекомендуем стандартные времена публикаций"
                 }
             
-            # Анализируем время создания контента
-            hours = {}
-            for item in history:
-                hour = item.generated_at.hour
-                hours[hour] = hours.get(hour, 0) + 1
-            
             # Находим наиболее активные часы
             sorted_hours = sorted(hours.items(), key=lambda x: x[1], reverse=True)
             
             # Рекомендуем время на основе активности
-            if sorted_hours:
-                top_hours = [h for h, _ in sorted_hours[:3]]
-                recommended_times = [f"{h:02d}:00" for h in top_hours]
-            else:
-                recommended_times = ["09:00", "14:00", "18:00"]
+            top_hours = [h for h, _ in sorted_hours[:3]]
+            recommended_times = [f"{h:02d}:00" for h in top_hours]
             
             return {
                 "success": True,
                 "recommended_times": recommended_times,
                 "analysis": {
-                    "most_active_hour": sorted_hours[0][0] if sorted_hours else None,
-                    "activity_distribution": hours
+                    "most_active_hour": sorted_hours[0][0],
+                    "activity_distribution": {h: round(weight, 2) for h, weight in sorted(hours.items())}
                 }
             }
         
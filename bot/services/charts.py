@@ -0,0 +1,264 @@
+"""
+Графики аналитики: отрисовка в пуле процессов и кэш готовых картинок
+
+- matplotlib работает только в процессах пула (CHART_RENDER_WORKERS) через
+  объектный API (Figure), без глобального состояния pyplot; event loop
+  бота отрисовкой не занят.
+- Файл графика называется по (user_id, период, хеш данных): пока данные
+  не изменились, повторный запрос отдает готовый файл без отрисовки.
+  Одновременные запросы одного графика ждут одну отрисовку.
+- После первой отправки запоминается file_id Telegram: повторно
+  отправляется он, без загрузки файла (и без файла на диске).
+- Файлы старше CHART_CACHE_TTL_HOURS и сверх CHART_CACHE_MAX_FILES
+  (давно не запрашиваемые - первыми) удаляются после каждой отрисовки.
+"""
+import asyncio
+import hashlib
+import importlib.util
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+from bot.config import config
+
+logger = logging.getLogger(__name__)
+
+# Меняется вместе с оформлением графика: старые файлы перестают совпадать по ключу
+CHART_STYLE_VERSION = 1
+# Сколько file_id помнить
+MAX_FILE_IDS = 10000
+
+matplotlib_available = importlib.util.find_spec("matplotlib") is not None
+
+
+def _init_worker() -> None:
+    """Импортирует matplotlib в процессе пула один раз, до первой отрисовки"""
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure  # noqa: F401
+
+
+def render_activity_chart(dates: List[str], counts: List[int], period_days: int, path: str) -> str:
+    """
+    Рисует график активности (выполняется в процессе пула)
+
+    Args:
+        dates: Даты в формате ISO по возрастанию
+        counts: Количество постов по датам
+        period_days: Период в днях (для заголовка)
+        path: Куда сохранить PNG
+
+    Returns:
+        Путь к файлу
+    """
+    from datetime import date
+    import matplotlib.dates as mdates
+    from matplotlib.figure import Figure
+
+    days = [date.fromisoformat(value) for value in dates]
+
+    fig = Figure(figsize=(12, 6))
+    ax = fig.add_subplot()
+    ax.plot(days, counts, marker='o', linestyle='-', linewidth=2, markersize=5)
+    ax.fill_between(days, counts, alpha=0.3)
+    ax.set_title(f'Активность за {period_days} дней', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Дата', fontsize=12)
+    ax.set_ylabel('Количество постов', fontsize=12)
+    ax.grid(True, alpha=0.3)
+
+    # Форматируем даты
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
+    fig.autofmt_xdate()
+    fig.tight_layout()
+
+    # Запись во временный файл и переименование: читатель не увидит недописанный PNG
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fig.savefig(tmp_path, dpi=150, bbox_inches='tight', format='png')
+    os.replace(tmp_path, path)
+    return path
+
+
+@dataclass
+class Chart:
+    """Готовый график"""
+    key: str  # Имя файла: пользователь, период, хеш данных
+    path: Path
+    file_id: Optional[str] = None  # file_id Telegram, если график уже отправлялся
+
+
+class ChartService:
+    """Отрисовка графиков в пуле процессов с кэшем на диске и file_id Telegram"""
+
+    def __init__(self, charts_dir: Path, workers: int, ttl_hours: int, max_files: int):
+        """
+        Args:
+            charts_dir: Каталог файлов графиков
+            workers: Процессов отрисовки
+            ttl_hours: Время жизни файла графика
+            max_files: Максимум файлов в каталоге
+        """
+        self.charts_dir = charts_dir
+        self.charts_dir.mkdir(parents=True, exist_ok=True)
+        self.workers = workers
+        self.ttl = ttl_hours * 3600
+        self.max_files = max_files
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._rendering: Dict[str, asyncio.Future] = {}
+        self._file_ids: "OrderedDict[str, str]" = OrderedDict()
+
+    @staticmethod
+    def chart_key(user_id: int, period_days: int, data: Dict[str, int]) -> str:
+        """
+        Ключ графика: пользователь, период и хеш данных
+
+        Args:
+            user_id: ID пользователя
+            period_days: Период в днях
+            data: Данные графика {дата ISO: количество}
+
+        Returns:
+            Имя файла графика
+        """
+        payload = json.dumps([CHART_STYLE_VERSION, sorted(data.items())], separators=(",", ":"))
+        digest = hashlib.sha1(payload.encode()).hexdigest()[:16]
+        return f"activity_{user_id}_{period_days}_{digest}.png"
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: дочерний процесс не наследует потоки и соединения бота
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        return self._executor
+
+    def _cached(self, path: Path) -> bool:
+        """Есть ли свежий файл (обращение продлевает его жизнь в LRU)"""
+        try:
+            if time.time() - path.stat().st_mtime >= self.ttl:
+                return False
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def _render(self, key: str, data: Dict[str, int], period_days: int) -> Path:
+        path = self.charts_dir / key
+        dates = sorted(data)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(
+                self._pool(), render_activity_chart, dates, [data[day] for day in dates], period_days, str(path)
+            )
+        except BrokenProcessPool:
+            # Процесс пула упал (например, по памяти) - пересоздаем пул и пробуем еще раз
+            logger.warning("Пул отрисовки графиков перезапущен")
+            self._executor = None
+            await loop.run_in_executor(
+                self._pool(), render_activity_chart, dates, [data[day] for day in dates], period_days, str(path)
+            )
+        self._evict()
+        return path
+
+    async def activity_chart(self, user_id: int, period_days: int, data: Dict[str, int]) -> Optional[Chart]:
+        """
+        График активности пользователя (из кэша или новая отрисовка)
+
+        Args:
+            user_id: ID пользователя
+            period_days: Период в днях
+            data: Количество постов по дням {дата ISO: количество}
+
+        Returns:
+            Chart или None, если matplotlib не установлен
+        """
+        if not matplotlib_available:
+            logger.warning("matplotlib не установлен, график не может быть создан")
+            return None
+
+        key = self.chart_key(user_id, period_days, data)
+        path = self.charts_dir / key
+        # file_id остается действительным и после удаления файла
+        file_id = self._file_ids.get(key)
+        if file_id is not None:
+            self._file_ids.move_to_end(key)
+            return Chart(key, path, file_id)
+        if self._cached(path):
+            return Chart(key, path)
+
+        future = self._rendering.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._render(key, data, period_days))
+            self._rendering[key] = future
+            future.add_done_callback(lambda _: self._rendering.pop(key, None))
+        path = await asyncio.shield(future)
+        logger.info(f"График активности создан: {path}")
+        return Chart(key, path)
+
+    def remember_file_id(self, chart: Chart, file_id: str) -> None:
+        """
+        Запоминает file_id отправленного графика
+
+        Args:
+            chart: График
+            file_id: file_id фото из ответа Telegram
+        """
+        self._file_ids[chart.key] = file_id
+        self._file_ids.move_to_end(chart.key)
+        while len(self._file_ids) > MAX_FILE_IDS:
+            self._file_ids.popitem(last=False)
+
+    def _evict(self) -> int:
+        """
+        Удаляет устаревшие файлы и лишние - по давности последнего запроса
+
+        Returns:
+            Количество удаленных файлов
+        """
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.charts_dir):
+            if entry.is_file() and entry.name.endswith(".png"):
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+
+        files.sort()
+        expired = [item for item in files if now - item[0] >= self.ttl]
+        fresh = files[len(expired):]
+        excess = fresh[:max(len(fresh) - self.max_files, 0)]
+
+        removed = 0
+        for _, file_path in expired + excess:
+            try:
+                os.remove(file_path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        if removed:
+            logger.info(f"Удалено файлов графиков: {removed}")
+        return removed
+
+    def shutdown(self) -> None:
+        """Останавливает пул отрисовки"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Глобальный экземпляр
+chart_service = ChartService(
+    charts_dir=config.CHARTS_DIR,
+    workers=config.CHART_RENDER_WORKERS,
+    ttl_hours=config.CHART_CACHE_TTL_HOURS,
+    max_files=config.CHART_CACHE_MAX_FILES
+)
@@ -0,0 +1,205 @@
+"""
+Полнотекстовый поиск по сгенерированному контенту
+
+Индексируются текст поста (content_data['text'] или 'edited_text'),
+хештеги (content_data['hashtags']) и теги записи истории.
+
+- SQLite: виртуальная таблица FTS5 content_history_fts, которую поддерживают
+  триггеры на content_history (вставка, изменение, удаление); создается
+  миграцией 0008. Владелец записи индексируется токеном u<user_id>, поэтому
+  фильтр по пользователю выполняется пересечением списков в самом индексе FTS5. Русская морфология: термы запроса
+  приводятся к основе легким стеммером и ищутся как префиксы.
+- PostgreSQL: вычисляемая колонка search_vector (to_tsvector('russian', ...))
+  с GIN-индексом (миграция 0008); стемминг выполняет сам PostgreSQL.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List
+from sqlalchemy import text
+from bot.database.database import engine, get_db
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "content_history_fts"
+
+# Окончания для легкого стемминга русских слов (от длинных к коротким)
+_RU_ENDINGS = sorted([
+    "иями", "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "ешь", "ете", "ишь", "ите",
+    "ать", "ять", "еть", "ить", "ала", "ила", "ыла", "ела", "али", "или", "ыли", "ели",
+    "ость", "ости", "ение", "ения", "ений", "ием", "ией", "иях",
+    "ой", "ей", "ий", "ый", "ая", "яя", "ое", "ее", "ые", "ие", "ом", "ем", "ам", "ям",
+    "ах", "ях", "ую", "юю", "ов", "ев", "ью", "ия", "ие", "ии", "ет", "ит", "ут", "ют", "ат", "ят",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+], key=len, reverse=True)
+
+_MIN_STEM_LENGTH = 3
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def stem_russian(word: str) -> str:
+    """
+    Приводит слово к основе, отбрасывая самое длинное подходящее окончание
+
+    Args:
+        word: Слово в нижнем регистре
+
+    Returns:
+        Основа слова
+    """
+    for ending in _RU_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+@dataclass(frozen=True)
+class SearchResult:
+    """Найденная запись истории"""
+    history_id: int
+    content_type: str
+    generated_at: datetime
+    snippet: str
+
+
+@dataclass(frozen=True)
+class SearchPage:
+    """Страница результатов поиска"""
+    results: List[SearchResult]
+    has_more: bool
+
+
+class ContentSearchService:
+    """Поиск по истории контента пользователя"""
+
+    SNIPPET_START = "«"
+    SNIPPET_END = "»"
+
+    def __init__(self):
+        self.dialect = engine.dialect.name
+        self.available = False
+
+    def ensure_index(self) -> None:
+        """
+        Проверяет, что поисковый индекс создан (миграция 0008), и включает поиск
+
+        Индекс создают миграции Alembic; без него (SQLite без FTS5,
+        неподдерживаемая БД) поиск по контенту отключен.
+        """
+        try:
+            with get_db() as db:
+                if self.dialect == "sqlite":
+                    exists = db.execute(
+                        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                        {"name": FTS_TABLE}
+                    ).first()
+                elif self.dialect == "postgresql":
+                    exists = db.execute(text(
+                        "SELECT 1 FROM information_schema.columns "
+                        "WHERE table_name = 'content_history' AND column_name = 'search_vector'"
+                    )).first()
+                else:
+                    logger.warning(f"Полнотекстовый поиск не поддерживается для {self.dialect}")
+                    exists = None
+        except Exception as e:
+            logger.exception(f"Не удалось проверить поисковый индекс: {e}")
+            exists = None
+
+        self.available = exists is not None
+        if not self.available:
+            logger.warning("Поисковый индекс не создан - поиск по контенту отключен")
+
+    @staticmethod
+    def _query_terms(query: str) -> List[str]:
+        return [token.lower() for token in _TOKEN_RE.findall(query) if token.strip("_")]
+
+    def _build_fts_query(self, user_id: int, terms: List[str]) -> str:
+        """Формирует выражение MATCH: владелец И все термы запроса (как префиксы основ)"""
+        parts = [f'owner : "u{user_id}"']
+        for term in terms:
+            stem = stem_russian(term)
+            parts.append(f'"{stem}"*')
+        return " AND ".join(parts)
+
+    def search(self, user_id: int, query: str, offset: int = 0, limit: int = 5) -> SearchPage:
+        """
+        Ищет записи истории пользователя, отсортированные по релевантности
+
+        Args:
+            user_id: ID пользователя
+            query: Поисковый запрос
+            offset: Смещение (номер первого результата)
+            limit: Количество результатов на странице
+
+        Returns:
+            SearchPage
+        """
+        terms = self._query_terms(query)
+        if not terms or not self.available:
+            return SearchPage(results=[], has_more=False)
+
+        if self.dialect == "sqlite":
+            sql = text(f"""
+                SELECT h.id, h.content_type, h.generated_at,
+                       snippet({FTS_TABLE}, 1, :start, :end, '…', 12) AS snippet
+                FROM {FTS_TABLE}
+                JOIN content_history h ON h.id = {FTS_TABLE}.rowid
+                WHERE {FTS_TABLE} MATCH :match
+                ORDER BY bm25({FTS_TABLE}, 0.0, 10.0, 5.0, 5.0)
+                LIMIT :limit OFFSET :offset
+            """)
+            params = {"match": self._build_fts_query(user_id, terms)}
+        else:
+            # ts_headline дорогой, поэтому считаем его только для строк страницы
+            sql = text("""
+                SELECT page.id, page.content_type, page.generated_at,
+                       ts_headline('russian',
+                                   coalesce(page.content_data->>'text', page.content_data->>'edited_text', ''),
+                                   page.query,
+                                   'StartSel=' || :start || ', StopSel=' || :end || ', MaxWords=20, MinWords=8') AS snippet
+                FROM (
+                    SELECT h.id, h.content_type, h.generated_at, h.content_data, q.query,
+                           ts_rank_cd(h.search_vector, q.query) AS rank
+                    FROM content_history h, plainto_tsquery('russian', :query) AS q(query)
+                    WHERE h.user_id = :user_id AND h.search_vector @@ q.query
+                    ORDER BY rank DESC, h.id DESC
+                    LIMIT :limit OFFSET :offset
+                ) AS page
+                ORDER BY page.rank DESC, page.id DESC
+            """)
+            params = {"query": " ".join(terms), "user_id": user_id}
+
+        params.update({
+            "start": self.SNIPPET_START,
+            "end": self.SNIPPET_END,
+            # Берем на одну строку больше, чтобы узнать, есть ли следующая страница
+            "limit": limit + 1,
+            "offset": offset,
+        })
+
+        try:
+            with get_db() as db:
+                rows = db.execute(sql, params).all()
+        except Exception as e:
+            logger.exception(f"Ошибка полнотекстового поиска: {e}")
+            return SearchPage(results=[], has_more=False)
+
+        results = []
+        for row in rows[:limit]:
+            generated_at = row.generated_at
+            if isinstance(generated_at, str):
+                # SQLite в сыром SQL возвращает дату строкой
+                generated_at = datetime.fromisoformat(generated_at)
+            results.append(SearchResult(
+                history_id=row.id,
+                content_type=row.content_type,
+                generated_at=generated_at,
+                snippet=row.snippet or ""
+            ))
+
+        return SearchPage(results=results, has_more=len(rows) > limit)
+
+
+# Глобальный экземпляр
+content_search = ContentSearchService()
@@ -4,8 +4,12 @@
 import logging
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta, date
+from sqlalchemy import func
 from bot.database.models import ContentHistory, ContentPlan
 from bot.database.database import get_db
+from bot.database.migrations import content_history_fields
+from bot.database.plan_repository import plan_repository
+from bot.services.activity_profile import activity_profile
 from bot.services.ai.openrouter import openrouter_api
 
 logger = logging.getLogger(__name__)
@@ -26,27 +30,16 @@ class SmartPlanningService:
             Dict с рекомендациями по времени публикаций
         """
         try:
-            with get_db() as db:
-                # Получаем историю публикаций за последние 30 дней
-                month_ago = datetime.now() - timedelta(days=30)
-                history = db.query(ContentHistory).filter(
-                    ContentHistory.user_id == user_id,
-                    ContentHistory.generated_at >= month_ago
-                ).all()
+            # Профиль активности по часам (в поясе пользователя), без чтения истории
+            hours, events = activity_profile.hours_of_day(user_id)
             
-            if not history:
+            if not hours:
                 return {
                     "success": True,
                     "recommended_times": ["09:00", "14:00", "18:00"],
                     "message": "Недостаточно данных для анализа. Рекомендуем стандартные времена: 09:00, 14:00, 18:00"
                 }
             
-            # Анализируем время создания контента
-            hours = {}
-            for item in history:
-                hour = item.generated_at.hour
-                hours[hour] = hours.get(hour, 0) + 1
-            
             # Находим наиболее активные часы
             sorted_hours = sorted(hours.items(), key=lambda x: x[1], reverse=True)
             recommended_times = [f"{h:02d}:00" for h, _ in sorted_hours[:3]]
@@ -55,9 +48,9 @@ class SmartPlanningService:
                 "success": True,
                 "recommended_times": recommended_times,
                 "analysis": {
-                    "total_posts": len(history),
-                    "most_active_hour": sorted_hours[0][0] if sorted_hours else None,
-                    "activity_by_hour": hours
+                    "total_posts": events,
+                    "most_active_hour": sorted_hours[0][0],
+                    "activity_by_hour": {h: round(weight, 2) for h, weight in sorted(hours.items())}
                 }
             }
         
@@ -69,11 +62,39 @@ class SmartPlanningService:
                 "recommended_times": ["09:00", "14:00", "18:00"]
             }
     
+    @staticmethod
+    def get_post_type_usage(user_id: int) -> Dict[str, int]:
+        """
+        Считает посты пользователя по типам (новости, series, holiday и т.д.)
+        
+        Args:
+            user_id: ID пользователя
+        
+        Returns:
+            Dict {тип поста: количество}
+        """
+        with get_db() as db:
+            content_history_fields.backfill_user(db, user_id)
+            rows = db.query(
+                ContentHistory.post_type,
+                func.count(ContentHistory.id)
+            ).filter(
+                ContentHistory.user_id == user_id,
+                ContentHistory.content_type == "text"
+            ).group_by(ContentHistory.post_type).all()
+        
+        type_usage = {}
+        for post_type, count in rows:
+            post_type = post_type or 'новости'
+            type_usage[post_type] = type_usage.get(post_type, 0) + count
+        return type_usage
+    
     @staticmethod
     async def balance_content_types(
         content_types: List[str],
         count: int,
-        user_history: Optional[List[Dict]] = None
+        user_history: Optional[List[Dict]] = None,
+        type_usage: Optional[Dict[str, int]] = None
     ) -> List[str]:
         """
         Балансирует типы контента для равномерного распределения
@@ -82,6 +103,7 @@ class SmartPlanningService:
             content_types: Список типов контента
             count: Количество постов
             user_history: История пользователя для анализа предпочтений
+            type_usage: Готовая статистика типов (см. get_post_type_usage) вместо user_history
         
         Returns:
             Сбалансированный список типов контента
@@ -93,15 +115,16 @@ class SmartPlanningService:
         balanced = []
         types_count = len(content_types)
         
-        # Если есть история, учитываем предпочтения
-        if user_history:
+        if type_usage is None and user_history:
             # Анализируем популярные типы
             type_usage = {}
             for item in user_history:
                 content_data = item.get('content_data', {})
                 content_type = content_data.get('type', 'новости')
                 type_usage[content_type] = type_usage.get(content_type, 0) + 1
-            
+        
+        # Если есть история, учитываем предпочтения
+        if type_usage:
             # Взвешиваем типы
             weighted_types = []
             for ctype in content_types:
@@ -148,22 +171,19 @@ class SmartPlanningService:
                 if not plan:
                     return {"success": False, "error": "План не найден"}
                 
-                schedule = plan.schedule if isinstance(plan.schedule, dict) else {}
-                dates = schedule.get("dates", [])
-                topics = schedule.get("topics", "любые")
-                
-                if not dates:
-                    return {"success": False, "error": "В плане нет дат"}
+            slots = plan_repository.get_plan_slots(plan_id)
+            if not slots:
+                return {"success": False, "error": "В плане нет дат"}
             
             generated_posts = []
             
             # Генерируем пост для каждой даты
-            for i, date_str in enumerate(dates, 1):
+            for slot in slots:
                 try:
-                    post_date = datetime.fromisoformat(date_str).date() if isinstance(date_str, str) else date_str
+                    post_date = slot.date
                     
                     # Формируем тему поста
-                    topic = topics if isinstance(topics, str) else topics[i % len(topics)] if topics else "Пост для НКО"
+                    topic = slot.topic or "Пост для НКО"
                     
                     # Генерируем пост
                     nko_info = ""
@@ -211,9 +231,9 @@ class SmartPlanningService:
                     await asyncio.sleep(1)
                 
                 except Exception as e:
-                    logger.error(f"Ошибка при генерации текста для даты {date_str}: {e}")
+                    logger.error(f"Ошибка при генерации текста для даты {slot.date}: {e}")
                     generated_posts.append({
-                        "date": date_str,
+                        "date": slot.date.isoformat(),
                         "topic": topic,
                         "text": None,
                         "success": False,
@@ -257,36 +277,32 @@ class SmartPlanningService:
                 if not plan:
                     return {"success": False, "error": "План не найден"}
                 
-                schedule = plan.schedule if isinstance(plan.schedule, dict) else {}
-                dates = schedule.get("dates", [])
+                total_posts = plan_repository.count_slots(db, plan_id)
                 
                 # Подсчитываем выполненные посты
                 plan_start = plan.start_date
                 plan_end = plan.end_date
                 
-                completed = db.query(ContentHistory).filter(
+                # Посты за период плана по типам - одним агрегирующим запросом
+                content_history_fields.backfill_user(db, user_id)
+                type_rows = db.query(
+                    ContentHistory.post_type,
+                    func.count(ContentHistory.id)
+                ).filter(
                     ContentHistory.user_id == user_id,
                     ContentHistory.content_type == "text",
                     ContentHistory.generated_at >= datetime.combine(plan_start, datetime.min.time()),
                     ContentHistory.generated_at <= datetime.combine(plan_end, datetime.min.time()) + timedelta(days=1)
-                ).count()
-                
-                total_posts = len(dates) if dates else 0
-                completion_percentage = (completed / total_posts * 100) if total_posts > 0 else 0
+                ).group_by(ContentHistory.post_type).all()
                 
                 # Анализ разнообразия контента
                 content_types = {}
-                posts = db.query(ContentHistory).filter(
-                    ContentHistory.user_id == user_id,
-                    ContentHistory.content_type == "text",
-                    ContentHistory.generated_at >= datetime.combine(plan_start, datetime.min.time()),
-                    ContentHistory.generated_at <= datetime.combine(plan_end, datetime.min.time()) + timedelta(days=1)
-                ).all()
+                for post_type, count in type_rows:
+                    post_type = post_type or 'новости'
+                    content_types[post_type] = content_types.get(post_type, 0) + count
                 
-                for post in posts:
-                    content_data = post.content_data if isinstance(post.content_data, dict) else {}
-                    post_type = content_data.get('type', 'новости')
-                    content_types[post_type] = content_types.get(post_type, 0) + 1
+                completed = sum(content_types.values())
+                completion_percentage = (completed / total_posts * 100) if total_posts > 0 else 0
                 
                 # Рекомендации
                 recommendations = []
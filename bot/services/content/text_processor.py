@@ -6,21 +6,28 @@ import re
 import json
 from typing import List, Optional, Dict, Any
 from collections import Counter
-try:
-    import textstat
-except ImportError:
-    textstat = None
-    logging.warning("textstat не установлен, проверка читаемости будет недоступна")
-try:
-    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-    vader_available = True
-except ImportError:
-    vader_available = False
-    logging.warning("vaderSentiment не установлен, анализ тональности будет через AI")
+from bot.utils.lazy import lazy_import
+
+textstat = lazy_import("textstat", "textstat не установлен, проверка читаемости будет недоступна")
+vader = lazy_import(
+    "vaderSentiment.vaderSentiment",
+    "vaderSentiment не установлен, анализ тональности будет через AI"
+)
 
 logger = logging.getLogger(__name__)
 
 
+_analyzer = None
+
+
+def _sentiment_analyzer():
+    """Анализатор VaderSentiment (словарь загружается один раз)"""
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = vader.SentimentIntensityAnalyzer()
+    return _analyzer
+
+
 class TextProcessor:
     """Класс для обработки текста"""
     
@@ -207,7 +214,7 @@ class TextProcessor:
         Returns:
             Dict с показателями читаемости
         """
-        if textstat is None:
+        if not textstat.available:
             return {
                 "readability_score": None,
                 "readability_level": "Недоступно (textstat не установлен)",
@@ -511,9 +518,9 @@ async def suggest_emojis(text: str, count: int = 4) -> List[Dict[str, Any]]:
         Returns:
             Dict с анализом тональности
         """
-        if vader_available:
+        if vader.available:
             try:
-                analyzer = SentimentIntensityAnalyzer()
+                analyzer = _sentiment_analyzer()
                 # VaderSentiment работает лучше с английским, но можно попробовать
                 scores = analyzer.polarity_scores(text)
                 
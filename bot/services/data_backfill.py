@@ -0,0 +1,77 @@
+"""
+Фоновый перенос данных после изменения схемы
+
+Перенос старых записей в новые колонки и таблицы (см. bot.database.backfill)
+не задерживает старт: init_db только обновляет схему, а эта задача
+планировщика после запуска бота обрабатывает переносы по одной пачке
+с паузой между ними. Прогресс хранится в backfill_progress, поэтому после
+перезапуска перенос продолжается с того же места.
+
+Пока перенос не завершен, запросы по новым колонкам сначала переносят
+записи своего пользователя (backfill_user в bot.database.migrations).
+"""
+import asyncio
+import logging
+from typing import Callable, List, Tuple
+from bot.config import config
+from bot.database.database import engine
+from bot.database.migrations import content_history_fields, plan_schedule
+
+logger = logging.getLogger(__name__)
+
+JOB_ID = "data_backfill"
+
+# Переносы в порядке выполнения: планов немного, они переносятся первыми
+BACKFILLS: List[Tuple[str, Callable[..., int]]] = [
+    (plan_schedule.BACKFILL_NAME, plan_schedule.backfill),
+    (content_history_fields.BACKFILL_NAME, content_history_fields.backfill),
+]
+
+
+class DataBackfill:
+    """Выполнение переносов данных пачками в фоне"""
+
+    def __init__(self, pause_ms: int):
+        """
+        Args:
+            pause_ms: Пауза между пачками в миллисекундах
+        """
+        self.pause = pause_ms / 1000
+
+    async def _call(self, func_, *args, **kwargs):
+        """Выполняет синхронную работу с БД, не блокируя event loop на PostgreSQL"""
+        if config.DATABASE_URL.startswith("sqlite"):
+            # SQLite работает через одно соединение (StaticPool) - только в потоке loop'а
+            return func_(*args, **kwargs)
+        return await asyncio.to_thread(func_, *args, **kwargs)
+
+    async def run(self) -> int:
+        """
+        Выполняет все незавершенные переносы до конца
+
+        Returns:
+            Количество обработанных строк
+        """
+        total = 0
+        for name, backfill in BACKFILLS:
+            try:
+                while processed := await self._call(backfill, engine, max_batches=1):
+                    total += processed
+                    await asyncio.sleep(self.pause)
+            except Exception as e:
+                # Прогресс сохранен: перенос продолжится при следующем запуске
+                logger.exception(f"Ошибка переноса {name}: {e}")
+        return total
+
+    def start(self, scheduler) -> None:
+        """
+        Запускает переносы задачей планировщика (один раз, сразу после старта)
+
+        Args:
+            scheduler: AsyncIOScheduler
+        """
+        scheduler.add_job(self.run, id=JOB_ID, replace_existing=True, max_instances=1)
+
+
+# Глобальный экземпляр
+data_backfill = DataBackfill(pause_ms=config.DATA_BACKFILL_PAUSE_MS)
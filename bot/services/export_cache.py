@@ -0,0 +1,219 @@
+"""
+Кэш файлов экспорта и очистка каталога data/exports
+
+- Имя файла экспорта строится по (user_id, формат, фильтр, версия данных):
+  версия - max(id) и количество записей истории пользователя или
+  max(updated_at) его планов. Пока данные не изменились, повторный
+  запрос отдает готовый файл без экспорта; одновременные запросы одного
+  файла ждут один экспорт.
+- После первой отправки запоминается file_id Telegram: повторно
+  отправляется он, без загрузки файла (и без файла на диске).
+- Файлы старше EXPORT_CACHE_TTL_HOURS (с последнего запроса) и сверх
+  EXPORT_CACHE_MAX_FILES / EXPORT_CACHE_MAX_MB (давно не запрашиваемые -
+  первыми) удаляет фоновая задача раз в EXPORT_CACHE_CLEANUP_MINUTES.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+from telegram import Message
+from bot.config import config
+
+logger = logging.getLogger(__name__)
+
+JOB_ID = "export_cache_cleanup"
+# Сколько file_id помнить
+MAX_FILE_IDS = 10000
+
+
+class ExportCache:
+    """Файлы экспорта по версии данных с file_id Telegram и ограничением каталога"""
+
+    def __init__(self, exports_dir: Path, ttl_hours: int, max_files: int, max_mb: int):
+        """
+        Args:
+            exports_dir: Каталог файлов экспорта
+            ttl_hours: Время жизни файла с последнего запроса
+            max_files: Максимум файлов в каталоге
+            max_mb: Максимальный общий размер файлов, МБ
+        """
+        self.exports_dir = exports_dir
+        self.ttl = ttl_hours * 3600
+        self.max_files = max_files
+        self.max_bytes = max_mb * 1024 * 1024
+        self._creating: Dict[str, asyncio.Future] = {}
+        self._file_ids: "OrderedDict[str, str]" = OrderedDict()
+
+    @staticmethod
+    def artifact_name(prefix: str, user_id: int, extension: str, *parts: Any) -> str:
+        """
+        Имя файла экспорта: префикс, пользователь и хеш формата, фильтра и версии данных
+
+        Args:
+            prefix: Что экспортируется (history, texts, content_plans...)
+            user_id: ID пользователя
+            extension: Расширение файла без точки
+            *parts: Фильтр и версия данных (сериализуемые в JSON)
+
+        Returns:
+            Имя файла
+        """
+        payload = json.dumps([extension, *parts], separators=(",", ":"), default=str)
+        digest = hashlib.sha1(payload.encode()).hexdigest()[:16]
+        return f"{prefix}_{user_id}_{digest}.{extension}"
+
+    def _cached(self, path: Path) -> bool:
+        """Есть ли свежий файл (обращение продлевает его жизнь в LRU)"""
+        try:
+            if time.time() - path.stat().st_mtime >= self.ttl:
+                return False
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def artifact(self, name: str, create: Callable[[str], Awaitable[Optional[Path]]]) -> Optional[Path]:
+        """
+        Файл экспорта из кэша или новый экспорт
+
+        Args:
+            name: Имя файла (см. artifact_name)
+            create: Экспорт в файл с этим именем, create(name) -> Path или None
+
+        Returns:
+            Path к файлу или None. Если известен file_id, файла на диске
+            может уже не быть - отправлять через send()
+        """
+        path = self.exports_dir / name
+        if name in self._file_ids or self._cached(path):
+            logger.debug(f"Экспорт из кэша: {name}")
+            return path
+
+        future = self._creating.get(name)
+        if future is None:
+            future = asyncio.ensure_future(create(name))
+            self._creating[name] = future
+            future.add_done_callback(lambda _: self._creating.pop(name, None))
+        return await asyncio.shield(future)
+
+    async def send(self, message: Message, path: Path, caption: str) -> bool:
+        """
+        Отправляет файл экспорта ответом на сообщение (по file_id, если он известен)
+
+        Args:
+            message: Сообщение, на которое отвечаем
+            path: Файл экспорта
+            caption: Подпись
+
+        Returns:
+            False, если файла уже нет и file_id неизвестен
+        """
+        file_id = self._file_ids.get(path.name)
+        if file_id is not None:
+            self._file_ids.move_to_end(path.name)
+            await message.reply_document(document=file_id, filename=path.name, caption=caption)
+            return True
+
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return False
+        with f:
+            sent = await message.reply_document(document=f, filename=path.name, caption=caption)
+        if sent.document:
+            self._file_ids[path.name] = sent.document.file_id
+            while len(self._file_ids) > MAX_FILE_IDS:
+                self._file_ids.popitem(last=False)
+        return True
+
+    def cleanup(self) -> int:
+        """
+        Удаляет устаревшие файлы и лишние - по давности последнего запроса
+
+        Незавершенные экспорты (.part, каталоги пакетного экспорта)
+        удаляются только по сроку жизни.
+
+        Returns:
+            Количество удаленных файлов
+        """
+        now = time.time()
+        files = []
+        stale_dirs = []
+        for entry in os.scandir(self.exports_dir):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            expired = now - stat.st_mtime >= self.ttl
+            if entry.is_dir():
+                if expired:
+                    stale_dirs.append(entry.path)
+            elif entry.name.endswith(".part"):
+                if expired:
+                    files.append((0, 0, entry.path))
+            else:
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        files.sort()
+        expired = [item for item in files if now - item[0] >= self.ttl]
+        fresh = files[len(expired):]
+        total = sum(size for _, size, _ in fresh)
+        excess = []
+        for item in fresh:
+            if len(fresh) - len(excess) <= self.max_files and total <= self.max_bytes:
+                break
+            excess.append(item)
+            total -= item[1]
+
+        removed = 0
+        for _, _, file_path in expired + excess:
+            try:
+                os.remove(file_path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        for dir_path in stale_dirs:
+            shutil.rmtree(dir_path, ignore_errors=True)
+        if removed or stale_dirs:
+            logger.info(f"Удалено файлов экспорта: {removed}, каталогов: {len(stale_dirs)}")
+        return removed
+
+    async def _run_job(self) -> None:
+        try:
+            await asyncio.to_thread(self.cleanup)
+        except Exception as e:
+            logger.exception(f"Ошибка при очистке файлов экспорта: {e}")
+
+    def start(self, scheduler, interval_minutes: int) -> None:
+        """
+        Регистрирует периодическую очистку каталога в планировщике
+
+        Args:
+            scheduler: AsyncIOScheduler
+            interval_minutes: Период запуска в минутах
+        """
+        scheduler.add_job(
+            self._run_job,
+            trigger="interval",
+            minutes=interval_minutes,
+            id=JOB_ID,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        logger.info(f"Очистка файлов экспорта запланирована каждые {interval_minutes} мин.")
+
+
+# Глобальный экземпляр
+export_cache = ExportCache(
+    exports_dir=config.EXPORTS_DIR,
+    ttl_hours=config.EXPORT_CACHE_TTL_HOURS,
+    max_files=config.EXPORT_CACHE_MAX_FILES,
+    max_mb=config.EXPORT_CACHE_MAX_MB
+)
@@ -0,0 +1,370 @@
+"""
+Очистка (ретеншн) истории контента
+
+Политики задаются по типу контента: максимум записей на пользователя и
+максимальный возраст записи. Избранное не удаляется и в лимит не входит,
+как и записи, которые расшарены в команду или привязаны к публикации плана.
+
+Удаляемые записи переносятся в content_history_archive (JSON, сжатый zlib),
+а файлы изображений этих записей удаляются с диска, если на них больше
+не ссылается ни одна запись.
+
+Очистка инкрементальная: задача планировщика за один запуск обходит не более
+HISTORY_RETENTION_USERS_PER_RUN пользователей (продолжая с места прошлого
+запуска), а каждая транзакция переносит не более HISTORY_RETENTION_BATCH_SIZE
+записей, с паузой между транзакциями - длинных блокировок нет.
+"""
+import asyncio
+import json
+import logging
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, exists, func, insert, or_
+from sqlalchemy.orm import Session
+from bot.config import config
+from bot.database.models import (
+    ContentHistory,
+    ContentHistoryArchive,
+    ContentHistoryHashtag,
+    PlanSlot,
+    SharedContent
+)
+from bot.database.database import get_db
+from bot.database.migrations import content_history_fields
+
+logger = logging.getLogger(__name__)
+
+JOB_ID = "history_retention"
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """Политика хранения для одного типа контента"""
+    max_items: Optional[int]  # None - без лимита количества
+    max_age_days: Optional[int]  # None - без ограничения по возрасту
+
+
+def default_policies() -> Dict[str, RetentionPolicy]:
+    """Политики по умолчанию из настроек"""
+    max_age_days = config.HISTORY_RETENTION_DAYS or None
+    return {
+        "text": RetentionPolicy(max_items=config.MAX_HISTORY_ITEMS, max_age_days=max_age_days),
+        "plan": RetentionPolicy(max_items=config.MAX_HISTORY_ITEMS, max_age_days=max_age_days),
+        "image": RetentionPolicy(max_items=config.MAX_HISTORY_IMAGES, max_age_days=max_age_days),
+    }
+
+
+class HistoryRetention:
+    """Перенос устаревших записей истории в архив"""
+
+    def __init__(
+        self,
+        policies: Dict[str, RetentionPolicy],
+        batch_size: int,
+        users_per_run: int,
+        pause_ms: int
+    ):
+        """
+        Args:
+            policies: Политики по типам контента
+            batch_size: Записей в одной транзакции
+            users_per_run: Пользователей за один запуск
+            pause_ms: Пауза между транзакциями в миллисекундах
+        """
+        self.policies = policies
+        self.batch_size = batch_size
+        self.users_per_run = users_per_run
+        self.pause = pause_ms / 1000
+        # Последний обработанный пользователь: следующий запуск продолжает после него
+        self._cursor = 0
+        self._running = False
+
+    @staticmethod
+    def _prunable(query, content_type: str):
+        """Ограничивает выборку записями, которые политика может удалить"""
+        return query.filter(
+            ContentHistory.content_type == content_type,
+            ContentHistory.is_favorite != True,
+            ~exists().where(SharedContent.content_history_id == ContentHistory.id),
+            ~exists().where(PlanSlot.generated_history_id == ContentHistory.id)
+        )
+
+    def _cutoff(self, policy: RetentionPolicy) -> Optional[datetime]:
+        if not policy.max_age_days:
+            return None
+        # generated_at хранится в UTC
+        return datetime.utcnow() - timedelta(days=policy.max_age_days)
+
+    def find_users(self, db: Session, after_user_id: int, limit: int) -> List[int]:
+        """
+        Пользователи (по возрастанию ID после after_user_id), у которых есть что очищать
+
+        Args:
+            db: Сессия БД
+            after_user_id: Продолжить после этого пользователя
+            limit: Максимум пользователей
+
+        Returns:
+            Список ID пользователей
+        """
+        conditions = []
+        for content_type, policy in self.policies.items():
+            having = []
+            if policy.max_items is not None:
+                having.append(func.count(ContentHistory.id) > policy.max_items)
+            cutoff = self._cutoff(policy)
+            if cutoff is not None:
+                having.append(func.min(ContentHistory.generated_at) < cutoff)
+            if having:
+                conditions.append(and_(ContentHistory.content_type == content_type, or_(*having)))
+
+        if not conditions:
+            return []
+
+        rows = db.query(ContentHistory.user_id).filter(
+            ContentHistory.user_id > after_user_id,
+            ContentHistory.content_type.in_(list(self.policies)),
+            ContentHistory.is_favorite != True
+        ).group_by(
+            ContentHistory.user_id,
+            ContentHistory.content_type
+        ).having(
+            or_(*conditions)
+        ).order_by(ContentHistory.user_id).limit(limit * len(self.policies)).all()
+
+        user_ids = []
+        for (user_id,) in rows:
+            if user_id not in user_ids:
+                user_ids.append(user_id)
+        return user_ids[:limit]
+
+    def _candidates(self, db: Session, user_id: int) -> List[Tuple[int, str]]:
+        """Следующая пачка (id, причина) записей пользователя на перенос в архив"""
+        candidates: List[Tuple[int, str]] = []
+
+        for content_type, policy in self.policies.items():
+            remaining = self.batch_size - len(candidates)
+            if remaining <= 0:
+                break
+
+            base = self._prunable(
+                db.query(ContentHistory.id).filter(ContentHistory.user_id == user_id),
+                content_type
+            )
+
+            cutoff = self._cutoff(policy)
+            if cutoff is not None:
+                rows = base.filter(
+                    ContentHistory.generated_at < cutoff
+                ).order_by(ContentHistory.generated_at).limit(remaining).all()
+                candidates.extend((row.id, "age") for row in rows)
+                remaining = self.batch_size - len(candidates)
+
+            if policy.max_items is not None and remaining > 0:
+                taken = {history_id for history_id, _ in candidates}
+                rows = base.order_by(
+                    ContentHistory.generated_at.desc(),
+                    ContentHistory.id.desc()
+                ).offset(policy.max_items).limit(remaining + len(taken)).all()
+                candidates.extend((row.id, "limit") for row in rows if row.id not in taken)
+
+        return candidates[:self.batch_size]
+
+    def _archive_batch(self, user_id: int) -> Tuple[int, List[str]]:
+        """
+        Переносит одну пачку записей пользователя в архив (одна короткая транзакция)
+
+        Returns:
+            (количество перенесенных записей, пути файлов удаленных записей)
+        """
+        with get_db() as db:
+            candidates = self._candidates(db, user_id)
+            if not candidates:
+                return 0, []
+
+            # В архив попадают типизированные поля и хештеги - переносим их, если фон еще не успел
+            content_history_fields.backfill_user(db, user_id)
+
+            reasons = dict(candidates)
+            ids = list(reasons)
+
+            items = db.query(ContentHistory).filter(ContentHistory.id.in_(ids)).all()
+            hashtags: Dict[int, List[str]] = {}
+            for history_id, hashtag in db.query(
+                ContentHistoryHashtag.content_history_id,
+                ContentHistoryHashtag.hashtag
+            ).filter(ContentHistoryHashtag.content_history_id.in_(ids)):
+                hashtags.setdefault(history_id, []).append(hashtag)
+
+            archive_rows = []
+            file_paths = []
+            for item in items:
+                payload = {
+                    "id": item.id,
+                    "user_id": item.user_id,
+                    "content_type": item.content_type,
+                    "content_data": item.content_data,
+                    "extra_data": item.extra_data,
+                    "tags": item.tags,
+                    "is_saved": item.is_saved,
+                    "is_favorite": item.is_favorite,
+                    "style": item.style,
+                    "post_type": item.post_type,
+                    "file_path": item.file_path,
+                    "hashtags": hashtags.get(item.id, []),
+                    "generated_at": item.generated_at.isoformat() if item.generated_at else None,
+                }
+                archive_rows.append({
+                    "id": item.id,
+                    "user_id": item.user_id,
+                    "content_type": item.content_type,
+                    "generated_at": item.generated_at,
+                    "reason": reasons[item.id],
+                    "payload": zlib.compress(json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")),
+                })
+                if item.file_path:
+                    file_paths.append(item.file_path)
+
+            db.execute(insert(ContentHistoryArchive), archive_rows)
+            # Хештеги удаляются каскадом, индекс полнотекстового поиска - триггером
+            db.query(ContentHistory).filter(
+                ContentHistory.id.in_(ids)
+            ).delete(synchronize_session=False)
+
+        return len(archive_rows), file_paths
+
+    @staticmethod
+    def _delete_orphan_files(file_paths: List[str]) -> int:
+        """Удаляет файлы изображений, на которые больше не ссылается ни одна запись"""
+        if not file_paths:
+            return 0
+
+        with get_db() as db:
+            referenced = {
+                row.file_path for row in db.query(ContentHistory.file_path).filter(
+                    ContentHistory.file_path.in_(file_paths)
+                )
+            }
+
+        images_dir = Path(config.IMAGES_DIR).resolve()
+        deleted = 0
+        for file_path in set(file_paths) - referenced:
+            path = Path(file_path)
+            if not path.is_absolute():
+                path = Path(config.BASE_DIR) / path
+            path = path.resolve()
+            # Удаляем только файлы из каталога изображений бота
+            if images_dir not in path.parents:
+                continue
+            try:
+                path.unlink()
+                deleted += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Не удалось удалить файл {path}: {e}")
+        return deleted
+
+    async def _call(self, func_, *args):
+        """Выполняет синхронную работу с БД, не блокируя event loop на PostgreSQL"""
+        if config.DATABASE_URL.startswith("sqlite"):
+            # SQLite работает через одно соединение (StaticPool) - только в потоке loop'а
+            return func_(*args)
+        return await asyncio.to_thread(func_, *args)
+
+    async def prune_user(self, user_id: int) -> int:
+        """
+        Переносит в архив все записи пользователя, нарушающие политики
+
+        Args:
+            user_id: ID пользователя
+
+        Returns:
+            Количество перенесенных записей
+        """
+        total = 0
+        while True:
+            archived, file_paths = await self._call(self._archive_batch, user_id)
+            if not archived:
+                break
+            total += archived
+            await self._call(self._delete_orphan_files, file_paths)
+            await asyncio.sleep(self.pause)
+        return total
+
+    async def run_once(self) -> int:
+        """
+        Один инкрементальный проход очистки
+
+        Returns:
+            Количество перенесенных в архив записей
+        """
+        if self._running:
+            return 0
+        self._running = True
+        total = 0
+        try:
+            def find() -> List[int]:
+                with get_db() as db:
+                    return self.find_users(db, self._cursor, self.users_per_run)
+
+            user_ids = await self._call(find)
+            for user_id in user_ids:
+                total += await self.prune_user(user_id)
+                self._cursor = user_id
+
+            if len(user_ids) < self.users_per_run:
+                # Дошли до конца списка пользователей - следующий проход с начала
+                self._cursor = 0
+
+            if total:
+                logger.info(f"Очистка истории: в архив перенесено записей: {total}")
+        except Exception as e:
+            logger.exception(f"Ошибка при очистке истории: {e}")
+        finally:
+            self._running = False
+        return total
+
+    def start(self, scheduler, interval_minutes: int) -> None:
+        """
+        Регистрирует периодическую задачу очистки в планировщике
+
+        Args:
+            scheduler: AsyncIOScheduler
+            interval_minutes: Период запуска в минутах
+        """
+        scheduler.add_job(
+            self.run_once,
+            trigger="interval",
+            minutes=interval_minutes,
+            id=JOB_ID,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        logger.info(f"Очистка истории запланирована каждые {interval_minutes} мин.")
+
+
+def load_archived(payload: bytes) -> dict:
+    """
+    Распаковывает запись из content_history_archive
+
+    Args:
+        payload: Значение колонки payload
+
+    Returns:
+        Dict с данными исходной записи
+    """
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+# Глобальный экземпляр
+history_retention = HistoryRetention(
+    policies=default_policies(),
+    batch_size=config.HISTORY_RETENTION_BATCH_SIZE,
+    users_per_run=config.HISTORY_RETENTION_USERS_PER_RUN,
+    pause_ms=config.HISTORY_RETENTION_PAUSE_MS
+)
@@ -0,0 +1,325 @@
+"""
+Отложенная (write-behind) запись истории контента
+
+Обработчики не открывают собственную сессию БД для каждой записи ContentHistory,
+а ставят строку в очередь. Фоновая задача сбрасывает очередь пакетными INSERT
+каждые HISTORY_FLUSH_INTERVAL_MS миллисекунд или при накоплении
+HISTORY_FLUSH_BATCH_SIZE строк. При остановке бота очередь сбрасывается полностью.
+В той же транзакции обновляются профили активности пользователей
+(bot.services.activity_profile).
+
+Чтение собственных записей: перед чтением истории пользователя вызывайте
+await history_writer.flush_user(user_id) - отложенные строки этого пользователя
+будут записаны до выполнения запроса (на PostgreSQL - в потоке, без блокировки
+event loop). В синхронном коде вне loop'а - flush_user_sync.
+
+Если пакет не записывается из-за данных (нарушение внешнего ключа и т.п.),
+каждая его строка получает попытку; после HISTORY_WRITE_MAX_ATTEMPTS
+неудач пакет пишется по одной строке, а строка, которая так и не
+записалась, отбрасывается с ошибкой в логе. Недоступность БД
+(OperationalError) попыткой не считается - пакет ждет следующего сброса.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from bot.config import config
+from bot.database.models import ContentHistory, ContentHistoryHashtag
+from bot.database.database import get_db
+from bot.database.history_fields import extract_history_fields, extract_hashtags
+from bot.services.activity_profile import activity_profile
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryWriter:
+    """Буфер записей истории с пакетным сбросом в БД"""
+
+    def __init__(self, flush_interval_ms: int, batch_size: int, max_attempts: int):
+        """
+        Args:
+            flush_interval_ms: Максимальная задержка записи в миллисекундах
+            batch_size: Количество строк, при котором сброс запускается досрочно
+            max_attempts: Неудачных попыток записи строки до записи по одной и отбрасывания
+        """
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._pending: Deque[Dict[str, Any]] = deque()
+        # Неудачные попытки записи строк, оставшихся в очереди: id(строки) -> количество
+        self._attempts: Dict[int, int] = {}
+        # _lock защищает только очередь, _write_lock держится на всё время INSERT:
+        # flush_user дожидается уже начатой записи и видит её результат,
+        # а enqueue никогда не ждёт БД
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def enqueue(
+        self,
+        user_id: int,
+        content_type: str,
+        content_data: Dict[str, Any],
+        tags: Optional[List[str]] = None,
+        extra_data: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Ставит запись истории в очередь на сохранение
+
+        Args:
+            user_id: ID пользователя
+            content_type: Тип контента (text, image, plan)
+            content_data: Данные контента
+            tags: Теги для поиска
+            extra_data: Дополнительные данные
+        """
+        row = self.make_row(user_id, content_type, content_data, tags, extra_data)
+
+        if self._task is None:
+            # Фоновая задача не запущена (скрипты, сервисы вне бота) - пишем сразу
+            self._write([row])
+            return
+
+        with self._lock:
+            self._pending.append(row)
+            pending_count = len(self._pending)
+
+        if pending_count >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    @staticmethod
+    def make_row(
+        user_id: int,
+        content_type: str,
+        content_data: Dict[str, Any],
+        tags: Optional[List[str]] = None,
+        extra_data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Строка content_history с типизированными полями из content_data
+
+        Raises:
+            TypeError: content_data, tags или extra_data не сериализуются в JSON -
+                такая строка не записалась бы и задержала бы очередь
+        """
+        for name, value in (("content_data", content_data), ("tags", tags), ("extra_data", extra_data)):
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError) as e:
+                raise TypeError(f"{name} записи истории не сериализуется в JSON: {e}") from e
+
+        row = {
+            "user_id": user_id,
+            "content_type": content_type,
+            "content_data": content_data,
+            "extra_data": extra_data,
+            "tags": tags,
+            # Время генерации фиксируем в момент постановки в очередь, а не сброса.
+            # UTC - как у server_default func.now() в SQLite
+            "generated_at": datetime.utcnow(),
+        }
+        row.update(extract_history_fields(content_data))
+        return row
+
+    @staticmethod
+    def insert(db: Session, rows: List[Dict[str, Any]]) -> List[int]:
+        """
+        Пакетный INSERT (executemany) истории и её хештегов в транзакции вызывающего
+
+        Args:
+            db: Сессия БД
+            rows: Строки (см. make_row)
+
+        Returns:
+            ID записей в порядке строк
+        """
+        ids = db.execute(
+            insert(ContentHistory).returning(ContentHistory.id, sort_by_parameter_order=True),
+            rows
+        ).scalars().all()
+
+        hashtag_rows = [
+            {"content_history_id": history_id, "user_id": row["user_id"], "hashtag": hashtag}
+            for history_id, row in zip(ids, rows)
+            for hashtag in extract_hashtags(row["content_data"])
+        ]
+        if hashtag_rows:
+            db.execute(insert(ContentHistoryHashtag), hashtag_rows)
+        return ids
+
+    async def flush_user(self, user_id: int) -> int:
+        """
+        Записывает отложенные строки пользователя (перед чтением его истории)
+
+        Ошибка записи не прерывает чтение: строки остаются в очереди
+        фоновой записи, запрос увидит историю без них.
+
+        Args:
+            user_id: ID пользователя
+
+        Returns:
+            Количество записанных строк
+        """
+        try:
+            if config.DATABASE_URL.startswith("sqlite"):
+                # SQLite работает через одно соединение (StaticPool) - только в потоке loop'а
+                return self.flush_user_sync(user_id)
+            # _write_lock может держать фоновая запись - ждем её в потоке, а не в loop'е
+            return await asyncio.to_thread(self.flush_user_sync, user_id)
+        except Exception as e:
+            logger.exception(f"Ошибка при записи истории пользователя {user_id}: {e}")
+            return 0
+
+    def flush_user_sync(self, user_id: int) -> int:
+        """
+        Синхронно записывает отложенные строки пользователя (из потока или скрипта)
+
+        Args:
+            user_id: ID пользователя
+
+        Returns:
+            Количество записанных строк
+        """
+        with self._write_lock:
+            with self._lock:
+                rows = [row for row in self._pending if row["user_id"] == user_id]
+                if not rows:
+                    return 0
+                remaining = [row for row in self._pending if row["user_id"] != user_id]
+                self._pending.clear()
+                self._pending.extend(remaining)
+            self._write_or_requeue(rows)
+        return len(rows)
+
+    def flush(self) -> int:
+        """
+        Синхронно записывает все отложенные строки
+
+        Returns:
+            Количество записанных строк
+        """
+        with self._write_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                rows = list(self._pending)
+                self._pending.clear()
+            self._write_or_requeue(rows)
+        return len(rows)
+
+    def _write_or_requeue(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Записывает строки, а при ошибке возвращает их в начало очереди
+
+        Строки, не записанные max_attempts раз, пишутся по одной:
+        строка, которая снова не записалась, отбрасывается.
+        """
+        try:
+            self._write(rows)
+        except OperationalError:
+            # БД недоступна - это не ошибка строк, пакет ждет следующего сброса
+            self._requeue(rows)
+            raise
+        except Exception as e:
+            error = e
+        else:
+            for row in rows:
+                self._attempts.pop(id(row), None)
+            return
+
+        for row in rows:
+            self._attempts[id(row)] = self._attempts.get(id(row), 0) + 1
+        if max(self._attempts[id(row)] for row in rows) < self.max_attempts:
+            self._requeue(rows)
+            raise error
+
+        # Пакет не записывается max_attempts раз подряд - ищем строку-виновника
+        retry = []
+        for index, row in enumerate(rows):
+            try:
+                self._write([row])
+            except OperationalError:
+                retry.extend(rows[index:])
+                break
+            except Exception as e:
+                if self._attempts[id(row)] >= self.max_attempts:
+                    self._attempts.pop(id(row))
+                    logger.error(
+                        f"Запись истории отброшена после {self.max_attempts} попыток "
+                        f"(user_id={row['user_id']}, тип {row['content_type']}): {e}; "
+                        f"данные: {str(row['content_data'])[:500]}"
+                    )
+                else:
+                    retry.append(row)
+            else:
+                self._attempts.pop(id(row), None)
+        if retry:
+            self._requeue(retry)
+            raise error
+
+    def _requeue(self, rows: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._pending.extendleft(reversed(rows))
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        """Выполняет пакетный INSERT (executemany) истории и её хештегов одной транзакцией"""
+        with get_db() as db:
+            self.insert(db, rows)
+            activity_profile.record(db, rows)
+
+    async def _run(self) -> None:
+        """Фоновый цикл сброса очереди"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                if config.DATABASE_URL.startswith("sqlite"):
+                    # SQLite работает через одно соединение (StaticPool), которое
+                    # нельзя делить с другим потоком посреди транзакции
+                    written = self.flush()
+                else:
+                    written = await asyncio.to_thread(self.flush)
+                if written:
+                    logger.debug(f"Записано {written} записей истории")
+            except Exception as e:
+                logger.exception(f"Ошибка при пакетной записи истории: {e}")
+
+    def start(self) -> None:
+        """Запускает фоновую задачу сброса (нужен работающий event loop)"""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info("Отложенная запись истории запущена")
+
+    async def stop(self) -> None:
+        """Останавливает фоновую задачу и сбрасывает оставшиеся строки"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        written = self.flush()
+        logger.info(f"Отложенная запись истории остановлена, сброшено записей: {written}")
+
+
+# Глобальный экземпляр
+history_writer = HistoryWriter(
+    flush_interval_ms=config.HISTORY_FLUSH_INTERVAL_MS,
+    batch_size=config.HISTORY_FLUSH_BATCH_SIZE,
+    max_attempts=config.HISTORY_WRITE_MAX_ATTEMPTS
+)
@@ -4,8 +4,13 @@
 import logging
 from typing import Optional, List, Tuple
 from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont
 import io
+from bot.utils.lazy import lazy_import
+
+# Pillow импортируется при первой обработке изображения
+Image = lazy_import("PIL.Image")
+ImageDraw = lazy_import("PIL.ImageDraw")
+ImageFont = lazy_import("PIL.ImageFont")
 
 logger = logging.getLogger(__name__)
 
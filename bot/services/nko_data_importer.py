@@ -5,7 +5,6 @@ import logging
 import json
 import re
 from typing import Optional, Dict, Any
-import requests
 
 logger = logging.getLogger(__name__)
 
@@ -0,0 +1,566 @@
+"""
+Отправка исходящих сообщений с учетом лимитов Telegram
+
+Напоминания, уведомления и рассылки отправляются не напрямую через
+context.bot, а через диспетчер:
+
+- лимиты - token bucket на бота (OUTBOX_GLOBAL_RATE сообщений в секунду)
+  и на чат (OUTBOX_CHAT_RATE в секунду для личных чатов,
+  OUTBOX_GROUP_RATE_PER_MINUTE в минуту для групп);
+- приоритеты - из чатов, которым лимит позволяет отправку, первым
+  обслуживается сообщение с меньшим OutboxPriority: интерактивные
+  уведомления раньше напоминаний, напоминания раньше массовых рассылок;
+- RetryAfter от Telegram приостанавливает чат на указанное время, сообщение
+  отправляется повторно; сетевые ошибки повторяются до OUTBOX_MAX_ATTEMPTS
+  раз, а недоставляемые сообщения (бот заблокирован, чат не найден)
+  отбрасываются;
+- очередь в БД - напоминания и рассылки (enqueue, enqueue_many) сначала
+  записываются в outbox_messages и удаляются после доставки, поэтому
+  переживают перезапуск. Доставка "хотя бы один раз": после аварийной
+  остановки сообщения, отправленные за последние OUTBOX_POLL_INTERVAL
+  секунд, могут прийти повторно.
+
+send() - интерактивная отправка с ожиданием результата: в БД не пишется.
+
+В многопроцессном режиме (WORKER_PROCESSES > 1) общий лимит делится
+между процессами, а сообщения из очереди в БД отправляет процесс, который
+обслуживает чат (chat_id по модулю числа процессов, как в shard_for):
+остальные процессы только записывают их в БД.
+"""
+import asyncio
+import enum
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import delete, insert, select, update
+from telegram import Bot, InlineKeyboardMarkup, Message
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+from bot.config import config
+from bot.database.database import get_db
+from bot.database.models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+# Максимум одновременно отправляемых запросов
+MAX_IN_FLIGHT = 64
+# Сколько лимитов чатов помнить (давно не использованные и восстановившиеся забываются)
+MAX_CHAT_BUCKETS = 10000
+
+
+class OutboxPriority(enum.IntEnum):
+    """Приоритет исходящего сообщения: меньше - раньше"""
+    INTERACTIVE = 0  # Уведомления в ответ на действия пользователей
+    REMINDER = 1  # Напоминания
+    BULK = 2  # Массовые рассылки и результаты пакетных задач
+
+
+class TokenBucket:
+    """Token bucket: rate отправок в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько секунд ждать до следующей разрешенной отправки"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now: float) -> bool:
+        """Восстановился ли запас полностью (новый bucket вел бы себя так же)"""
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+    def pause(self, seconds: float, now: float) -> None:
+        """Запрещает отправку на seconds секунд (RetryAfter)"""
+        self._refill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class _Outgoing:
+    """Сообщение в очереди диспетчера"""
+
+    __slots__ = ("chat_id", "priority", "seq", "text", "options", "row_id", "attempts", "future")
+
+    def __init__(
+        self,
+        chat_id: int,
+        priority: int,
+        seq: int,
+        text: str,
+        options: Dict[str, Any],
+        row_id: Optional[int] = None,
+        attempts: int = 0,
+        future: Optional[asyncio.Future] = None
+    ):
+        self.chat_id = chat_id
+        self.priority = priority
+        self.seq = seq
+        self.text = text
+        self.options = options
+        self.row_id = row_id
+        self.attempts = attempts
+        self.future = future
+
+
+class _ChatQueue:
+    """Сообщения одного чата, его лимит и признак отправки"""
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.items: List[Tuple[int, int, _Outgoing]] = []
+        self.busy = False
+
+    def head(self) -> Optional[Tuple[int, int]]:
+        return self.items[0][:2] if self.items else None
+
+
+def _dump_options(options: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Параметры send_message в виде, пригодном для JSON"""
+    if not options:
+        return None
+    result = dict(options)
+    if isinstance(result.get("reply_markup"), InlineKeyboardMarkup):
+        result["reply_markup"] = result["reply_markup"].to_dict()
+    return result
+
+
+class OutboundDispatcher:
+    """Диспетчер исходящих сообщений: лимиты, приоритеты, повторы и очередь в БД"""
+
+    def __init__(
+        self,
+        global_rate: float,
+        chat_rate: float,
+        group_rate_per_minute: int,
+        max_attempts: int,
+        poll_interval: float
+    ):
+        """
+        Args:
+            global_rate: Сообщений в секунду на бота
+            chat_rate: Сообщений в секунду в личный чат
+            group_rate_per_minute: Сообщений в минуту в группу
+            max_attempts: Попыток отправки при сетевых ошибках
+            poll_interval: Секунд между удалениями доставленных из БД
+                (и опросом очереди в многопроцессном режиме)
+        """
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate_per_minute / 60
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._bot: Optional[Bot] = None
+        self._worker_index = 0
+        self._workers = 1
+        self._global = TokenBucket(global_rate, 1)
+        self._seq = itertools.count()
+        self._chats: Dict[int, _ChatQueue] = {}
+        # Лимиты чатов переживают опустошение очереди чата: иначе следующее
+        # сообщение получало бы новый bucket и отправлялось без паузы
+        self._buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        # Чаты, готовые к отправке: (приоритет, seq первого сообщения, chat_id);
+        # ожидающие лимита чата: (время готовности, chat_id). Устаревшие записи
+        # пропускаются при извлечении
+        self._ready: List[Tuple[int, int, int]] = []
+        self._waiting: List[Tuple[float, int]] = []
+        # Строки БД, которые уже в памяти, и доставленные (ждут удаления)
+        self._queued_rows: Set[int] = set()
+        self._delivered_rows: List[int] = []
+        self._last_loaded_row = 0
+        self._load_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._in_flight: Set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(MAX_IN_FLIGHT)
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._housekeeper: Optional[asyncio.Task] = None
+
+    async def _call(self, func_, *args):
+        """Выполняет синхронную работу с БД, не блокируя event loop на PostgreSQL"""
+        if config.DATABASE_URL.startswith("sqlite"):
+            # SQLite работает через одно соединение (StaticPool) - только в потоке loop'а
+            return func_(*args)
+        return await asyncio.to_thread(func_, *args)
+
+    @property
+    def running(self) -> bool:
+        return self._dispatcher is not None
+
+    def owns(self, chat_id: int) -> bool:
+        """Отправляет ли этот процесс сообщения чата из очереди в БД"""
+        return chat_id % self._workers == self._worker_index
+
+    # --- Постановка в очередь ---
+
+    async def send(
+        self,
+        chat_id: int,
+        text: str,
+        priority: OutboxPriority = OutboxPriority.INTERACTIVE,
+        **options
+    ) -> Message:
+        """
+        Отправляет сообщение с учетом лимитов и дожидается доставки (без записи в БД)
+
+        Args:
+            chat_id: ID чата
+            text: Текст сообщения
+            priority: Приоритет
+            **options: Параметры send_message (parse_mode, reply_markup и т.п.)
+
+        Returns:
+            Отправленное сообщение
+
+        Raises:
+            TelegramError: Сообщение не доставлено
+        """
+        if not self.running:
+            raise RuntimeError("Диспетчер исходящих сообщений не запущен")
+        future = asyncio.get_running_loop().create_future()
+        self._push(_Outgoing(chat_id, priority, next(self._seq), text, options, future=future))
+        return await future
+
+    async def enqueue(
+        self,
+        chat_id: int,
+        text: str,
+        priority: OutboxPriority = OutboxPriority.REMINDER,
+        **options
+    ) -> None:
+        """
+        Ставит сообщение в очередь в БД; оно будет отправлено и после перезапуска
+
+        Args:
+            chat_id: ID чата
+            text: Текст сообщения
+            priority: Приоритет
+            **options: Параметры send_message (должны сериализоваться в JSON;
+                InlineKeyboardMarkup преобразуется автоматически)
+        """
+        await self.enqueue_many([(chat_id, text)], priority, **options)
+
+    async def enqueue_many(
+        self,
+        messages: Iterable[Tuple[int, str]],
+        priority: OutboxPriority = OutboxPriority.BULK,
+        **options
+    ) -> int:
+        """
+        Ставит в очередь в БД пакет сообщений одной транзакцией
+
+        Args:
+            messages: Пары (chat_id, текст)
+            priority: Приоритет
+            **options: Параметры send_message для всех сообщений
+
+        Returns:
+            Количество поставленных сообщений
+        """
+        dumped = _dump_options(options)
+        rows = [
+            {"chat_id": chat_id, "priority": int(priority), "text": text, "options": dumped, "attempts": 0}
+            for chat_id, text in messages
+        ]
+        if not rows:
+            return 0
+
+        async with self._load_lock:
+            ids = await self._call(self._insert_rows, rows)
+            if self.running:
+                for row_id, row in zip(ids, rows):
+                    if self.owns(row["chat_id"]):
+                        self._push_row(row_id, row)
+        return len(rows)
+
+    def _insert_rows(self, rows: List[Dict[str, Any]]) -> List[int]:
+        with get_db() as db:
+            return db.execute(
+                insert(OutboxMessage).returning(OutboxMessage.id, sort_by_parameter_order=True),
+                rows
+            ).scalars().all()
+
+    def _push_row(self, row_id: int, row: Dict[str, Any]) -> None:
+        options = dict(row["options"] or {})
+        if isinstance(options.get("reply_markup"), dict):
+            options["reply_markup"] = InlineKeyboardMarkup.de_json(options["reply_markup"], self._bot)
+        self._queued_rows.add(row_id)
+        # Порядок внутри приоритета - порядок записи в БД
+        self._push(_Outgoing(
+            row["chat_id"], row["priority"], next(self._seq), row["text"], options,
+            row_id=row_id, attempts=row["attempts"]
+        ))
+
+    def _bucket(self, chat_id: int, now: float) -> TokenBucket:
+        """Лимит чата (LRU: недавно использованные - в конце)"""
+        bucket = self._buckets.get(chat_id)
+        if bucket is not None:
+            self._buckets.move_to_end(chat_id)
+            return bucket
+
+        # Группы и каналы (отрицательный chat_id) - не чаще group_rate
+        rate = self.chat_rate if chat_id > 0 else self.group_rate
+        bucket = self._buckets[chat_id] = TokenBucket(rate, 1)
+        excess = len(self._buckets) - MAX_CHAT_BUCKETS
+        if excess > 0:
+            # Забываются только восстановившиеся лимиты чатов без сообщений в очереди
+            stale = []
+            for old_chat_id, old_bucket in self._buckets.items():
+                if len(stale) >= excess:
+                    break
+                if old_chat_id != chat_id and old_chat_id not in self._chats and old_bucket.full(now):
+                    stale.append(old_chat_id)
+            for old_chat_id in stale:
+                del self._buckets[old_chat_id]
+        return bucket
+
+    def _push(self, item: _Outgoing) -> None:
+        chat = self._chats.get(item.chat_id)
+        if chat is None:
+            chat = self._chats[item.chat_id] = _ChatQueue(self._bucket(item.chat_id, time.monotonic()))
+        heapq.heappush(chat.items, (item.priority, item.seq, item))
+        if not chat.busy and chat.head() == (item.priority, item.seq):
+            self._schedule(item.chat_id, chat, time.monotonic())
+        self._wakeup.set()
+
+    def _schedule(self, chat_id: int, chat: _ChatQueue, now: float) -> None:
+        delay = chat.bucket.delay(now)
+        if delay > 0:
+            heapq.heappush(self._waiting, (now + delay, chat_id))
+        else:
+            priority, seq = chat.head()
+            heapq.heappush(self._ready, (priority, seq, chat_id))
+
+    # --- Отправка ---
+
+    def _next(self, now: float) -> Optional[_Outgoing]:
+        """Извлекает самое приоритетное сообщение из чатов, которым позволяет лимит"""
+        while self._waiting and self._waiting[0][0] <= now:
+            _, chat_id = heapq.heappop(self._waiting)
+            chat = self._chats.get(chat_id)
+            if chat is not None and not chat.busy and chat.items:
+                self._schedule(chat_id, chat, now)
+
+        while self._ready:
+            priority, seq, chat_id = heapq.heappop(self._ready)
+            chat = self._chats.get(chat_id)
+            if chat is None or chat.busy or chat.head() != (priority, seq):
+                continue
+            if chat.bucket.delay(now) > 0:
+                # Чат приостановлен (RetryAfter) после постановки в готовые
+                self._schedule(chat_id, chat, now)
+                continue
+            _, _, item = heapq.heappop(chat.items)
+            chat.bucket.consume(now)
+            chat.busy = True
+            return item
+        return None
+
+    async def _dispatch(self) -> None:
+        """Главный цикл: выдает сообщения с учетом общего лимита и лимитов чатов"""
+        while True:
+            await self._slots.acquire()
+            now = time.monotonic()
+            delay = self._global.delay(now)
+            if delay > 0:
+                self._slots.release()
+                await asyncio.sleep(delay)
+                continue
+
+            item = self._next(now)
+            if item is None:
+                self._slots.release()
+                self._wakeup.clear()
+                timeout = self._waiting[0][0] - now if self._waiting else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._global.consume(now)
+            task = asyncio.create_task(self._deliver(item))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _deliver(self, item: _Outgoing) -> None:
+        """Отправляет одно сообщение и решает, повторять ли его"""
+        chat = self._chats[item.chat_id]
+        retry = False
+        try:
+            message = await self._bot.send_message(item.chat_id, item.text, **item.options)
+        except RetryAfter as e:
+            logger.warning(f"Исходящие: чат {item.chat_id} приостановлен на {e.retry_after} с (RetryAfter)")
+            chat.bucket.pause(float(e.retry_after), time.monotonic())
+            retry = True
+        except (Forbidden, BadRequest) as e:
+            logger.warning(f"Исходящие: сообщение в чат {item.chat_id} не доставлено: {e}")
+            self._done(item, error=e)
+        except NetworkError as e:
+            item.attempts += 1
+            if item.attempts >= self.max_attempts:
+                logger.error(f"Исходящие: сообщение в чат {item.chat_id} не доставлено после {item.attempts} попыток: {e}")
+                self._done(item, error=e)
+            else:
+                chat.bucket.pause(2 ** item.attempts, time.monotonic())
+                retry = True
+                if item.row_id is not None:
+                    await self._call(self._save_attempts, item.row_id, item.attempts)
+        except Exception as e:
+            logger.exception(f"Исходящие: ошибка отправки в чат {item.chat_id}: {e}")
+            self._done(item, error=e)
+        else:
+            self._done(item, message=message)
+        finally:
+            self._slots.release()
+            if retry:
+                heapq.heappush(chat.items, (item.priority, item.seq, item))
+            chat.busy = False
+            if chat.items:
+                self._schedule(item.chat_id, chat, time.monotonic())
+            else:
+                del self._chats[item.chat_id]
+            self._wakeup.set()
+
+    def _done(self, item: _Outgoing, message: Optional[Message] = None, error: Optional[Exception] = None) -> None:
+        """Завершает сообщение: доставлено или отброшено"""
+        if item.row_id is not None:
+            self._queued_rows.discard(item.row_id)
+            self._delivered_rows.append(item.row_id)
+        if item.future is not None and not item.future.done():
+            if error is not None:
+                item.future.set_exception(error)
+            else:
+                item.future.set_result(message)
+
+    def _save_attempts(self, row_id: int, attempts: int) -> None:
+        with get_db() as db:
+            db.execute(update(OutboxMessage).where(OutboxMessage.id == row_id).values(attempts=attempts))
+
+    # --- Очередь в БД ---
+
+    def _select_new_rows(self, after_id: int) -> List[Tuple[int, int, int, str, Any, int]]:
+        with get_db() as db:
+            return db.execute(
+                select(
+                    OutboxMessage.id, OutboxMessage.chat_id, OutboxMessage.priority,
+                    OutboxMessage.text, OutboxMessage.options, OutboxMessage.attempts
+                ).where(OutboxMessage.id > after_id).order_by(OutboxMessage.id)
+            ).all()
+
+    def _delete_rows(self, row_ids: List[int]) -> None:
+        with get_db() as db:
+            db.execute(delete(OutboxMessage).where(OutboxMessage.id.in_(row_ids)))
+
+    async def _load_new(self) -> int:
+        """Загружает в память новые сообщения очереди в БД, которые отправляет этот процесс"""
+        async with self._load_lock:
+            rows = await self._call(self._select_new_rows, self._last_loaded_row)
+            loaded = 0
+            for row_id, chat_id, priority, text, options, attempts in rows:
+                self._last_loaded_row = max(self._last_loaded_row, row_id)
+                if row_id in self._queued_rows or not self.owns(chat_id):
+                    continue
+                self._push_row(row_id, {
+                    "chat_id": chat_id, "priority": priority, "text": text,
+                    "options": options, "attempts": attempts
+                })
+                loaded += 1
+            return loaded
+
+    async def _flush_delivered(self) -> None:
+        """Удаляет из БД доставленные и отброшенные сообщения"""
+        if not self._delivered_rows:
+            return
+        row_ids, self._delivered_rows = self._delivered_rows, []
+        try:
+            for start in range(0, len(row_ids), 500):
+                await self._call(self._delete_rows, row_ids[start:start + 500])
+        except Exception as e:
+            logger.exception(f"Исходящие: ошибка удаления доставленных сообщений: {e}")
+            self._delivered_rows.extend(row_ids)
+
+    async def _housekeep(self) -> None:
+        """Периодически удаляет доставленные и (в многопроцессном режиме) забирает новые сообщения"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await self._flush_delivered()
+            if self._workers > 1:
+                try:
+                    await self._load_new()
+                except Exception as e:
+                    logger.exception(f"Исходящие: ошибка чтения очереди: {e}")
+
+    # --- Запуск и остановка ---
+
+    async def start(self, bot: Bot, worker_index: int = 0, workers: int = 1) -> None:
+        """
+        Запускает отправку и загружает недоставленные сообщения из БД
+
+        Args:
+            bot: Бот для отправки
+            worker_index: Номер процесса-обработчика (0 в однопроцессном режиме)
+            workers: Количество процессов-обработчиков
+        """
+        self._bot = bot
+        self._worker_index = max(worker_index, 0)
+        self._workers = max(workers, 1)
+        # Без накопленного запаса: Telegram считает сообщения в каждую секунду
+        self._global = TokenBucket(self.global_rate / self._workers, 1)
+        self._dispatcher = asyncio.create_task(self._dispatch(), name="outbox_dispatcher")
+        self._housekeeper = asyncio.create_task(self._housekeep(), name="outbox_housekeeper")
+
+        loaded = await self._load_new()
+        if loaded:
+            logger.info(f"Исходящие: недоставленных сообщений в очереди: {loaded}")
+
+    async def stop(self) -> None:
+        """
+        Останавливает отправку: отправляемые сообщения дожидаются результата,
+        неотправленные из очереди в БД будут отправлены после запуска
+        """
+        for task in (self._dispatcher, self._housekeeper):
+            if task is not None:
+                task.cancel()
+        self._dispatcher = self._housekeeper = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        await self._flush_delivered()
+
+        for chat in self._chats.values():
+            for _, _, item in chat.items:
+                if item.future is not None and not item.future.done():
+                    item.future.set_exception(RuntimeError("Диспетчер исходящих сообщений остановлен"))
+        self._chats.clear()
+        self._ready.clear()
+        self._waiting.clear()
+        self._queued_rows.clear()
+        self._last_loaded_row = 0
+
+    def pending(self) -> int:
+        """Количество сообщений, ожидающих отправки в этом процессе"""
+        return sum(len(chat.items) for chat in self._chats.values())
+
+
+# Глобальный экземпляр
+outbox = OutboundDispatcher(
+    global_rate=config.OUTBOX_GLOBAL_RATE,
+    chat_rate=config.OUTBOX_CHAT_RATE,
+    group_rate_per_minute=config.OUTBOX_GROUP_RATE_PER_MINUTE,
+    max_attempts=config.OUTBOX_MAX_ATTEMPTS,
+    poll_interval=config.OUTBOX_POLL_INTERVAL
+)
@@ -0,0 +1,353 @@
+"""
+Черновики постов контент-планов, подготовленные заранее
+
+Фоновая задача в часы низкой нагрузки (PLAN_DRAFT_OFFPEAK_HOURS, по Москве)
+находит публикации планов, напоминание о которых придет в ближайшие
+PLAN_DRAFT_LOOKAHEAD_HOURS часов, и генерирует для них пост (текст,
+хештеги и, при PLAN_DRAFT_IMAGES, картинку) обычными сервисами генерации.
+Черновик сохраняется в историю и привязывается к публикации
+(PlanSlot.generated_history_id, статус generated) - напоминание приходит
+уже с готовым постом.
+
+- Публикации с контентом (статус не planned или есть generated_history_id)
+  пропускаются; привязка выполняется условным UPDATE, поэтому уже
+  заполненная публикация не перезаписывается.
+- Бюджет API: не больше PLAN_DRAFT_MAX_PER_RUN черновиков за запуск
+  и PLAN_DRAFT_DAILY_LIMIT в сутки (UTC, в пределах процесса), пауза
+  PLAN_DRAFT_DELAY_SECONDS между генерациями; после нескольких ошибок
+  API подряд запуск прекращается до следующей проверки.
+- Пользователи с выключенными напоминаниями пропускаются.
+
+Выполняется в процессе напоминаний (в многопроцессном режиме - процесс 0).
+"""
+import asyncio
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import select, update
+from bot.config import config
+from bot.database.database import get_db
+from bot.database.models import ContentPlan, NotificationSettings, PlanSlot, PlanSlotStatus
+from bot.services.ai.image_ai import image_ai_service
+from bot.services.ai.openrouter import openrouter_api
+from bot.services.content.hashtag_generator import hashtag_generator
+from bot.services.content.text_processor import text_processor
+from bot.services.history_writer import history_writer
+from bot.services.plan_reminders import get_timezone, utc_offset_minutes
+from bot.services.user_cache import user_cache
+
+logger = logging.getLogger(__name__)
+
+JOB_ID = "plan_drafts"
+# Ошибок генерации подряд, после которых запуск прекращается (нет средств, API недоступен)
+MAX_CONSECUTIVE_FAILURES = 3
+
+
+def parse_hours(value: str) -> Optional[Tuple[int, int]]:
+    """
+    Разбирает окно часов вида "1-7" (с 01:00 до 07:00, может переходить через полночь)
+
+    Args:
+        value: Строка окна
+
+    Returns:
+        (начало, конец) или None - без ограничения
+    """
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        start, end = (int(part) % 24 for part in value.split("-", 1))
+    except ValueError:
+        logger.warning(f"Некорректное окно часов {value!r}, черновики готовятся круглосуточно")
+        return None
+    return start, end
+
+
+def in_window(hour: int, window: Optional[Tuple[int, int]]) -> bool:
+    """Попадает ли час в окно (см. parse_hours)"""
+    if window is None:
+        return True
+    start, end = window
+    if start == end:
+        return True
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+class PlanDraftService:
+    """Заблаговременная генерация постов для ближайших публикаций планов"""
+
+    def __init__(
+        self,
+        lookahead_hours: int,
+        offpeak_hours: str,
+        max_per_run: int,
+        daily_limit: int,
+        delay_seconds: float,
+        images: bool
+    ):
+        """
+        Args:
+            lookahead_hours: Для публикаций в ближайшие N часов
+            offpeak_hours: Часы работы по Москве, например "1-7" (пусто - круглосуточно)
+            max_per_run: Черновиков за один запуск
+            daily_limit: Черновиков в сутки
+            delay_seconds: Пауза между генерациями
+            images: Генерировать картинку к посту
+        """
+        self.lookahead = timedelta(hours=lookahead_hours)
+        self.window = parse_hours(offpeak_hours)
+        self.max_per_run = max_per_run
+        self.daily_limit = daily_limit
+        self.delay = delay_seconds
+        self.images = images
+        self._day: Optional[date] = None
+        self._drafted_today = 0
+
+    async def _call(self, func_, *args):
+        """Выполняет синхронную работу с БД, не блокируя event loop на PostgreSQL"""
+        if config.DATABASE_URL.startswith("sqlite"):
+            # SQLite работает через одно соединение (StaticPool) - только в потоке loop'а
+            return func_(*args)
+        return await asyncio.to_thread(func_, *args)
+
+    def _budget(self, now: datetime) -> int:
+        """Сколько черновиков еще можно сгенерировать в этом запуске"""
+        if self._day != now.date():
+            self._day = now.date()
+            self._drafted_today = 0
+        return max(min(self.max_per_run, self.daily_limit - self._drafted_today), 0)
+
+    def _candidates(self, now: datetime, limit: int) -> List[Dict[str, Any]]:
+        """
+        Публикации без контента, напоминание о которых придет в ближайшие часы
+
+        Args:
+            now: Текущее время UTC
+            limit: Максимум публикаций
+
+        Returns:
+            Публикации по возрастанию времени напоминания
+        """
+        until = now + self.lookahead
+        with get_db() as db:
+            rows = db.execute(
+                select(
+                    PlanSlot.id,
+                    PlanSlot.plan_id,
+                    PlanSlot.user_id,
+                    PlanSlot.date,
+                    PlanSlot.time,
+                    PlanSlot.topic,
+                    NotificationSettings.timezone,
+                    NotificationSettings.reminder_time,
+                    NotificationSettings.reminder_enabled
+                )
+                .join(ContentPlan, ContentPlan.id == PlanSlot.plan_id)
+                .outerjoin(NotificationSettings, NotificationSettings.user_id == PlanSlot.user_id)
+                .where(
+                    PlanSlot.status == PlanSlotStatus.PLANNED.value,
+                    # Пояса пользователей сдвигают дату не больше чем на сутки
+                    PlanSlot.date.between((now - timedelta(days=1)).date(), (until + timedelta(days=1)).date()),
+                    PlanSlot.generated_history_id.is_(None),
+                    ContentPlan.is_active.is_(True)
+                )
+            ).all()
+
+        slots = []
+        offsets: Dict[Optional[str], int] = {}
+        for slot_id, plan_id, user_id, slot_date, slot_time, topic, timezone_name, reminder_time, reminder_enabled in rows:
+            if reminder_enabled is False:
+                continue
+            # Напоминание приходит во время публикации по текущему смещению пояса (как в plan_reminders)
+            if timezone_name not in offsets:
+                offsets[timezone_name] = utc_offset_minutes(get_timezone(timezone_name))
+            local = datetime.combine(slot_date, slot_time or reminder_time or time(9, 0))
+            due = local - timedelta(minutes=offsets[timezone_name])
+            if now < due <= until:
+                slots.append({
+                    "id": slot_id,
+                    "plan_id": plan_id,
+                    "user_id": user_id,
+                    "date": slot_date,
+                    "topic": topic,
+                    "due": due,
+                })
+        slots.sort(key=lambda slot: slot["due"])
+        return slots[:limit]
+
+    async def _generate(self, slot: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Генерирует пост для публикации
+
+        Args:
+            slot: Публикация (см. _candidates)
+
+        Returns:
+            content_data черновика или None при ошибке генерации
+        """
+        topic = slot["topic"] or "Пост для НКО"
+        nko_profile = user_cache.get_active_profile(slot["user_id"])
+
+        nko_info = ""
+        if nko_profile:
+            if nko_profile.organization_name:
+                nko_info += f"Организация: {nko_profile.organization_name}. "
+            if nko_profile.description:
+                nko_info += f"Деятельность: {nko_profile.description[:200]}. "
+
+        prompt = f"""Создай пост для некоммерческой организации на тему: {topic}
+
+{nko_info}
+
+Требования:
+- Живой, естественный язык
+- Абзацы - ОБЯЗАТЕЛЬНО (разделяй пустой строкой)
+- 80-120 слов
+- Одна тема
+- Естественные переходы
+- Уместные эмоции
+- Простота языка
+- Без хештегов"""
+
+        result = await openrouter_api.generate_text(
+            prompt=prompt,
+            system_prompt="Ты эксперт по созданию контента для некоммерческих организаций.",
+            temperature=0.8,
+            max_tokens=300
+        )
+        if not result or not result.get("success") or not result.get("content"):
+            return None
+
+        text = text_processor.format_for_telegram(result["content"])
+        hashtags = await hashtag_generator.generate_hashtags(
+            text=text,
+            nko_profile=nko_profile,
+            count=5,
+            use_ai=True
+        )
+
+        draft = {
+            "text": text,
+            "hashtags": hashtags,
+            "type": "plan_draft",
+            "topic": topic,
+            "plan_id": slot["plan_id"],
+            "plan_date": slot["date"].isoformat(),
+            "auto_generated": True
+        }
+
+        if self.images:
+            image = await image_ai_service.generate_image(
+                prompt=f"Иллюстрация к посту некоммерческой организации на тему: {topic}",
+                style="realistic",
+                aspect_ratio="1:1",
+                user_id=slot["user_id"]
+            )
+            if image and image.get("success"):
+                draft["file_path"] = image.get("file_path")
+        return draft
+
+    def _attach(self, slot: Dict[str, Any], draft: Dict[str, Any]) -> bool:
+        """
+        Сохраняет черновик в историю и привязывает к публикации одной транзакцией
+
+        Returns:
+            False, если у публикации уже появился контент (черновик не сохраняется)
+        """
+        with get_db() as db:
+            claimed = db.execute(
+                update(PlanSlot).where(
+                    PlanSlot.id == slot["id"],
+                    PlanSlot.status == PlanSlotStatus.PLANNED.value,
+                    PlanSlot.generated_history_id.is_(None)
+                ).values(status=PlanSlotStatus.GENERATED.value)
+            ).rowcount
+            if not claimed:
+                return False
+
+            row = history_writer.make_row(slot["user_id"], "text", draft, tags=draft["hashtags"])
+            history_id = history_writer.insert(db, [row])[0]
+            db.execute(
+                update(PlanSlot).where(PlanSlot.id == slot["id"]).values(generated_history_id=history_id)
+            )
+        return True
+
+    async def run(self, now: Optional[datetime] = None) -> int:
+        """
+        Готовит черновики для ближайших публикаций (в окне часов низкой нагрузки)
+
+        Args:
+            now: Текущее время UTC (для проверки и бенчмарков)
+
+        Returns:
+            Количество подготовленных черновиков
+        """
+        now = (now or datetime.now(timezone.utc)).replace(tzinfo=None)
+        local_hour = (now + timedelta(minutes=utc_offset_minutes(get_timezone(None)))).hour
+        if not in_window(local_hour, self.window) or not openrouter_api.api_key:
+            return 0
+
+        budget = self._budget(now)
+        if budget <= 0:
+            return 0
+        slots = await self._call(self._candidates, now, budget)
+
+        drafted = 0
+        failures = 0
+        for slot in slots:
+            draft = await self._generate(slot)
+            if draft is None:
+                failures += 1
+                if failures >= MAX_CONSECUTIVE_FAILURES:
+                    logger.warning(f"Черновики планов: {failures} ошибок генерации подряд, запуск прерван")
+                    break
+            else:
+                failures = 0
+                # Генерация оплачена, даже если черновик не пригодился
+                self._drafted_today += 1
+                if await self._call(self._attach, slot, draft):
+                    drafted += 1
+            await asyncio.sleep(self.delay)
+
+        if slots:
+            logger.info(f"Черновики планов: подготовлено {drafted} из {len(slots)}")
+        return drafted
+
+    async def _run_job(self) -> None:
+        try:
+            await self.run()
+        except Exception as e:
+            logger.exception(f"Ошибка при подготовке черновиков планов: {e}")
+
+    def start(self, scheduler, interval_minutes: int) -> None:
+        """
+        Регистрирует периодическую проверку в планировщике
+
+        Args:
+            scheduler: AsyncIOScheduler
+            interval_minutes: Период проверки в минутах
+        """
+        scheduler.add_job(
+            self._run_job,
+            trigger="interval",
+            minutes=interval_minutes,
+            id=JOB_ID,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        logger.info("Подготовка черновиков планов запущена")
+
+
+# Глобальный экземпляр
+plan_drafts = PlanDraftService(
+    lookahead_hours=config.PLAN_DRAFT_LOOKAHEAD_HOURS,
+    offpeak_hours=config.PLAN_DRAFT_OFFPEAK_HOURS,
+    max_per_run=config.PLAN_DRAFT_MAX_PER_RUN,
+    daily_limit=config.PLAN_DRAFT_DAILY_LIMIT,
+    delay_seconds=config.PLAN_DRAFT_DELAY_SECONDS,
+    images=config.PLAN_DRAFT_IMAGES
+)
@@ -0,0 +1,488 @@
+"""
+Напоминания по контент-планам: поминутная выборка из БД
+
+Вместо задачи планировщика на каждый план у каждого дня недели плана есть
+строка plan_reminders с временем напоминания по часовому поясу пользователя
+и тем же временем в UTC (день недели и минута суток). Одна задача раз
+в минуту выбирает по индексу (weekday_utc, minute_utc) строки, время
+которых наступило, и ставит напоминания в очередь исходящих сообщений
+(bot.services.outbox) - она соблюдает лимиты Telegram.
+
+- Отмена - флаг active по индексу plan_id, без обхода задач.
+- Каждая строка отправляется не чаще раза в день (last_sent_on - дата
+  пользователя), поэтому после перезапуска пропущенные за
+  REMINDER_MISFIRE_GRACE_SECONDS минуты догоняются без повторов.
+- Сверка (при запуске и каждые REMINDER_RECONCILE_INTERVAL_MINUTES минут)
+  создает строки для активных планов без них, удаляет строки
+  завершившихся планов и пересчитывает UTC-время для поясов, у которых
+  сменилось смещение (переход на летнее время).
+- Настройки уведомлений пользователя (пояс, время, включение) читаются,
+  когда строки плана создаются или пересчитываются (schedule); сверка их
+  не отслеживает.
+
+Строки может записывать любой процесс; выборку выполняет один
+(в многопроцессном режиме - процесс 0).
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+from apscheduler.util import astimezone
+from sqlalchemy import delete, func, select, update
+from bot.config import config
+from bot.database.database import get_db
+from bot.database.models import ContentHistory, ContentPlan, NotificationSettings, PlanReminder, PlanSlot
+from bot.services.outbox import OutboxPriority, outbox
+
+logger = logging.getLogger(__name__)
+
+TICK_JOB_ID = "plan_reminders_tick"
+RECONCILE_JOB_ID = "plan_reminders_reconcile"
+DEFAULT_TIMEZONE = "Europe/Moscow"
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+# Размер пакета при чтении и записи
+BATCH_SIZE = 500
+# Лимит длины сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+# Неизвестные часовые пояса, о которых уже предупредили
+_unknown_timezones: Set[str] = set()
+
+
+def get_timezone(name: Optional[str]):
+    """
+    Часовой пояс по имени (неизвестный заменяется поясом по умолчанию)
+
+    Args:
+        name: Имя пояса, например Europe/Moscow
+
+    Returns:
+        tzinfo
+    """
+    name = name or DEFAULT_TIMEZONE
+    try:
+        return astimezone(name)
+    except Exception:
+        if name not in _unknown_timezones:
+            _unknown_timezones.add(name)
+            logger.warning(f"Неизвестный часовой пояс {name!r}, используется {DEFAULT_TIMEZONE}")
+        return astimezone(DEFAULT_TIMEZONE)
+
+
+def utc_offset_minutes(tz) -> int:
+    """Текущее смещение пояса от UTC в минутах"""
+    return int(datetime.now(tz).utcoffset().total_seconds() // 60)
+
+
+def to_utc_slot(weekday: int, minute: int, offset: int) -> Tuple[int, int]:
+    """
+    Переводит день недели и минуту суток пользователя в UTC
+
+    Args:
+        weekday: День недели (0=понедельник)
+        minute: Минута суток
+        offset: Смещение пояса в минутах
+
+    Returns:
+        (день недели, минута суток) в UTC
+    """
+    total = (weekday * MINUTES_PER_DAY + minute - offset) % MINUTES_PER_WEEK
+    return divmod(total, MINUTES_PER_DAY)
+
+
+def reminder_message(plan_name: str, topic: Optional[str], draft: Optional[dict] = None) -> str:
+    """
+    Текст напоминания о публикации
+
+    Args:
+        plan_name: Название контент-плана
+        topic: Тема публикации
+        draft: content_data заранее подготовленного черновика (bot.services.plan_drafts)
+
+    Returns:
+        Текст сообщения (не длиннее лимита Telegram)
+    """
+    message = f"📅 Напоминание: сегодня запланирован пост по контент-плану '{plan_name}'"
+    if topic:
+        message += f"\n\n💡 Тема: {topic}"
+    if not draft or not draft.get("text"):
+        return message
+
+    footer = ""
+    if draft.get("file_path"):
+        footer = "\n\n🖼 Картинка к посту сохранена в истории"
+    post = draft["text"]
+    if draft.get("hashtags"):
+        post += "\n\n" + " ".join(draft["hashtags"])
+    header = message + "\n\n📝 Черновик поста готов:\n\n"
+    room = MAX_MESSAGE_LENGTH - len(header) - len(footer)
+    if len(post) > room:
+        post = post[:room - 1] + "…"
+    return header + post + footer
+
+
+def _plan_schedule(schedule: Any, default_time: Optional[time]) -> Optional[Tuple[List[int], int]]:
+    """
+    Дни недели (0=понедельник) и минута суток напоминаний плана
+
+    Args:
+        schedule: ContentPlan.schedule
+        default_time: Время напоминаний из настроек пользователя
+
+    Returns:
+        (дни, минута) или None, если у плана нет дней публикаций
+    """
+    schedule = schedule if isinstance(schedule, dict) else {}
+    # day: 1=понедельник, 7=воскресенье
+    days = sorted({day - 1 for day in schedule.get("days", []) if isinstance(day, int) and 1 <= day <= 7})
+    if not days:
+        return None
+
+    # Время публикации из плана, иначе время напоминаний из настроек
+    reminder_time = default_time or time(9, 0)
+    time_str = schedule.get("time", "09:00")
+    if isinstance(time_str, str) and ":" in time_str:
+        try:
+            hour, minute = map(int, time_str.split(":")[:2])
+            reminder_time = time(hour, minute)
+        except ValueError:
+            pass
+    return days, reminder_time.hour * 60 + reminder_time.minute
+
+
+class PlanReminderEngine:
+    """Напоминания по контент-планам: строки в БД и поминутная выборка"""
+
+    def __init__(self, misfire_grace_seconds: int):
+        """
+        Args:
+            misfire_grace_seconds: За сколько секунд догонять пропущенные напоминания
+                (после перезапуска или задержки выборки)
+        """
+        self.misfire_grace = timedelta(seconds=misfire_grace_seconds)
+        self._last_tick: Optional[datetime] = None
+
+    async def _call(self, func_, *args):
+        """Выполняет синхронную работу с БД, не блокируя event loop на PostgreSQL"""
+        if config.DATABASE_URL.startswith("sqlite"):
+            # SQLite работает через одно соединение (StaticPool) - только в потоке loop'а
+            return func_(*args)
+        return await asyncio.to_thread(func_, *args)
+
+    # --- Запись ---
+
+    def sync_plans(self, plan_ids: List[int]) -> int:
+        """
+        Пересоздает строки напоминаний планов по их текущему расписанию и настройкам
+
+        Дата последней отправки сохраняется, чтобы пересчет не повторил
+        уже отправленное сегодня напоминание.
+
+        Args:
+            plan_ids: ID планов
+
+        Returns:
+            Количество созданных строк
+        """
+        created = 0
+        # Смещение пояса считается один раз на вызов
+        offsets: Dict[str, int] = {}
+        for start in range(0, len(plan_ids), BATCH_SIZE):
+            chunk = plan_ids[start:start + BATCH_SIZE]
+            with get_db() as db:
+                plans = db.execute(
+                    select(
+                        ContentPlan.id, ContentPlan.user_id, ContentPlan.schedule,
+                        ContentPlan.start_date, ContentPlan.end_date, ContentPlan.is_active,
+                        NotificationSettings.timezone, NotificationSettings.reminder_enabled,
+                        NotificationSettings.reminder_time
+                    ).outerjoin(
+                        NotificationSettings,
+                        NotificationSettings.user_id == ContentPlan.user_id
+                    ).where(ContentPlan.id.in_(chunk))
+                ).all()
+                last_sent = dict(db.execute(
+                    select(PlanReminder.plan_id, func.max(PlanReminder.last_sent_on)).where(
+                        PlanReminder.plan_id.in_(chunk)
+                    ).group_by(PlanReminder.plan_id)
+                ).all())
+
+                rows = []
+                for plan_id, user_id, schedule, start_date, end_date, is_active, tz_name, enabled, default_time in plans:
+                    parsed = _plan_schedule(schedule, default_time)
+                    if parsed is None:
+                        continue
+                    days, minute = parsed
+                    tz_name = tz_name or DEFAULT_TIMEZONE
+                    if tz_name not in offsets:
+                        offsets[tz_name] = utc_offset_minutes(get_timezone(tz_name))
+                    offset = offsets[tz_name]
+                    for weekday in days:
+                        weekday_utc, minute_utc = to_utc_slot(weekday, minute, offset)
+                        rows.append({
+                            "plan_id": plan_id,
+                            "user_id": user_id,
+                            "weekday": weekday,
+                            "minute": minute,
+                            "timezone": tz_name,
+                            "utc_offset": offset,
+                            "weekday_utc": weekday_utc,
+                            "minute_utc": minute_utc,
+                            "start_date": start_date,
+                            "end_date": end_date,
+                            # Нет настроек - напоминания включены (как по умолчанию в NotificationSettings)
+                            "active": bool(is_active) and enabled is not False,
+                            "last_sent_on": last_sent.get(plan_id),
+                        })
+
+                db.execute(delete(PlanReminder).where(PlanReminder.plan_id.in_(chunk)))
+                if rows:
+                    # Core INSERT (executemany) без ORM-обработки строк
+                    db.execute(PlanReminder.__table__.insert(), rows)
+                created += len(rows)
+        return created
+
+    def cancel_plan(self, plan_id: int) -> None:
+        """Отменяет напоминания плана (флаг, без удаления строк)"""
+        with get_db() as db:
+            db.execute(update(PlanReminder).where(PlanReminder.plan_id == plan_id).values(active=False))
+
+    async def schedule(self, plan_id: int) -> int:
+        """Создает или пересчитывает напоминания плана, см. sync_plans"""
+        return await self._call(self.sync_plans, [plan_id])
+
+    async def cancel(self, plan_id: int) -> None:
+        """Отменяет напоминания плана, см. cancel_plan"""
+        await self._call(self.cancel_plan, plan_id)
+
+    # --- Выборка ---
+
+    def _due_rows(self, day: datetime, first_minute: int, last_minute: int) -> List[Tuple]:
+        """Активные напоминания дня UTC day с минутой от first_minute до last_minute"""
+        with get_db() as db:
+            return db.execute(
+                select(
+                    PlanReminder.id, PlanReminder.plan_id, PlanReminder.user_id,
+                    PlanReminder.minute_utc, PlanReminder.utc_offset,
+                    PlanReminder.start_date, PlanReminder.end_date, PlanReminder.last_sent_on,
+                    ContentPlan.plan_name
+                ).join(
+                    ContentPlan, ContentPlan.id == PlanReminder.plan_id
+                ).where(
+                    PlanReminder.weekday_utc == day.weekday(),
+                    PlanReminder.minute_utc.between(first_minute, last_minute),
+                    PlanReminder.active.is_(True),
+                    ContentPlan.is_active.is_(True)
+                )
+            ).all()
+
+    def _collect(self, since: datetime, until: datetime) -> List[Tuple[int, int, int, str, date]]:
+        """
+        Напоминания, время которых наступило в (since, until]
+
+        Returns:
+            Список (ID строки, ID плана, ID пользователя, название плана, дата пользователя)
+        """
+        due = []
+        start = since + timedelta(minutes=1)
+        while start <= until:
+            day = start.replace(hour=0, minute=0)
+            end = min(until, day + timedelta(minutes=MINUTES_PER_DAY - 1))
+            first = start.hour * 60 + start.minute
+            last = end.hour * 60 + end.minute
+            for row_id, plan_id, user_id, minute_utc, offset, start_date, end_date, last_sent_on, plan_name in self._due_rows(day, first, last):
+                local_date = (day + timedelta(minutes=minute_utc + offset)).date()
+                if start_date <= local_date <= end_date and last_sent_on != local_date:
+                    due.append((row_id, plan_id, user_id, plan_name, local_date))
+            start = end + timedelta(minutes=1)
+        return due
+
+    def _slot_details(self, due: List[Tuple[int, int, int, str, date]]) -> Dict[Tuple[int, date], Tuple[Optional[str], Optional[dict]]]:
+        """Публикации на дату напоминания: (ID плана, дата) -> (тема, черновик поста)"""
+        details = {}
+        for start in range(0, len(due), BATCH_SIZE):
+            chunk = due[start:start + BATCH_SIZE]
+            with get_db() as db:
+                rows = db.execute(
+                    select(PlanSlot.plan_id, PlanSlot.date, PlanSlot.topic, ContentHistory.content_data)
+                    .outerjoin(ContentHistory, ContentHistory.id == PlanSlot.generated_history_id)
+                    .where(
+                        PlanSlot.plan_id.in_({plan_id for _, plan_id, _, _, _ in chunk}),
+                        PlanSlot.date.in_({local_date for _, _, _, _, local_date in chunk})
+                    )
+                    .order_by(PlanSlot.id)
+                ).all()
+            for plan_id, slot_date, topic, draft in rows:
+                key = (plan_id, slot_date)
+                known_topic, known_draft = details.get(key, (None, None))
+                details[key] = (known_topic or topic, known_draft or draft)
+        return details
+
+    def _mark_sent(self, due: List[Tuple[int, int, int, str, date]]) -> None:
+        by_date: Dict[date, List[int]] = defaultdict(list)
+        for row_id, _, _, _, local_date in due:
+            by_date[local_date].append(row_id)
+        with get_db() as db:
+            for local_date, row_ids in by_date.items():
+                for start in range(0, len(row_ids), BATCH_SIZE):
+                    db.execute(
+                        update(PlanReminder).where(
+                            PlanReminder.id.in_(row_ids[start:start + BATCH_SIZE])
+                        ).values(last_sent_on=local_date)
+                    )
+
+    async def tick(self, now: Optional[datetime] = None) -> int:
+        """
+        Отправляет напоминания, время которых наступило с предыдущей выборки
+
+        Args:
+            now: Текущее время UTC (для проверки и бенчмарков)
+
+        Returns:
+            Количество поставленных в очередь напоминаний
+        """
+        now = (now or datetime.now(timezone.utc)).replace(tzinfo=None, second=0, microsecond=0)
+        since = now - self.misfire_grace
+        if self._last_tick is not None:
+            since = max(since, self._last_tick)
+        if since >= now:
+            return 0
+
+        try:
+            due = await self._call(self._collect, since, now)
+            if due:
+                details = await self._call(self._slot_details, due)
+                messages = [
+                    (user_id, reminder_message(plan_name, *details.get((plan_id, local_date), (None, None))))
+                    for _, plan_id, user_id, plan_name, local_date in due
+                ]
+                await outbox.enqueue_many(messages, OutboxPriority.REMINDER)
+                await self._call(self._mark_sent, due)
+                logger.info(f"Напоминания по планам: поставлено в очередь {len(due)}")
+            self._last_tick = now
+            return len(due)
+        except Exception as e:
+            logger.exception(f"Ошибка при отправке напоминаний: {e}")
+            return 0
+
+    # --- Сверка ---
+
+    async def reconcile(self) -> Tuple[int, int, int]:
+        """
+        Сверяет строки напоминаний с планами
+
+        Планы без строк обрабатываются пакетами по BATCH_SIZE с возвратом
+        управления event loop между пакетами.
+
+        Returns:
+            (создано строк для планов без напоминаний, удалено строк завершенных планов,
+             пересчитано строк со сменившимся смещением пояса)
+        """
+        removed = await self._call(self._remove_ended)
+        missing = await self._call(self._missing_plans)
+        created = 0
+        for start in range(0, len(missing), BATCH_SIZE):
+            created += await self._call(self.sync_plans, missing[start:start + BATCH_SIZE])
+            await asyncio.sleep(0)
+        shifted = await self._call(self._refresh_offsets)
+
+        if created or removed or shifted:
+            logger.info(
+                f"Напоминания сверены с планами: создано {created}, удалено {removed}, "
+                f"пересчитано {shifted}"
+            )
+        return created, removed, shifted
+
+    def _remove_ended(self) -> int:
+        """Удаляет строки завершившихся планов (день запаса - даты в строках по поясу пользователя)"""
+        with get_db() as db:
+            return db.execute(
+                delete(PlanReminder).where(PlanReminder.end_date < date.today() - timedelta(days=1))
+            ).rowcount
+
+    def _missing_plans(self) -> List[int]:
+        """Активные планы без строк: созданы до появления таблицы или в обход sync_plans"""
+        with get_db() as db:
+            return list(db.execute(
+                select(ContentPlan.id).outerjoin(
+                    PlanReminder, PlanReminder.plan_id == ContentPlan.id
+                ).where(
+                    ContentPlan.is_active.is_(True),
+                    ContentPlan.end_date >= date.today(),
+                    PlanReminder.id.is_(None)
+                )
+            ).scalars().all())
+
+    def _refresh_offsets(self) -> int:
+        """Пересчитывает UTC-время строк поясов, у которых сменилось смещение"""
+        with get_db() as db:
+            stored = db.execute(
+                select(PlanReminder.timezone, PlanReminder.utc_offset).group_by(
+                    PlanReminder.timezone, PlanReminder.utc_offset
+                )
+            ).all()
+
+        shifted = 0
+        for tz_name, offset in stored:
+            current = utc_offset_minutes(get_timezone(tz_name))
+            if current == offset:
+                continue
+            with get_db() as db:
+                rows = db.execute(
+                    select(PlanReminder.id, PlanReminder.weekday, PlanReminder.minute).where(
+                        PlanReminder.timezone == tz_name,
+                        PlanReminder.utc_offset == offset
+                    )
+                ).all()
+                params = []
+                for row_id, weekday, minute in rows:
+                    weekday_utc, minute_utc = to_utc_slot(weekday, minute, current)
+                    params.append({
+                        "id": row_id, "utc_offset": current,
+                        "weekday_utc": weekday_utc, "minute_utc": minute_utc
+                    })
+                if params:
+                    db.execute(update(PlanReminder), params)
+            shifted += len(rows)
+        return shifted
+
+    async def _reconcile_job(self) -> None:
+        try:
+            await self.reconcile()
+        except Exception as e:
+            logger.exception(f"Ошибка при сверке напоминаний: {e}")
+
+    def start(self, scheduler, reconcile_interval_minutes: int) -> None:
+        """
+        Регистрирует поминутную выборку и периодическую сверку в планировщике
+
+        Args:
+            scheduler: AsyncIOScheduler
+            reconcile_interval_minutes: Период сверки в минутах
+        """
+        scheduler.add_job(
+            self.tick,
+            trigger="cron",
+            second=1,
+            id=TICK_JOB_ID,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        scheduler.add_job(
+            self._reconcile_job,
+            trigger="interval",
+            minutes=reconcile_interval_minutes,
+            next_run_time=datetime.now(timezone.utc),
+            id=RECONCILE_JOB_ID,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        logger.info("Напоминания по контент-планам запущены")
+
+
+# Глобальный экземпляр
+plan_reminders = PlanReminderEngine(misfire_grace_seconds=config.REMINDER_MISFIRE_GRACE_SECONDS)
@@ -1,81 +1,125 @@
 """
 Сервис для планирования и напоминаний
+
+Служебные периодические задачи (очистка истории, выгрузка состояний)
+хранятся в памяти и регистрируются при каждом запуске.
+
+Напоминания по дням публикаций контент-планов - строки plan_reminders
+с поминутной выборкой (см. bot.services.plan_reminders), а не задачи
+планировщика. Разовые напоминания (адаптивные, SmartReminderService)
+хранятся в БД бота (хранилище задач REMINDER_JOBSTORE, таблица
+apscheduler_jobs), получают только ID плана и переживают перезапуск:
+пропущенное во время остановки бота напоминание отправляется после запуска,
+если опоздание меньше REMINDER_MISFIRE_GRACE_SECONDS.
+
+Заранее подготовленные черновики постов (bot.services.plan_drafts)
+приходят вместе с напоминанием.
+
+В многопроцессном режиме напоминания выполняет только процесс 0.
+Остальные процессы записывают разовые напоминания в то же хранилище
+через отдельный планировщик на паузе (reminder_scheduler), а процесс 0
+раз в REMINDER_JOBS_POLL_SECONDS перечитывает хранилище и видит их.
 """
 import logging
-from datetime import datetime, time, timedelta
+from datetime import datetime
 from typing import Optional
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
-from bot.database.models import ContentPlan, NotificationSettings
-from bot.database.database import get_db
+from bot.config import config
+from bot.database.models import ContentHistory, ContentPlan, NotificationSettings, PlanSlot
+from bot.database.database import engine, get_db
+from bot.database.migrations import plan_schedule
+from bot.services.outbox import OutboxPriority, outbox
+from bot.services.plan_drafts import plan_drafts
+from bot.services.plan_reminders import get_timezone, plan_reminders, reminder_message
 
 logger = logging.getLogger(__name__)
 
+# Хранилище разовых напоминаний в БД
+REMINDER_JOBSTORE = "reminders"
+# Как часто процесс 0 перечитывает хранилище (задачи, добавленные другими процессами)
+REMINDER_JOBS_POLL_SECONDS = 60
+POLL_JOB_ID = "reminder_jobs_poll"
+
 scheduler = AsyncIOScheduler()
 
+# Выполняет ли этот процесс напоминания (см. start_scheduler)
+_reminders_enabled = False
+# Планировщик на паузе: только записывает разовые напоминания в хранилище
+_job_writer: Optional[AsyncIOScheduler] = None
+
 
-async def send_reminder(user_id: int, plan_id: int, message: str):
-    """Отправляет напоминание пользователю"""
-    # Эта функция будет вызвана планировщиком
-    # Здесь должна быть логика отправки сообщения через Telegram Bot API
-    # Пока просто логируем
-    logger.info(f"Напоминание для пользователя {user_id}, план {plan_id}: {message}")
-    # TODO: Реализовать отправку через application.bot.send_message
+def reminders_enabled() -> bool:
+    """Выполняет ли этот процесс напоминания"""
+    return _reminders_enabled
 
 
-async def schedule_content_plan_reminders(plan: ContentPlan):
+def reminder_scheduler() -> Optional[AsyncIOScheduler]:
     """
-    Планирует напоминания для контент-плана
-    
+    Планировщик для добавления разовых напоминаний (jobstore=REMINDER_JOBSTORE)
+
+    Returns:
+        Основной планировщик в процессе, выполняющем напоминания, иначе
+        планировщик на паузе с тем же хранилищем; None, если не запущен
+    """
+    return scheduler if _reminders_enabled else _job_writer
+
+
+def _reminder_jobstore() -> SQLAlchemyJobStore:
+    return SQLAlchemyJobStore(engine=engine, tablename="apscheduler_jobs")
+
+
+async def _poll_reminder_jobs():
+    """
+    Ничего не делает: выполнение задачи заставляет планировщик перечитать
+    хранилища и увидеть напоминания, добавленные другими процессами
+    """
+
+
+async def send_reminder(plan_id: int):
+    """
+    Отправляет разовое напоминание по контент-плану (через очередь исходящих сообщений)
+
     Args:
-        plan: Контент-план
+        plan_id: ID контент-плана
     """
-    try:
-        with get_db() as db:
-            settings = db.query(NotificationSettings).filter(
-                NotificationSettings.user_id == plan.user_id
-            ).first()
-        
-        if not settings or not settings.reminder_enabled:
+    with get_db() as db:
+        plan = db.get(ContentPlan, plan_id)
+        if plan is None or not plan.is_active:
             return
-        
-        schedule = plan.schedule if isinstance(plan.schedule, dict) else {}
-        days = schedule.get("days", [])
-        time_str = schedule.get("time", "09:00")
-        
-        # Парсим время
-        reminder_time = settings.reminder_time or time(9, 0)
-        if isinstance(time_str, str) and ":" in time_str:
-            try:
-                hour, minute = map(int, time_str.split(":")[:2])
-                reminder_time = time(hour, minute)
-            except:
-                pass
-        
-        # Планируем напоминания для каждого дня
-        for day in days:
-            # day: 1=понедельник, 7=воскресенье
-            # APScheduler использует: 0=понедельник, 6=воскресенье
-            weekday = day - 1 if day <= 7 else day
-            
-            trigger = CronTrigger(
-                day_of_week=weekday,
-                hour=reminder_time.hour,
-                minute=reminder_time.minute
-            )
-            
-            message = f"📅 Напоминание: сегодня запланирован пост по контент-плану '{plan.plan_name}'"
-            
-            scheduler.add_job(
-                send_reminder,
-                trigger=trigger,
-                args=[plan.user_id, plan.id, message],
-                id=f"plan_{plan.id}_day_{day}",
-                replace_existing=True
-            )
-        
-        logger.info(f"Напоминания для плана {plan.id} запланированы")
-    
+        settings = db.query(NotificationSettings).filter(
+            NotificationSettings.user_id == plan.user_id
+        ).first()
+        if settings is not None and not settings.reminder_enabled:
+            return
+        user_id, plan_name = plan.user_id, plan.plan_name
+        # Тема сегодняшней публикации по дате пользователя
+        plan_schedule.backfill_plan(db, plan_id)
+        today = datetime.now(get_timezone(settings.timezone if settings else None)).date()
+        slot = db.query(PlanSlot.topic, ContentHistory.content_data).outerjoin(
+            ContentHistory, ContentHistory.id == PlanSlot.generated_history_id
+        ).filter(
+            PlanSlot.plan_id == plan_id,
+            PlanSlot.date == today
+        ).order_by(PlanSlot.id).first()
+
+    topic, draft = slot if slot is not None else (None, None)
+    message = reminder_message(plan_name, topic, draft)
+    logger.info(f"Напоминание для пользователя {user_id}, план {plan_id}")
+    await outbox.enqueue(user_id, message, priority=OutboxPriority.REMINDER)
+
+
+async def schedule_content_plan_reminders(plan_id: int):
+    """
+    Планирует напоминания для контент-плана (или пересчитывает после изменения)
+
+    Args:
+        plan_id: ID контент-плана
+    """
+    try:
+        rows = await plan_reminders.schedule(plan_id)
+        logger.info(f"Напоминания для плана {plan_id} запланированы: дней в неделю {rows}")
+
     except Exception as e:
         logger.exception(f"Ошибка при планировании напоминаний: {e}")
 
@@ -83,28 +127,65 @@ async def schedule_content_plan_reminders(plan: ContentPlan):
 async def cancel_content_plan_reminders(plan_id: int):
     """Отменяет напоминания для контент-плана"""
     try:
-        # Удаляем все задачи для этого плана
-        jobs = [job for job in scheduler.get_jobs() if job.id.startswith(f"plan_{plan_id}_")]
-        for job in jobs:
-            scheduler.remove_job(job.id)
-        
+        await plan_reminders.cancel(plan_id)
         logger.info(f"Напоминания для плана {plan_id} отменены")
-    
+
     except Exception as e:
         logger.exception(f"Ошибка при отмене напоминаний: {e}")
 
 
-def start_scheduler():
-    """Запускает планировщик"""
-    if not scheduler.running:
-        scheduler.start()
-        logger.info("Планировщик запущен")
+def _remove_legacy_plan_jobs() -> None:
+    """Удаляет задачи plan_<id> прежней схемы (задача планировщика на каждый план)"""
+    legacy = [job.id for job in scheduler.get_jobs(REMINDER_JOBSTORE) if job.id.startswith("plan_")]
+    for job_id in legacy:
+        scheduler.remove_job(job_id, REMINDER_JOBSTORE)
+    if legacy:
+        logger.info(f"Удалены задачи напоминаний прежней схемы: {len(legacy)}")
+
+
+def start_scheduler(reminders: bool = True):
+    """
+    Запускает планировщик
+
+    Args:
+        reminders: Выполнять напоминания в этом процессе (разовые из БД, выборка по планам, черновики)
+    """
+    global _reminders_enabled, _job_writer
+    if scheduler.running:
+        return
+
+    if reminders:
+        scheduler.add_jobstore(_reminder_jobstore(), REMINDER_JOBSTORE)
+        _reminders_enabled = True
+    else:
+        _job_writer = AsyncIOScheduler()
+        _job_writer.add_jobstore(_reminder_jobstore(), REMINDER_JOBSTORE)
+        _job_writer.start(paused=True)
+    scheduler.start()
+    logger.info("Планировщик запущен")
+
+    if reminders:
+        _remove_legacy_plan_jobs()
+        scheduler.add_job(
+            _poll_reminder_jobs,
+            trigger="interval",
+            seconds=REMINDER_JOBS_POLL_SECONDS,
+            id=POLL_JOB_ID,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        plan_reminders.start(scheduler, config.REMINDER_RECONCILE_INTERVAL_MINUTES)
+        if config.PLAN_DRAFTS_ENABLED:
+            plan_drafts.start(scheduler, config.PLAN_DRAFT_INTERVAL_MINUTES)
 
 
 def stop_scheduler():
     """Останавливает планировщик"""
+    global _job_writer
+    if _job_writer is not None:
+        _job_writer.shutdown(wait=False)
+        _job_writer = None
     if scheduler.running:
         scheduler.shutdown()
         logger.info("Планировщик остановлен")
-
-
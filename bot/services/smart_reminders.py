@@ -4,13 +4,16 @@
 import logging
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
-from bot.database.models import ContentPlan, ContentHistory, NotificationSettings
-from bot.database.database import get_db
-from bot.services.scheduler import scheduler
+from bot.config import config
+from bot.services.activity_profile import activity_profile
 from bot.services.ai.openrouter import openrouter_api
+from bot.services.user_cache import user_cache
 
 logger = logging.getLogger(__name__)
 
+# Доля активности позже запланированного часа, при которой напоминаем раньше
+LATE_SHARE_THRESHOLD = 0.3
+
 
 class SmartReminderService:
     """Сервис для умных напоминаний"""
@@ -19,37 +22,24 @@ class SmartReminderService:
     async def schedule_adaptive_reminder(
         user_id: int,
         plan_id: int,
-        scheduled_time: datetime,
-        content_plan: ContentPlan
+        scheduled_time: datetime
     ):
         """
-        Планирует адаптивное напоминание с учетом истории пользователя
+        Планирует адаптивное напоминание с учетом профиля активности пользователя
+        
+        Задача хранится в БД и получает только ID плана.
         
         Args:
             user_id: ID пользователя
             plan_id: ID контент-плана
             scheduled_time: Запланированное время публикации
-            content_plan: Объект контент-плана
         """
         try:
-            # Анализируем историю пользователя
-            with get_db() as db:
-                # Получаем последние публикации
-                recent_posts = db.query(ContentHistory).filter(
-                    ContentHistory.user_id == user_id,
-                    ContentHistory.generated_at >= datetime.now() - timedelta(days=30)
-                ).order_by(ContentHistory.generated_at.desc()).limit(10).all()
-            
-            # Определяем, часто ли пользователь опаздывает
-            late_count = 0
-            for post in recent_posts:
-                # Проверяем, был ли пост создан позже запланированного времени
-                # (упрощенная логика)
-                if post.generated_at.hour > 18:  # После 18:00 считается поздним
-                    late_count += 1
-            
-            # Если пользователь часто опаздывает, напоминаем раньше
-            if late_count >= 3:
+            # Доля активности пользователя позже запланированного часа (профиль по часам недели)
+            late_share = activity_profile.late_share(user_id, scheduled_time.weekday(), scheduled_time.hour)
+            
+            # Если пользователь обычно создает контент позже, напоминаем раньше
+            if late_share is not None and late_share >= LATE_SHARE_THRESHOLD:
                 reminder_offset = timedelta(hours=2)  # Напоминаем за 2 часа
             else:
                 reminder_offset = timedelta(hours=1)  # Напоминаем за 1 час
@@ -57,15 +47,23 @@ class SmartReminderService:
             reminder_time = scheduled_time - reminder_offset
             
             # Планируем напоминание
-            from bot.services.scheduler import send_reminder
+            from bot.services.scheduler import REMINDER_JOBSTORE, reminder_scheduler, send_reminder
+            
+            # В многопроцессном режиме задача пишется в общее хранилище, выполняет ее процесс 0
+            reminders = reminder_scheduler()
+            if reminders is None:
+                logger.warning(f"Планировщик не запущен, адаптивное напоминание для плана {plan_id} не запланировано")
+                return
             
-            scheduler.add_job(
+            reminders.add_job(
                 send_reminder,
                 'date',
                 run_date=reminder_time,
-                args=[user_id, plan_id, content_plan],
-                id=f"reminder_{user_id}_{plan_id}_{scheduled_time.timestamp()}",
-                replace_existing=True
+                args=[plan_id],
+                id=f"reminder_{user_id}_{plan_id}_{int(scheduled_time.timestamp())}",
+                jobstore=REMINDER_JOBSTORE,
+                replace_existing=True,
+                misfire_grace_time=config.REMINDER_MISFIRE_GRACE_SECONDS
             )
             
             logger.info(f"Адаптивное напоминание запланировано для пользователя {user_id} на {reminder_time}")
@@ -92,9 +90,7 @@ class SmartReminderService:
         """
         try:
             # Получаем профиль НКО
-            from bot.database.models import NKOProfile
-            with get_db() as db:
-                profile = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).first()
+            profile = user_cache.get_active_profile(user_id)
             
             nko_info = ""
             if profile:
@@ -166,9 +162,7 @@ class SmartReminderService:
         """
         try:
             # Получаем профиль НКО
-            from bot.database.models import NKOProfile
-            with get_db() as db:
-                profile = db.query(NKOProfile).filter(NKOProfile.user_id == user_id).first()
+            profile = user_cache.get_active_profile(user_id)
             
             nko_info = ""
             if profile:
@@ -204,25 +198,22 @@ class SmartReminderService:
                 text = result.get("content", "")
                 
                 # Сохраняем в историю
-                from bot.database.models import ContentHistory
+                from bot.services.history_writer import history_writer
                 from bot.utils.helpers import get_or_create_user
                 from telegram import User
                 
-                with get_db() as db:
-                    history_entry = ContentHistory(
-                        user_id=user_id,
-                        content_type="text",
-                        content_data={
-                            "text": text,
-                            "type": "holiday",
-                            "holiday_name": holiday_name,
-                            "holiday_date": holiday_date.isoformat(),
-                            "auto_generated": True
-                        },
-                        tags=[holiday_name]
-                    )
-                    db.add(history_entry)
-                    db.commit()
+                history_writer.enqueue(
+                    user_id=user_id,
+                    content_type="text",
+                    content_data={
+                        "text": text,
+                        "type": "holiday",
+                        "holiday_name": holiday_name,
+                        "holiday_date": holiday_date.isoformat(),
+                        "auto_generated": True
+                    },
+                    tags=[holiday_name]
+                )
                 
                 return {
                     "success": True,
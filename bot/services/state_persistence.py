@@ -0,0 +1,354 @@
+"""
+Сохранение состояния диалогов в БД (persistence для python-telegram-bot)
+
+context.user_data и состояния ConversationHandler хранятся в таблицах
+user_states и conversation_states, поэтому перезапуск бота не прерывает
+начатые диалоги.
+
+- Запись пакетами: PTB раз в STATE_FLUSH_INTERVAL секунд передает данные
+  пользователей, обработавших обновления за этот период, и изменившиеся
+  состояния диалогов. Все они записываются одной транзакцией (upsert).
+- Ленивая загрузка: при запуске user_data не загружается; данные пользователя
+  читаются из БД перед первым его обновлением (refresh_user_data).
+- Выгрузка из памяти: данные пользователя, бездействующего дольше
+  STATE_IDLE_MINUTES, удаляются из памяти (в БД они уже записаны)
+  и при следующем обновлении загрузятся снова.
+- TTL: записи без активности дольше STATE_TTL_HOURS удаляются из БД
+  и при запуске не загружаются.
+
+Значения user_data должны сериализоваться в JSON; остальные ключи не
+сохраняются (с предупреждением в логе).
+"""
+import asyncio
+import json
+import logging
+import time
+from copy import deepcopy
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+from sqlalchemy import delete, select
+from telegram.ext import Application, BasePersistence, PersistenceInput
+from bot.config import config
+from bot.database.database import get_db
+from bot.database.models import ConversationState, UserState
+
+if config.DATABASE_URL.startswith("sqlite"):
+    from sqlalchemy.dialects.sqlite import insert as upsert_insert
+else:
+    from sqlalchemy.dialects.postgresql import insert as upsert_insert
+
+logger = logging.getLogger(__name__)
+
+JOB_ID = "state_persistence_expiry"
+
+# Ключи user_data, о несохранении которых уже предупредили
+_unserializable_keys: Set[str] = set()
+
+
+def _serializable(user_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Оставляет в user_data только ключи, которые сериализуются в JSON"""
+    try:
+        json.dumps(data)
+        return data
+    except (TypeError, ValueError):
+        pass
+
+    result = {}
+    for key, value in data.items():
+        try:
+            json.dumps({key: value})
+            result[key] = value
+        except (TypeError, ValueError):
+            if key not in _unserializable_keys:
+                _unserializable_keys.add(key)
+                logger.warning(f"user_data[{key!r}] (пользователь {user_id}) не сохраняется: значение не сериализуется в JSON")
+    return result
+
+
+class SQLPersistence(BasePersistence):
+    """Persistence PTB на базе данных бота: user_data и состояния ConversationHandler"""
+
+    def __init__(self, flush_interval: float, idle_minutes: int, ttl_hours: int):
+        """
+        Args:
+            flush_interval: Секунд между пакетными записями
+            idle_minutes: Бездействие, после которого данные выгружаются из памяти
+            ttl_hours: Бездействие, после которого данные удаляются из БД
+        """
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=flush_interval
+        )
+        self.idle_seconds = idle_minutes * 60
+        self.ttl = timedelta(hours=ttl_hours)
+        # Ожидающие записи: None - удалить запись
+        self._dirty_users: Dict[int, Optional[Dict[str, Any]]] = {}
+        self._dirty_conversations: Dict[Tuple[str, str], Any] = {}
+        # Пользователи, чьи данные загружены в память, и время их последнего обновления
+        self._loaded: Set[int] = set()
+        self._last_seen: Dict[int, float] = {}
+        # Выгружаемые из памяти (ждут drop_user_data от PTB) и вернувшиеся за это время
+        self._evicting: Set[int] = set()
+        self._revived: Dict[int, Dict[str, Any]] = {}
+        self._write_lock = asyncio.Lock()
+        self._write_task: Optional[asyncio.Task] = None
+
+    async def _call(self, func_, *args):
+        """Выполняет синхронную работу с БД, не блокируя event loop на PostgreSQL"""
+        if config.DATABASE_URL.startswith("sqlite"):
+            # SQLite работает через одно соединение (StaticPool) - только в потоке loop'а
+            return func_(*args)
+        return await asyncio.to_thread(func_, *args)
+
+    # --- Чтение ---
+
+    async def get_user_data(self) -> Dict[int, Dict[str, Any]]:
+        """Данные пользователей загружаются лениво (см. refresh_user_data)"""
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Dict[str, Any]]:
+        return {}
+
+    async def get_bot_data(self) -> Dict[str, Any]:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[Tuple, object]:
+        """Состояния диалогов ConversationHandler, активных в пределах TTL"""
+        rows = await self._call(self._load_conversations, name)
+        conversations = {tuple(json.loads(key)): state for key, state in rows}
+        if conversations:
+            logger.info(f"Восстановлено диалогов {name}: {len(conversations)}")
+        return conversations
+
+    def _load_conversations(self, name: str) -> List[Tuple[str, Any]]:
+        with get_db() as db:
+            return db.execute(
+                select(ConversationState.key, ConversationState.state).where(
+                    ConversationState.name == name,
+                    ConversationState.updated_at >= datetime.utcnow() - self.ttl
+                )
+            ).all()
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[str, Any]) -> None:
+        """Загружает данные пользователя перед первым обновлением после запуска или выгрузки"""
+        self._last_seen[user_id] = time.monotonic()
+        if user_id in self._evicting:
+            # Пользователь вернулся раньше, чем PTB удалил его из памяти (см. drop_user_data)
+            self._revived[user_id] = user_data
+        if user_id in self._loaded:
+            return
+
+        self._loaded.add(user_id)
+        try:
+            stored = await self._call(self._load_user, user_id)
+        except Exception:
+            self._loaded.discard(user_id)
+            raise
+        for key, value in (stored or {}).items():
+            user_data.setdefault(key, value)
+
+    def _load_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        if user_id in self._dirty_users:
+            # Еще не записано в БД
+            return deepcopy(self._dirty_users[user_id])
+        with get_db() as db:
+            return db.execute(
+                select(UserState.data).where(
+                    UserState.user_id == user_id,
+                    UserState.updated_at >= datetime.utcnow() - self.ttl
+                )
+            ).scalar_one_or_none()
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[str, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict[str, Any]) -> None:
+        pass
+
+    # --- Запись ---
+
+    async def update_user_data(self, user_id: int, data: Dict[str, Any]) -> None:
+        self._dirty_users[user_id] = data
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        if user_id in self._evicting:
+            # Выгрузка из памяти, а не удаление: запись в БД остается
+            self._evicting.discard(user_id)
+            revived = self._revived.pop(user_id, None)
+            if revived is not None:
+                # PTB не сохраняет данные, удаляемые в этом же цикле - сохраняем сами
+                self._dirty_users[user_id] = deepcopy(revived)
+                self._schedule_write()
+            return
+
+        self._dirty_users[user_id] = None
+        self._loaded.discard(user_id)
+        self._last_seen.pop(user_id, None)
+        self._schedule_write()
+
+    async def update_conversation(self, name: str, key: Tuple, new_state: Optional[object]) -> None:
+        self._dirty_conversations[(name, json.dumps(list(key)))] = new_state
+        self._schedule_write()
+
+    async def update_chat_data(self, chat_id: int, data: Dict[str, Any]) -> None:
+        pass
+
+    async def update_bot_data(self, data: Dict[str, Any]) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    def _schedule_write(self) -> None:
+        """Планирует одну пакетную запись на все изменения текущего цикла PTB"""
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.get_running_loop().create_task(self._write_soon())
+
+    async def _write_soon(self) -> None:
+        # PTB вызывает update_* для всех изменений цикла одним gather -
+        # к следующей итерации loop'а они все уже в буфере
+        await asyncio.sleep(0)
+        try:
+            await self._write_dirty()
+        except Exception as e:
+            logger.exception(f"Ошибка при записи состояния диалогов: {e}")
+
+    async def _write_dirty(self) -> int:
+        """Записывает накопленные изменения; при ошибке они остаются в буфере"""
+        async with self._write_lock:
+            users, self._dirty_users = self._dirty_users, {}
+            conversations, self._dirty_conversations = self._dirty_conversations, {}
+            if not users and not conversations:
+                return 0
+            try:
+                await self._call(self._write, users, conversations)
+            except Exception:
+                # Более новые изменения, пришедшие во время записи, не перезаписываем
+                for user_id, data in users.items():
+                    self._dirty_users.setdefault(user_id, data)
+                for key, state in conversations.items():
+                    self._dirty_conversations.setdefault(key, state)
+                raise
+            return len(users) + len(conversations)
+
+    def _write(self, users: Dict[int, Optional[Dict[str, Any]]], conversations: Dict[Tuple[str, str], Any]) -> None:
+        """Пакетный upsert и удаление одной транзакцией"""
+        now = datetime.utcnow()
+        user_rows = [
+            {"user_id": user_id, "data": _serializable(user_id, data), "updated_at": now}
+            for user_id, data in users.items()
+            if data
+        ]
+        # Пустой user_data не храним
+        deleted_users = [user_id for user_id, data in users.items() if not data]
+        conversation_rows = [
+            {"name": name, "key": key, "state": state, "updated_at": now}
+            for (name, key), state in conversations.items()
+            if state is not None
+        ]
+        ended_conversations = [key for key, state in conversations.items() if state is None]
+
+        with get_db() as db:
+            if user_rows:
+                statement = upsert_insert(UserState)
+                db.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[UserState.user_id],
+                        set_={"data": statement.excluded.data, "updated_at": statement.excluded.updated_at}
+                    ),
+                    user_rows
+                )
+            if deleted_users:
+                db.execute(delete(UserState).where(UserState.user_id.in_(deleted_users)))
+            if conversation_rows:
+                statement = upsert_insert(ConversationState)
+                db.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[ConversationState.name, ConversationState.key],
+                        set_={"state": statement.excluded.state, "updated_at": statement.excluded.updated_at}
+                    ),
+                    conversation_rows
+                )
+            for name, key in ended_conversations:
+                db.execute(delete(ConversationState).where(ConversationState.name == name, ConversationState.key == key))
+
+    async def flush(self) -> None:
+        """Записывает все оставшиеся изменения (вызывается PTB при остановке)"""
+        if self._write_task is not None and not self._write_task.done():
+            await self._write_task
+        written = await self._write_dirty()
+        logger.info(f"Состояние диалогов сохранено, записей при остановке: {written}")
+
+    # --- Выгрузка и TTL ---
+
+    async def expire(self, application: Application) -> Tuple[int, int]:
+        """
+        Выгружает из памяти бездействующих пользователей и удаляет устаревшие записи
+
+        Args:
+            application: Приложение PTB, использующее эту persistence
+
+        Returns:
+            (выгружено пользователей, удалено записей из БД)
+        """
+        now = time.monotonic()
+        evicted = 0
+        # Во время записи данные пользователя уже не в буфере, но еще не в БД
+        async with self._write_lock:
+            for user_id, last_seen in list(self._last_seen.items()):
+                if now - last_seen < self.idle_seconds or user_id in self._dirty_users:
+                    continue
+                del self._last_seen[user_id]
+                self._loaded.discard(user_id)
+                if user_id in application.user_data:
+                    self._evicting.add(user_id)
+                    application.drop_user_data(user_id)
+                    evicted += 1
+
+        deleted = await self._call(self._delete_expired)
+        if evicted or deleted:
+            logger.info(f"Состояние диалогов: выгружено из памяти {evicted}, удалено устаревших записей {deleted}")
+        return evicted, deleted
+
+    def _delete_expired(self) -> int:
+        threshold = datetime.utcnow() - self.ttl
+        with get_db() as db:
+            users = db.execute(delete(UserState).where(UserState.updated_at < threshold)).rowcount
+            conversations = db.execute(delete(ConversationState).where(ConversationState.updated_at < threshold)).rowcount
+        return users + conversations
+
+    def start(self, scheduler, application: Application, interval_minutes: int) -> None:
+        """
+        Регистрирует периодическую выгрузку и удаление в планировщике
+
+        Args:
+            scheduler: AsyncIOScheduler
+            application: Приложение PTB
+            interval_minutes: Период запуска в минутах
+        """
+        scheduler.add_job(
+            self.expire,
+            trigger="interval",
+            minutes=interval_minutes,
+            args=[application],
+            id=JOB_ID,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        logger.info(f"Выгрузка состояния диалогов запланирована каждые {interval_minutes} мин.")
+
+
+# Глобальный экземпляр
+state_persistence = SQLPersistence(
+    flush_interval=config.STATE_FLUSH_INTERVAL,
+    idle_minutes=config.STATE_IDLE_MINUTES,
+    ttl_hours=config.STATE_TTL_HOURS
+)
@@ -0,0 +1,108 @@
+"""
+Параллельная обработка обновлений с сохранением порядка для каждого пользователя
+
+По умолчанию python-telegram-bot обрабатывает обновления по одному, и долгая
+генерация одного пользователя задерживает всех остальных. Этот процессор
+выполняет обновления разных пользователей параллельно (не более
+UPDATE_CONCURRENCY одновременно), а обновления одного пользователя и одного
+чата - строго по очереди, в порядке поступления. Поэтому состояния
+ConversationHandler и context.user_data не меняются из двух обработчиков сразу.
+
+Очередь каждого ключа (пользователь, чат) - цепочка future: обновление
+занимает место в цепочках синхронно при входе, ждет завершения предыдущих
+обновлений своих ключей и только потом занимает слот выполнения. Ожидающие
+своей очереди обновления слотов не занимают, так что поток сообщений от одного
+пользователя не блокирует остальных. Общее число принятых, но не завершенных
+обновлений ограничено UPDATE_MAX_PENDING (семафор PTB) - это обратное
+давление на получение обновлений.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Hashable, List
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Процессор обновлений: параллельно между пользователями, по порядку внутри"""
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int):
+        """
+        Args:
+            max_concurrent_updates: Максимум одновременно выполняемых обновлений
+            max_pending_updates: Максимум принятых обновлений (выполняемых и ожидающих)
+        """
+        super().__init__(max(max_pending_updates, max_concurrent_updates, 2))
+        if max_concurrent_updates < 1:
+            raise ValueError("max_concurrent_updates должен быть положительным")
+        self.concurrency = max_concurrent_updates
+        self._running = asyncio.BoundedSemaphore(max_concurrent_updates)
+        # Последнее обновление в очереди каждого ключа
+        self._tails: Dict[Hashable, asyncio.Future] = {}
+
+    @staticmethod
+    def update_keys(update: object) -> List[Hashable]:
+        """
+        Ключи очередей обновления: чат и пользователь
+
+        Args:
+            update: Обновление
+
+        Returns:
+            Список ключей (пустой - обновление выполняется без очереди)
+        """
+        if not isinstance(update, Update):
+            return []
+
+        keys: List[Hashable] = []
+        if update.effective_chat is not None:
+            keys.append(("chat", update.effective_chat.id))
+        if update.effective_user is not None:
+            keys.append(("user", update.effective_user.id))
+        return keys
+
+    @property
+    def queued_keys(self) -> int:
+        """Количество чатов и пользователей с необработанными обновлениями"""
+        return len(self._tails)
+
+    async def do_process_update(self, update: object, coroutine: "Awaitable[Any]") -> None:
+        keys = self.update_keys(update)
+
+        # Место в очередях занимается до первого await - в порядке поступления
+        done = asyncio.get_running_loop().create_future()
+        previous = []
+        for key in keys:
+            tail = self._tails.get(key)
+            if tail is not None:
+                previous.append(tail)
+            self._tails[key] = done
+
+        started = False
+        try:
+            if previous:
+                # asyncio.wait не отменяет чужие future при отмене этой задачи
+                await asyncio.wait(previous)
+            async with self._running:
+                started = True
+                await coroutine
+        finally:
+            if not started:
+                # Обновление отменено до запуска обработчика
+                coroutine.close()
+            done.set_result(None)
+            for key in keys:
+                if self._tails.get(key) is done:
+                    del self._tails[key]
+
+    async def initialize(self) -> None:
+        """Ресурсы не требуются"""
+
+    async def shutdown(self) -> None:
+        """Ждет завершения уже принятых обновлений"""
+        pending = list(set(self._tails.values()))
+        if pending:
+            logger.info(f"Ожидание обработки обновлений: {len(pending)}")
+            await asyncio.wait(pending)
@@ -0,0 +1,301 @@
+"""
+Кэш пользователей и активных профилей НКО
+
+Почти каждый обработчик вызывает get_or_create_user и отдельно читает профиль НКО.
+Кэш хранит их в памяти процесса в виде неизменяемых снимков (frozen dataclass),
+а не отсоединённых ORM-объектов, поэтому обычный путь не обращается к БД вовсе.
+
+- Записи живут USER_CACHE_TTL секунд и вытесняются по LRU при превышении USER_CACHE_MAX_SIZE
+- Одновременные промахи по одному ключу объединяются: БД читает только один поток
+- После изменения профиля или пользователя вызывайте invalidate_user / invalidate_profile
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from bot.config import config
+from bot.database.models import User, NKOProfile
+from bot.database.database import get_db
+
+logger = logging.getLogger(__name__)
+
+# Маркер "значение загружено, но отсутствует" - отличает None в кэше от промаха
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """Снимок пользователя Telegram"""
+    id: int
+    username: Optional[str]
+    first_name: str
+    last_name: Optional[str]
+    language_code: str
+    is_active: bool
+    active_profile_id: Optional[int]
+
+    @classmethod
+    def from_model(cls, user: User) -> "CachedUser":
+        return cls(
+            id=user.id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            language_code=user.language_code,
+            is_active=user.is_active,
+            active_profile_id=user.active_profile_id
+        )
+
+
+@dataclass(frozen=True)
+class CachedProfile:
+    """Снимок профиля НКО"""
+    id: int
+    user_id: int
+    profile_name: Optional[str]
+    organization_name: Optional[str]
+    description: Optional[str]
+    activity_types: Optional[Tuple[str, ...]]
+    target_audience: Optional[str]
+    tone_of_voice: Optional[str]
+    contact_info: Optional[Dict[str, Any]]
+    brand_colors: Optional[Tuple[Any, ...]]
+    logo_path: Optional[str]
+    is_complete: bool
+    is_active: bool
+
+    @classmethod
+    def from_model(cls, profile: NKOProfile) -> "CachedProfile":
+        return cls(
+            id=profile.id,
+            user_id=profile.user_id,
+            profile_name=profile.profile_name,
+            organization_name=profile.organization_name,
+            description=profile.description,
+            activity_types=tuple(profile.activity_types) if profile.activity_types else None,
+            target_audience=profile.target_audience,
+            tone_of_voice=profile.tone_of_voice,
+            contact_info=dict(profile.contact_info) if profile.contact_info else None,
+            brand_colors=tuple(profile.brand_colors) if profile.brand_colors else None,
+            logo_path=profile.logo_path,
+            is_complete=bool(profile.is_complete),
+            is_active=bool(profile.is_active)
+        )
+
+
+class TTLCache:
+    """Потокобезопасный LRU-кэш с ограничением времени жизни записей"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Блокировки загрузки по ключам для объединения одновременных промахов
+        self._loading: Dict[Hashable, threading.Lock] = {}
+
+    def get(self, key: Hashable) -> Any:
+        """Возвращает значение или _MISSING, если записи нет или она устарела"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Возвращает значение из кэша, а при промахе загружает его один раз
+
+        Args:
+            key: Ключ
+            loader: Функция загрузки значения из БД
+
+        Returns:
+            Значение (может быть None)
+        """
+        value = self.get(key)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # Пока ждали блокировку, значение мог загрузить другой поток
+            value = self.get(key)
+            if value is _MISSING:
+                value = loader()
+                self.set(key, value)
+
+        with self._lock:
+            if self._loading.get(key) is load_lock and not load_lock.locked():
+                del self._loading[key]
+
+        return value
+
+
+class UserCache:
+    """Кэш пользователей и их активных профилей НКО"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self._users = TTLCache(max_size, ttl)
+        self._profiles = TTLCache(max_size, ttl)
+
+    def get_or_create_user(
+        self,
+        user_id: int,
+        username: Optional[str] = None,
+        first_name: str = "",
+        last_name: Optional[str] = None,
+        language_code: str = "ru"
+    ) -> CachedUser:
+        """
+        Возвращает пользователя, создавая или обновляя его в БД только при необходимости
+
+        Args:
+            user_id: ID пользователя Telegram
+            username: Имя пользователя
+            first_name: Имя
+            last_name: Фамилия
+            language_code: Код языка
+
+        Returns:
+            Снимок пользователя
+        """
+        cached = self._users.get(user_id)
+        if cached is not _MISSING and not self._is_outdated(
+            cached, username, first_name, last_name, language_code
+        ):
+            return cached
+
+        with get_db() as db:
+            user = db.query(User).filter(User.id == user_id).first()
+
+            if not user:
+                user = User(
+                    id=user_id,
+                    username=username,
+                    first_name=first_name,
+                    last_name=last_name,
+                    language_code=language_code
+                )
+                db.add(user)
+                db.flush()
+                logger.info(f"Создан новый пользователь: {user_id} ({username or first_name})")
+            elif self._is_outdated(CachedUser.from_model(user), username, first_name, last_name, language_code):
+                if username:
+                    user.username = username
+                if first_name:
+                    user.first_name = first_name
+                if last_name:
+                    user.last_name = last_name
+                if language_code:
+                    user.language_code = language_code
+                user.updated_at = datetime.now()
+                logger.info(f"Обновлен пользователь: {user_id}")
+
+            snapshot = CachedUser.from_model(user)
+
+        self._users.set(user_id, snapshot)
+        return snapshot
+
+    def get_user(self, user_id: int) -> Optional[CachedUser]:
+        """
+        Возвращает пользователя без создания
+
+        Args:
+            user_id: ID пользователя Telegram
+
+        Returns:
+            Снимок пользователя или None
+        """
+        def load() -> Optional[CachedUser]:
+            with get_db() as db:
+                user = db.query(User).filter(User.id == user_id).first()
+                return CachedUser.from_model(user) if user else None
+
+        return self._users.get_or_load(user_id, load)
+
+    def get_active_profile(self, user_id: int) -> Optional[CachedProfile]:
+        """
+        Возвращает активный профиль НКО пользователя
+
+        Если активный профиль не выбран, берется первый завершенный профиль,
+        а если таких нет - первый профиль пользователя.
+
+        Args:
+            user_id: ID пользователя Telegram
+
+        Returns:
+            Снимок профиля или None
+        """
+        def load() -> Optional[CachedProfile]:
+            with get_db() as db:
+                profile = None
+                user = db.query(User).filter(User.id == user_id).first()
+                if user and user.active_profile_id:
+                    profile = db.query(NKOProfile).filter(NKOProfile.id == user.active_profile_id).first()
+                if not profile:
+                    profile = db.query(NKOProfile).filter(
+                        NKOProfile.user_id == user_id,
+                        NKOProfile.is_complete == True,
+                        NKOProfile.is_active == True
+                    ).order_by(NKOProfile.id).first()
+                if not profile:
+                    profile = db.query(NKOProfile).filter(
+                        NKOProfile.user_id == user_id
+                    ).order_by(NKOProfile.id).first()
+                return CachedProfile.from_model(profile) if profile else None
+
+        return self._profiles.get_or_load(user_id, load)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Сбрасывает пользователя и его профиль (например, после смены активного профиля)"""
+        self._users.delete(user_id)
+        self._profiles.delete(user_id)
+
+    def invalidate_profile(self, user_id: int) -> None:
+        """Сбрасывает активный профиль пользователя после его изменения"""
+        self._profiles.delete(user_id)
+
+    @staticmethod
+    def _is_outdated(
+        cached: CachedUser,
+        username: Optional[str],
+        first_name: str,
+        last_name: Optional[str],
+        language_code: str
+    ) -> bool:
+        """Проверяет, отличаются ли переданные данные Telegram от сохраненных"""
+        return bool(
+            (username and cached.username != username)
+            or (first_name and cached.first_name != first_name)
+            or (last_name and cached.last_name != last_name)
+            or (language_code and cached.language_code != language_code)
+        )
+
+
+# Глобальный экземпляр
+user_cache = UserCache(
+    max_size=config.USER_CACHE_MAX_SIZE,
+    ttl=config.USER_CACHE_TTL
+)
@@ -0,0 +1,185 @@
+"""
+Получение обновлений через webhook (встроенный сервер aiohttp)
+
+Альтернатива long polling (BOT_MODE=webhook). Telegram отправляет обновления
+POST-запросами на WEBHOOK_URL; сервер проверяет секретный токен из заголовка
+X-Telegram-Bot-Api-Secret-Token и кладет обновление во входную очередь
+ограниченного размера. Если очередь заполнена, сервер отвечает 503 -
+Telegram повторит доставку позже (обратное давление), а обновления не теряются.
+
+Из входной очереди обновления по одному, в порядке поступления, передаются
+в update_queue приложения (или супервизора процессов, см. bot.services.workers). Очередь приложения (InFlightLimitedQueue)
+ограничивает число переданных, но еще не обработанных обновлений, поэтому
+количество задач обработки не растет без предела.
+
+При остановке сервер перестает принимать запросы, оставшиеся обновления
+из входной очереди передаются приложению, и остановка ждет их обработки.
+Webhook при остановке не удаляется: обновления, пришедшие во время
+перезапуска, Telegram доставит после него.
+"""
+import asyncio
+import hmac
+import json
+import logging
+from typing import Optional
+from aiohttp import web
+from telegram import Bot, Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Через сколько секунд Telegram стоит повторить доставку при переполнении
+RETRY_AFTER_SECONDS = 1
+
+
+class InFlightLimitedQueue(asyncio.Queue):
+    """
+    Очередь обновлений приложения с ограничением необработанных элементов
+
+    put_limited ждет, пока число переданных через него и еще не
+    обработанных (task_done) обновлений станет меньше лимита.
+    Обычный put (сигнал остановки PTB, polling) не ограничивается.
+    """
+
+    def __init__(self, limit: int):
+        """
+        Args:
+            limit: Максимум необработанных обновлений
+        """
+        super().__init__()
+        self._slots = asyncio.Semaphore(limit)
+        self._limited = 0
+
+    async def put_limited(self, item) -> None:
+        await self._slots.acquire()
+        self._limited += 1
+        self.put_nowait(item)
+
+    def task_done(self) -> None:
+        super().task_done()
+        if self._limited > 0:
+            self._limited -= 1
+            self._slots.release()
+
+
+class WebhookServer:
+    """Встроенный сервер aiohttp для приема обновлений Telegram"""
+
+    def __init__(
+        self,
+        bot: Bot,
+        update_queue: asyncio.Queue,
+        path: str,
+        secret_token: str,
+        host: str,
+        port: int,
+        queue_size: int
+    ):
+        """
+        Args:
+            bot: Бот для разбора обновлений
+            update_queue: Очередь, в которую передаются обновления
+                (update_queue приложения PTB с InFlightLimitedQueue)
+            path: Путь webhook, например /telegram
+            secret_token: Секрет, который Telegram передает в заголовке
+            host: Адрес для прослушивания
+            port: Порт для прослушивания
+            queue_size: Размер входной очереди
+        """
+        self.bot = bot
+        self.update_queue = update_queue
+        self.path = path
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.ingress: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._runner: Optional[web.AppRunner] = None
+        self._forwarder: Optional[asyncio.Task] = None
+        self._accepting = False
+        self._overloaded = False
+
+    def build_app(self) -> web.Application:
+        """Приложение aiohttp с маршрутами webhook и проверки состояния"""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get("/healthz", self.handle_health)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """Прием одного обновления от Telegram"""
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            return web.Response(status=403)
+
+        if not self._accepting:
+            return web.Response(status=503, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.bot)
+        except (json.JSONDecodeError, ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Webhook: некорректное обновление: {e}")
+            return web.Response(status=400)
+
+        try:
+            self.ingress.put_nowait(update)
+        except asyncio.QueueFull:
+            if not self._overloaded:
+                self._overloaded = True
+                logger.warning("Webhook: входная очередь заполнена, обновления отклоняются (503)")
+            return web.Response(status=503, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+        if self._overloaded:
+            self._overloaded = False
+            logger.info("Webhook: прием обновлений восстановлен")
+        return web.Response(status=200)
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """Состояние сервера для балансировщика/мониторинга"""
+        return web.json_response({
+            "accepting": self._accepting,
+            "ingress_queue": self.ingress.qsize(),
+            "ingress_capacity": self.ingress.maxsize
+        })
+
+    async def _forward(self) -> None:
+        """Передает обновления из входной очереди в приложение по порядку"""
+        update_queue = self.update_queue
+        while True:
+            update = await self.ingress.get()
+            try:
+                if isinstance(update_queue, InFlightLimitedQueue):
+                    await update_queue.put_limited(update)
+                else:
+                    await update_queue.put(update)
+            finally:
+                self.ingress.task_done()
+
+    async def start(self) -> None:
+        """Запускает прием обновлений"""
+        self._forwarder = asyncio.create_task(self._forward(), name="webhook_forwarder")
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self._accepting = True
+        logger.info(f"Webhook-сервер слушает {self.host}:{self.port}{self.path}")
+
+    async def stop(self) -> None:
+        """Прекращает прием и дожидается обработки уже принятых обновлений"""
+        self._accepting = False
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+        pending = self.ingress.qsize()
+        if pending:
+            logger.info(f"Webhook: обработка оставшихся обновлений: {pending}")
+        await self.ingress.join()
+        if self._forwarder is not None:
+            self._forwarder.cancel()
+            self._forwarder = None
+
+        # Все переданные дальше обновления обработаны
+        await self.update_queue.join()
+        logger.info("Webhook-сервер остановлен")
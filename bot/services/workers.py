@@ -0,0 +1,369 @@
+"""
+Многопроцессный режим: супервизор и процессы-обработчики (WORKER_PROCESSES > 1)
+
+Один процесс упирается в одно ядро на CPU-задачах (Pillow, matplotlib,
+reportlab, textstat). В многопроцессном режиме run.py запускает супервизор:
+
+- супервизор - единственная точка приема обновлений (polling или webhook);
+- обновления распределяются по WORKER_PROCESSES процессам по user_id
+  (остаток от деления), поэтому все обновления одного пользователя
+  обрабатывает один процесс и порядок внутри пользователя сохраняется;
+- обновления передаются по локальному unix-сокету строками JSON;
+- процессы присылают heartbeat; упавший или зависший процесс
+  перезапускается, неотправленные ему обновления дожидаются нового процесса.
+  Уже отправленные, но не обработанные упавшим процессом обновления теряются.
+
+Общее состояние - только в БД (в том числе user_data и состояния диалогов,
+см. bot.services.state_persistence); кэши в памяти у каждого процесса свои.
+Процесс-обработчик - обычный бот (bot.main.run_bot) без собственного
+приема обновлений: супервизор задает ему BOT_WORKER_INDEX и BOT_WORKER_SOCKET.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from telegram import Update
+from telegram.ext import Application
+from bot.config import config
+from bot.services.webhook import InFlightLimitedQueue
+
+logger = logging.getLogger(__name__)
+
+# Переменные окружения процесса-обработчика
+WORKER_INDEX_ENV = "BOT_WORKER_INDEX"
+WORKER_SOCKET_ENV = "BOT_WORKER_SOCKET"
+# Пауза перед перезапуском процесса, растет при повторных падениях (секунды)
+RESTART_DELAY_MIN = 1
+RESTART_DELAY_MAX = 60
+# Сколько ждать подключения нового процесса (импорт, инициализация)
+STARTUP_TIMEOUT = 120
+
+
+def shard_for(update: Update, workers: int) -> int:
+    """
+    Номер процесса для обновления: по пользователю, иначе по чату
+
+    Args:
+        update: Обновление
+        workers: Количество процессов
+
+    Returns:
+        Номер процесса от 0 до workers - 1
+    """
+    if update.effective_user is not None:
+        key = update.effective_user.id
+    elif update.effective_chat is not None:
+        key = update.effective_chat.id
+    else:
+        key = update.update_id
+    return key % workers
+
+
+class WorkerProcess:
+    """Процесс-обработчик, каким его видит супервизор"""
+
+    def __init__(self, index: int, queue_size: int):
+        self.index = index
+        # Обновления, ожидающие отправки в процесс (переживают его перезапуск)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.connected = asyncio.Event()
+        self.started_at = 0.0
+        self.last_heartbeat = 0.0
+        self.restarts = 0
+        # Падения подряд: от них зависит пауза перед перезапуском
+        self.failures = 0
+        self.restarting = False
+        # Обновление, отправка которого не удалась - отправляется первым
+        self.retry: Optional[str] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+
+class Supervisor:
+    """Запуск процессов-обработчиков, маршрутизация обновлений и контроль здоровья"""
+
+    def __init__(
+        self,
+        workers: int,
+        socket_path: Path,
+        queue_size: int,
+        heartbeat_interval: float,
+        heartbeat_timeout: float,
+        command: Optional[List[str]] = None
+    ):
+        """
+        Args:
+            workers: Количество процессов-обработчиков
+            socket_path: Путь unix-сокета для связи с процессами
+            queue_size: Размер входной очереди и очереди каждого процесса
+            heartbeat_interval: Период проверки процессов в секундах
+            heartbeat_timeout: Через сколько секунд без heartbeat процесс перезапускается
+            command: Команда запуска процесса (по умолчанию run.py)
+        """
+        self.socket_path = socket_path
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.command = command or [sys.executable, str(config.BASE_DIR / "run.py")]
+        # Входная очередь: сюда кладут обновления polling и webhook
+        self.update_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.workers = [WorkerProcess(index, queue_size) for index in range(workers)]
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    async def start(self) -> None:
+        """Запускает сервер сокета, процессы, маршрутизацию и контроль"""
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        self._server = await asyncio.start_unix_server(self._handle_connection, path=str(self.socket_path))
+
+        for worker in self.workers:
+            await self._spawn(worker)
+        self._tasks.append(asyncio.create_task(self._route(), name="supervisor_router"))
+        self._tasks.append(asyncio.create_task(self._monitor(), name="supervisor_monitor"))
+        for worker in self.workers:
+            self._tasks.append(asyncio.create_task(self._send(worker), name=f"supervisor_sender_{worker.index}"))
+        logger.info(f"Супервизор запущен: процессов {len(self.workers)}")
+
+    async def wait_ready(self, timeout: float = STARTUP_TIMEOUT) -> None:
+        """Ждет подключения всех процессов"""
+        await asyncio.wait_for(
+            asyncio.gather(*(worker.connected.wait() for worker in self.workers)),
+            timeout=timeout
+        )
+
+    async def _spawn(self, worker: WorkerProcess) -> None:
+        env = dict(os.environ)
+        env[WORKER_INDEX_ENV] = str(worker.index)
+        env[WORKER_SOCKET_ENV] = str(self.socket_path)
+        worker.connected.clear()
+        worker.writer = None
+        worker.started_at = time.monotonic()
+        # Отдельная группа процессов: Ctrl+C получает только супервизор,
+        # а процессы останавливаются по разрыву соединения после передачи обновлений
+        worker.process = await asyncio.create_subprocess_exec(*self.command, env=env, start_new_session=True)
+        logger.info(f"Процесс-обработчик {worker.index} запущен (pid {worker.process.pid})")
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Соединение от процесса: приветствие, затем heartbeat до разрыва"""
+        worker = None
+        try:
+            hello = json.loads(await reader.readline())
+            index = int(hello["worker"])
+            if not 0 <= index < len(self.workers):
+                raise ValueError(f"неизвестный номер процесса {index}")
+            worker = self.workers[index]
+            worker.writer = writer
+            worker.last_heartbeat = time.monotonic()
+            worker.connected.set()
+            logger.info(f"Процесс-обработчик {index} подключен")
+
+            while line := await reader.readline():
+                json.loads(line)  # {"heartbeat": ...}
+                worker.last_heartbeat = time.monotonic()
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Супервизор: некорректное сообщение процесса: {e}")
+        except ConnectionError:
+            pass
+        finally:
+            if worker is not None and worker.writer is writer:
+                worker.writer = None
+                worker.connected.clear()
+            writer.close()
+
+    async def _route(self) -> None:
+        """Распределяет входные обновления по очередям процессов"""
+        workers = len(self.workers)
+        while True:
+            update = await self.update_queue.get()
+            try:
+                if isinstance(update, Update):
+                    worker = self.workers[shard_for(update, workers)]
+                    await worker.queue.put(json.dumps(update.to_dict()))
+            finally:
+                self.update_queue.task_done()
+
+    async def _send(self, worker: WorkerProcess) -> None:
+        """Отправляет обновления из очереди процесса по его соединению"""
+        while True:
+            if worker.retry is None:
+                worker.retry = await worker.queue.get()
+                worker.queue.task_done()
+            await worker.connected.wait()
+            writer = worker.writer
+            if writer is None:
+                continue
+            try:
+                writer.write(worker.retry.encode() + b"\n")
+                await writer.drain()
+                worker.retry = None
+            except ConnectionError:
+                # Процесс отключился - отправим новому после перезапуска
+                worker.connected.clear()
+
+    async def _monitor(self) -> None:
+        """Перезапускает упавшие и зависшие процессы"""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            for worker in self.workers:
+                if worker.restarting or self._stopping:
+                    continue
+                reason = None
+                if not worker.alive:
+                    reason = f"процесс завершился с кодом {worker.process.returncode}"
+                elif worker.connected.is_set() and now - worker.last_heartbeat > self.heartbeat_timeout:
+                    reason = f"нет heartbeat {now - worker.last_heartbeat:.0f} с"
+                elif not worker.connected.is_set() and now - worker.started_at > STARTUP_TIMEOUT:
+                    reason = "процесс не подключился"
+                if reason:
+                    worker.restarting = True
+                    self._tasks.append(asyncio.create_task(self._restart(worker, reason)))
+
+    async def _restart(self, worker: WorkerProcess, reason: str) -> None:
+        logger.error(f"Процесс-обработчик {worker.index}: {reason}, перезапуск")
+        try:
+            if worker.alive:
+                worker.process.kill()
+                await worker.process.wait()
+            # Процесс, проработавший долго, перезапускается сразу; падающий при старте - с растущей паузой
+            if time.monotonic() - worker.started_at > RESTART_DELAY_MAX * 10:
+                worker.failures = 0
+            delay = min(RESTART_DELAY_MIN * 2 ** worker.failures, RESTART_DELAY_MAX)
+            worker.failures += 1
+            worker.restarts += 1
+            await asyncio.sleep(delay)
+            if not self._stopping:
+                await self._spawn(worker)
+        finally:
+            worker.restarting = False
+
+    def stats(self) -> Dict[int, Dict[str, int]]:
+        """Очереди и перезапуски процессов"""
+        return {
+            worker.index: {"queued": worker.queue.qsize(), "restarts": worker.restarts, "alive": int(worker.alive)}
+            for worker in self.workers
+        }
+
+    async def stop(self, timeout: float = 30) -> None:
+        """
+        Дожидается отправки принятых обновлений и останавливает процессы
+
+        Процессы получают конец потока, обрабатывают уже полученные
+        обновления и завершаются; не успевшие за timeout завершаются принудительно.
+        """
+        self._stopping = True
+        try:
+            await asyncio.wait_for(self._drain(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Супервизор: не все обновления переданы процессам до остановки")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Полузакрытие: процесс дочитывает отправленные обновления до EOF,
+        # а его heartbeat продолжают читаться (полное закрытие оборвало бы
+        # соединение и непрочитанные обновления пропали бы)
+        for worker in self.workers:
+            if worker.writer is not None and worker.writer.can_write_eof():
+                worker.writer.write_eof()
+
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            try:
+                await asyncio.wait_for(worker.process.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Процесс-обработчик {worker.index} не завершился, принудительная остановка")
+                worker.process.kill()
+                await worker.process.wait()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        logger.info("Супервизор остановлен")
+
+    async def _drain(self) -> None:
+        await self.update_queue.join()
+        for worker in self.workers:
+            while (worker.queue.qsize() or worker.retry is not None) and worker.alive:
+                await asyncio.sleep(0.05)
+
+
+class WorkerLink:
+    """Связь процесса-обработчика с супервизором"""
+
+    def __init__(self, index: int, socket_path: str, heartbeat_interval: float):
+        """
+        Args:
+            index: Номер процесса
+            socket_path: Путь unix-сокета супервизора
+            heartbeat_interval: Период heartbeat в секундах
+        """
+        self.index = index
+        self.socket_path = socket_path
+        self.heartbeat_interval = heartbeat_interval
+        # Устанавливается при разрыве соединения: супервизор останавливает процесс
+        self.closed = asyncio.Event()
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._update_queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self, application: Application) -> None:
+        """Подключается к супервизору и начинает передавать обновления в приложение"""
+        self._update_queue = application.update_queue
+        reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+        self._writer.write(json.dumps({"worker": self.index}).encode() + b"\n")
+        await self._writer.drain()
+        self._tasks = [
+            asyncio.create_task(self._receive(reader, application), name="worker_receiver"),
+            asyncio.create_task(self._heartbeat(), name="worker_heartbeat")
+        ]
+        logger.info(f"Процесс-обработчик {self.index} подключен к супервизору")
+
+    async def _receive(self, reader: asyncio.StreamReader, application: Application) -> None:
+        update_queue = application.update_queue
+        try:
+            while line := await reader.readline():
+                update = Update.de_json(json.loads(line), application.bot)
+                # Ожидание свободного места замедляет чтение сокета - обратное давление
+                if isinstance(update_queue, InFlightLimitedQueue):
+                    await update_queue.put_limited(update)
+                else:
+                    await update_queue.put(update)
+        except ConnectionError:
+            pass
+        finally:
+            self.closed.set()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                self._writer.write(json.dumps({"heartbeat": self.index}).encode() + b"\n")
+                await self._writer.drain()
+            except ConnectionError:
+                self.closed.set()
+                return
+
+    async def stop(self) -> None:
+        """Закрывает соединение и дожидается обработки полученных обновлений"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._writer is not None:
+            self._writer.close()
+        if self._update_queue is not None:
+            await self._update_queue.join()
+        logger.info(f"Процесс-обработчик {self.index} отключен от супервизора")
@@ -1,615 +1,770 @@
 """
 Утилиты для экспорта контента
+
+Экспорт потоковый: записи читаются из БД порциями (yield_per, на PostgreSQL -
+серверный курсор) и сразу пишутся в файл, поэтому память не растет с размером
+истории. Файл пишется во временный (.part) и переименовывается по готовности.
+Файлы форматов пишутся в пуле потоков (EXPORT_WORKERS) и не блокируют
+event loop. На SQLite (одно соединение) записи сначала быстро читаются в
+потоке loop'а во временный файл, и формат пишется в пуле уже по нему.
+
+Пакетный экспорт (batch_export) читает записи один раз во временный файл,
+пишет все форматы параллельно в процессах (EXPORT_PROCESSES) и собирает
+результат в один архив.
+
+Имя файла строится по версии данных (см. bot.services.export_cache): пока
+история или планы пользователя не изменились, экспорт отдает готовый файл.
 """
-import logging
+import asyncio
 import csv
-import json
-from datetime import datetime, date, timedelta
+import io
+import logging
+import multiprocessing
+import os
+import pickle
+import re
+import shutil
+import textwrap
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, time, timedelta
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+from sqlalchemy import Select, func, select
+from sqlalchemy.orm import Session
+from bot.config import config
 from bot.database.models import ContentHistory, ContentPlan
 from bot.database.database import get_db
+from bot.database.migrations import content_history_fields
+from bot.services.export_cache import export_cache
+from bot.services.history_writer import history_writer
+from bot.utils.lazy import lazy_import
 
-try:
-    from docx import Document
-    docx_available = True
-except ImportError:
-    docx_available = False
-    logging.warning("python-docx не установлен, экспорт в DOCX будет недоступен")
-
-try:
-    from reportlab.lib.pagesizes import letter, A4
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.units import inch
-    reportlab_available = True
-except ImportError:
-    reportlab_available = False
-    logging.warning("reportlab не установлен, экспорт в PDF будет недоступен")
-
-try:
-    import openpyxl
-    from openpyxl import Workbook
-    openpyxl_available = True
-except ImportError:
-    openpyxl_available = False
-    logging.warning("openpyxl не установлен, экспорт в Excel будет недоступен")
-
-try:
-    from icalendar import Calendar, Event
-    icalendar_available = True
-except ImportError:
-    icalendar_available = False
-    logging.warning("icalendar не установлен, экспорт в iCal будет недоступен")
+# Тяжелые библиотеки форматов импортируются при первом экспорте
+docx = lazy_import("docx", "python-docx не установлен, экспорт в DOCX будет недоступен")
+pdf_canvas = lazy_import("reportlab.pdfgen.canvas", "reportlab не установлен, экспорт в PDF будет недоступен")
+pagesizes = lazy_import("reportlab.lib.pagesizes")
+openpyxl = lazy_import("openpyxl", "openpyxl не установлен, экспорт в Excel будет недоступен")
+icalendar = lazy_import("icalendar", "icalendar не установлен, экспорт в iCal будет недоступен")
 
 logger = logging.getLogger(__name__)
 
-EXPORT_DIR = Path("data/exports")
-EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+EXPORT_DIR = config.EXPORTS_DIR
+# Меняется вместе с форматом файлов: старые файлы экспорта перестают совпадать по имени
+EXPORT_FORMAT_VERSION = 1
+# Записей в одной порции чтения из БД
+EXPORT_BATCH_SIZE = 500
+# Символов в строке PDF (шрифт 11 pt, поля 50 pt)
+PDF_LINE_CHARS = 80
+DAYS_NAMES = ['пн', 'вт', 'ср', 'чт', 'пт', 'сб', 'вс']
+# Тело документа DOCX - пишется потоково, остальные части берутся из шаблона python-docx
+DOCX_BODY = "word/document.xml"
+# Символы, недопустимые в XML
+XML_INVALID_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
 
+_executor = ThreadPoolExecutor(max_workers=config.EXPORT_WORKERS, thread_name_prefix="export")
+# Процессы записи форматов пакетного экспорта (создаются при первом использовании)
+_process_pool: Optional[ProcessPoolExecutor] = None
 
-async def export_history_to_txt(user_id: int, limit: Optional[int] = None) -> Optional[Path]:
+
+def _stream(db: Session, statement: Select):
+    """Результат запроса порциями по EXPORT_BATCH_SIZE строк"""
+    return db.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+
+def _history_statement(
+    user_id: int,
+    limit: Optional[int] = None,
+    content_types: Optional[Sequence[str]] = None,
+    since: Optional[datetime] = None,
+    files_only: bool = False
+) -> Select:
     """
-    Экспортирует историю контента в текстовый файл
-    
+    Запрос записей истории (без загрузки ORM-объектов), новые первыми
+
+    Строка: (generated_at, content_type, content_data, file_path)
+
     Args:
         user_id: ID пользователя
-        limit: Максимальное количество записей (None = все)
-    
+        limit: Максимальное количество записей
+        content_types: Только записи этих типов
+        since: Только записи не старше (UTC)
+        files_only: Только записи с файлом
+    """
+    statement = select(
+        ContentHistory.generated_at,
+        ContentHistory.content_type,
+        ContentHistory.content_data,
+        ContentHistory.file_path
+    ).where(ContentHistory.user_id == user_id)
+    if content_types:
+        statement = statement.where(ContentHistory.content_type.in_(content_types))
+    if since:
+        statement = statement.where(ContentHistory.generated_at >= since)
+    if files_only:
+        statement = statement.where(ContentHistory.file_path.isnot(None))
+    statement = statement.order_by(ContentHistory.generated_at.desc())
+    if limit:
+        statement = statement.limit(limit)
+    return statement
+
+
+def _history_rows(user_id: int, **filters) -> Iterator[Tuple]:
+    """
+    Записи истории пользователя порциями из БД (сессия открыта, пока идет чтение)
+
+    Args:
+        user_id: ID пользователя
+        **filters: Параметры _history_statement
+
     Returns:
-        Path к файлу или None
+        Итератор строк (generated_at, content_type, content_data, file_path)
+    """
+    history_writer.flush_user_sync(user_id)
+    # file_path записей, еще не перенесенных фоном - отдельной короткой транзакцией
+    with get_db() as db:
+        content_history_fields.backfill_user(db, user_id)
+    with get_db() as db:
+        yield from _stream(db, _history_statement(user_id, **filters))
+
+
+def _history_version(user_id: int) -> List[int]:
+    """Версия истории пользователя: (max id, количество записей) - меняется при добавлении и удалении"""
+    history_writer.flush_user_sync(user_id)
+    with get_db() as db:
+        return list(db.execute(
+            select(func.max(ContentHistory.id), func.count()).where(ContentHistory.user_id == user_id)
+        ).one())
+
+
+def _plan_rows(user_id: int, plan_id: Optional[int], active_only: bool = False) -> Iterator[Tuple]:
     """
+    Контент-планы пользователя из БД (сессия открыта, пока идет чтение)
+
+    Args:
+        user_id, plan_id, active_only: см. _plans_statement
+
+    Returns:
+        Итератор строк (plan_name, start_date, end_date, frequency, schedule, is_active)
+    """
+    with get_db() as db:
+        yield from _stream(db, _plans_statement(user_id, plan_id, active_only))
+
+
+def _plans_version(user_id: int, plan_id: Optional[int]) -> List[Any]:
+    """Версия контент-планов пользователя: (последнее изменение, max id, количество)"""
+    statement = select(
+        func.max(ContentPlan.updated_at),
+        func.max(ContentPlan.id),
+        func.count()
+    ).where(ContentPlan.user_id == user_id)
+    if plan_id:
+        statement = statement.where(ContentPlan.id == plan_id)
+    with get_db() as db:
+        return list(db.execute(statement).one())
+
+
+def _plans_statement(user_id: int, plan_id: Optional[int], active_only: bool = False) -> Select:
+    """
+    Запрос контент-планов пользователя
+
+    Args:
+        user_id: ID пользователя
+        plan_id: ID плана (None = все активные планы)
+        active_only: Только активные, даже если указан plan_id
+    """
+    statement = select(
+        ContentPlan.plan_name,
+        ContentPlan.start_date,
+        ContentPlan.end_date,
+        ContentPlan.frequency,
+        ContentPlan.schedule,
+        ContentPlan.is_active
+    ).where(ContentPlan.user_id == user_id)
+    if plan_id:
+        statement = statement.where(ContentPlan.id == plan_id)
+    if active_only or not plan_id:
+        statement = statement.where(ContentPlan.is_active == True)
+    return statement
+
+
+def _text_fields(content_data: Any) -> Tuple[Dict[str, Any], str, List[str]]:
+    """(content_data как словарь, текст, хештеги) записи истории"""
+    data = content_data if isinstance(content_data, dict) else {}
+    return data, data.get("text", str(content_data)), data.get("hashtags", [])
+
+
+def _texts(rows: Iterable[Tuple]) -> Iterator[Tuple]:
+    """Только текстовые записи (пакетный экспорт передает записи всех типов)"""
+    return (row for row in rows if row[1] == "text")
+
+
+def _text_row(generated_at: datetime, content_data: Any) -> List[str]:
+    """Строка таблицы текстов: дата, текст, хештеги, стиль, тип"""
+    data, text, hashtags = _text_fields(content_data)
+    return [
+        generated_at.strftime("%d.%m.%Y %H:%M"),
+        text,
+        ' '.join(hashtags),
+        data.get("style", "не указан"),
+        data.get("type", "обычный")
+    ]
+
+
+def _plan_days(schedule: Dict[str, Any]) -> str:
+    days = schedule.get("days", [])
+    return ', '.join([DAYS_NAMES[d-1] for d in days]) if days else "не указано"
+
+
+async def _call(func_: Callable, *args, reads_db: bool = True):
+    """Выполняет синхронную работу в пуле потоков экспорта"""
+    if reads_db and config.DATABASE_URL.startswith("sqlite"):
+        # SQLite работает через одно соединение (StaticPool) - только в потоке loop'а
+        return func_(*args)
+    return await asyncio.get_running_loop().run_in_executor(_executor, func_, *args)
+
+
+async def _export(
+    writer: Callable[..., int],
+    filename: str,
+    description: str,
+    *args,
+    reads_db: bool = True
+) -> Optional[Path]:
+    """
+    Выполняет экспорт в файл EXPORT_DIR/filename
+
+    Args:
+        writer: Функция writer(путь, *args), которая пишет файл и возвращает количество записей
+        filename: Имя файла
+        description: Что экспортируется (для лога)
+        reads_db: Первый из args - итератор записей из БД (writer(путь, rows))
+
+    Returns:
+        Path к файлу или None, если записей нет или произошла ошибка
+    """
+    file_path = EXPORT_DIR / filename
+    # С pid: один и тот же файл могут готовить несколько процессов бота
+    tmp_path = file_path.with_name(f"{filename}.{os.getpid()}.part")
+    spool_path = file_path.with_name(f"{filename}.{os.getpid()}.spool.part")
     try:
-        with get_db() as db:
-            query = db.query(ContentHistory).filter(
-                ContentHistory.user_id == user_id
-            ).order_by(ContentHistory.generated_at.desc())
-            
-            if limit:
-                query = query.limit(limit)
-            
-            history_items = query.all()
-        
-        if not history_items:
+        if reads_db and config.DATABASE_URL.startswith("sqlite"):
+            # SQLite работает через одно соединение (StaticPool) - записи читаются
+            # в потоке loop'а во временный файл, а формат пишется по нему в пуле
+            if not _spool_rows(spool_path, args[0]):
+                return None
+            count = await _call(_write_from_spool, writer, str(spool_path), str(tmp_path), reads_db=False)
+        else:
+            count = await _call(writer, tmp_path, *args, reads_db=False)
+        if not count:
             return None
-        
-        # Создаем файл
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"history_{user_id}_{timestamp}.txt"
-        file_path = EXPORT_DIR / filename
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write("=" * 80 + "\n")
-            f.write("ИСТОРИЯ КОНТЕНТА\n")
-            f.write("=" * 80 + "\n\n")
-            
-            for i, item in enumerate(history_items, 1):
-                date_str = item.generated_at.strftime("%d.%m.%Y %H:%M")
-                f.write(f"Запись {i}\n")
-                f.write("-" * 80 + "\n")
-                f.write(f"Дата: {date_str}\n")
-                f.write(f"Тип: {item.content_type}\n")
-                
-                if item.content_type == "text":
-                    content_data = item.content_data if isinstance(item.content_data, dict) else {}
-                    text = content_data.get("text", str(item.content_data))
-                    hashtags = content_data.get("hashtags", [])
-                    
-                    f.write(f"\nТекст:\n{text}\n")
-                    
-                    if hashtags:
-                        f.write(f"\nХештеги: {' '.join(hashtags)}\n")
-                
-                f.write("\n" + "=" * 80 + "\n\n")
-        
-        logger.info(f"Экспортировано {len(history_items)} записей в {file_path}")
-        return file_path
-    
+        os.replace(tmp_path, file_path)
     except Exception as e:
-        logger.exception(f"Ошибка при экспорте истории: {e}")
+        logger.exception(f"Ошибка при экспорте ({description}): {e}")
         return None
+    finally:
+        tmp_path.unlink(missing_ok=True)
+        spool_path.unlink(missing_ok=True)
+
+    logger.info(f"Экспортировано {count} записей ({description}): {file_path}")
+    return file_path
+
+
+async def _cached_export(
+    prefix: str,
+    extension: str,
+    user_id: int,
+    version: List[Any],
+    filters: List[Any],
+    writer: Callable[..., int],
+    description: str,
+    *args,
+    reads_db: bool = True
+) -> Optional[Path]:
+    """
+    Экспорт через кэш файлов: при той же версии данных возвращает готовый файл
+
+    Args:
+        prefix: Начало имени файла
+        extension: Расширение файла
+        user_id: ID пользователя
+        version: Версия данных (_history_version, _plans_version)
+        filters: Параметры выборки (limit, plan_id...)
+        writer, description, *args, reads_db: см. _export
+
+    Returns:
+        Path к файлу или None
+    """
+    filename = export_cache.artifact_name(prefix, user_id, extension, EXPORT_FORMAT_VERSION, filters, version)
+    return await export_cache.artifact(
+        filename,
+        lambda name: _export(writer, name, description, *args, reads_db=reads_db)
+    )
+
+
+def _write_history_txt(path: Path, rows: Iterable[Tuple]) -> int:
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("=" * 80 + "\n")
+        f.write("ИСТОРИЯ КОНТЕНТА\n")
+        f.write("=" * 80 + "\n\n")
+
+        for count, (generated_at, content_type, content_data, _) in enumerate(rows, 1):
+            f.write(f"Запись {count}\n")
+            f.write("-" * 80 + "\n")
+            f.write(f"Дата: {generated_at.strftime('%d.%m.%Y %H:%M')}\n")
+            f.write(f"Тип: {content_type}\n")
+
+            if content_type == "text":
+                _, text, hashtags = _text_fields(content_data)
+                f.write(f"\nТекст:\n{text}\n")
+                if hashtags:
+                    f.write(f"\nХештеги: {' '.join(hashtags)}\n")
+
+            f.write("\n" + "=" * 80 + "\n\n")
+    return count
+
+
+def _write_texts_csv(path: Path, rows: Iterable[Tuple]) -> int:
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Дата", "Текст", "Хештеги", "Стиль", "Тип"])
+
+        for count, (generated_at, _, content_data, _) in enumerate(_texts(rows), 1):
+            writer.writerow(_text_row(generated_at, content_data))
+    return count
+
+
+def _write_texts_excel(path: Path, rows: Iterable[Tuple]) -> int:
+    # Режим write_only: строки сразу сбрасываются на диск, а не копятся в листе
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Тексты")
+    ws.append(["Дата", "Текст", "Хештеги", "Стиль", "Тип"])
+
+    count = 0
+    for count, (generated_at, _, content_data, _) in enumerate(_texts(rows), 1):
+        # Управляющие символы openpyxl не принимает
+        ws.append([XML_INVALID_CHARS.sub("", value) for value in _text_row(generated_at, content_data)])
+
+    wb.save(path)
+    return count
+
+
+def _docx_paragraph(text: str, style: Optional[str] = None) -> bytes:
+    """Абзац WordprocessingML; переводы строк - разрывы строки, как в python-docx"""
+    properties = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+    lines = XML_INVALID_CHARS.sub("", text).replace("\r", "").split("\n")
+    runs = "<w:br/>".join(f'<w:t xml:space="preserve">{escape(line)}</w:t>' for line in lines)
+    return f"<w:p>{properties}<w:r>{runs}</w:r></w:p>".encode("utf-8")
+
+
+def _write_docx(path: Path, rows: Iterable[Tuple]) -> int:
+    # Пустой документ python-docx: стили, тема и настройки копируются как есть
+    template_buffer = io.BytesIO()
+    docx.Document().save(template_buffer)
+
+    count = 0
+    with zipfile.ZipFile(template_buffer) as template, \
+            zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as package:
+        for item in template.infolist():
+            if item.filename != DOCX_BODY:
+                package.writestr(item, template.read(item))
+
+        # Абзацы вставляются перед параметрами раздела (w:sectPr) в конце тела
+        body = template.read(DOCX_BODY)
+        split_at = body.rindex(b"<w:sectPr")
+
+        with package.open(DOCX_BODY, 'w') as f:
+            f.write(body[:split_at])
+            f.write(_docx_paragraph('История контента', "Title"))
+
+            for count, (generated_at, _, content_data, _) in enumerate(_texts(rows), 1):
+                _, text, hashtags = _text_fields(content_data)
+                date_str = generated_at.strftime("%d.%m.%Y %H:%M")
+                f.write(_docx_paragraph(f'Запись {count} - {date_str}', "Heading1"))
+                f.write(_docx_paragraph(text))
+                if hashtags:
+                    f.write(_docx_paragraph(f"Хештеги: {' '.join(hashtags)}"))
+
+            f.write(body[split_at:])
+    return count
+
+
+def _write_pdf(path: Path, rows: Iterable[Tuple]) -> int:
+    c = pdf_canvas.Canvas(str(path), pagesize=pagesizes.A4, pageCompression=1)
+    width, height = pagesizes.A4
+    y_position = height - 50
+    current_font = None
+
+    def draw(line: str, font: str, size: int, step: int) -> None:
+        nonlocal y_position, current_font
+        if y_position < 100:
+            c.showPage()
+            y_position = height - 50
+            current_font = None
+        if current_font != (font, size):
+            c.setFont(font, size)
+            current_font = (font, size)
+        c.drawString(50, y_position, line)
+        y_position -= step
+
+    def draw_wrapped(text: str, font: str, size: int, step: int) -> None:
+        # Перенос длинных строк по словам
+        for paragraph in text.split('\n'):
+            for line in textwrap.wrap(paragraph, PDF_LINE_CHARS) or [""]:
+                draw(line, font, size, step)
+
+    draw("История контента", "Helvetica-Bold", 16, 40)
+
+    count = 0
+    for count, (generated_at, _, content_data, _) in enumerate(_texts(rows), 1):
+        _, text, hashtags = _text_fields(content_data)
+        date_str = generated_at.strftime("%d.%m.%Y %H:%M")
+        draw(f"Запись {count} - {date_str}", "Helvetica-Bold", 14, 25)
+        draw_wrapped(text, "Helvetica", 11, 15)
+        if hashtags:
+            draw_wrapped(f"Хештеги: {' '.join(hashtags)}", "Helvetica-Oblique", 10, 15)
+            y_position -= 5
+        y_position -= 10
+
+    c.save()
+    return count
+
+
+def _plan_row(plan_name, start_date, end_date, frequency, schedule) -> List[Any]:
+    schedule = schedule if isinstance(schedule, dict) else {}
+    topics = schedule.get("topics") or "не указано"
+    if isinstance(topics, list):
+        # Ячейка Excel не принимает список
+        topics = ', '.join(map(str, topics))
+    return [
+        plan_name,
+        start_date.strftime("%d.%m.%Y"),
+        end_date.strftime("%d.%m.%Y"),
+        f"{frequency} раз в неделю",
+        _plan_days(schedule),
+        schedule.get("time", "не указано"),
+        topics
+    ]
+
+
+def _write_plans_csv(path: Path, rows: Iterable[Tuple]) -> int:
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([
+            "План", "Начало", "Окончание", "Частота", "Дни недели", "Время", "Темы"
+        ])
+        for count, (*plan, _) in enumerate(rows, 1):
+            writer.writerow(_plan_row(*plan))
+    return count
+
+
+def _write_plans_excel(path: Path, rows: Iterable[Tuple]) -> int:
+    # Режим write_only: строки сразу сбрасываются на диск, а не копятся в листе
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Контент-планы")
+    ws.append(["План", "Начало", "Окончание", "Частота", "Дни недели", "Время", "Темы", "Статус"])
+
+    count = 0
+    for count, (*plan, is_active) in enumerate(rows, 1):
+        ws.append(_plan_row(*plan) + ["Активен" if is_active else "Неактивен"])
+
+    wb.save(path)
+    return count
+
+
+def _write_ical(path: Path, rows: Iterable[Tuple]) -> int:
+    cal = icalendar.Calendar()
+    cal.add('prodid', '-//NKO Bot Content Plan//EN')
+    cal.add('version', '2.0')
+    # События пишутся между заголовком и концом календаря по одному
+    header, end, footer = cal.to_ical().rpartition(b"END:VCALENDAR")
+
+    count = 0
+    with open(path, 'wb') as f:
+        f.write(header)
+        for count, (plan_name, start_date, end_date, _, schedule, _) in enumerate(rows, 1):
+            schedule = schedule if isinstance(schedule, dict) else {}
+            days = schedule.get("days", [])
+            topics = schedule.get("topics", [])
+
+            # Парсим время
+            try:
+                hour, minute = map(int, schedule.get("time", "12:00").split(':'))
+                publish_time = time(hour, minute)
+            except (AttributeError, ValueError):
+                publish_time = time(12, 0)
+
+            # Генерируем события для всех дней публикации
+            current_date = start_date
+            event_num = 0
+            while current_date <= end_date:
+                weekday = current_date.weekday() + 1  # 1=понедельник, 7=воскресенье
+
+                if weekday in days:
+                    event = icalendar.Event()
+                    event.add('summary', f"{plan_name} - Публикация поста")
+
+                    # Тема поста
+                    topic = topics[event_num % len(topics)] if topics else "Пост для НКО"
+                    event.add('description', f"Тема поста: {topic}")
+
+                    # Дата и время
+                    start = datetime.combine(current_date, publish_time)
+                    event.add('dtstart', start)
+                    event.add('dtend', start + timedelta(hours=1))
+                    event.add('dtstamp', datetime.now())
+
+                    f.write(event.to_ical())
+                    event_num += 1
+
+                current_date += timedelta(days=1)
+        f.write(end + footer)
+    return count
+
+
+def _write_images_archive(path: Path, rows: Iterable[Tuple]) -> int:
+    count = 0
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for _, content_type, _, file_path in rows:
+            if content_type == "image" and file_path and Path(file_path).exists():
+                # Добавляем файл в архив
+                count += 1
+                arcname = f"image_{count}_{Path(file_path).name}"
+                zipf.write(file_path, arcname)
+    return count
+
+
+def _spool_rows(path: Path, rows: Iterable[Tuple]) -> int:
+    """
+    Сохраняет записи во временный файл порциями (pickle) для процессов записи форматов
+
+    Returns:
+        Количество записей
+    """
+    count = 0
+    batch = []
+    with open(path, 'wb') as f:
+        for row in rows:
+            batch.append(tuple(row))
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+                count += len(batch)
+                batch = []
+        if batch:
+            pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+            count += len(batch)
+    return count
+
+
+def _read_spool(path: str) -> Iterator[Tuple]:
+    """Записи из временного файла _spool_rows по порциям"""
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            yield from batch
+
+
+def _write_from_spool(writer: Callable[..., int], spool_path: str, path: str) -> int:
+    """Пишет файл формата по записям временного файла (в процессе или потоке пула)"""
+    return writer(Path(path), _read_spool(spool_path))
+
+
+def _bundle(path: Path, work_dir: Path, names: List[str], count: int) -> int:
+    """Собирает файлы форматов в один архив; возвращает количество записей"""
+    with zipfile.ZipFile(path, 'w') as bundle:
+        for name in names:
+            # DOCX, XLSX и ZIP уже сжаты
+            compression = zipfile.ZIP_STORED if name.endswith((".docx", ".xlsx", ".zip")) else zipfile.ZIP_DEFLATED
+            bundle.write(work_dir / name, name, compress_type=compression)
+    return count
+
+
+def _processes() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn: дочерний процесс не наследует потоки и соединения бота
+        _process_pool = ProcessPoolExecutor(
+            max_workers=config.EXPORT_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+def shutdown_export() -> None:
+    """Останавливает пулы экспорта (при остановке бота)"""
+    global _process_pool
+    _executor.shutdown(wait=False, cancel_futures=True)
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+# Пакетный экспорт: формат -> (имя файла в архиве, функция записи, нужная библиотека)
+BATCH_FORMATS = {
+    "txt": ("history.txt", _write_history_txt, None),
+    "csv": ("texts.csv", _write_texts_csv, None),
+    "docx": ("texts.docx", _write_docx, docx),
+    "pdf": ("texts.pdf", _write_pdf, pdf_canvas),
+    "excel": ("texts.xlsx", _write_texts_excel, openpyxl),
+}
+
+
+async def export_history_to_txt(user_id: int, limit: Optional[int] = None) -> Optional[Path]:
+    """
+    Экспортирует историю контента в текстовый файл
+
+    Args:
+        user_id: ID пользователя
+        limit: Максимальное количество записей (None = все)
+
+    Returns:
+        Path к файлу или None
+    """
+    version = await _call(_history_version, user_id)
+    rows = _history_rows(user_id, limit=limit)
+    return await _cached_export("history", "txt", user_id, version, [limit], _write_history_txt, "история в TXT", rows)
 
 
 async def export_content_plan_to_csv(user_id: int, plan_id: Optional[int] = None) -> Optional[Path]:
     """
     Экспортирует контент-план в CSV файл
-    
+
     Args:
         user_id: ID пользователя
         plan_id: ID плана (None = все активные планы)
-    
+
     Returns:
         Path к файлу или None
     """
-    try:
-        with get_db() as db:
-            query = db.query(ContentPlan).filter(
-                ContentPlan.user_id == user_id
-            )
-            
-            if plan_id:
-                query = query.filter(ContentPlan.id == plan_id)
-            else:
-                query = query.filter(ContentPlan.is_active == True)
-            
-            plans = query.all()
-        
-        if not plans:
-            return None
-        
-        # Создаем CSV файл
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"content_plans_{user_id}_{timestamp}.csv"
-        file_path = EXPORT_DIR / filename
-        
-        with open(file_path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            
-            # Заголовки
-            writer.writerow([
-                "План", "Начало", "Окончание", "Частота", "Дни недели", "Время", "Темы"
-            ])
-            
-            for plan in plans:
-                schedule = plan.schedule if isinstance(plan.schedule, dict) else {}
-                
-                days = schedule.get("days", [])
-                days_names = ['пн', 'вт', 'ср', 'чт', 'пт', 'сб', 'вс']
-                days_str = ', '.join([days_names[d-1] for d in days]) if days else "не указано"
-                
-                writer.writerow([
-                    plan.plan_name,
-                    plan.start_date.strftime("%d.%m.%Y"),
-                    plan.end_date.strftime("%d.%m.%Y"),
-                    f"{plan.frequency} раз в неделю",
-                    days_str,
-                    schedule.get("time", "не указано"),
-                    schedule.get("topics", "не указано")
-                ])
-        
-        logger.info(f"Экспортировано {len(plans)} планов в {file_path}")
-        return file_path
-    
-    except Exception as e:
-        logger.exception(f"Ошибка при экспорте контент-плана: {e}")
-        return None
+    version = await _call(_plans_version, user_id, plan_id)
+    rows = _plan_rows(user_id, plan_id)
+    return await _cached_export(
+        "content_plans", "csv", user_id, version, [plan_id], _write_plans_csv, "контент-планы в CSV", rows
+    )
 
 
 async def export_texts_to_csv(user_id: int, limit: Optional[int] = None) -> Optional[Path]:
     """
     Экспортирует тексты в CSV файл
-    
+
     Args:
         user_id: ID пользователя
         limit: Максимальное количество записей
-    
+
     Returns:
         Path к файлу или None
     """
-    try:
-        with get_db() as db:
-            query = db.query(ContentHistory).filter(
-                ContentHistory.user_id == user_id,
-                ContentHistory.content_type == "text"
-            ).order_by(ContentHistory.generated_at.desc())
-            
-            if limit:
-                query = query.limit(limit)
-            
-            texts = query.all()
-        
-        if not texts:
-            return None
-        
-        # Создаем CSV файл
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"texts_{user_id}_{timestamp}.csv"
-        file_path = EXPORT_DIR / filename
-        
-        with open(file_path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            
-            # Заголовки
-            writer.writerow(["Дата", "Текст", "Хештеги", "Стиль", "Тип"])
-            
-            for text_item in texts:
-                content_data = text_item.content_data if isinstance(text_item.content_data, dict) else {}
-                text = content_data.get("text", str(text_item.content_data))
-                hashtags = ' '.join(content_data.get("hashtags", []))
-                style = content_data.get("style", "не указан")
-                text_type = content_data.get("type", "обычный")
-                
-                writer.writerow([
-                    text_item.generated_at.strftime("%d.%m.%Y %H:%M"),
-                    text,
-                    hashtags,
-                    style,
-                    text_type
-                ])
-        
-        logger.info(f"Экспортировано {len(texts)} текстов в {file_path}")
-        return file_path
-    
-    except Exception as e:
-        logger.exception(f"Ошибка при экспорте текстов: {e}")
-        return None
+    version = await _call(_history_version, user_id)
+    rows = _history_rows(user_id, limit=limit, content_types=["text"])
+    return await _cached_export("texts", "csv", user_id, version, [limit], _write_texts_csv, "тексты в CSV", rows)
 
 
 async def export_to_docx(user_id: int, limit: Optional[int] = None) -> Optional[Path]:
     """
     Экспортирует тексты в DOCX документ
-    
+
     Args:
         user_id: ID пользователя
         limit: Максимальное количество записей
-    
+
     Returns:
         Path к файлу или None
     """
-    if not docx_available:
+    if not docx.available:
         logger.warning("python-docx не установлен, экспорт в DOCX недоступен")
         return None
-    
-    try:
-        with get_db() as db:
-            query = db.query(ContentHistory).filter(
-                ContentHistory.user_id == user_id,
-                ContentHistory.content_type == "text"
-            ).order_by(ContentHistory.generated_at.desc())
-            
-            if limit:
-                query = query.limit(limit)
-            
-            texts = query.all()
-        
-        if not texts:
-            return None
-        
-        # Создаем документ
-        doc = Document()
-        doc.add_heading('История контента', 0)
-        
-        for i, text_item in enumerate(texts, 1):
-            date_str = text_item.generated_at.strftime("%d.%m.%Y %H:%M")
-            doc.add_heading(f'Запись {i} - {date_str}', level=1)
-            
-            content_data = text_item.content_data if isinstance(text_item.content_data, dict) else {}
-            text = content_data.get("text", str(text_item.content_data))
-            hashtags = content_data.get("hashtags", [])
-            
-            doc.add_paragraph(text)
-            
-            if hashtags:
-                doc.add_paragraph(f"Хештеги: {' '.join(hashtags)}")
-        
-        # Сохраняем файл
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"history_{user_id}_{timestamp}.docx"
-        file_path = EXPORT_DIR / filename
-        doc.save(file_path)
-        
-        logger.info(f"Экспортировано {len(texts)} текстов в DOCX: {file_path}")
-        return file_path
-    
-    except Exception as e:
-        logger.exception(f"Ошибка при экспорте в DOCX: {e}")
-        return None
+
+    version = await _call(_history_version, user_id)
+    rows = _history_rows(user_id, limit=limit, content_types=["text"])
+    return await _cached_export("history", "docx", user_id, version, [limit], _write_docx, "тексты в DOCX", rows)
 
 
 async def export_to_pdf(user_id: int, limit: Optional[int] = None) -> Optional[Path]:
     """
     Экспортирует тексты в PDF документ
-    
+
     Args:
         user_id: ID пользователя
         limit: Максимальное количество записей
-    
+
     Returns:
         Path к файлу или None
     """
-    if not reportlab_available:
+    if not pdf_canvas.available:
         logger.warning("reportlab не установлен, экспорт в PDF недоступен")
         return None
-    
-    try:
-        with get_db() as db:
-            query = db.query(ContentHistory).filter(
-                ContentHistory.user_id == user_id,
-                ContentHistory.content_type == "text"
-            ).order_by(ContentHistory.generated_at.desc())
-            
-            if limit:
-                query = query.limit(limit)
-            
-            texts = query.all()
-        
-        if not texts:
-            return None
-        
-        # Создаем PDF
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"history_{user_id}_{timestamp}.pdf"
-        file_path = EXPORT_DIR / filename
-        
-        c = canvas.Canvas(str(file_path), pagesize=A4)
-        width, height = A4
-        
-        y_position = height - 50
-        c.setFont("Helvetica-Bold", 16)
-        c.drawString(50, y_position, "История контента")
-        y_position -= 40
-        
-        c.setFont("Helvetica", 12)
-        
-        for i, text_item in enumerate(texts, 1):
-            if y_position < 100:
-                c.showPage()
-                y_position = height - 50
-            
-            date_str = text_item.generated_at.strftime("%d.%m.%Y %H:%M")
-            c.setFont("Helvetica-Bold", 14)
-            c.drawString(50, y_position, f"Запись {i} - {date_str}")
-            y_position -= 25
-            
-            content_data = text_item.content_data if isinstance(text_item.content_data, dict) else {}
-            text = content_data.get("text", str(content_data))
-            hashtags = content_data.get("hashtags", [])
-            
-            c.setFont("Helvetica", 11)
-            # Простой перенос текста
-            lines = text.split('\n')
-            for line in lines:
-                if y_position < 100:
-                    c.showPage()
-                    y_position = height - 50
-                
-                # Разбиваем длинные строки
-                if len(line) > 80:
-                    words = line.split()
-                    current_line = ""
-                    for word in words:
-                        if len(current_line + word) > 80:
-                            if current_line:
-                                c.drawString(50, y_position, current_line)
-                                y_position -= 15
-                            current_line = word + " "
-                        else:
-                            current_line += word + " "
-                    if current_line:
-                        c.drawString(50, y_position, current_line)
-                        y_position -= 15
-                else:
-                    c.drawString(50, y_position, line)
-                    y_position -= 15
-            
-            if hashtags:
-                c.setFont("Helvetica-Oblique", 10)
-                hashtags_text = f"Хештеги: {' '.join(hashtags)}"
-                c.drawString(50, y_position, hashtags_text)
-                y_position -= 20
-            
-            y_position -= 10
-        
-        c.save()
-        
-        logger.info(f"Экспортировано {len(texts)} текстов в PDF: {file_path}")
-        return file_path
-    
-    except Exception as e:
-        logger.exception(f"Ошибка при экспорте в PDF: {e}")
-        return None
+
+    version = await _call(_history_version, user_id)
+    rows = _history_rows(user_id, limit=limit, content_types=["text"])
+    return await _cached_export("history", "pdf", user_id, version, [limit], _write_pdf, "тексты в PDF", rows)
 
 
 async def export_plan_to_excel(user_id: int, plan_id: Optional[int] = None) -> Optional[Path]:
     """
     Экспортирует контент-план в Excel файл
-    
+
     Args:
         user_id: ID пользователя
         plan_id: ID плана (None = все активные планы)
-    
+
     Returns:
         Path к файлу или None
     """
-    if not openpyxl_available:
+    if not openpyxl.available:
         logger.warning("openpyxl не установлен, экспорт в Excel недоступен")
         return None
-    
-    try:
-        with get_db() as db:
-            query = db.query(ContentPlan).filter(
-                ContentPlan.user_id == user_id
-            )
-            
-            if plan_id:
-                query = query.filter(ContentPlan.id == plan_id)
-            else:
-                query = query.filter(ContentPlan.is_active == True)
-            
-            plans = query.all()
-        
-        if not plans:
-            return None
-        
-        # Создаем Excel файл
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Контент-планы"
-        
-        # Заголовки
-        headers = ["План", "Начало", "Окончание", "Частота", "Дни недели", "Время", "Темы", "Статус"]
-        ws.append(headers)
-        
-        # Данные
-        for plan in plans:
-            schedule = plan.schedule if isinstance(plan.schedule, dict) else {}
-            days = schedule.get("days", [])
-            days_names = ['пн', 'вт', 'ср', 'чт', 'пт', 'сб', 'вс']
-            days_str = ', '.join([days_names[d-1] for d in days]) if days else "не указано"
-            
-            ws.append([
-                plan.plan_name,
-                plan.start_date.strftime("%d.%m.%Y"),
-                plan.end_date.strftime("%d.%m.%Y"),
-                f"{plan.frequency} раз в неделю",
-                days_str,
-                schedule.get("time", "не указано"),
-                schedule.get("topics", "не указано"),
-                "Активен" if plan.is_active else "Неактивен"
-            ])
-        
-        # Сохраняем файл
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"content_plans_{user_id}_{timestamp}.xlsx"
-        file_path = EXPORT_DIR / filename
-        wb.save(file_path)
-        
-        logger.info(f"Экспортировано {len(plans)} планов в Excel: {file_path}")
-        return file_path
-    
-    except Exception as e:
-        logger.exception(f"Ошибка при экспорте в Excel: {e}")
-        return None
+
+    version = await _call(_plans_version, user_id, plan_id)
+    rows = _plan_rows(user_id, plan_id)
+    return await _cached_export(
+        "content_plans", "xlsx", user_id, version, [plan_id], _write_plans_excel, "контент-планы в Excel", rows
+    )
 
 
 async def export_to_ical(user_id: int, plan_id: Optional[int] = None) -> Optional[Path]:
     """
     Экспортирует контент-план в iCal формат (.ics)
-    
+
     Args:
         user_id: ID пользователя
         plan_id: ID плана (None = все активные планы)
-    
+
     Returns:
         Path к файлу или None
     """
-    if not icalendar_available:
+    if not icalendar.available:
         logger.warning("icalendar не установлен, экспорт в iCal недоступен")
         return None
-    
-    try:
-        with get_db() as db:
-            query = db.query(ContentPlan).filter(
-                ContentPlan.user_id == user_id,
-                ContentPlan.is_active == True
-            )
-            
-            if plan_id:
-                query = query.filter(ContentPlan.id == plan_id)
-            
-            plans = query.all()
-        
-        if not plans:
-            return None
-        
-        # Создаем календарь
-        cal = Calendar()
-        cal.add('prodid', '-//NKO Bot Content Plan//EN')
-        cal.add('version', '2.0')
-        
-        # Добавляем события для каждого плана
-        for plan in plans:
-            schedule = plan.schedule if isinstance(plan.schedule, dict) else {}
-            days = schedule.get("days", [])
-            topics = schedule.get("topics", [])
-            time_str = schedule.get("time", "12:00")
-            
-            # Парсим время
-            try:
-                hour, minute = map(int, time_str.split(':'))
-            except:
-                hour, minute = 12, 0
-            
-            # Генерируем события для всех дней публикации
-            current_date = plan.start_date
-            event_num = 0
-            
-            while current_date <= plan.end_date:
-                weekday = current_date.weekday() + 1  # 1=понедельник, 7=воскресенье
-                
-                if weekday in days:
-                    event = Event()
-                    event.add('summary', f"{plan.plan_name} - Публикация поста")
-                    
-                    # Тема поста
-                    topic = topics[event_num % len(topics)] if topics else "Пост для НКО"
-                    event.add('description', f"Тема поста: {topic}")
-                    
-                    # Дата и время
-                    event.add('dtstart', datetime.combine(current_date, datetime.min.time().replace(hour=hour, minute=minute)))
-                    event.add('dtend', datetime.combine(current_date, datetime.min.time().replace(hour=hour+1, minute=minute)))
-                    event.add('dtstamp', datetime.now())
-                    
-                    cal.add_component(event)
-                    event_num += 1
-                
-                current_date += timedelta(days=1)
-        
-        # Сохраняем файл
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"content_plan_{user_id}_{timestamp}.ics"
-        file_path = EXPORT_DIR / filename
-        
-        with open(file_path, 'wb') as f:
-            f.write(cal.to_ical())
-        
-        logger.info(f"Экспортирован контент-план в iCal: {file_path}")
-        return file_path
-    
-    except Exception as e:
-        logger.exception(f"Ошибка при экспорте в iCal: {e}")
-        return None
+
+    version = await _call(_plans_version, user_id, plan_id)
+    rows = _plan_rows(user_id, plan_id, active_only=True)
+    return await _cached_export(
+        "content_plan", "ics", user_id, version, [plan_id], _write_ical, "контент-план в iCal", rows
+    )
 
 
 async def create_images_archive(user_id: int, limit: Optional[int] = None) -> Optional[Path]:
     """
     Создает ZIP-архив с изображениями пользователя
-    
+
     Args:
         user_id: ID пользователя
         limit: Максимальное количество изображений
-    
+
     Returns:
         Path к архиву или None
     """
-    try:
-        import zipfile
-        from bot.config import config
-        
-        with get_db() as db:
-            query = db.query(ContentHistory).filter(
-                ContentHistory.user_id == user_id,
-                ContentHistory.content_type == "image"
-            ).order_by(ContentHistory.generated_at.desc())
-            
-            if limit:
-                query = query.limit(limit)
-            
-            images = query.all()
-        
-        if not images:
-            return None
-        
-        # Создаем ZIP архив
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"images_{user_id}_{timestamp}.zip"
-        archive_path = EXPORT_DIR / filename
-        
-        with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for i, image_item in enumerate(images, 1):
-                content_data = image_item.content_data if isinstance(image_item.content_data, dict) else {}
-                file_path = content_data.get("file_path") or content_data.get("path")
-                
-                if file_path and Path(file_path).exists():
-                    # Добавляем файл в архив
-                    arcname = f"image_{i}_{Path(file_path).name}"
-                    zipf.write(file_path, arcname)
-        
-        logger.info(f"Создан архив с {len(images)} изображениями: {archive_path}")
-        return archive_path
-    
-    except Exception as e:
-        logger.exception(f"Ошибка при создании архива изображений: {e}")
-        return None
+    version = await _call(_history_version, user_id)
+    rows = _history_rows(user_id, limit=limit, content_types=["image"], files_only=True)
+    return await _cached_export("images", "zip", user_id, version, [limit], _write_images_archive, "архив изображений", rows)
 
 
 async def batch_export(
@@ -617,45 +772,103 @@ async def batch_export(
     content_types: List[str] = ["text", "image"],
     formats: List[str] = ["txt"],
     period_days: Optional[int] = None
-) -> Dict[str, Optional[Path]]:
+) -> Optional[Path]:
     """
-    Пакетный экспорт контента за период
-    
+    Пакетный экспорт контента за период в один ZIP-архив
+
+    Записи читаются из БД один раз, файлы всех форматов пишутся
+    параллельно в процессах пула.
+
     Args:
         user_id: ID пользователя
-        content_types: Типы контента для экспорта
+        content_types: Типы контента для экспорта (для "image" - архив изображений)
         formats: Форматы для экспорта (txt, docx, pdf, csv, excel)
-        period_days: Период в днях (None = весь период)
-    
+        period_days: Период: сегодня и N предыдущих суток, UTC (None = весь период)
+
+    Returns:
+        Path к архиву или None
+    """
+    jobs: Dict[str, Callable[..., int]] = {}
+    if "text" in content_types:
+        for fmt in formats:
+            if fmt not in BATCH_FORMATS:
+                logger.warning(f"Неизвестный формат экспорта: {fmt}")
+                continue
+            name, writer, library = BATCH_FORMATS[fmt]
+            if library is None or library.available:
+                jobs[name] = writer
+    if "image" in content_types:
+        jobs["images.zip"] = _write_images_archive
+    if not jobs:
+        return None
+
+    # Период - целыми сутками (UTC): в течение дня архив берется из кэша
+    since = datetime.combine(datetime.utcnow().date() - timedelta(days=period_days), time()) if period_days else None
+    version = await _call(_history_version, user_id)
+    filename = export_cache.artifact_name(
+        "export", user_id, "zip", EXPORT_FORMAT_VERSION, [sorted(jobs), sorted(content_types), since], version
+    )
+    return await export_cache.artifact(
+        filename,
+        lambda name: _batch_export(name, user_id, jobs, content_types, since)
+    )
+
+
+async def _batch_export(
+    filename: str,
+    user_id: int,
+    jobs: Dict[str, Callable[..., int]],
+    content_types: List[str],
+    since: Optional[datetime]
+) -> Optional[Path]:
+    """
+    Выполняет пакетный экспорт в архив EXPORT_DIR/filename
+
+    Args:
+        filename: Имя архива
+        user_id: ID пользователя
+        jobs: Имя файла в архиве -> функция записи
+        content_types: Типы контента
+        since: Только записи не старше (UTC)
+
     Returns:
-        Dict с путями к файлам
+        Path к архиву или None
     """
-    results = {}
-    
+    global _process_pool
+    work_dir = EXPORT_DIR / f".batch_{Path(filename).stem}_{os.getpid()}"
+    work_dir.mkdir(parents=True, exist_ok=True)
     try:
-        start_date = datetime.now() - timedelta(days=period_days) if period_days else None
-        
-        for content_type in content_types:
-            if content_type == "text":
-                for fmt in formats:
-                    if fmt == "txt":
-                        results["texts_txt"] = await export_history_to_txt(user_id)
-                    elif fmt == "docx" and docx_available:
-                        results["texts_docx"] = await export_to_docx(user_id)
-                    elif fmt == "pdf" and reportlab_available:
-                        results["texts_pdf"] = await export_to_pdf(user_id)
-                    elif fmt == "csv":
-                        results["texts_csv"] = await export_texts_to_csv(user_id)
-                    elif fmt == "excel" and openpyxl_available:
-                        # Можно использовать CSV как альтернативу Excel
-                        results["texts_excel"] = await export_texts_to_csv(user_id)
-            
-            elif content_type == "image":
-                results["images_zip"] = await create_images_archive(user_id)
-        
-        return results
-    
+        # Один проход по записям: дальше форматы читают временный файл
+        spool_path = work_dir / "rows.spool"
+        rows = _history_rows(user_id, content_types=content_types, since=since)
+        count = await _call(_spool_rows, spool_path, rows)
+        if not count:
+            return None
+
+        loop = asyncio.get_running_loop()
+        pool = _processes()
+        names = list(jobs)
+        results = await asyncio.gather(*(
+            loop.run_in_executor(pool, _write_from_spool, jobs[name], str(spool_path), str(work_dir / name))
+            for name in names
+        ), return_exceptions=True)
+
+        written = []
+        for name, result in zip(names, results):
+            if isinstance(result, BrokenProcessPool):
+                # Процесс пула упал - следующий экспорт создаст пул заново
+                _process_pool = None
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка при пакетном экспорте ({name}): {result}")
+            elif result:
+                written.append(name)
+        if not written:
+            return None
+
+        return await _export(_bundle, filename, "пакетный экспорт", work_dir, written, count, reads_db=False)
+
     except Exception as e:
         logger.exception(f"Ошибка при пакетном экспорте: {e}")
-        return results
-
+        return None
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -2,19 +2,22 @@
 Вспомогательные функции
 """
 import logging
-from typing import Optional, Dict, Any, Tuple
-from datetime import datetime, date, timedelta
+from typing import Optional, Dict, Any, Tuple, Union
+from datetime import date, timedelta
 from bot.database.models import User
-from bot.database.database import get_db
+from bot.services.user_cache import user_cache, CachedUser
 
 logger = logging.getLogger(__name__)
 
 
 def get_or_create_user(user_id: int, username: Optional[str] = None, first_name: str = "", 
-                      last_name: Optional[str] = None, language_code: str = "ru") -> User:
+                      last_name: Optional[str] = None, language_code: str = "ru") -> CachedUser:
     """
     Получает или создает пользователя в БД
     
+    Результат берется из кэша пользователей: к БД обращаемся, только если
+    пользователя нет в кэше или данные Telegram изменились.
+    
     Args:
         user_id: ID пользователя Telegram
         username: Имя пользователя
@@ -23,45 +26,15 @@ def get_or_create_user(user_id: int, username: Optional[str] = None, first_name:
         language_code: Код языка
     
     Returns:
-        Объект User
+        Снимок пользователя (CachedUser)
     """
-    with get_db() as db:
-        user = db.query(User).filter(User.id == user_id).first()
-        
-        if not user:
-            user = User(
-                id=user_id,
-                username=username,
-                first_name=first_name,
-                last_name=last_name,
-                language_code=language_code
-            )
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-            logger.info(f"Создан новый пользователь: {user_id} ({username or first_name})")
-        else:
-            # Обновляем информацию о пользователе
-            updated = False
-            if username and user.username != username:
-                user.username = username
-                updated = True
-            if first_name and user.first_name != first_name:
-                user.first_name = first_name
-                updated = True
-            if last_name and user.last_name != last_name:
-                user.last_name = last_name
-                updated = True
-            if language_code and user.language_code != language_code:
-                user.language_code = language_code
-                updated = True
-            
-            if updated:
-                user.updated_at = datetime.now()
-                db.commit()
-                logger.info(f"Обновлен пользователь: {user_id}")
-        
-        return user
+    return user_cache.get_or_create_user(
+        user_id,
+        username=username,
+        first_name=first_name,
+        last_name=last_name,
+        language_code=language_code
+    )
 
 
 def calculate_content_plan_dates(period_days: int, frequency: int, days: list) -> Tuple[date, date, list]:
@@ -146,12 +119,12 @@ def get_weekday_name(weekday: int) -> str:
     return ""
 
 
-def format_user_name(user: User) -> str:
+def format_user_name(user: Union[User, CachedUser]) -> str:
     """
     Форматирует имя пользователя для отображения
     
     Args:
-        user: Объект User
+        user: Объект User или снимок из кэша
     
     Returns:
         Отформатированное имя
@@ -0,0 +1,112 @@
+"""
+Отложенный импорт необязательных тяжелых зависимостей
+
+Модули экспорта (python-docx, reportlab, openpyxl с numpy, icalendar),
+обработки изображений (Pillow) и анализа текста (textstat, vaderSentiment)
+нужны немногим пользователям, а их импорт занимает сотни миллисекунд
+и десятки мегабайт памяти при старте бота. lazy_import возвращает
+заместитель модуля: настоящий импорт выполняется при первом обращении
+к атрибуту, наличие пакета проверяется без импорта (find_spec).
+
+Пакет, который установлен, но не импортируется (нет его зависимостей),
+считается недоступным, как и раньше с try/except ImportError, -
+выясняется это при первом использовании.
+
+Пример:
+    docx = lazy_import("docx", "python-docx не установлен, экспорт в DOCX будет недоступен")
+    if docx.available:
+        document = docx.Document()
+"""
+import importlib
+import importlib.util
+import logging
+import threading
+import types
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def is_available(name: str) -> bool:
+    """
+    Установлен ли пакет модуля (без импорта)
+
+    Проверяется пакет верхнего уровня: find_spec для вложенного
+    модуля импортировал бы его родительские пакеты.
+
+    Args:
+        name: Полное имя модуля, например "reportlab.pdfgen.canvas"
+
+    Returns:
+        True, если пакет установлен
+    """
+    return importlib.util.find_spec(name.partition(".")[0]) is not None
+
+
+class LazyModule(types.ModuleType):
+    """Заместитель модуля, импортирующий его при первом обращении к атрибуту"""
+
+    def __init__(self, name: str, installed: bool, missing_warning: Optional[str] = None):
+        super().__init__(name)
+        self.__dict__["installed"] = installed
+        self.__dict__["_missing_warning"] = missing_warning
+        self.__dict__["_module"] = None
+        self.__dict__["_error"] = None if installed else ImportError(f"No module named {name!r}")
+        self.__dict__["_lock"] = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_module"]
+        if module is not None:
+            return module
+        if self.__dict__["_error"] is not None:
+            raise self.__dict__["_error"]
+        # Экспорт может выполняться в потоках - импорт один раз
+        with self.__dict__["_lock"]:
+            if self.__dict__["_module"] is None and self.__dict__["_error"] is None:
+                try:
+                    self.__dict__["_module"] = importlib.import_module(self.__name__)
+                    logger.debug(f"Загружен модуль {self.__name__}")
+                except ImportError as e:
+                    # Пакет установлен, но не импортируется (нет его зависимостей)
+                    self.__dict__["_error"] = e
+                    logger.warning(self.__dict__["_missing_warning"] or f"Модуль {self.__name__} недоступен: {e}")
+        if self.__dict__["_error"] is not None:
+            raise self.__dict__["_error"]
+        return self.__dict__["_module"]
+
+    @property
+    def available(self) -> bool:
+        """Можно ли пользоваться модулем (при первой проверке модуль импортируется)"""
+        try:
+            self._load()
+            return True
+        except ImportError:
+            return False
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "загружен" if self.__dict__["_module"] is not None else "не загружен"
+        return f"<LazyModule {self.__name__} ({state})>"
+
+
+def lazy_import(name: str, missing_warning: Optional[str] = None) -> LazyModule:
+    """
+    Заместитель модуля с отложенным импортом
+
+    Args:
+        name: Полное имя модуля
+        missing_warning: Предупреждение в лог, если модуль недоступен
+
+    Returns:
+        LazyModule: installed - пакет установлен (без импорта),
+        available - модуль импортируется (проверять перед использованием)
+    """
+    installed = is_available(name)
+    if not installed and missing_warning:
+        logger.warning(missing_warning)
+    return LazyModule(name, installed, missing_warning)
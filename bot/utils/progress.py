@@ -1,10 +1,177 @@
 """
 Утилиты для отображения прогресса операций
+
+Правки сообщений прогресса выполняются в фоне и не задерживают генерацию:
+update() только запоминает новый текст. Для каждого сообщения правки
+объединяются - не чаще PROGRESS_MIN_INTERVAL секунд отправляется последний
+текст, промежуточные пропускаются, одинаковый текст не отправляется повторно.
+Правки учитываются в бюджете чата (PROGRESS_CHAT_EDITS_PER_MINUTE в минуту,
+плюс RetryAfter от Telegram): при исчерпании бюджета правка откладывается.
+
+Перед финальной правкой сообщения прогресса напрямую (edit_text обработчика)
+вызывайте finish_progress(message): иначе отложенная правка прогресса может
+прийти позже и затереть результат.
 """
 import asyncio
-from typing import Optional, Callable, List
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
 from telegram import Message
-from telegram.ext import ContextTypes
+from telegram.error import RetryAfter, TelegramError
+from bot.config import config
+
+logger = logging.getLogger(__name__)
+
+# Сколько сообщений прогресса помнить (последний показанный текст для пропуска повторов)
+MAX_TRACKED_MESSAGES = 1000
+
+
+class _MessageProgress:
+    """Состояние правок одного сообщения"""
+
+    def __init__(self, message: Message):
+        self.message = message
+        self.shown_text: Optional[str] = None
+        self.pending_text: Optional[str] = None
+        self.last_edit = 0.0
+        self.editing = False
+        self.finished = False
+        self.task: Optional[asyncio.Task] = None
+
+
+class ProgressEditor:
+    """Фоновые объединяемые правки сообщений прогресса с учетом лимитов чата"""
+
+    def __init__(self, min_interval: float, chat_edits_per_minute: int):
+        """
+        Args:
+            min_interval: Минимальный интервал между правками одного сообщения (секунды)
+            chat_edits_per_minute: Бюджет правок прогресса на чат в минуту
+        """
+        self.min_interval = min_interval
+        self.chat_edits_per_minute = chat_edits_per_minute
+        self._messages: "OrderedDict[Tuple[int, int], _MessageProgress]" = OrderedDict()
+        # Время правок за последнюю минуту и блокировка по RetryAfter для каждого чата
+        self._chat_edits: Dict[int, Deque[float]] = {}
+        self._chat_blocked_until: Dict[int, float] = {}
+
+    @staticmethod
+    def _key(message: Message) -> Tuple[int, int]:
+        return message.chat_id, message.message_id
+
+    def remaining_budget(self, chat_id: int) -> int:
+        """
+        Сколько правок прогресса еще можно отправить в чат в текущую минуту
+
+        Args:
+            chat_id: ID чата
+
+        Returns:
+            Остаток бюджета (0 - пока заблокирован по RetryAfter)
+        """
+        if self._chat_blocked_until.get(chat_id, 0) > time.monotonic():
+            return 0
+        return max(self.chat_edits_per_minute - len(self._recent_edits(chat_id)), 0)
+
+    def _recent_edits(self, chat_id: int) -> Deque[float]:
+        """Время правок чата за последнюю минуту"""
+        edits = self._chat_edits.setdefault(chat_id, deque())
+        now = time.monotonic()
+        while edits and now - edits[0] >= 60:
+            edits.popleft()
+        if not edits:
+            del self._chat_edits[chat_id]
+        return edits
+
+    def _budget_delay(self, chat_id: int) -> float:
+        """Сколько ждать, пока в бюджете чата появится правка"""
+        now = time.monotonic()
+        delay = self._chat_blocked_until.get(chat_id, 0) - now
+        if delay <= 0:
+            self._chat_blocked_until.pop(chat_id, None)
+        edits = self._recent_edits(chat_id)
+        if len(edits) >= self.chat_edits_per_minute:
+            delay = max(delay, edits[0] + 60 - now)
+        return max(delay, 0)
+
+    def _record_edit(self, chat_id: int) -> None:
+        self._chat_edits.setdefault(chat_id, deque()).append(time.monotonic())
+
+    def submit(self, message: Message, text: str) -> None:
+        """
+        Запоминает новый текст сообщения; правка отправится в фоне
+
+        Args:
+            message: Сообщение прогресса
+            text: Новый текст
+        """
+        key = self._key(message)
+        state = self._messages.get(key)
+        if state is None:
+            state = self._messages[key] = _MessageProgress(message)
+            while len(self._messages) > MAX_TRACKED_MESSAGES:
+                _, oldest = self._messages.popitem(last=False)
+                if oldest.task is not None:
+                    oldest.task.cancel()
+        self._messages.move_to_end(key)
+
+        if text == (state.pending_text if state.pending_text is not None else state.shown_text):
+            return
+        state.pending_text = text
+        if state.task is None or state.task.done():
+            state.task = asyncio.get_running_loop().create_task(self._run(state))
+
+    async def _run(self, state: _MessageProgress) -> None:
+        """Отправляет последний запомненный текст, соблюдая интервал и бюджет чата"""
+        chat_id = state.message.chat_id
+        while state.pending_text is not None:
+            delay = max(state.last_edit + self.min_interval - time.monotonic(), self._budget_delay(chat_id))
+            if delay > 0:
+                # За время ожидания текст может смениться еще несколько раз - отправится последний
+                await asyncio.sleep(delay)
+
+            text, state.pending_text = state.pending_text, None
+            if text is None or text == state.shown_text:
+                continue
+
+            # Правка занимает место в бюджете до отправки: параллельные правки чата его видят
+            self._record_edit(chat_id)
+            state.editing = True
+            try:
+                await state.message.edit_text(text)
+                state.shown_text = text
+            except RetryAfter as e:
+                self._chat_blocked_until[chat_id] = time.monotonic() + float(e.retry_after)
+                if state.pending_text is None and not state.finished:
+                    state.pending_text = text
+            except TelegramError:
+                # Сообщение удалено или уже изменено - прогресс не важен
+                pass
+            finally:
+                state.editing = False
+                state.last_edit = time.monotonic()
+
+    async def finish(self, message: Message) -> None:
+        """
+        Завершает прогресс сообщения перед его финальной правкой
+
+        Отложенная правка отменяется, уже отправляемая - дожидается завершения.
+
+        Args:
+            message: Сообщение прогресса
+        """
+        state = self._messages.pop(self._key(message), None)
+        if state is None or state.task is None or state.task.done():
+            return
+        state.finished = True
+        state.pending_text = None
+        if not state.editing:
+            state.task.cancel()
+        try:
+            await state.task
+        except asyncio.CancelledError:
+            pass
 
 
 class ProgressBar:
@@ -32,7 +199,7 @@ class ProgressBar:
     
     async def update(self, stage: int, custom_text: Optional[str] = None):
         """
-        Обновляет прогресс-бар
+        Обновляет прогресс-бар (правка сообщения выполняется в фоне)
         
         Args:
             stage: Номер этапа (0-based)
@@ -49,13 +216,7 @@ class ProgressBar:
         # Добавляем визуальный индикатор
         progress_bar = self._create_progress_bar(stage, self.total_stages)
         
-        full_text = f"{progress_text}\n\n{progress_bar}"
-        
-        try:
-            await self.message.edit_text(full_text)
-        except Exception:
-            # Если не удалось обновить (например, сообщение уже изменено), игнорируем
-            pass
+        progress_editor.submit(self.message, f"{progress_text}\n\n{progress_bar}")
     
     def _create_progress_bar(self, current: int, total: int) -> str:
         """Создает визуальный прогресс-бар"""
@@ -64,8 +225,14 @@ class ProgressBar:
         percentage = int((current / total) * 100) if total > 0 else 0
         return f"{filled}{empty} {percentage}%"
     
+    async def finish(self):
+        """Завершает фоновые правки прогресса (перед финальной правкой сообщения)"""
+        await progress_editor.finish(self.message)
+    
     async def complete(self, final_text: str):
         """Завершает прогресс-бар финальным сообщением"""
+        await self.finish()
+        progress_editor._record_edit(self.message.chat_id)
         progress_bar = self._create_progress_bar(self.total_stages, self.total_stages)
         full_text = f"{final_text}\n\n{progress_bar}"
         try:
@@ -77,16 +244,17 @@ class ProgressBar:
 async def show_progress(
     message: Message,
     stages: List[str],
-    update_interval: float = 2.0,
     callback: Optional[Callable] = None
 ) -> ProgressBar:
     """
     Показывает прогресс выполнения операции
     
+    Этапы без callback сменяются сразу: частые смены объединяются,
+    и пользователь видит последний этап.
+    
     Args:
         message: Сообщение для обновления
         stages: Список названий этапов
-        update_interval: Интервал обновления в секундах
         callback: Функция, которая будет вызвана для каждого этапа
     
     Returns:
@@ -99,9 +267,6 @@ async def show_progress(
         
         if callback:
             await callback(i)
-        
-        if i < len(stages) - 1:  # Не ждем после последнего этапа
-            await asyncio.sleep(update_interval)
     
     return progress
 
@@ -124,3 +289,19 @@ async def update_progress_message(
     progress_bar = ProgressBar(message, total_stages)
     await progress_bar.update(stage, text)
 
+
+async def finish_progress(message: Message):
+    """
+    Завершает фоновые правки прогресса сообщения перед его финальной правкой
+
+    Args:
+        message: Сообщение прогресса
+    """
+    await progress_editor.finish(message)
+
+
+# Глобальный экземпляр
+progress_editor = ProgressEditor(
+    min_interval=config.PROGRESS_MIN_INTERVAL,
+    chat_edits_per_minute=config.PROGRESS_CHAT_EDITS_PER_MINUTE
+)
@@ -13,8 +13,10 @@ sys.path.insert(0, str(Path(__file__).parent))
 from bot.config import config
 
 # Настраиваем логирование
+# В многопроцессном режиме в каждой строке лога виден номер процесса-обработчика
+process_label = f" - worker-{config.WORKER_INDEX}" if config.WORKER_INDEX >= 0 else ""
 logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    format=f"%(asctime)s{process_label} - %(name)s - %(levelname)s - %(message)s",
     level=getattr(logging, config.LOG_LEVEL.upper(), logging.INFO)
 )
 
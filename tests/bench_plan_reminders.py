@@ -0,0 +1,128 @@
+"""
+Benchmark of PlanReminderEngine with synthetic content plans
+
+Creates --plans plans (three publishing days each, times in 15-minute steps,
+users spread over several timezones) in a throwaway SQLite database or in
+--database-url, then measures the initial backfill, a steady reconcile,
+minute ticks over an hour of the busiest time, cancellation and the
+recalculation after a timezone offset change.
+
+    python -m tests.bench_plan_reminders --plans 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+TIMEZONES = ["Europe/Moscow", "Europe/Kaliningrad", "Asia/Yekaterinburg", "Asia/Novosibirsk", "Europe/Berlin"]
+
+
+def _timed(label, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    shown = "" if isinstance(result, tuple) and isinstance(result[-1], list) else result
+    print(f"{label:<34} {time.perf_counter() - started:8.3f} s  {shown}")
+    return result
+
+
+def _seed(plans: int, users: int) -> int:
+    from bot.database.database import get_db
+    from bot.database.models import ContentPlan, NotificationSettings, User
+
+    rnd = random.Random(43)
+    today = date.today()
+    with get_db() as db:
+        db.execute(User.__table__.insert(), [
+            {"id": user_id, "first_name": f"user {user_id}"} for user_id in range(1, users + 1)
+        ])
+        db.execute(NotificationSettings.__table__.insert(), [
+            {"user_id": user_id, "timezone": TIMEZONES[user_id % len(TIMEZONES)], "reminder_enabled": True}
+            for user_id in range(1, users + 1)
+        ])
+        rows = []
+        for plan_id in range(1, plans + 1):
+            minute = rnd.randrange(6 * 4, 22 * 4) * 15
+            rows.append({
+                "id": plan_id,
+                "user_id": rnd.randint(1, users),
+                "plan_name": f"План {plan_id}",
+                "start_date": today - timedelta(days=30),
+                "end_date": today + timedelta(days=60),
+                "frequency": 3,
+                "schedule": {"days": sorted(rnd.sample(range(1, 8), 3)), "time": f"{minute // 60:02d}:{minute % 60:02d}"},
+                "is_active": True,
+            })
+        db.execute(ContentPlan.__table__.insert(), rows)
+    return len(rows)
+
+
+async def _ticks(engine, start: datetime, minutes: int):
+    durations = []
+    sent = 0
+    for minute in range(minutes):
+        started = time.perf_counter()
+        sent += await engine.tick(start + timedelta(minutes=minute))
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    return sent, durations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plans", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--tick-minutes", type=int, default=60)
+    parser.add_argument("--database-url", help="Empty database to use instead of a temporary SQLite file")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='bench-reminders-')}/bench.db"
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "bench-token")
+    # Without SQL echo of the development environment
+    os.environ.setdefault("ENVIRONMENT", "benchmark")
+    if "bot.config" in sys.modules:
+        raise SystemExit("run as a script: the database must be chosen before the bot is imported")
+
+    from sqlalchemy import func, select, update
+    from bot.database.database import get_db, init_db
+    from bot.database.models import OutboxMessage, PlanReminder
+    from bot.services.plan_reminders import PlanReminderEngine
+
+    init_db()
+    _timed(f"seed {args.plans} plans", _seed, args.plans, args.users)
+    engine = PlanReminderEngine(misfire_grace_seconds=60)
+
+    _timed("initial reconcile (backfill)", lambda: asyncio.run(engine.reconcile()))
+    _timed("steady reconcile", lambda: asyncio.run(engine.reconcile()))
+    with get_db() as db:
+        print(f"reminder rows: {db.scalar(select(func.count()).select_from(PlanReminder))}")
+
+    # 06:00-07:00 UTC on the next Monday: 09:00-10:00 in Moscow
+    monday = date.today() + timedelta(days=7 - date.today().weekday())
+    start = datetime.combine(monday, datetime.min.time()) + timedelta(hours=6)
+    engine._last_tick = start - timedelta(minutes=1)
+    sent, durations = _timed(f"{args.tick_minutes} minute ticks", lambda: asyncio.run(_ticks(engine, start, args.tick_minutes)))
+    print(
+        f"  reminders sent {sent}, tick p50 {durations[len(durations) // 2] * 1000:.1f} ms, "
+        f"max {durations[-1] * 1000:.1f} ms"
+    )
+    with get_db() as db:
+        print(f"  outbox rows {db.scalar(select(func.count()).select_from(OutboxMessage))}")
+
+    cancel_ids = list(range(1, min(args.plans, 1000) + 1))
+    _timed(f"cancel {len(cancel_ids)} plans", lambda: [engine.cancel_plan(plan_id) for plan_id in cancel_ids] and len(cancel_ids))
+
+    # As if the stored offset of one timezone went stale after a DST transition
+    with get_db() as db:
+        db.execute(
+            update(PlanReminder).where(PlanReminder.timezone == "Europe/Berlin")
+            .values(utc_offset=PlanReminder.utc_offset + 60)
+        )
+    _timed("offset refresh (one timezone)", engine._refresh_offsets)
+
+
+if __name__ == "__main__":
+    main()
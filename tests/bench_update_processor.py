@@ -0,0 +1,59 @@
+"""
+Load test of UserOrderedUpdateProcessor: throughput against UPDATE_CONCURRENCY
+
+Handlers wait on simulated I/O (Telegram API, AI generation), so throughput
+should grow with the concurrency bound until it reaches the number of users
+with queued updates. Per-user ordering is checked on every run.
+
+    python -m tests.bench_update_processor --updates 2000 --users 200 --io-ms 50 --concurrency 1 4 16 64
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from bot.services.update_processor import UserOrderedUpdateProcessor
+from tests.test_services.test_update_processor import _update
+
+
+async def _run(concurrency: int, updates: int, users: int, io_ms: float) -> float:
+    processor = UserOrderedUpdateProcessor(concurrency, max_pending_updates=updates)
+    rnd = random.Random(concurrency)
+    batch = [_update(update_id, rnd.randint(1, users)) for update_id in range(updates)]
+    last_seen = {}
+
+    async def handle(update):
+        await asyncio.sleep(io_ms / 1000 * rnd.uniform(0.5, 1.5))
+        user_id = update.effective_user.id
+        if update.update_id < last_seen.get(user_id, -1):
+            raise AssertionError(f"user {user_id}: update {update.update_id} out of order")
+        last_seen[user_id] = update.update_id
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        asyncio.create_task(processor.process_update(update, handle(update))) for update in batch
+    ))
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--io-ms", type=float, default=50.0, help="Mean handler wait time")
+    args = parser.parse_args()
+
+    print(f"updates: {args.updates}, users: {args.users}, io: {args.io_ms} ms")
+    baseline = None
+    for concurrency in args.concurrency:
+        elapsed = asyncio.run(_run(concurrency, args.updates, args.users, args.io_ms))
+        baseline = baseline or elapsed
+        print(
+            f"concurrency={concurrency}: {elapsed:.2f} s, {args.updates / elapsed:.0f} updates/s, "
+            f"speedup x{baseline / elapsed:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
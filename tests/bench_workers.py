@@ -0,0 +1,122 @@
+"""
+Benchmark of the multi-process mode: Supervisor routing to stub workers
+
+Stub workers speak the real socket protocol (hello, heartbeat, JSON lines)
+and burn CPU for every update instead of running handlers, so the numbers
+show how routing scales with WORKER_PROCESSES on this machine. Each stub
+also checks that updates of one user arrive in order and exits with a
+non-zero code otherwise.
+
+    python -m tests.bench_workers --updates 2000 --users 200 --work-ms 2 --workers 1 2 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from telegram import Chat, Message, Update, User
+
+from bot.services.workers import WORKER_INDEX_ENV, WORKER_SOCKET_ENV, Supervisor
+
+
+def _burn(ms: float) -> None:
+    deadline = time.perf_counter() + ms / 1000
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def _stub_worker(work_ms: float) -> int:
+    """Worker side: handle updates until the supervisor closes the stream"""
+    index = int(os.environ[WORKER_INDEX_ENV])
+    reader, writer = await asyncio.open_unix_connection(os.environ[WORKER_SOCKET_ENV])
+    writer.write(json.dumps({"worker": index}).encode() + b"\n")
+    await writer.drain()
+
+    last_seen = {}
+    out_of_order = 0
+    handled = 0
+    while line := await reader.readline():
+        update = json.loads(line)
+        user_id = update["message"]["from"]["id"]
+        if update["update_id"] <= last_seen.get(user_id, -1):
+            out_of_order += 1
+        last_seen[user_id] = update["update_id"]
+        _burn(work_ms)
+        handled += 1
+        if handled % 100 == 0:
+            writer.write(json.dumps({"heartbeat": index}).encode() + b"\n")
+            await writer.drain()
+    writer.close()
+    print(f"worker {index}: handled {handled}, users {len(last_seen)}, out of order {out_of_order}", file=sys.stderr)
+    return 1 if out_of_order else 0
+
+
+def _update(update_id: int, user_id: int) -> Update:
+    user = User(id=user_id, first_name="bench", is_bot=False)
+    message = Message(
+        message_id=update_id,
+        date=datetime.now(timezone.utc),
+        chat=Chat(id=user_id, type=Chat.PRIVATE),
+        from_user=user,
+        text="/start"
+    )
+    return Update(update_id=update_id, message=message)
+
+
+async def _run(workers: int, updates: int, users: int, work_ms: float) -> float:
+    socket_path = Path(tempfile.mkdtemp()) / "workers.sock"
+    supervisor = Supervisor(
+        workers=workers,
+        socket_path=socket_path,
+        queue_size=1000,
+        heartbeat_interval=1,
+        heartbeat_timeout=30,
+        command=[sys.executable, "-m", "tests.bench_workers", "--stub", "--work-ms", str(work_ms)]
+    )
+    await supervisor.start()
+    await supervisor.wait_ready()
+
+    batch = [_update(update_id, update_id % users + 1) for update_id in range(updates)]
+    started = time.perf_counter()
+    for update in batch:
+        await supervisor.update_queue.put(update)
+    # stop() returns after every worker has read its stream to the end and exited
+    await supervisor.stop(timeout=600)
+    elapsed = time.perf_counter() - started
+
+    failed = [worker.index for worker in supervisor.workers if worker.process.returncode != 0]
+    if failed:
+        raise SystemExit(f"workers {failed} saw updates of one user out of order")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stub", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--work-ms", type=float, default=2.0, help="CPU time per update in a worker")
+    args = parser.parse_args()
+
+    if args.stub:
+        sys.exit(asyncio.run(_stub_worker(args.work_ms)))
+
+    print(f"CPUs: {os.cpu_count()}, updates: {args.updates}, users: {args.users}, work: {args.work_ms} ms")
+    baseline = None
+    for workers in args.workers:
+        elapsed = asyncio.run(_run(workers, args.updates, args.users, args.work_ms))
+        baseline = baseline or elapsed
+        print(
+            f"workers={workers}: {elapsed:.2f} s, {args.updates / elapsed:.0f} updates/s, "
+            f"speedup x{baseline / elapsed:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
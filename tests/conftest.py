@@ -0,0 +1,47 @@
+"""
+Shared fixtures: a throwaway SQLite database for the whole test session
+
+The bot reads its configuration from the environment at import time,
+so the variables are set here, before any bot module is imported.
+"""
+import os
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="bot-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_DIR}/test.db"
+os.environ["ENVIRONMENT"] = "test"
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test-token")
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Schema created by the Alembic migrations, as on bot start"""
+    from bot.database.database import init_db
+    init_db()
+
+
+@pytest.fixture
+def db(database):
+    """Empty database for the test; all rows are deleted afterwards"""
+    yield
+    from bot.database.database import engine
+    from bot.database.models import Base
+    with engine.connect() as connection:
+        # users and nko_profiles reference each other, so clear with key checks off
+        connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        for table in Base.metadata.tables.values():
+            connection.execute(table.delete())
+        connection.commit()
+        connection.exec_driver_sql("PRAGMA foreign_keys=ON")
+
+
+@pytest.fixture
+def user(db):
+    """User 1 with no profile"""
+    from bot.database.database import get_db
+    from bot.database.models import User
+    with get_db() as session:
+        session.add(User(id=1, username="tester", first_name="Tester"))
+    return 1
@@ -0,0 +1,100 @@
+"""Data backfills run after startup; readers catch up a user's rows before they finish"""
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import func
+
+from bot.database import backfill
+from bot.database.database import get_db
+from bot.database.history_repository import HistoryFilter, HistoryRepository
+from bot.database.migrations import content_history_fields
+from bot.database.models import ContentHistory, ContentHistoryHashtag, ContentPlan, PlanSlot
+from bot.database.plan_repository import PlanRepository
+from bot.services.data_backfill import DataBackfill
+
+
+@pytest.fixture(autouse=True)
+def fresh_progress(monkeypatch):
+    # The db fixture empties backfill_progress; forget completions cached by earlier tests
+    monkeypatch.setattr(backfill, "_completed", set())
+
+
+def _legacy_post(user_id, text, hashtags):
+    """A row written before the typed columns existed"""
+    with get_db() as db:
+        post = ContentHistory(
+            user_id=user_id,
+            content_type="text",
+            content_data={"text": text, "style": "дружелюбный", "hashtags": hashtags}
+        )
+        db.add(post)
+        db.flush()
+        return post.id
+
+
+def _legacy_plan(user_id, dates):
+    with get_db() as db:
+        plan = ContentPlan(
+            user_id=user_id,
+            plan_name="Старый план",
+            start_date=dates[0],
+            end_date=dates[-1],
+            frequency=3,
+            schedule={"time": "10:00", "topics": ["Сбор"], "dates": [day.isoformat() for day in dates]}
+        )
+        db.add(plan)
+        db.flush()
+        return plan.id
+
+
+def _hashtag_rows():
+    with get_db() as db:
+        return db.query(func.count()).select_from(ContentHistoryHashtag).scalar()
+
+
+def test_tag_filter_finds_rows_the_backfill_has_not_reached(user):
+    post_id = _legacy_post(user, "Привет", ["#Помощь", "волонтеры"])
+
+    page = HistoryRepository.get_page(user, history_filter=HistoryFilter(tag="помощь"))
+
+    assert [item.id for item in page.items] == [post_id]
+    with get_db() as db:
+        post = db.get(ContentHistory, post_id)
+        assert (post.style, post.text_length, post.hashtag_count) == ("дружелюбный", 6, 2)
+
+
+def test_upcoming_slots_include_plans_the_backfill_has_not_reached(user):
+    today = date.today()
+    plan_id = _legacy_plan(user, [today + timedelta(days=1), today + timedelta(days=3)])
+
+    slots = PlanRepository.get_upcoming_slots(user, today)
+
+    assert [slot.plan_id for slot in slots] == [plan_id, plan_id]
+    with get_db() as db:
+        assert "dates" not in db.get(ContentPlan, plan_id).schedule
+
+
+def test_background_run_skips_rows_readers_already_moved(user):
+    _legacy_post(user, "Один", ["#a"])
+    HistoryRepository.get_page(user, history_filter=HistoryFilter(tag="a"))
+    _legacy_post(user, "Два", ["#b", "#c"])
+    _legacy_plan(user, [date.today() + timedelta(days=2)])
+
+    asyncio.run(DataBackfill(pause_ms=0).run())
+
+    assert _hashtag_rows() == 3
+    with get_db() as db:
+        assert db.query(ContentHistory).filter(ContentHistory.hashtag_count.is_(None)).count() == 0
+        assert db.query(PlanSlot).count() == 1
+        assert backfill.is_completed(db, content_history_fields.BACKFILL_NAME)
+
+
+def test_readers_stop_querying_progress_once_completed(user):
+    asyncio.run(DataBackfill(pause_ms=0).run())
+    # A row left with NULL columns after completion is not picked up by readers any more
+    post_id = _legacy_post(user, "Поздно", ["#x"])
+
+    with get_db() as db:
+        assert content_history_fields.backfill_user(db, user) == 0
+        assert db.get(ContentHistory, post_id).hashtag_count is None
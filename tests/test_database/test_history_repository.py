@@ -0,0 +1,63 @@
+"""History keyset pagination: every row exactly once, in order"""
+from datetime import datetime, timedelta
+
+from alembic import command
+from sqlalchemy import text
+
+from bot.database.database import engine, get_alembic_config, get_db
+from bot.database.history_repository import HistoryRepository
+from bot.database.models import ContentHistory
+
+
+def _pages(user_id, page_size):
+    pages = []
+    cursor = None
+    while True:
+        page = HistoryRepository.get_page(user_id, cursor, page_size)
+        pages.append([item.id for item in page.items])
+        if not page.next_cursor:
+            return pages
+        assert len(pages) < 100, pages
+        cursor = page.next_cursor
+
+
+def test_pages_cover_all_rows_once_across_equal_timestamps(user):
+    moment = datetime(2030, 1, 1, 12, 0, 0)
+    with get_db() as db:
+        # Twelve rows in one second and a few with distinct times around them
+        for i in range(12):
+            db.add(ContentHistory(user_id=user, content_type="text", content_data={"text": str(i)}, generated_at=moment))
+        for minutes in (-2, -1, 1):
+            db.add(ContentHistory(
+                user_id=user, content_type="text", content_data={"text": "x"},
+                generated_at=moment + timedelta(minutes=minutes, microseconds=250)
+            ))
+
+    pages = _pages(user, page_size=5)
+    ids = [item_id for page in pages for item_id in page]
+
+    assert [len(page) for page in pages] == [5, 5, 5]
+    assert len(ids) == len(set(ids)) == 15
+    with get_db() as db:
+        expected = [row.id for row in db.query(ContentHistory.id).order_by(
+            ContentHistory.generated_at.desc(), ContentHistory.id.desc()
+        )]
+    assert ids == expected
+
+
+def test_rows_stored_by_current_timestamp_are_paged_after_migration(user):
+    # Rows written before the history writer: generated_at without fractional seconds
+    with get_db() as db:
+        for i in range(7):
+            db.add(ContentHistory(user_id=user, content_type="text", content_data={"text": str(i)}))
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE content_history SET generated_at = '2025-05-01 10:00:00'"))
+        alembic_cfg = get_alembic_config()
+        alembic_cfg.attributes["connection"] = connection
+        command.downgrade(alembic_cfg, "0008")
+        command.upgrade(alembic_cfg, "head")
+
+    pages = _pages(user, page_size=5)
+
+    assert [len(page) for page in pages] == [5, 2]
+    assert pages[0] + pages[1] == sorted(pages[0] + pages[1], reverse=True)
@@ -0,0 +1,38 @@
+"""History browsing: rendering of the filtered page"""
+from bot.database.database import get_db
+from bot.handlers.history import _render_history_page
+from bot.services.history_writer import HistoryWriter
+
+
+def _browse(tag=None):
+    return {"content_type": None, "favorites_only": False, "tag": tag, "cursors": [None], "next_cursor": None}
+
+
+def _add_post(user_id, text, hashtags):
+    row = HistoryWriter.make_row(user_id, "text", {"text": text, "hashtags": hashtags})
+    with get_db() as db:
+        HistoryWriter.insert(db, [row])
+
+
+def test_user_tag_is_escaped_for_markdown(user):
+    text, _ = _render_history_page(user, _browse("#добрые_дела"))
+
+    assert "🏷 #добрые\\_дела" in text
+
+
+def test_preview_is_escaped_for_markdown(user):
+    _add_post(user, "Спасибо *всем* за_помощь", ["#добрые_дела"])
+
+    text, _ = _render_history_page(user, _browse())
+
+    assert "Спасибо \\*всем\\* за\\_помощь" in text
+
+
+def test_tag_filter_matches_hashtags_case_insensitively_with_or_without_hash(user):
+    _add_post(user, "Субботник", ["#Добрые_Дела", "#эко"])
+    _add_post(user, "Отчет за месяц", ["#отчет"])
+
+    for tag in ("#добрые_дела", "Добрые_Дела", "#ДОБРЫЕ_ДЕЛА"):
+        text, _ = _render_history_page(user, _browse(tag))
+        assert "Субботник" in text, tag
+        assert "Отчет за месяц" not in text, tag
@@ -0,0 +1,94 @@
+"""Team screens: the number of SQL statements does not grow with shared content"""
+import asyncio
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+from bot.database.database import engine, get_db
+from bot.database.models import ContentHistory, SharedContent, Team, TeamMember, TeamRole, User
+from bot.handlers.team_advanced import show_pending_approval, show_shared_content, show_team_advanced_menu
+
+
+class _Message:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def _update(user_id):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), message=_Message(), callback_query=None)
+
+
+@contextmanager
+def _count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _seed(owner_id, items):
+    """Two teams of the owner with `items` posts by different authors, half approved"""
+    with get_db() as db:
+        teams = [Team(name=f"Команда {i}", owner_id=owner_id) for i in range(2)]
+        db.add_all(teams)
+        db.flush()
+        for team in teams:
+            db.add(TeamMember(team_id=team.id, user_id=owner_id, role=TeamRole.ADMIN.value))
+        for i in range(items):
+            author = User(id=1000 + i, first_name=f"Автор {i}")
+            db.add(author)
+            db.flush()
+            team = teams[i % len(teams)]
+            db.add(TeamMember(team_id=team.id, user_id=author.id, role=TeamRole.AUTHOR.value))
+            post = ContentHistory(user_id=author.id, content_type="text", content_data={"text": f"Пост {i}"})
+            db.add(post)
+            db.flush()
+            db.add(SharedContent(
+                team_id=team.id,
+                content_history_id=post.id,
+                shared_by=author.id,
+                is_approved=i % 2 == 0
+            ))
+
+
+SCREENS = [
+    # Handler and the number of statements it may issue
+    (show_team_advanced_menu, 1),
+    (show_shared_content, 1),
+    (show_pending_approval, 1),
+]
+
+
+@pytest.mark.parametrize("handler,expected", SCREENS, ids=[handler.__name__ for handler, _ in SCREENS])
+@pytest.mark.parametrize("items", [2, 30])
+def test_statement_count_does_not_depend_on_shared_items(user, handler, expected, items):
+    _seed(user, items)
+    update = _update(user)
+
+    with _count_statements() as statements:
+        asyncio.run(handler(update, SimpleNamespace(user_data={})))
+
+    assert len(statements) == expected, statements
+    assert update.message.replies
+
+
+@pytest.mark.parametrize("handler", [show_shared_content, show_pending_approval])
+def test_empty_screens_need_one_more_statement(user, handler):
+    update = _update(user)
+
+    with _count_statements() as statements:
+        asyncio.run(handler(update, SimpleNamespace(user_data={})))
+
+    # The list query comes back empty, then membership is checked for the message
+    assert len(statements) == 2, statements
@@ -0,0 +1,39 @@
+"""Startup: importing the bot stays cheap and leaves heavy optional packages unloaded"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# Cumulative import time of bot.main; override on slow machines
+BUDGET_MS = int(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+HEAVY_MODULES = ["matplotlib", "reportlab", "docx", "openpyxl", "icalendar", "PIL", "numpy", "vaderSentiment"]
+
+SCRIPT = f"""
+import json, sys
+import bot.main
+print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))
+"""
+
+
+def _import_bot():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT],
+        cwd=ROOT, env=dict(os.environ), capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if line.startswith("import time:") and line.rsplit("|", 1)[-1].strip() == "bot.main":
+            cumulative_us = int(line.split("|")[1])
+    assert cumulative_us is not None, result.stderr[-2000:]
+    return cumulative_us / 1000, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_bot_main_within_budget_without_heavy_modules():
+    elapsed_ms, loaded = _import_bot()
+
+    assert loaded == []
+    assert elapsed_ms <= BUDGET_MS, f"import bot.main took {elapsed_ms:.0f} ms (budget {BUDGET_MS} ms)"
@@ -0,0 +1,63 @@
+"""Write-behind history writer: poison rows must not block the queue"""
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from bot.database.database import get_db
+from bot.database.models import ContentHistory
+from bot.services.history_writer import HistoryWriter
+
+
+def _writer(max_attempts=3):
+    return HistoryWriter(flush_interval_ms=10, batch_size=100, max_attempts=max_attempts)
+
+
+def _history_count():
+    with get_db() as db:
+        return db.execute(select(func.count()).select_from(ContentHistory)).scalar()
+
+
+def test_make_row_rejects_values_that_are_not_json():
+    with pytest.raises(TypeError, match="content_data"):
+        HistoryWriter.make_row(1, "text", {"text": "x", "when": datetime.now()})
+    with pytest.raises(TypeError, match="extra_data"):
+        HistoryWriter.make_row(1, "text", {"text": "x"}, extra_data={"raw": object()})
+
+
+def test_poison_row_is_dropped_after_max_attempts(user):
+    writer = _writer(max_attempts=3)
+    good = [writer.make_row(user, "text", {"text": f"post {i}"}) for i in range(3)]
+    # Unknown user: a foreign key violation on every attempt
+    poison = writer.make_row(999, "text", {"text": "orphan"})
+    writer._pending.extend([good[0], poison, good[1], good[2]])
+
+    for _ in range(2):
+        with pytest.raises(Exception):
+            writer.flush()
+        assert len(writer._pending) == 4
+        assert _history_count() == 0
+
+    # Third failure: the batch is written row by row and the culprit is dropped
+    writer.flush()
+    assert not writer._pending
+    assert not writer._attempts
+    assert _history_count() == 3
+
+    # The queue is no longer blocked
+    writer._pending.append(writer.make_row(user, "text", {"text": "next"}))
+    assert writer.flush() == 1
+    assert _history_count() == 4
+
+
+def test_flush_user_writes_only_that_user_and_does_not_raise(user):
+    writer = _writer(max_attempts=5)
+    writer._pending.append(writer.make_row(user, "text", {"text": "mine"}))
+    writer._pending.append(writer.make_row(999, "text", {"text": "orphan"}))
+
+    assert asyncio.run(writer.flush_user(user)) == 1
+    assert _history_count() == 1
+    # A failing row of another user does not propagate to the handler
+    assert asyncio.run(writer.flush_user(999)) == 0
+    assert len(writer._pending) == 1
@@ -0,0 +1,73 @@
+"""Outbox dispatcher: per-chat limits hold for sequential sends"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+from bot.services import outbox as outbox_module
+from bot.services.outbox import OutboundDispatcher, TokenBucket
+
+
+class _Bot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **options):
+        self.sent.append((chat_id, time.monotonic()))
+        return SimpleNamespace(chat_id=chat_id, text=text)
+
+
+def _dispatcher():
+    # 10 messages a second to a private chat, 5 a second to a group
+    return OutboundDispatcher(
+        global_rate=1000, chat_rate=10, group_rate_per_minute=300, max_attempts=3, poll_interval=60
+    )
+
+
+def _gaps(sent, chat_id):
+    times = [at for sent_chat_id, at in sent if sent_chat_id == chat_id]
+    return [later - earlier for earlier, later in zip(times, times[1:])]
+
+
+def test_sequential_sends_to_one_chat_are_spaced_by_its_rate(db):
+    async def scenario():
+        dispatcher = _dispatcher()
+        bot = _Bot()
+        await dispatcher.start(bot)
+        try:
+            # Each send waits for delivery, so the chat queue drains in between
+            for _ in range(5):
+                await dispatcher.send(-100, "group")
+            for _ in range(4):
+                await dispatcher.send(42, "private")
+        finally:
+            await dispatcher.stop()
+        return bot.sent
+
+    sent = asyncio.run(scenario())
+    assert all(gap >= 0.2 * 0.95 for gap in _gaps(sent, -100)), _gaps(sent, -100)
+    assert all(gap >= 0.1 * 0.95 for gap in _gaps(sent, 42)), _gaps(sent, 42)
+
+
+def test_only_refilled_buckets_of_idle_chats_are_forgotten(monkeypatch):
+    monkeypatch.setattr(outbox_module, "MAX_CHAT_BUCKETS", 2)
+    dispatcher = _dispatcher()
+
+    busy = dispatcher._bucket(-1, time.monotonic())
+    busy.consume(time.monotonic())
+    dispatcher._bucket(2, time.monotonic())
+    # Chat -1 is still limited, so the refilled bucket of chat 2 goes instead
+    dispatcher._bucket(3, time.monotonic())
+    assert list(dispatcher._buckets) == [-1, 3]
+    assert dispatcher._bucket(-1, time.monotonic()) is busy
+
+    # Once all are refilled, the least recently used one (3, after the lookup of -1) is dropped
+    dispatcher._bucket(4, time.monotonic() + 1)
+    assert list(dispatcher._buckets) == [-1, 4]
+
+
+def test_token_bucket_full_after_refill():
+    bucket = TokenBucket(rate=2, capacity=1)
+    now = bucket.updated
+    bucket.consume(now)
+    assert not bucket.full(now + 0.25)
+    assert bucket.full(now + 0.5)
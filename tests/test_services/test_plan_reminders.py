@@ -0,0 +1,102 @@
+"""Plan reminders: indexed selection of due rows and timezone offset refresh"""
+import asyncio
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import select
+
+from bot.database.database import get_db
+from bot.database.models import ContentPlan, NotificationSettings, PlanReminder
+from bot.services import plan_reminders as plan_reminders_module
+from bot.services.plan_reminders import PlanReminderEngine
+
+# 2030-01-07 is a Monday
+MONDAY = date(2030, 1, 7)
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    messages = []
+
+    async def enqueue_many(batch, priority, **options):
+        messages.extend(batch)
+        return len(batch)
+
+    monkeypatch.setattr(plan_reminders_module.outbox, "enqueue_many", enqueue_many)
+    return messages
+
+
+def _plan(user_id, days, at, timezone="Europe/Moscow", name="План"):
+    with get_db() as db:
+        if not db.scalar(select(NotificationSettings.id).where(NotificationSettings.user_id == user_id)):
+            db.add(NotificationSettings(user_id=user_id, timezone=timezone))
+        plan = ContentPlan(
+            user_id=user_id, plan_name=name, start_date=date(2030, 1, 1), end_date=date(2030, 12, 31),
+            frequency=len(days), schedule={"days": days, "time": at}, is_active=True
+        )
+        db.add(plan)
+        db.flush()
+        return plan.id
+
+
+def _rows(plan_id):
+    with get_db() as db:
+        return db.execute(
+            select(PlanReminder.weekday_utc, PlanReminder.minute_utc, PlanReminder.utc_offset)
+            .where(PlanReminder.plan_id == plan_id)
+            .order_by(PlanReminder.weekday_utc)
+        ).all()
+
+
+def test_tick_selects_only_due_rows_once(user, sent):
+    engine = PlanReminderEngine(misfire_grace_seconds=300)
+    due = _plan(user, [1, 3], "09:00", name="Понедельник")
+    later = _plan(user, [1], "10:00", name="Позже")
+    engine.sync_plans([due, later])
+    # Moscow is UTC+3: Monday 09:00 local is Monday 06:00 UTC
+    assert _rows(due) == [(0, 360, 180), (2, 360, 180)]
+
+    assert asyncio.run(engine.tick(datetime(2030, 1, 7, 6, 0))) == 1
+    assert sent == [(user, "📅 Напоминание: сегодня запланирован пост по контент-плану 'Понедельник'")]
+    # Same minute again, and a restarted engine within the misfire window: nothing new
+    assert asyncio.run(engine.tick(datetime(2030, 1, 7, 6, 0))) == 0
+    assert asyncio.run(PlanReminderEngine(misfire_grace_seconds=300).tick(datetime(2030, 1, 7, 6, 3))) == 0
+
+    assert asyncio.run(engine.tick(datetime(2030, 1, 7, 7, 0))) == 1
+    assert sent[-1][1].endswith("'Позже'")
+
+
+def test_tick_uses_the_users_date_across_midnight(user, sent):
+    engine = PlanReminderEngine(misfire_grace_seconds=60)
+    plan_id = _plan(user, [2], "01:30")
+    engine.sync_plans([plan_id])
+    # Tuesday 01:30 in Moscow is Monday 22:30 UTC
+    assert _rows(plan_id) == [(0, 22 * 60 + 30, 180)]
+
+    assert asyncio.run(engine.tick(datetime(2030, 1, 7, 22, 30))) == 1
+    with get_db() as db:
+        assert db.scalar(select(PlanReminder.last_sent_on).where(PlanReminder.plan_id == plan_id)) == date(2030, 1, 8)
+
+
+def test_cancelled_plan_is_not_selected(user, sent):
+    engine = PlanReminderEngine(misfire_grace_seconds=60)
+    plan_id = _plan(user, [1], "09:00")
+    engine.sync_plans([plan_id])
+    asyncio.run(engine.cancel(plan_id))
+
+    assert asyncio.run(engine.tick(datetime(2030, 1, 7, 6, 0))) == 0
+    assert not sent
+
+
+def test_refresh_offsets_moves_rows_when_the_offset_changes(user, monkeypatch):
+    engine = PlanReminderEngine(misfire_grace_seconds=60)
+    plan_id = _plan(user, [1], "09:00", timezone="Europe/Berlin")
+    monkeypatch.setattr(plan_reminders_module, "utc_offset_minutes", lambda tz: 60)
+    engine.sync_plans([plan_id])
+    assert _rows(plan_id) == [(0, 8 * 60, 60)]
+
+    # Daylight saving time starts: Berlin moves to UTC+2
+    monkeypatch.setattr(plan_reminders_module, "utc_offset_minutes", lambda tz: 120)
+    assert engine._refresh_offsets() == 1
+    assert _rows(plan_id) == [(0, 7 * 60, 120)]
+    assert engine._refresh_offsets() == 0
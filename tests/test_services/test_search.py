@@ -0,0 +1,22 @@
+"""Full-text search: the index comes from the migrations"""
+from bot.database.database import get_db
+from bot.services.content.search import ContentSearchService
+from bot.services.history_writer import HistoryWriter
+
+
+def test_index_created_by_migration_is_detected_and_searchable(user):
+    service = ContentSearchService()
+    service.ensure_index()
+    assert service.available
+
+    rows = [
+        HistoryWriter.make_row(user, "text", {"text": "Собираем волонтеров на субботник", "hashtags": ["#эко"]}),
+        HistoryWriter.make_row(user, "text", {"text": "Отчет о благотворительном концерте"}),
+    ]
+    with get_db() as db:
+        HistoryWriter.insert(db, rows)
+
+    page = service.search(user, "волонтеры")
+    assert len(page.results) == 1
+    assert "волонтер" in page.results[0].snippet
+    assert not service.search(user + 1, "волонтеры").results
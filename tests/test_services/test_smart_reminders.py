@@ -0,0 +1,38 @@
+"""Adaptive reminders: any process can schedule them, process 0 runs them"""
+import asyncio
+from datetime import datetime, timedelta
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from bot.services import scheduler as scheduler_module
+from bot.services.smart_reminders import SmartReminderService
+
+
+def test_worker_without_reminders_writes_the_job_to_the_shared_store(user, monkeypatch):
+    monkeypatch.setattr(scheduler_module, "scheduler", AsyncIOScheduler())
+    scheduled_time = datetime.now() + timedelta(days=1)
+
+    async def scenario():
+        scheduler_module.start_scheduler(reminders=False)
+        try:
+            assert not scheduler_module.reminders_enabled()
+            await SmartReminderService.schedule_adaptive_reminder(user, 7, scheduled_time)
+        finally:
+            scheduler_module.stop_scheduler()
+
+        # What process 0 sees in the same job store
+        executing = AsyncIOScheduler()
+        executing.add_jobstore(scheduler_module._reminder_jobstore(), scheduler_module.REMINDER_JOBSTORE)
+        executing.start(paused=True)
+        try:
+            return executing.get_jobs(scheduler_module.REMINDER_JOBSTORE)
+        finally:
+            for job in executing.get_jobs():
+                job.remove()
+            executing.shutdown(wait=False)
+
+    jobs = asyncio.run(scenario())
+
+    assert [job.args for job in jobs] == [(7,)]
+    assert jobs[0].func is scheduler_module.send_reminder
+    assert jobs[0].next_run_time.replace(tzinfo=None) == scheduled_time - timedelta(hours=1)
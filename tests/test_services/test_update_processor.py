@@ -0,0 +1,94 @@
+"""Concurrent update processing: parallel across users, in order within one"""
+import asyncio
+import random
+from datetime import datetime, timezone
+
+from telegram import Chat, Message, Update, User
+
+from bot.services.update_processor import UserOrderedUpdateProcessor
+
+
+def _update(update_id, user_id):
+    return Update(update_id=update_id, message=Message(
+        message_id=update_id,
+        date=datetime.now(timezone.utc),
+        chat=Chat(id=user_id, type=Chat.PRIVATE),
+        from_user=User(id=user_id, first_name="u", is_bot=False),
+        text="x"
+    ))
+
+
+async def _feed(processor, updates, handler):
+    """Starts one task per update in arrival order, as Application does"""
+    tasks = [asyncio.create_task(processor.process_update(update, handler(update))) for update in updates]
+    await asyncio.gather(*tasks)
+
+
+def test_updates_of_one_user_run_in_order_and_never_overlap():
+    processor = UserOrderedUpdateProcessor(max_concurrent_updates=4, max_pending_updates=100)
+    rnd = random.Random(1)
+    updates = [_update(update_id, rnd.randint(1, 5)) for update_id in range(60)]
+    handled = {}
+    running = set()
+    overlaps = []
+    peak = 0
+
+    async def handle(update):
+        nonlocal peak
+        user_id = update.effective_user.id
+        if user_id in running:
+            overlaps.append(update.update_id)
+        running.add(user_id)
+        peak = max(peak, len(running))
+        await asyncio.sleep(rnd.random() / 200)
+        handled.setdefault(user_id, []).append(update.update_id)
+        running.discard(user_id)
+
+    asyncio.run(_feed(processor, updates, handle))
+
+    assert not overlaps
+    for user_id, update_ids in handled.items():
+        assert update_ids == sorted(update_ids), user_id
+    assert sum(map(len, handled.values())) == len(updates)
+    # Different users did run in parallel, within the bound
+    assert 1 < peak <= 4
+    assert processor.queued_keys == 0
+
+
+def test_slow_user_does_not_block_others():
+    processor = UserOrderedUpdateProcessor(max_concurrent_updates=2, max_pending_updates=100)
+    finished = []
+
+    async def handle(update):
+        await asyncio.sleep(0.5 if update.effective_user.id == 1 else 0.01)
+        finished.append(update.update_id)
+
+    updates = [_update(0, 1), _update(1, 1)] + [_update(update_id, 2) for update_id in range(2, 12)]
+    asyncio.run(_feed(processor, updates, handle))
+
+    # User 2 finished everything while user 1 was still on its first update
+    assert finished[:10] == list(range(2, 12))
+    assert finished[10:] == [0, 1]
+
+
+def test_cancelled_update_releases_its_queue():
+    async def scenario():
+        processor = UserOrderedUpdateProcessor(max_concurrent_updates=1, max_pending_updates=10)
+        gate = asyncio.Event()
+        order = []
+
+        async def handle(update):
+            if update.update_id == 0:
+                await gate.wait()
+            order.append(update.update_id)
+
+        tasks = [asyncio.create_task(processor.process_update(_update(i, 1), handle(_update(i, 1)))) for i in range(3)]
+        await asyncio.sleep(0)
+        tasks[1].cancel()
+        gate.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return order, processor.queued_keys
+
+    order, queued = asyncio.run(scenario())
+    assert order == [0, 2]
+    assert queued == 0
@@ -0,0 +1,113 @@
+"""Webhook server: secret check, backpressure and drain on shutdown"""
+import asyncio
+import socket
+
+import aiohttp
+from telegram import Bot
+
+from bot.services.webhook import RETRY_AFTER_SECONDS, SECRET_HEADER, InFlightLimitedQueue, WebhookServer
+
+SECRET = "s3cret"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _server(update_queue, queue_size=1):
+    return WebhookServer(
+        bot=Bot("123:test"),
+        update_queue=update_queue,
+        path="/telegram",
+        secret_token=SECRET,
+        host="127.0.0.1",
+        port=_free_port(),
+        queue_size=queue_size
+    )
+
+
+def fake_update(update_id, user_id=1):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+            "text": f"message {update_id}"
+        }
+    }
+
+
+async def _post(session, server, payload, secret=SECRET):
+    headers = {SECRET_HEADER: secret} if secret is not None else {}
+    url = f"http://{server.host}:{server.port}{server.path}"
+    async with session.post(url, json=payload, headers=headers) as response:
+        return response.status, response.headers.get("Retry-After")
+
+
+def test_wrong_or_missing_secret_is_forbidden():
+    async def scenario():
+        server = _server(InFlightLimitedQueue(10))
+        await server.start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                wrong = await _post(session, server, fake_update(1), secret="nope")
+                missing = await _post(session, server, fake_update(2), secret=None)
+        finally:
+            await server.stop()
+        return wrong, missing, server.update_queue.qsize()
+
+    wrong, missing, queued = asyncio.run(scenario())
+    assert wrong[0] == 403
+    assert missing[0] == 403
+    assert queued == 0
+
+
+def test_malformed_update_is_rejected():
+    async def scenario():
+        server = _server(InFlightLimitedQueue(10))
+        await server.start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                url = f"http://{server.host}:{server.port}{server.path}"
+                async with session.post(url, data=b"{not json", headers={SECRET_HEADER: SECRET}) as response:
+                    return response.status
+        finally:
+            await server.stop()
+
+    assert asyncio.run(scenario()) == 400
+
+
+def test_full_queue_answers_503_with_retry_after_and_drains_accepted_updates():
+    async def scenario():
+        # One update in the application, one held by the forwarder, one in the ingress queue
+        update_queue = InFlightLimitedQueue(1)
+        server = _server(update_queue, queue_size=1)
+        await server.start()
+        async with aiohttp.ClientSession() as session:
+            statuses = []
+            for update_id in range(1, 6):
+                statuses.append(await _post(session, server, fake_update(update_id)))
+                await asyncio.sleep(0.01)
+
+        processed = []
+
+        async def consume():
+            while True:
+                update = await update_queue.get()
+                processed.append(update.update_id)
+                update_queue.task_done()
+
+        consumer = asyncio.create_task(consume())
+        await asyncio.wait_for(server.stop(), timeout=5)
+        consumer.cancel()
+        return statuses, processed
+
+    statuses, processed = asyncio.run(scenario())
+    assert statuses[:3] == [(200, None)] * 3
+    assert statuses[3:] == [(503, str(RETRY_AFTER_SECONDS))] * 2
+    # Accepted updates are not lost on shutdown and keep their order
+    assert processed == [1, 2, 3]
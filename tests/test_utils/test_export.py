@@ -0,0 +1,71 @@
+"""Single-format exports: rows are read on the loop, the format is written off it"""
+import asyncio
+import csv
+import threading
+from datetime import date
+
+import pytest
+
+from bot.database.database import get_db
+from bot.database.models import ContentPlan
+from bot.services.export_cache import export_cache
+from bot.services.history_writer import HistoryWriter
+from bot.utils import export
+
+
+@pytest.fixture
+def exports_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_DIR", tmp_path)
+    monkeypatch.setattr(export_cache, "exports_dir", tmp_path)
+    return tmp_path
+
+
+def _record_thread(monkeypatch, name):
+    """Wraps the format writer `name` to remember which thread ran it"""
+    threads = []
+    original = getattr(export, name)
+
+    def writer(path, rows):
+        threads.append(threading.current_thread())
+        return original(path, rows)
+
+    monkeypatch.setattr(export, name, writer)
+    return threads
+
+
+def test_texts_csv_is_written_off_the_event_loop(user, exports_dir, monkeypatch):
+    rows = [HistoryWriter.make_row(user, "text", {"text": f"Пост {i}", "hashtags": ["#нко"]}) for i in range(3)]
+    rows.append(HistoryWriter.make_row(user, "image", {"prompt": "not a text"}))
+    with get_db() as db:
+        HistoryWriter.insert(db, rows)
+    threads = _record_thread(monkeypatch, "_write_texts_csv")
+
+    path = asyncio.run(export.export_texts_to_csv(user))
+
+    assert threads and threads[0] is not threading.main_thread()
+    with open(path, encoding="utf-8") as f:
+        table = list(csv.reader(f))
+    assert sorted(row[1] for row in table[1:]) == ["Пост 0", "Пост 1", "Пост 2"]
+    # Only the finished file is left in the exports directory
+    assert [p.name for p in exports_dir.iterdir()] == [path.name]
+
+
+def test_plans_csv_reads_rows_before_writing(user, exports_dir, monkeypatch):
+    with get_db() as db:
+        db.add(ContentPlan(
+            user_id=user, plan_name="Осень", start_date=date(2030, 9, 1), end_date=date(2030, 11, 30),
+            frequency=2, schedule={"days": [1, 4], "time": "10:00", "topics": ["отчет", "история"]}, is_active=True
+        ))
+    threads = _record_thread(monkeypatch, "_write_plans_csv")
+
+    path = asyncio.run(export.export_content_plan_to_csv(user))
+
+    assert threads and threads[0] is not threading.main_thread()
+    with open(path, encoding="utf-8") as f:
+        table = list(csv.reader(f))
+    assert table[1] == ["Осень", "01.09.2030", "30.11.2030", "2 раз в неделю", "пн, чт", "10:00", "отчет, история"]
+
+
+def test_empty_export_returns_none_and_leaves_no_files(user, exports_dir):
+    assert asyncio.run(export.export_history_to_txt(user)) is None
+    assert not list(exports_dir.iterdir())
@@ -0,0 +1,110 @@
+"""
+Local harness for the webhook mode: posts fake updates and reports the answers
+
+Against a running bot (BOT_MODE=webhook):
+
+    python -m tests.webhook_harness --url http://127.0.0.1:8443/telegram --secret $WEBHOOK_SECRET
+
+Without --url an embedded WebhookServer is started with a consumer that
+spends --work-ms on every update, which shows backpressure (503 with
+Retry-After) and the drain of accepted updates on shutdown. Senders resend
+rejected updates after Retry-After, as Telegram does.
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import aiohttp
+from telegram import Bot
+
+from bot.services.webhook import SECRET_HEADER, InFlightLimitedQueue, WebhookServer
+from tests.test_services.test_webhook import fake_update
+
+
+async def _send(session, url, secret, update_id, users, statuses, latencies):
+    payload = fake_update(update_id, user_id=update_id % users + 1)
+    while True:
+        started = time.perf_counter()
+        async with session.post(url, json=payload, headers={SECRET_HEADER: secret}) as response:
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status] += 1
+            if response.status != 503:
+                return
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+
+
+async def _post_all(url, secret, updates, users, parallel):
+    statuses = Counter()
+    latencies = []
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def send(update_id):
+        async with semaphore:
+            await _send(session, url, secret, update_id, users, statuses, latencies)
+
+    async with aiohttp.ClientSession() as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(send(update_id) for update_id in range(1, updates + 1)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"sent {updates} updates in {elapsed:.2f} s, answers: {dict(statuses)}")
+    print(
+        f"latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms"
+    )
+
+
+async def _local(args):
+    update_queue = InFlightLimitedQueue(args.in_flight)
+    server = WebhookServer(
+        bot=Bot("123:harness"),
+        update_queue=update_queue,
+        path="/telegram",
+        secret_token=args.secret,
+        host="127.0.0.1",
+        port=args.port,
+        queue_size=args.queue_size
+    )
+    processed = []
+
+    async def consume():
+        while True:
+            update = await update_queue.get()
+            await asyncio.sleep(args.work_ms / 1000)
+            processed.append(update.update_id)
+            update_queue.task_done()
+
+    consumers = [asyncio.create_task(consume()) for _ in range(args.in_flight)]
+    await server.start()
+    try:
+        await _post_all(f"http://127.0.0.1:{args.port}/telegram", args.secret, args.updates, args.users, args.parallel)
+    finally:
+        await server.stop()
+        for consumer in consumers:
+            consumer.cancel()
+    print(f"processed {len(processed)} of {args.updates}, lost {args.updates - len(set(processed))}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Webhook URL of a running bot")
+    parser.add_argument("--secret", default="harness-secret")
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--parallel", type=int, default=50, help="Concurrent requests")
+    parser.add_argument("--port", type=int, default=8444, help="Port of the embedded server")
+    parser.add_argument("--queue-size", type=int, default=100, help="WEBHOOK_QUEUE_SIZE of the embedded server")
+    parser.add_argument("--in-flight", type=int, default=16, help="UPDATE_MAX_PENDING of the embedded server")
+    parser.add_argument("--work-ms", type=float, default=20.0, help="Handling time per update")
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(_post_all(args.url, args.secret, args.updates, args.users, args.parallel))
+    else:
+        asyncio.run(_local(args))
+
+
+if __name__ == "__main__":
+    main()